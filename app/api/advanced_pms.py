@@ -3,10 +3,15 @@ Advanced PMS Integration Endpoints
 """
 
 from fastapi import APIRouter, HTTPException, UploadFile, File, Form, Request, Body
-from fastapi.responses import JSONResponse
 from typing import List, Dict, Any
 import os
+from app.core import json_codec
+from app.core.json_codec import CodecJSONResponse
 from app.core.logging import get_logger
+from app.core.mapping_loader import mapping_loader
+from app.core.message_schema import MessageValidationError
+from app.core.pipeline import build_document, translate_combined
+from app.plugins import plugin_registry
 
 router = APIRouter(prefix="/api/v1")
 
@@ -15,7 +20,7 @@ logger = get_logger("advanced_pms")
 
 # Add this at the top, after imports
 PMS_REGISTRY = {
-    "cloudbeds": {"code": "cloudbeds", "name": "Cloudbeds", "status": "active", "description": "Sample PMS"}
+    "cloudbeds": {"code": "cloudbeds", "name": "Cloudbeds", "status": "active", "description": "Sample PMS", "combined_avail_rate": True}
 }
 
 # --- PMS Management ---
@@ -81,7 +86,7 @@ async def get_mapping(pms_code: str) -> Any:
         raise HTTPException(status_code=404, detail="Mapping not found")
     with open(mapping_path, "r", encoding="utf-8") as f:
         logger.info(f"Fetched mapping for PMS: {pms_code}")
-        return JSONResponse(content={"mapping": f.read()})
+        return CodecJSONResponse(content={"mapping": f.read()})
 
 @router.post("/mappings/{pms_code}")
 async def upload_mapping(pms_code: str, file: UploadFile = File(...)) -> Dict[str, Any]:
@@ -93,6 +98,7 @@ async def upload_mapping(pms_code: str, file: UploadFile = File(...)) -> Dict[st
     content = await file.read()
     with open(mapping_path, "wb") as f:
         f.write(content)
+    mapping_loader.invalidate(pms_code)
     logger.info(f"Uploaded mapping for PMS: {pms_code}")
     return {"message": f"Mapping for '{pms_code}' uploaded"}
 
@@ -133,6 +139,7 @@ async def delete_mapping(pms_code: str) -> dict:
         logger.warning(f"Mapping not found for PMS (delete): {pms_code}")
         raise HTTPException(status_code=404, detail="Mapping not found")
     os.remove(mapping_path)
+    mapping_loader.invalidate(pms_code)
     logger.info(f"Deleted mapping for PMS: {pms_code}")
     return {"message": f"Mapping for '{pms_code}' deleted"}
 
@@ -158,7 +165,7 @@ async def get_schema(pms_code: str) -> Any:
         raise HTTPException(status_code=404, detail="Schema not found")
     # Return the first one for now
     with open(os.path.join(schema_dir, files[0]), "r", encoding="utf-8") as f:
-        return JSONResponse(content={"schema": f.read(), "filename": files[0]})
+        return CodecJSONResponse(content={"schema": f.read(), "filename": files[0]})
 
 @router.get("/schemas")
 async def list_schemas() -> dict:
@@ -207,21 +214,32 @@ async def register_translator(pms_code: str, file: UploadFile = File(...)) -> Di
 async def test_translation(pms_code: str, request: Request) -> Dict[str, Any]:
     """Test translation with sample PMS message, return RGBridge XML and validation result"""
     logger.info(f"called test_translation")
-    data = await request.json()
+    data = json_codec.loads(await request.body())
     pms_config = PMS_REGISTRY.get(pms_code, {"combined_avail_rate": False})
 
     if pms_config.get("combined_avail_rate"):
-        # Stub: split message into availability and rate
-        avail_data = data.get("availability", {})
-        rate_data = data.get("rate", {})
-        # Stub: translate to RGBridge XML
-        xml_avail = f"<xml><availability>{avail_data}</availability></xml>"
-        xml_rate = f"<xml><rate>{rate_data}</rate></xml>"
-        # Stub: validate XML (always True)
-        return {
-            "availability": {"translated": avail_data, "xml": xml_avail, "valid": True},
-            "rate": {"translated": rate_data, "xml": xml_rate, "valid": True}
-        }
+        # Availability and rates come from the same message, translated in one pass
+        translator = plugin_registry.get_translator_instance(pms_code)
+        if translator is None:
+            raise HTTPException(status_code=404, detail=f"No translator registered for PMS: {pms_code}")
+        try:
+            translator.check_schema(data)
+        except MessageValidationError as e:
+            logger.error(f"Schema validation failed for PMS {pms_code}: {e}")
+            raise HTTPException(status_code=400, detail=f"Message validation failed: {e}")
+        try:
+            translated = translate_combined(translator, data)
+        except Exception as e:
+            logger.error(f"Translation failed for PMS {pms_code}: {e}")
+            raise HTTPException(status_code=400, detail=f"Translation failed: {e}")
+        preview = {}
+        for msg_type, rows in translated.items():
+            hotel_code = (rows[0].get("HotelCode") if rows else None) or "UNKNOWN"
+            xml_body, xsd_error = build_document(msg_type, hotel_code, rows, pms_code=pms_code)
+            preview[msg_type.value] = {
+                "translated": rows, "xml": xml_body.decode("utf-8"), "valid": xsd_error is None, "error": xsd_error
+            }
+        return preview
     else:
         # Normal processing
         return {"translated": data, "xml": "<xml>...</xml>", "valid": True} 
\ No newline at end of file
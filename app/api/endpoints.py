@@ -4,18 +4,38 @@ API endpoints for RGBridge PMS Integration Platform
 
 from fastapi import APIRouter, Depends, HTTPException, Request, Query
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from typing import Dict, Any
+from typing import AsyncIterator, Awaitable, Callable, Dict, Any, List, Optional, Tuple
+import asyncio
+import functools
+import itertools
 import logging
 from fastapi.responses import Response
 import os
+import httpx
 
 from app.core.config import settings
-from app.core.logging import get_logger
+from app.core.logging import get_logger, log_payload
+from app.core import json_codec
+from app.core.json_codec import CodecJSONResponse
 from app.plugins import plugin_registry
-from app.plugins.base import MessageType
-from app.core.xml_builder import build_avail_notif_xml, build_rate_amount_notif_xml
-from app.core.xsd_validator import validate_xml_with_xsd
+from app.plugins.base import BasePMSTranslator, MessageType
+from app.core.pipeline import (
+    MultipleHotelsError, build_document, build_document_from_columns, check_document_rows,
+    ensure_single_hotel, ensure_single_hotel_columns, group_by_hotel, iter_document_xml,
+    iter_document_xml_from_columns, iter_translated, iter_translated_columns, translate_combined
+)
+from app.core.xsd_validator import XMLStreamValidationError
 from app.core.internal_api_client import post_xml_to_internal_api
+from app.core.delivery_queue import delivery_queue, delivery_spool
+from app.core.coalescer import coalescer
+from app.core.metrics import IDEMPOTENT_REPLAYS, ROWS_REJECTED, STAGE_SECONDS, VALIDATION_FAILURES, XML_BYTES, counted
+from app.core.idempotency import CachedResponse, idempotency_store, message_key
+from app.core.json_stream import ChunkChannel, StreamedJSONError, StreamedList, StreamingJSONParser, aiter_in_thread
+from app.core.mapping_loader import mapping_loader
+from app.core.message_schema import MessageValidationError
+from app.core.conversions import ConversionError
+from app.core.quarantine import row_quarantine
+from app.core.row_screening import RejectedItem, screen_items
 
 # Create router
 router = APIRouter()
@@ -26,6 +46,31 @@ security = HTTPBearer(auto_error=False)
 # Get logger
 logger = get_logger("api")
 
+# Delivery modes for PMS messages
+DELIVERY_SYNC = "sync"
+DELIVERY_ASYNC = "async"
+DELIVERY_COALESCE = "coalesce"
+DELIVERY_MODES = (DELIVERY_SYNC, DELIVERY_ASYNC, DELIVERY_COALESCE)
+
+# message_type producing both OTA documents from a message carrying availability and rates
+COMBINED_MESSAGE_TYPE = "combined"
+COMBINED_MESSAGE_TYPES = (MessageType.AVAILABILITY, MessageType.RATE)
+
+# Response header marking a replayed outcome of an earlier identical message
+IDEMPOTENT_REPLAY_HEADER = "X-Idempotent-Replay"
+
+# Metrics stage covering the hand-off for each delivery mode
+DELIVERY_STAGES = {DELIVERY_SYNC: "upstream", DELIVERY_ASYNC: "spool", DELIVERY_COALESCE: "buffer"}
+
+# Handling of invalid rows: fail the whole message, or deliver the valid rows
+INVALID_ROWS_REJECT = "reject"
+INVALID_ROWS_SKIP = "skip"
+INVALID_ROWS_MODES = (INVALID_ROWS_REJECT, INVALID_ROWS_SKIP)
+
+
+class RowLevelError(HTTPException):
+    """Schema, translation or XSD failure that individual items of the message may cause"""
+
 
 async def verify_api_key(
     credentials: HTTPAuthorizationCredentials = Depends(security),
@@ -44,7 +89,7 @@ async def verify_api_key(
     Raises:
         HTTPException: If authentication fails
     """
-    logger.info(f"called verify_api_key")
+    logger.debug("called verify_api_key")
     # Check if API keys are configured
     if not settings.API_KEYS:
         logger.warning("No API keys configured, skipping authentication")
@@ -65,7 +110,7 @@ async def verify_api_key(
         )
     
     if api_key not in settings.API_KEYS:
-        logger.warning(f"Invalid API key provided: {api_key[:8]}...")
+        logger.warning("Invalid API key provided: %s...", api_key[:8])
         raise HTTPException(
             status_code=401,
             detail="Invalid API key"
@@ -92,11 +137,10 @@ async def pms_endpoint(
     Returns:
         Response indicating message received
     """
-    logger.info(f"Received message from PMS: {pms_code}")
+    logger.info("Received message from PMS: %s", pms_code)
     
     # Log request details
-    logger.debug(f"Request method: {request.method}")
-    logger.debug(f"Request headers: {dict(request.headers)}")
+    logger.debug("Request method: %s", request.method)
     
     # TODO: Implement PMS-specific message processing
     # This will be expanded in Phase 3
@@ -112,77 +156,907 @@ async def pms_endpoint(
 async def pms_post_endpoint(
     pms_code: str,
     request: Request,
-    message_type: str = Query(..., description="Type of message: availability or rate"),
+    message_type: str = Query(..., description="Type of message: availability, rate, or combined for both from one message"),
+    delivery: str = Query("sync", description="sync: wait for the internal API; async: spool and return 202; coalesce: buffer and merge with other updates"),
+    invalid_rows: Optional[str] = Query(None, description="reject: fail the message on any invalid row; skip: deliver the valid rows and report the others (default: INVALID_ROWS)"),
     authenticated: bool = Depends(verify_api_key)
 ) -> Response:
     """
     Receive PMS message, validate, translate to RGBridge XML, validate, and post to internal API
     """
-    logger.info(f"Received POST message from PMS: {pms_code}")
-    logger.debug(f"Request method: {request.method}")
-    logger.debug(f"Request headers: {dict(request.headers)}")
+    logger.info("Received POST message from PMS: %s", pms_code)
+    _check_delivery_mode(delivery)
+    invalid_rows = (invalid_rows or settings.INVALID_ROWS).lower()
+    if invalid_rows not in INVALID_ROWS_MODES:
+        logger.error("Invalid invalid_rows mode: %s", invalid_rows)
+        raise HTTPException(status_code=400, detail=f"Invalid invalid_rows. Use one of: {', '.join(INVALID_ROWS_MODES)}.")
+    skip_invalid = invalid_rows == INVALID_ROWS_SKIP
 
     # Get translator
-    translator_class = plugin_registry.get_translator(pms_code)
-    if not translator_class:
-        logger.error(f"No translator registered for PMS: {pms_code}")
+    translator = plugin_registry.get_translator_instance(pms_code)
+    if not translator:
+        logger.error("No translator registered for PMS: %s", pms_code)
         raise HTTPException(status_code=404, detail=f"No translator registered for PMS: {pms_code}")
-    translator = translator_class(pms_code)
-    logger.info(f"translator: {translator}")
-    # Parse JSON body
+    logger.debug("translator: %s", translator)
+    # Determine message type
+    combined = message_type.lower() == COMBINED_MESSAGE_TYPE
+    if combined:
+        missing = [mt.value for mt in COMBINED_MESSAGE_TYPES if mt not in translator.supported_message_types]
+        if missing:
+            logger.error("PMS %s does not support combined messages (missing %s)", pms_code, missing)
+            raise HTTPException(status_code=400, detail=f"PMS {pms_code} does not support message types: {', '.join(missing)}")
+        kind = COMBINED_MESSAGE_TYPE
+    else:
+        try:
+            msg_type = MessageType(message_type.lower())
+        except ValueError:
+            logger.error("Invalid message_type: %s", message_type)
+            raise HTTPException(status_code=400, detail="Invalid message_type. Use 'availability', 'rate' or 'combined'.")
+        kind = msg_type.value
+    logger.debug("message_type: %s", kind)
+    labels = {"pms_code": pms_code, "message_type": kind}
+
+    # Parse JSON body (large bodies with a streamable list are parsed up to the list first)
+    parser = None
+    # Skipping invalid rows needs the whole list to screen it
+    stream_key = None if combined or skip_invalid else _stream_key(pms_code, request, delivery)
+    if stream_key:
+        chunks = request.stream()
+        parser, consumed = await _parse_header(chunks, stream_key, labels)
+        payload = parser.header
+        message_id = _get_message_id(pms_code, payload)
+        if not parser.streaming or (message_id is None and idempotency_store.enabled):
+            # Nothing to stream, or duplicates can only be recognized by the whole body
+            body = b"".join(consumed) + b"".join([chunk async for chunk in chunks])
+            parser = None
+        else:
+            body = b""
+            log_payload(logger, pms_code, "PMS payload header", payload)
+    else:
+        body = await request.body()
+    if parser is None:
+        with STAGE_SECONDS.time(stage="parse", **labels):
+            try:
+                payload = json_codec.loads(body)
+            except Exception as e:
+                logger.error("Invalid JSON payload: %s", e)
+                raise HTTPException(status_code=400, detail="Invalid JSON payload")
+        log_payload(logger, pms_code, "PMS payload", body)
+
+    # Forward Authorization header if present
+    auth_header = request.headers.get("authorization")
+    if combined:
+        process_payload = functools.partial(_process_combined, pms_code, translator, delivery)
+    else:
+        process_payload = functools.partial(_process_message, pms_code, translator, msg_type, delivery, body)
+    if parser is not None:
+        process = functools.partial(_process_streamed, pms_code, translator, msg_type, parser, chunks, auth_header)
+    elif skip_invalid:
+        msg_types = list(COMBINED_MESSAGE_TYPES) if combined else [msg_type]
+        process = functools.partial(
+            _process_skipping_invalid_rows, pms_code, translator, kind, msg_types, process_payload, payload, auth_header
+        )
+    else:
+        process = functools.partial(process_payload, payload, auth_header)
+    if not idempotency_store.enabled:
+        return await process()
+
+    # Retried messages get the outcome of the first attempt instead of being processed again
+    if parser is None:
+        message_id = _get_message_id(pms_code, payload)
+    key = message_key(pms_code, kind, delivery, body, message_id=message_id, auth_header=auth_header)
+    cached = await idempotency_store.acquire(key)
+    if cached is not None:
+        IDEMPOTENT_REPLAYS.inc(**labels)
+        logger.info("Replaying response for duplicate %s message from PMS %s (%s)", kind, pms_code, message_id or "content hash")
+        return Response(
+            content=cached.body, status_code=cached.status_code, media_type=cached.media_type,
+            headers={IDEMPOTENT_REPLAY_HEADER: "true"}
+        )
+    try:
+        response = await process()
+        if response.status_code < 300:
+            await idempotency_store.store(key, CachedResponse(response.status_code, bytes(response.body), response.media_type))
+        return response
+    finally:
+        idempotency_store.release(key)
+
+
+def _get_message_id(pms_code: str, payload: Any) -> Optional[str]:
+    """Message id configured by the PMS mapping, None if there is none"""
     try:
-        payload = await request.json()
+        return mapping_loader.get_message_id(pms_code, payload)
     except Exception as e:
-        logger.error(f"Invalid JSON payload: {e}")
-        raise HTTPException(status_code=400, detail="Invalid JSON payload")
-    logger.info(f"payload: {payload}")
+        logger.debug("No message id for PMS %s: %s", pms_code, e)
+        return None
 
-    # Determine message type
+
+def _stream_key(pms_code: str, request: Request, delivery: str) -> Optional[str]:
+    """
+    Top-level list to parse the body incrementally from, if any
+
+    Only synchronous deliveries of bodies declaring at least
+    JSON_STREAMING_MIN_BYTES are streamed: spooled and coalesced messages
+    are written or buffered whole anyway.
+    """
+    if delivery != DELIVERY_SYNC or settings.JSON_STREAMING_MIN_BYTES <= 0:
+        return None
     try:
-        msg_type = MessageType(message_type.lower())
+        length = int(request.headers.get("content-length", ""))
     except ValueError:
-        logger.error(f"Invalid message_type: {message_type}")
-        raise HTTPException(status_code=400, detail="Invalid message_type. Use 'availability' or 'rate'.")
-    logger.info(f"msg_type: {msg_type}")
+        return None
+    if length < settings.JSON_STREAMING_MIN_BYTES:
+        return None
+    try:
+        return mapping_loader.get_stream_key(pms_code)
+    except Exception as e:
+        logger.debug("No stream key for PMS %s: %s", pms_code, e)
+        return None
 
-    # Validate message
-    if not translator.validate_message(payload, msg_type):
-        logger.error(f"Validation failed for PMS: {pms_code}, message_type: {message_type}")
+
+async def _parse_header(
+    chunks: AsyncIterator[bytes],
+    stream_key: str,
+    labels: Dict[str, str]
+) -> Tuple[StreamingJSONParser, List[bytes]]:
+    """
+    Read the body until the streamed list starts
+
+    Args:
+        chunks: Request body stream, left positioned after the chunks read
+        stream_key: Top-level list to stream
+        labels: Metrics labels
+
+    Returns:
+        Tuple of the parser and the chunks read so far
+
+    Raises:
+        HTTPException: If the payload is not valid JSON
+    """
+    parser = StreamingJSONParser(stream_key)
+    consumed = []
+    with STAGE_SECONDS.time(stage="parse", **labels):
+        try:
+            async for chunk in chunks:
+                consumed.append(chunk)
+                parser.feed(chunk)
+                if parser.parse_header():
+                    break
+            else:
+                parser.close()
+                parser.parse_header()
+        except StreamedJSONError as e:
+            logger.error("Invalid JSON payload: %s", e)
+            raise HTTPException(status_code=400, detail="Invalid JSON payload")
+    return parser, consumed
+
+
+async def _process_streamed(
+    pms_code: str,
+    translator: BasePMSTranslator,
+    msg_type: MessageType,
+    parser: StreamingJSONParser,
+    chunks: AsyncIterator[bytes],
+    auth_header: Optional[str]
+) -> Response:
+    """
+    Translate and deliver a message whose list is parsed while the body arrives
+
+    The rest of the body is pumped into a ChunkChannel on the event loop; a
+    worker thread parses list items from it, translates them and writes
+    validated XML, which is uploaded as it is produced. Only one item and
+    one XML chunk are held in memory.
+
+    Args:
+        pms_code: PMS identifier
+        translator: Translator for the PMS
+        msg_type: Type of message
+        parser: Parser positioned at the start of the streamed list
+        chunks: Rest of the request body
+        auth_header: Authorization header to forward upstream
+
+    Returns:
+        Response for the PMS
+
+    Raises:
+        HTTPException: If the message cannot be processed
+    """
+    message_type = msg_type.value
+    labels = {"pms_code": pms_code, "message_type": message_type}
+    channel = ChunkChannel()
+    schema = translator.message_schema
+    validate_item = None
+    if schema is not None and schema.list_key == parser.stream_key and settings.MESSAGE_SCHEMA_VALIDATION:
+        validate_item = schema.validate_item
+    message = {**parser.header, parser.stream_key: StreamedList(parser, channel.get, validate_item)}
+    _validate_message(pms_code, translator, message, [msg_type], labels)
+
+    pump = asyncio.create_task(channel.pump(chunks))
+    # Items are translated while uploading, so translation and schema errors can arise in either stage
+    uploading = False
+    try:
+        rows = iter_translated(translator, msg_type, message)
+        with STAGE_SECONDS.time(stage="translate", **labels):
+            first = await asyncio.to_thread(next, rows, None)
+        hotel_code = (first or {}).get("HotelCode") or "UNKNOWN"
+        rows = ensure_single_hotel(itertools.chain([first], rows) if first is not None else iter(()), hotel_code)
+        xml_body = iter_document_xml(msg_type, hotel_code, rows, pms_code=pms_code)
+        xml_body = counted(xml_body, XML_BYTES, weight=len, **labels)
+        uploading = True
+        with STAGE_SECONDS.time(stage="upstream", **labels):
+            internal_response = await post_xml_to_internal_api(
+                aiter_in_thread(xml_body), message_type, auth_header=auth_header
+            )
+    except StreamedJSONError as e:
+        logger.error("Invalid JSON payload: %s", e)
+        raise HTTPException(status_code=400, detail=f"Invalid JSON payload: {e}")
+    except MessageValidationError as e:
+        VALIDATION_FAILURES.inc(stage="schema", **labels)
+        logger.error("Schema validation failed for PMS: %s, message_type: %s: %s", pms_code, message_type, e)
+        raise HTTPException(status_code=400, detail=f"Message validation failed: {e}")
+    except XMLStreamValidationError as e:
+        VALIDATION_FAILURES.inc(stage="xsd", **labels)
+        logger.error("XML validation error: %s", e)
+        raise HTTPException(status_code=500, detail=f"XML validation error: {e}")
+    except MultipleHotelsError as e:
+        logger.error("Payload for PMS %s spans multiple hotels: %s", pms_code, e)
+        raise _multiple_hotels_error(pms_code, e)
+    except Exception as e:
+        if not uploading:
+            logger.error("Translation/XML build error: %s", e)
+            raise HTTPException(status_code=500, detail=f"Translation/XML build error: {e}")
+        logger.error("Failed to post to internal API: %s", e)
+        raise HTTPException(status_code=502, detail=f"Failed to post to internal API: {e}")
+    finally:
+        channel.close()
+        pump.cancel()
+        await asyncio.gather(pump, return_exceptions=True)
+
+    return Response(content=internal_response.text, status_code=internal_response.status_code, media_type="application/xml")
+
+
+async def _process_skipping_invalid_rows(
+    pms_code: str,
+    translator: BasePMSTranslator,
+    kind: str,
+    msg_types: List[MessageType],
+    process_payload: Callable[[Any, Optional[str]], Awaitable[Response]],
+    payload: Any,
+    auth_header: Optional[str]
+) -> Response:
+    """
+    Process a message, leaving out the items that make it fail (invalid_rows=skip)
+
+    The message is processed as usual first. If it fails schema validation,
+    translation or the XSD, its items are screened and the message is
+    processed again without the failing ones, which are reported in the
+    response, counted and quarantined.
+
+    Args:
+        pms_code: PMS identifier
+        translator: Translator for the PMS
+        kind: Message type requested ('availability', 'rate' or 'combined')
+        msg_types: Message types the message is processed as
+        process_payload: Processes a message, given the message and the Authorization header
+        payload: Parsed message
+        auth_header: Authorization header to forward upstream
+
+    Returns:
+        JSON response with the outcome of processing and of each rejected item
+
+    Raises:
+        HTTPException: If the message fails for reasons outside its items
+    """
+    labels = {"pms_code": pms_code, "message_type": kind}
+    list_key = _item_list_key(pms_code)
+    try:
+        return _with_row_outcomes(await process_payload(payload, auth_header), payload, [], list_key)
+    except RowLevelError as error:
+        if list_key is None:
+            raise
+        failure = error
+
+    try:
+        with STAGE_SECONDS.time(stage="screen", **labels):
+            screened, rejected = await asyncio.to_thread(screen_items, translator, msg_types, payload, list_key)
+    except Exception as e:
+        logger.debug("Could not screen items of PMS %s message: %s", pms_code, e)
+        raise failure
+    if not rejected:
+        raise failure
+
+    for item in rejected:
+        ROWS_REJECTED.inc(stage=item.stage, **labels)
+    logger.warning(
+        "Skipping %d invalid items of PMS %s message: %s", len(rejected), pms_code,
+        "; ".join(f"{list_key}[{item.index}] {item.errors[0]}" for item in rejected[:5])
+    )
+    try:
+        await asyncio.to_thread(
+            row_quarantine.add, pms_code, kind, rejected, message_id=_get_message_id(pms_code, payload)
+        )
+    except OSError as e:
+        logger.error("Failed to quarantine items of PMS %s message: %s", pms_code, e)
+
+    if not screened[list_key]:
+        return CodecJSONResponse(status_code=400, content={
+            "detail": "Message has no valid rows", "accepted": 0, "rejected": [item.to_dict() for item in rejected]
+        })
+    return _with_row_outcomes(await process_payload(screened, auth_header), screened, rejected, list_key)
+
+
+def _item_list_key(pms_code: str) -> Optional[str]:
+    """Top-level list holding a PMS's message items (the mapping's 'stream' list)"""
+    try:
+        return mapping_loader.get_stream_key(pms_code)
+    except Exception as e:
+        logger.debug("No item list for PMS %s: %s", pms_code, e)
+        return None
+
+
+def _with_row_outcomes(
+    response: Response,
+    payload: Any,
+    rejected: List[RejectedItem],
+    list_key: Optional[str] = None
+) -> Response:
+    """
+    Wrap a response with the row outcomes of a message processed with invalid_rows=skip
+
+    Args:
+        response: Response of processing the message
+        payload: Message that was processed
+        rejected: Items left out of the message
+        list_key: Field holding the message's items
+
+    Returns:
+        JSON response with the same status code
+    """
+    if response.media_type == "application/json":
+        inner = json_codec.loads(response.body)
+    else:
+        inner = response.body.decode("utf-8")
+    items = payload.get(list_key) if list_key and isinstance(payload, dict) else None
+    return CodecJSONResponse(status_code=response.status_code, content={
+        "status_code": response.status_code,
+        "response": inner,
+        "accepted": len(items) if isinstance(items, list) else None,
+        "rejected": [item.to_dict() for item in rejected],
+    })
+
+
+def _validate_message(
+    pms_code: str,
+    translator: BasePMSTranslator,
+    message: Any,
+    msg_types: List[MessageType],
+    labels: Dict[str, str]
+) -> None:
+    """
+    Check a message against the translator's schema, then validate it for each message type
+
+    Args:
+        pms_code: PMS identifier
+        translator: Translator for the PMS
+        message: Decoded PMS message
+        msg_types: Message types the message is processed as
+        labels: Metrics labels
+
+    Raises:
+        HTTPException: If the message is invalid, listing the schema errors
+    """
+    with STAGE_SECONDS.time(stage="validate", **labels):
+        try:
+            translator.check_schema(message)
+        except MessageValidationError as e:
+            VALIDATION_FAILURES.inc(stage="schema", **labels)
+            logger.error("Schema validation failed for PMS: %s, message_type: %s: %s", pms_code, labels['message_type'], e)
+            raise RowLevelError(status_code=400, detail=f"Message validation failed: {e}")
+        valid = all(translator.validate_message(message, msg_type) for msg_type in msg_types)
+    if not valid:
+        VALIDATION_FAILURES.inc(stage="message", **labels)
+        logger.error("Validation failed for PMS: %s, message_type: %s", pms_code, labels['message_type'])
         raise HTTPException(status_code=400, detail="Message validation failed.")
-    logger.info(f"Validation passed for PMS: {pms_code}, message_type: {message_type}")
 
-    # Translate and build XML
+
+async def _process_message(
+    pms_code: str,
+    translator: BasePMSTranslator,
+    msg_type: MessageType,
+    delivery: str,
+    body: bytes,
+    payload: Any,
+    auth_header: Optional[str]
+) -> Response:
+    """
+    Validate, translate, build and deliver one parsed PMS message
+
+    Args:
+        pms_code: PMS identifier
+        translator: Translator for the PMS
+        msg_type: Type of message
+        delivery: Delivery mode
+        body: Raw request body
+        payload: Parsed message
+        auth_header: Authorization header to forward upstream
+
+    Returns:
+        Response for the PMS
+
+    Raises:
+        HTTPException: If the message cannot be processed
+    """
+    message_type = msg_type.value
+    labels = {"pms_code": pms_code, "message_type": message_type}
+
+    # Validate message
+    _validate_message(pms_code, translator, payload, [msg_type], labels)
+    logger.info("Validation passed for PMS: %s, message_type: %s", pms_code, message_type)
+
+    # Large bodies are translated, written and validated incrementally while uploading
+    # (coalesced rows are buffered, so they are never streamed)
+    streaming = delivery != DELIVERY_COALESCE and 0 < settings.XML_STREAMING_MIN_BYTES <= len(body)
+
+    # Translate and build XML (streamed documents are translated, built and
+    # validated while uploading, so that time is part of the delivery stage)
     try:
-        if msg_type == MessageType.AVAILABILITY:
-            translated = translator.translate_availability(payload)
-            hotel_code = translated[0]["HotelCode"] if translated and "HotelCode" in translated[0] else "UNKNOWN"
-            xml_string = build_avail_notif_xml(hotel_code, translated)
-            xsd_path = os.path.join("schemas", "OTA_HotelAvailNotifRQ.xsd")
-        elif msg_type == MessageType.RATE:
-            translated = translator.translate_rate(payload)
-            hotel_code = translated[0]["HotelCode"] if translated and "HotelCode" in translated[0] else "UNKNOWN"
-            xml_string = build_rate_amount_notif_xml(hotel_code, translated)
-            xsd_path = os.path.join("schemas", "OTA_HotelRateAmountNotifRQ.xsd")
+        # Large messages are translated column-wise instead of row by row
+        batches = None if delivery == DELIVERY_COALESCE else iter_translated_columns(translator, msg_type, payload)
+        if batches is not None:
+            with STAGE_SECONDS.time(stage="translate", **labels):
+                first_batch = next(batches, None)
+                hotel_code = ((first_batch or {}).get("HotelCode") or [None])[0] or "UNKNOWN"
+                batches = itertools.chain([first_batch], batches) if first_batch is not None else iter(())
+                batches = ensure_single_hotel_columns(batches, hotel_code)
+                if not streaming:
+                    batches = list(batches)
+            if streaming:
+                xml_body = iter_document_xml_from_columns(msg_type, hotel_code, batches, pms_code=pms_code)
+            else:
+                hotel_codes = [hotel_code]
+                xml_body, xsd_error = build_document_from_columns(msg_type, hotel_code, batches, pms_code=pms_code)
         else:
-            raise HTTPException(status_code=400, detail="Unsupported message_type.")
+            with STAGE_SECONDS.time(stage="translate", **labels):
+                translated = iter_translated(translator, msg_type, payload)
+                first = next(translated, None)
+                hotel_code = (first or {}).get("HotelCode") or "UNKNOWN"
+                rows = itertools.chain([first], translated) if first is not None else iter(())
+                if not streaming:
+                    rows = list(rows)
+                    hotel_codes = list(group_by_hotel(rows))
+            if streaming:
+                rows = ensure_single_hotel(rows, hotel_code)
+                xml_body = iter_document_xml(msg_type, hotel_code, rows, pms_code=pms_code)
+            elif len(hotel_codes) <= 1:
+                xml_body, xsd_error = build_document(msg_type, hotel_code, rows, pms_code=pms_code)
+        if streaming:
+            xml_body = counted(xml_body, XML_BYTES, weight=len, **labels)
+    except MultipleHotelsError as e:
+        logger.error("Payload for PMS %s spans multiple hotels: %s", pms_code, e)
+        raise _multiple_hotels_error(pms_code, e)
     except Exception as e:
-        logger.error(f"Translation/XML build error: {e}")
-        raise HTTPException(status_code=500, detail=f"Translation/XML build error: {e}")
-    logger.info(f"xml_string: {xml_string}")
+        logger.error("Translation/XML build error: %s", e)
+        raise RowLevelError(status_code=500, detail=f"Translation/XML build error: {e}")
 
-    # Validate XML against XSD
-    xsd_error = validate_xml_with_xsd(xml_string, xsd_path)
-    if xsd_error:
-        logger.error(f"XML validation error: {xsd_error}")
-        raise HTTPException(status_code=500, detail=f"XML validation error: {xsd_error}")
-    logger.info(f"XML validation passed for PMS: {pms_code}, message_type: {message_type}, starting post to internal API")
+    # Validate XML against XSD (streamed documents are validated as they are written)
+    if not streaming:
+        if len(hotel_codes) > 1:
+            logger.error("Payload for PMS %s spans multiple hotels: %s", pms_code, hotel_codes)
+            raise _multiple_hotels_error(
+                pms_code, f"Payload spans multiple hotels ({', '.join(map(str, hotel_codes))})"
+            )
+        log_payload(logger, pms_code, "RGBridge XML", xml_body)
+        if xsd_error:
+            logger.error("XML validation error: %s", xsd_error)
+            raise RowLevelError(status_code=500, detail=f"XML validation error: {xsd_error}")
+        logger.info("XML validation passed for PMS: %s, message_type: %s, starting post to internal API", pms_code, message_type)
 
-    # Forward Authorization header if present
-    auth_header = request.headers.get("authorization")
     try:
-        internal_response = post_xml_to_internal_api(xml_string, message_type, auth_header=auth_header)
+        with STAGE_SECONDS.time(stage=DELIVERY_STAGES[delivery], **labels):
+            if delivery == DELIVERY_ASYNC:
+                tracking_id = await asyncio.to_thread(
+                    delivery_spool.enqueue, xml_body, msg_type.value, pms_code, auth_header=auth_header
+                )
+                delivery_queue.submit(tracking_id)
+                return CodecJSONResponse(status_code=202, content=_tracking_response(tracking_id))
+            if delivery == DELIVERY_COALESCE:
+                buffered = coalescer.add(pms_code, msg_type, hotel_code, rows, auth_header=auth_header)
+                return CodecJSONResponse(status_code=202, content=_buffered_response(hotel_code, buffered))
+            internal_response = await post_xml_to_internal_api(xml_body, message_type, auth_header=auth_header)
+    except XMLStreamValidationError as e:
+        VALIDATION_FAILURES.inc(stage="xsd", **labels)
+        logger.error("XML validation error: %s", e)
+        raise RowLevelError(status_code=500, detail=f"XML validation error: {e}")
+    except MultipleHotelsError as e:
+        logger.error("Payload for PMS %s spans multiple hotels: %s", pms_code, e)
+        raise _multiple_hotels_error(pms_code, e)
+    except ConversionError as e:
+        # Streamed documents are translated while uploading
+        logger.error("Translation/XML build error: %s", e)
+        raise RowLevelError(status_code=500, detail=f"Translation/XML build error: {e}")
+    except OSError as e:
+        logger.error("Failed to spool XML for PMS %s: %s", pms_code, e)
+        raise HTTPException(status_code=503, detail=f"Failed to queue message for delivery: {e}")
     except Exception as e:
-        logger.error(f"Failed to post to internal API: {e}")
+        logger.error("Failed to post to internal API: %s", e)
         raise HTTPException(status_code=502, detail=f"Failed to post to internal API: {e}")
 
-    return Response(content=internal_response.text, status_code=internal_response.status_code, media_type="application/xml") 
\ No newline at end of file
+    return Response(content=internal_response.text, status_code=internal_response.status_code, media_type="application/xml")
+
+
+async def _process_combined(
+    pms_code: str,
+    translator: BasePMSTranslator,
+    delivery: str,
+    payload: Any,
+    auth_header: Optional[str]
+) -> Response:
+    """
+    Produce both OTA documents from one message carrying availability and rates
+
+    The message is translated in a single pass, then the availability and
+    rate documents are built, validated and delivered concurrently.
+
+    Args:
+        pms_code: PMS identifier
+        translator: Translator for the PMS
+        delivery: Delivery mode
+        payload: Parsed message
+        auth_header: Authorization header to forward upstream
+
+    Returns:
+        Response with the outcome per message type
+
+    Raises:
+        HTTPException: If the message cannot be processed
+    """
+    labels = {"pms_code": pms_code, "message_type": COMBINED_MESSAGE_TYPE}
+
+    _validate_message(pms_code, translator, payload, COMBINED_MESSAGE_TYPES, labels)
+
+    try:
+        with STAGE_SECONDS.time(stage="translate", **labels):
+            translated = translate_combined(translator, payload)
+    except Exception as e:
+        logger.error("Translation error: %s", e)
+        raise RowLevelError(status_code=500, detail=f"Translation/XML build error: {e}")
+    hotel_codes = list(group_by_hotel(itertools.chain.from_iterable(translated.values())))
+    if len(hotel_codes) > 1:
+        logger.error("Payload for PMS %s spans multiple hotels: %s", pms_code, hotel_codes)
+        raise _multiple_hotels_error(
+            pms_code, f"Payload spans multiple hotels ({', '.join(map(str, hotel_codes))})"
+        )
+    hotel_code = (hotel_codes or [None])[0] or "UNKNOWN"
+
+    documents: Dict[MessageType, bytes] = {}
+    for msg_type, rows in translated.items():
+        try:
+            xml_body, xsd_error = build_document(msg_type, hotel_code, rows, pms_code=pms_code)
+        except Exception as e:
+            logger.error("XML build error: %s", e)
+            raise RowLevelError(status_code=500, detail=f"Translation/XML build error: {e}")
+        log_payload(logger, pms_code, "RGBridge XML", xml_body)
+        if xsd_error:
+            logger.error("XML validation error (%s): %s", msg_type.value, xsd_error)
+            raise RowLevelError(status_code=500, detail=f"XML validation error ({msg_type.value}): {xsd_error}")
+        documents[msg_type] = xml_body
+    logger.info("XML validation passed for PMS: %s, message_type: %s, starting post to internal API", pms_code, COMBINED_MESSAGE_TYPE)
+
+    try:
+        with STAGE_SECONDS.time(stage=DELIVERY_STAGES[delivery], **labels):
+            if delivery == DELIVERY_ASYNC:
+                content = {}
+                for msg_type, xml_body in documents.items():
+                    tracking_id = await asyncio.to_thread(
+                        delivery_spool.enqueue, xml_body, msg_type.value, pms_code, auth_header=auth_header
+                    )
+                    delivery_queue.submit(tracking_id)
+                    content[msg_type.value] = _tracking_response(tracking_id)
+                return CodecJSONResponse(status_code=202, content=content)
+            if delivery == DELIVERY_COALESCE:
+                content = {
+                    msg_type.value: _buffered_response(
+                        hotel_code, coalescer.add(pms_code, msg_type, hotel_code, translated[msg_type], auth_header=auth_header)
+                    )
+                    for msg_type in documents
+                }
+                return CodecJSONResponse(status_code=202, content=content)
+            # One failed post must not hide that the other document was delivered
+            responses = await asyncio.gather(*(
+                post_xml_to_internal_api(xml_body, msg_type.value, auth_header=auth_header)
+                for msg_type, xml_body in documents.items()
+            ), return_exceptions=True)
+    except OSError as e:
+        logger.error("Failed to spool XML for PMS %s: %s", pms_code, e)
+        raise HTTPException(status_code=503, detail=f"Failed to queue message for delivery: {e}")
+
+    content = {}
+    failed = 0
+    for msg_type, response in zip(documents, responses):
+        if isinstance(response, httpx.HTTPStatusError):
+            response, error = response.response, response
+        elif isinstance(response, BaseException):
+            response, error = None, response
+        else:
+            error = None
+        outcome = content[msg_type.value] = _upstream_outcome(response)
+        if error is not None:
+            failed += 1
+            logger.error("Failed to post %s to internal API: %s", msg_type.value, error)
+            outcome["error"] = f"Failed to post to internal API: {error}"
+    return CodecJSONResponse(status_code=_combined_status(responses, failed), content=content)
+
+
+def _upstream_outcome(response: Optional[httpx.Response]) -> Dict[str, Any]:
+    """Outcome of one post to the internal API (None if no response was received)"""
+    if response is None:
+        return {"status_code": 502, "response": None}
+    return {"status_code": response.status_code, "response": response.text}
+
+
+def _combined_status(responses: List[Any], failed: int) -> int:
+    """
+    Status of a combined sync delivery
+
+    The worst upstream status when every post succeeded, 502 when all of
+    them failed, and 207 Multi-Status when only some did, so the PMS does
+    not re-send (and duplicate) the documents that were delivered.
+    """
+    if not failed:
+        return max(response.status_code for response in responses)
+    return 502 if failed == len(responses) else 207
+
+
+def _check_delivery_mode(delivery: str) -> None:
+    """Reject unknown delivery modes"""
+    if delivery not in DELIVERY_MODES:
+        logger.error("Invalid delivery mode: %s", delivery)
+        raise HTTPException(status_code=400, detail=f"Invalid delivery. Use one of: {', '.join(DELIVERY_MODES)}.")
+
+
+def _multiple_hotels_error(pms_code: str, reason: Any) -> HTTPException:
+    """Rejection of a single-document request whose rows span several hotels"""
+    return HTTPException(status_code=400, detail=f"{reason}. Use /pms/{pms_code}/bulk.")
+
+
+def _tracking_response(tracking_id: str) -> Dict[str, Any]:
+    """Body returned for a spooled document"""
+    return {
+        "tracking_id": tracking_id,
+        "status": "queued",
+        "status_url": f"/api/v1/deliveries/{tracking_id}",
+    }
+
+
+def _buffered_response(hotel_code: str, buffered: int) -> Dict[str, Any]:
+    """Body returned for rows handed to the coalescer"""
+    return {
+        "status": "buffered",
+        "hotel_code": hotel_code,
+        "buffered_rows": buffered,
+    }
+
+
+@router.get("/deliveries/{tracking_id}")
+async def delivery_status_endpoint(
+    tracking_id: str,
+    authenticated: bool = Depends(verify_api_key)
+) -> Dict[str, Any]:
+    """
+    Get the delivery status of a spooled document
+    """
+    meta = await asyncio.to_thread(delivery_spool.get, tracking_id)
+    if meta is None:
+        raise HTTPException(status_code=404, detail=f"Unknown tracking id: {tracking_id}")
+    return meta
+
+
+def _parse_bulk_body(body: bytes, content_type: str) -> List[Tuple[Any, Optional[str]]]:
+    """
+    Split a bulk body into PMS messages
+
+    Args:
+        body: Raw request body (JSON array or NDJSON)
+        content_type: Request content type
+
+    Returns:
+        List of (message, parse error) tuples
+
+    Raises:
+        HTTPException: If a JSON array body cannot be parsed
+    """
+    if "ndjson" not in content_type and body.lstrip().startswith(b"["):
+        try:
+            messages = json_codec.loads(body)
+        except Exception as e:
+            logger.error("Invalid JSON array payload: %s", e)
+            raise HTTPException(status_code=400, detail="Invalid JSON array payload")
+        return [(message, None) for message in messages]
+
+    items = []
+    for line in body.splitlines():
+        if not line.strip():
+            continue
+        try:
+            items.append((json_codec.loads(line), None))
+        except Exception as e:
+            items.append((None, f"Invalid JSON: {e}"))
+    return items
+
+
+def _translate_bulk_items(
+    pms_code: str,
+    translator: BasePMSTranslator,
+    msg_types: List[MessageType],
+    items: List[Tuple[Any, Optional[str]]]
+) -> Tuple[List[Dict[str, Any]], Dict[Tuple[str, MessageType], List[Dict[str, Any]]], Dict[Tuple[str, MessageType], List[int]]]:
+    """
+    Validate and translate bulk messages, grouping their rows by hotel and message type
+
+    An item contributes rows only if it translates completely. Blocks on
+    CPU work; call it from a worker thread when on the event loop.
+
+    Args:
+        pms_code: PMS identifier
+        translator: Translator for the PMS
+        msg_types: Message types produced per message
+        items: Parsed messages and their parse errors
+
+    Returns:
+        Tuple of per-item results, rows per (hotel, message type) group and
+        the indexes of the items contributing to each group
+    """
+    results: List[Dict[str, Any]] = []
+    groups: Dict[Tuple[str, MessageType], List[Dict[str, Any]]] = {}
+    group_items: Dict[Tuple[str, MessageType], List[int]] = {}
+    for index, (message, error) in enumerate(items):
+        result = {"index": index, "status": "accepted"}
+        results.append(result)
+        if error:
+            result.update(status="invalid", error=error)
+            continue
+        item_groups: Dict[Tuple[str, MessageType], List[Dict[str, Any]]] = {}
+        try:
+            try:
+                translator.check_schema(message)
+            except MessageValidationError as e:
+                for msg_type in msg_types:
+                    VALIDATION_FAILURES.inc(stage="schema", pms_code=pms_code, message_type=msg_type.value)
+                raise ValueError(f"Message validation failed: {e}")
+            for msg_type in msg_types:
+                if not translator.validate_message(message, msg_type):
+                    VALIDATION_FAILURES.inc(stage="message", pms_code=pms_code, message_type=msg_type.value)
+                    raise ValueError("Message validation failed.")
+                for row in iter_translated(translator, msg_type, message):
+                    if not row.get("HotelCode"):
+                        raise ValueError("Translated row is missing HotelCode")
+                    item_groups.setdefault((row["HotelCode"], msg_type), []).append(row)
+        except Exception as e:
+            result.update(status="invalid", error=str(e))
+            continue
+        for key, rows in item_groups.items():
+            groups.setdefault(key, []).extend(rows)
+            group_items.setdefault(key, []).append(index)
+    return results, groups, group_items
+
+
+@router.post("/pms/{pms_code}/bulk")
+async def pms_bulk_endpoint(
+    pms_code: str,
+    request: Request,
+    message_type: List[str] = Query(..., description="Message types to produce per message: availability and/or rate"),
+    delivery: str = Query("sync", description="sync: wait for the internal API; async: spool each document; coalesce: buffer and merge with other updates"),
+    authenticated: bool = Depends(verify_api_key)
+) -> Dict[str, Any]:
+    """
+    Receive a batch of PMS messages (NDJSON or JSON array), translate them, group the
+    RGBridge rows by hotel and message type, and post one OTA document per group
+    """
+    logger.info("Received bulk POST from PMS: %s", pms_code)
+    _check_delivery_mode(delivery)
+
+    translator = plugin_registry.get_translator_instance(pms_code)
+    if not translator:
+        logger.error("No translator registered for PMS: %s", pms_code)
+        raise HTTPException(status_code=404, detail=f"No translator registered for PMS: {pms_code}")
+
+    try:
+        msg_types = list(dict.fromkeys(MessageType(mt.lower()) for mt in message_type))
+    except ValueError:
+        logger.error("Invalid message_type: %s", message_type)
+        raise HTTPException(status_code=400, detail="Invalid message_type. Use 'availability' or 'rate'.")
+
+    body = await request.body()
+    with STAGE_SECONDS.time(stage="parse", pms_code=pms_code, message_type="bulk"):
+        items = await asyncio.to_thread(_parse_bulk_body, body, request.headers.get("content-type", ""))
+    logger.info("Bulk payload from PMS %s contains %s messages", pms_code, len(items))
+
+    results, groups, group_items = await asyncio.to_thread(
+        _translate_bulk_items, pms_code, translator, msg_types, items
+    )
+
+    documents = [
+        {"id": doc_id, "hotel_code": hotel_code, "message_type": msg_type.value,
+         "rows": len(groups[(hotel_code, msg_type)]), "items": group_items[(hotel_code, msg_type)]}
+        for doc_id, (hotel_code, msg_type) in enumerate(groups)
+    ]
+
+    auth_header = request.headers.get("authorization")
+    semaphore = asyncio.Semaphore(settings.BULK_MAX_CONCURRENCY)
+
+    async def deliver(document: Dict[str, Any], rows: List[Dict[str, Any]]) -> None:
+        msg_type = MessageType(document["message_type"])
+        async with semaphore:
+            if delivery == DELIVERY_COALESCE:
+                # The coalescer builds the merged document; only the rows are checked here
+                try:
+                    xsd_error = await asyncio.to_thread(
+                        check_document_rows, msg_type, document["hotel_code"], rows, pms_code=pms_code
+                    )
+                except Exception as e:
+                    document.update(status="failed", error=f"XML build error: {e}")
+                    return
+                if xsd_error:
+                    document.update(status="failed", error=f"XML validation error: {xsd_error}")
+                    return
+                coalescer.add(pms_code, msg_type, document["hotel_code"], rows, auth_header=auth_header)
+                document.update(status="buffered")
+                return
+            try:
+                xml_body, xsd_error = await asyncio.to_thread(
+                    build_document, msg_type, document["hotel_code"], rows, pms_code=pms_code
+                )
+            except Exception as e:
+                document.update(status="failed", error=f"XML build error: {e}")
+                return
+            if xsd_error:
+                document.update(status="failed", error=f"XML validation error: {xsd_error}")
+                return
+            if delivery == DELIVERY_ASYNC:
+                try:
+                    tracking_id = await asyncio.to_thread(
+                        delivery_spool.enqueue, xml_body, msg_type.value, pms_code, auth_header=auth_header
+                    )
+                except OSError as e:
+                    document.update(status="failed", error=f"Failed to queue message for delivery: {e}")
+                    return
+                delivery_queue.submit(tracking_id)
+                document.update(status="queued", tracking_id=tracking_id)
+                return
+            try:
+                response = await post_xml_to_internal_api(xml_body, msg_type.value, auth_header=auth_header)
+            except Exception as e:
+                document.update(status="failed", error=f"Failed to post to internal API: {e}")
+                return
+            document.update(status="delivered", upstream_status=response.status_code)
+
+    await asyncio.gather(*(deliver(document, rows) for document, rows in zip(documents, groups.values())))
+    for document in documents:
+        if document["status"] == "failed":
+            logger.error("Bulk document for hotel %s (%s) failed: %s", document['hotel_code'], document['message_type'], document['error'])
+
+    # Roll document outcomes up to the items that contributed to them
+    documents_by_item: Dict[int, List[Dict[str, Any]]] = {}
+    for document in documents:
+        for index in document["items"]:
+            documents_by_item.setdefault(index, []).append(document)
+    for result in results:
+        if result["status"] != "accepted":
+            continue
+        item_documents = documents_by_item.get(result["index"], [])
+        result["documents"] = [d["id"] for d in item_documents]
+        errors = [d["error"] for d in item_documents if d["status"] == "failed"]
+        if errors:
+            result["status"] = "failed"
+        elif any(d["status"] in ("queued", "buffered") for d in item_documents):
+            result["status"] = "queued"
+        else:
+            result["status"] = "delivered"
+        if errors:
+            result["errors"] = errors
+
+    return {
+        "pms_code": pms_code,
+        "items": results,
+        "documents": documents,
+    }
@@ -4,16 +4,17 @@ Wizard API endpoints for automated PMS integration
 
 from fastapi import APIRouter, HTTPException
 from typing import Dict, Any, List
-import json
 import yaml
 import re
 from datetime import datetime
 import os
-try:
-    import openai
-    OPENAI_AVAILABLE = True
-except ImportError:
-    OPENAI_AVAILABLE = False
+import importlib
+import importlib.util
+
+from app.core import json_codec
+
+# openai is slow to import, so it is only imported when a suggestion is requested
+OPENAI_AVAILABLE = importlib.util.find_spec("openai") is not None
 
 router = APIRouter(prefix="/api/v1/wizard")
 
@@ -85,7 +86,7 @@ RGBRIDGE_RATE_FIELDS = {
 def extract_fields_from_json(message: str) -> List[str]:
     """Extract field names from JSON message"""
     try:
-        data = json.loads(message)
+        data = json_codec.loads(message)
         fields = []
         
         def extract_nested_fields(obj, prefix=''):
@@ -239,24 +240,30 @@ def generate_translator_code(
     # Import statements
     imports = """from app.plugins.base import BasePMSTranslator, MessageType
 from app.plugins.registry import register_translator
-from typing import Dict, Any, List
-import json
+from app.core import json_codec
+from typing import Dict, Any, Iterator, List
 import xml.etree.ElementTree as ET
-from datetime import datetime
 """
     
     # Class definition
     class_def = f"""
+
 @register_translator("{pms_code}")
 class {pms_code.capitalize()}PMSTranslator(BasePMSTranslator):
     \"\"\"
     Translator for {pms_name}
+
+    Field mappings live in pms/{pms_code}/mapping.yaml and are compiled by
+    the mapping loader.
     \"\"\"
-    
-    def __init__(self, pms_code: str):
-        super().__init__(pms_code)
-        self.supported_formats = ["{message_format}"]
-        self.supported_message_types = [MessageType.AVAILABILITY, MessageType.RATE]
+
+    @property
+    def supported_formats(self) -> List[str]:
+        return ["{message_format}"]
+
+    @property
+    def supported_message_types(self) -> List[MessageType]:
+        return [MessageType.AVAILABILITY, MessageType.RATE]
 """
     
     # Parse method
@@ -265,13 +272,13 @@ class {pms_code.capitalize()}PMSTranslator(BasePMSTranslator):
         \"\"\"Parse {message_format.upper()} message\"\"\"
         try:
             if "{message_format}" == "json":
-                return json.loads(message)
+                return json_codec.loads(message)
             elif "{message_format}" == "xml":
                 root = ET.fromstring(message)
                 return self._xml_to_dict(root)
             else:
                 # GraphQL or other format
-                return json.loads(message)
+                return json_codec.loads(message)
         except Exception as e:
             raise ValueError(f"Failed to parse {message_format.upper()} message: {{e}}")
     
@@ -284,107 +291,57 @@ class {pms_code.capitalize()}PMSTranslator(BasePMSTranslator):
             else:
                 result[child.tag] = self._xml_to_dict(child)
         return result
+
+    def validate_message(self, message: Any, message_type: MessageType) -> bool:
+        \"\"\"Check the message was parsed into a dictionary\"\"\"
+        return isinstance(message, dict)
 """
     
     # Availability translation
-    availability_method = f"""
+    availability_method = """
     def translate_availability(self, message: Dict[str, Any]) -> List[Dict[str, Any]]:
         \"\"\"Translate availability message to RGBridge format\"\"\"
-        mapping = self._mapping.get('availability', {{}})
-        result = []
-        
-        # Apply custom conversions
-        converted_message = self._apply_conversions(message)
-        
-        # Map fields
-        rgbridge_data = {{}}
-        for pms_field, rgbridge_field in mapping.items():
-            value = self._get_nested_value(converted_message, pms_field)
-            if value is not None:
-                rgbridge_data[rgbridge_field] = value
-        
-        # Set defaults
-        if 'HotelCode' not in rgbridge_data:
-            rgbridge_data['HotelCode'] = 'UNKNOWN'
-        if 'InvCode' not in rgbridge_data:
-            rgbridge_data['InvCode'] = 'DEFAULT'
-        if 'RatePlanCode' not in rgbridge_data:
-            rgbridge_data['RatePlanCode'] = 'DEFAULT'
-        
-        result.append(rgbridge_data)
-        return result
+        return list(self.iter_availability(message))
+
+    def iter_availability(self, message: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+        \"\"\"Lazily translate availability message to RGBridge format\"\"\"
+        return self.get_compiled_mapping(MessageType.AVAILABILITY).iter_rows(message)
 """
     
     # Rate translation
-    rate_method = f"""
+    rate_method = """
     def translate_rate(self, message: Dict[str, Any]) -> List[Dict[str, Any]]:
         \"\"\"Translate rate message to RGBridge format\"\"\"
-        mapping = self._mapping.get('rate', {{}})
-        result = []
-        
-        # Apply custom conversions
-        converted_message = self._apply_conversions(message)
-        
-        # Map fields
-        rgbridge_data = {{}}
-        for pms_field, rgbridge_field in mapping.items():
-            value = self._get_nested_value(converted_message, pms_field)
-            if value is not None:
-                rgbridge_data[rgbridge_field] = value
-        
-        # Set defaults
-        if 'HotelCode' not in rgbridge_data:
-            rgbridge_data['HotelCode'] = 'UNKNOWN'
-        if 'InvCode' not in rgbridge_data:
-            rgbridge_data['InvCode'] = 'DEFAULT'
-        if 'RatePlanCode' not in rgbridge_data:
-            rgbridge_data['RatePlanCode'] = 'DEFAULT'
-        if 'CurrencyCode' not in rgbridge_data:
-            rgbridge_data['CurrencyCode'] = 'USD'
-        
-        result.append(rgbridge_data)
-        return result
-"""
-    
-    # Utility methods
-    utility_methods = """
-    def _get_nested_value(self, data: Dict[str, Any], field_path: str) -> Any:
-        \"\"\"Get value from nested dictionary using dot notation\"\"\"
-        keys = field_path.split('.')
-        current = data
-        for key in keys:
-            if isinstance(current, dict) and key in current:
-                current = current[key]
-            else:
-                return None
-        return current
-    
-    def _apply_conversions(self, data: Dict[str, Any]) -> Dict[str, Any]:
-        \"\"\"Apply custom value conversions\"\"\"
-        conversions = self._mapping.get('conversions', {{}})
-        result = data.copy()
-        
-        for field, conversion in conversions.items():
-            if field in result:
-                try:
-                    # Simple lambda evaluation (be careful with this in production)
-                    if conversion.startswith('lambda'):
-                        # For now, just apply common conversions
-                        if 'upper()' in conversion:
-                            result[field] = str(result[field]).upper()
-                        elif 'lower()' in conversion:
-                            result[field] = str(result[field]).lower()
-                        elif 'int()' in conversion:
-                            result[field] = int(float(result[field]))
-                        elif 'float()' in conversion:
-                            result[field] = float(result[field])
-                except:
-                    pass
-        
-        return result
+        return list(self.iter_rate(message))
+
+    def iter_rate(self, message: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+        \"\"\"Lazily translate rate message to RGBridge format\"\"\"
+        return self.get_compiled_mapping(MessageType.RATE).iter_rows(message)
 """
     
-    return imports + class_def + parse_method + availability_method + rate_method + utility_methods
+    return imports + class_def + parse_method + availability_method + rate_method
+
+# Defaults for RGBridge fields the PMS message doesn't provide
+AVAILABILITY_DEFAULTS = {'HotelCode': 'UNKNOWN', 'InvCode': 'DEFAULT', 'RatePlanCode': 'DEFAULT'}
+RATE_DEFAULTS = {**AVAILABILITY_DEFAULTS, 'CurrencyCode': 'USD'}
+
+def _mapping_section(field_mappings: Dict[str, str], defaults: Dict[str, str]) -> Dict[str, Any]:
+    """Turn wizard PMS field -> RGBridge field pairs into a mapping section keyed by RGBridge field"""
+    paths: Dict[str, List[str]] = {}
+    for pms_field, rgbridge_field in field_mappings.items():
+        if rgbridge_field:
+            paths.setdefault(rgbridge_field, []).append(pms_field)
+
+    section: Dict[str, Any] = {}
+    for rgbridge_field, field_paths in paths.items():
+        path = field_paths[0] if len(field_paths) == 1 else field_paths
+        if rgbridge_field in defaults:
+            section[rgbridge_field] = {'path': path, 'default': defaults[rgbridge_field]}
+        else:
+            section[rgbridge_field] = path
+    for rgbridge_field, default in defaults.items():
+        section.setdefault(rgbridge_field, {'default': default})
+    return section
 
 def generate_mapping_yaml(
     pms_code: str,
@@ -396,8 +353,8 @@ def generate_mapping_yaml(
     
     mapping_data = {
         'pms_code': pms_code,
-        'availability': availability_mappings,
-        'rate': rate_mappings,
+        'availability': _mapping_section(availability_mappings, AVAILABILITY_DEFAULTS),
+        'rate': _mapping_section(rate_mappings, RATE_DEFAULTS),
         'conversions': custom_conversions,
         'metadata': {
             'created_at': datetime.now().isoformat(),
@@ -419,6 +376,7 @@ async def suggest_mapping(request: Dict[str, Any]) -> Dict[str, Any]:
 
     # Try OpenAI if available
     if OPENAI_AVAILABLE and os.getenv('OPENAI_API_KEY'):
+        openai = importlib.import_module("openai")
         openai.api_key = os.getenv('OPENAI_API_KEY')
         prompt = f"""
 You are an expert in hotel PMS integrations. Given the following PMS message sample and a list of possible RGBridge fields, suggest the best mapping for the PMS field '{field}'.
@@ -0,0 +1,256 @@
+"""
+Coalescing of superseded ARI updates before delivery
+
+PMSs often send several updates for the same room/rate and dates within
+seconds. The coalescer buffers translated RGBridge rows for a short window,
+lets later rows overwrite the dates they cover in earlier ones, and flushes
+one consolidated OTA document per hotel to the delivery spool.
+"""
+
+import asyncio
+import itertools
+import time
+from datetime import date, timedelta
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+from app.core.config import settings
+from app.core.date_ranges import parse_row_date, row_controls, row_facets, weekday_mask, with_dates
+from app.core.delivery_queue import DeliveryQueue, DeliverySpool, delivery_queue, delivery_spool
+from app.core.logging import get_logger
+from app.core.pipeline import build_document
+from app.plugins.base import MessageType
+
+logger = get_logger("coalescer")
+
+
+class _Segment(NamedTuple):
+    seq: int
+    start: Optional[date]
+    end: Optional[date]
+    mask: Tuple[bool, ...]
+    row: Dict[str, Any]
+
+
+class RowCoalescer:
+    """
+    Last-write-wins merge of RGBridge rows for one hotel and message type
+
+    Rows are keyed by InvCode, RatePlanCode and the facets they set. A new
+    row trims the dates it covers out of earlier rows with the same key,
+    splitting their Start/End ranges where needed; if it only applies to
+    some days of the week, it only supersedes rows with the same days.
+    Surviving rows are emitted in arrival order, so rows that do not
+    supersede each other are applied upstream in the order they were sent.
+    """
+
+    def __init__(self):
+        self._segments: Dict[Any, List[_Segment]] = {}
+        self._seq = itertools.count()
+        self.received = 0
+
+    def add(self, row: Dict[str, Any]) -> None:
+        """
+        Merge a row into the buffer
+
+        Args:
+            row: RGBridge row
+        """
+        self.received += 1
+        seq = next(self._seq)
+        sac = row_controls(row)
+        start, end = parse_row_date(sac.get("Start")), parse_row_date(sac.get("End"))
+        if start is None or end is None or end < start:
+            # Rows without a usable range are passed through untouched
+            self._segments[("passthrough", seq)] = [_Segment(seq, None, None, (), row)]
+            return
+
+        key = (sac.get("InvCode"), sac.get("RatePlanCode"), row_facets(row))
+        mask = weekday_mask(sac)
+        full_week = all(mask)
+        kept = []
+        for segment in self._segments.get(key, []):
+            if segment.end < start or segment.start > end or not (full_week or segment.mask == mask):
+                kept.append(segment)
+                continue
+            if segment.start < start:
+                before_end = start - timedelta(days=1)
+                kept.append(segment._replace(end=before_end, row=with_dates(segment.row, segment.start, before_end)))
+            if segment.end > end:
+                after_start = end + timedelta(days=1)
+                kept.append(segment._replace(start=after_start, row=with_dates(segment.row, after_start, segment.end)))
+        kept.append(_Segment(seq, start, end, mask, row))
+        self._segments[key] = kept
+
+    def rows(self) -> List[Dict[str, Any]]:
+        """
+        Get the coalesced rows
+
+        Returns:
+            Surviving rows in arrival order
+        """
+        segments = [segment for segments in self._segments.values() for segment in segments]
+        segments.sort(key=lambda segment: (segment.seq, segment.start or date.min))
+        return [segment.row for segment in segments]
+
+    def __len__(self) -> int:
+        return sum(len(segments) for segments in self._segments.values())
+
+
+def coalesce_rows(rows: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Coalesce RGBridge rows for one hotel and message type
+
+    Args:
+        rows: RGBridge rows in the order they were received
+
+    Returns:
+        Rows with superseded dates removed
+    """
+    coalescer = RowCoalescer()
+    for row in rows:
+        coalescer.add(row)
+    return coalescer.rows()
+
+
+class _Buffer(NamedTuple):
+    rows: RowCoalescer
+    created_at: float
+
+
+class Coalescer:
+    """
+    Time-windowed buffers of RGBridge rows flushed to the delivery spool
+
+    One buffer is kept per PMS, message type, hotel and Authorization
+    header. A buffer is flushed COALESCE_WINDOW seconds after its first row
+    arrives, or straight away once COALESCE_MAX_ROWS rows are buffered.
+    Flushes run as tasks whose document build and spool write happen in a
+    worker thread, so the event loop keeps serving requests meanwhile.
+    """
+
+    def __init__(self, spool: DeliverySpool, queue: DeliveryQueue):
+        """
+        Initialize coalescer
+
+        Args:
+            spool: Spool flushed documents are written to
+            queue: Queue the spooled documents are submitted to
+        """
+        self.spool = spool
+        self.queue = queue
+        self._buffers: Dict[Tuple[str, MessageType, str, Optional[str]], _Buffer] = {}
+        self._timers: Dict[Tuple[str, MessageType, str, Optional[str]], asyncio.TimerHandle] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._flushes: Set[asyncio.Task] = set()
+
+    def add(
+        self,
+        pms_code: str,
+        message_type: MessageType,
+        hotel_code: str,
+        rows: Iterable[Dict[str, Any]],
+        auth_header: Optional[str] = None
+    ) -> int:
+        """
+        Buffer rows for a hotel
+
+        Must be called from the event loop.
+
+        Args:
+            pms_code: PMS the rows came from
+            message_type: Type of message
+            hotel_code: Hotel the rows belong to
+            rows: RGBridge rows
+            auth_header: Authorization header to forward upstream
+
+        Returns:
+            Number of rows currently buffered for the hotel
+        """
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # Timers are bound to the loop that scheduled them
+            self._loop = loop
+            self._timers.clear()
+            for key in self._buffers:
+                self._schedule(key)
+
+        key = (pms_code, message_type, hotel_code, auth_header)
+        buffer = self._buffers.get(key)
+        if buffer is None:
+            buffer = self._buffers[key] = _Buffer(RowCoalescer(), time.monotonic())
+            self._schedule(key)
+        for row in rows:
+            buffer.rows.add(row)
+        if len(buffer.rows) >= settings.COALESCE_MAX_ROWS:
+            self._start_flush(key)
+            return 0
+        return len(buffer.rows)
+
+    def _schedule(self, key) -> None:
+        delay = self._buffers[key].created_at + settings.COALESCE_WINDOW - time.monotonic()
+        self._timers[key] = self._loop.call_later(max(delay, 0), self._start_flush, key)
+
+    def _start_flush(self, key) -> None:
+        task = asyncio.get_running_loop().create_task(self.flush(key))
+        self._flushes.add(task)
+        task.add_done_callback(self._flushes.discard)
+
+    async def flush(self, key) -> Optional[str]:
+        """
+        Build, spool and submit the document for one buffer
+
+        Args:
+            key: Buffer key
+
+        Returns:
+            Tracking id of the spooled document, or None if nothing was spooled
+        """
+        buffer = self._buffers.pop(key, None)
+        timer = self._timers.pop(key, None)
+        if timer is not None:
+            timer.cancel()
+        if buffer is None:
+            return None
+
+        pms_code, message_type, hotel_code, auth_header = key
+        rows = buffer.rows.rows()
+        try:
+            tracking_id = await asyncio.to_thread(self._spool_document, key, rows)
+        except Exception as e:
+            logger.error(
+                "Failed to flush coalesced %s rows for hotel %s: %s", message_type.value, hotel_code, e, exc_info=True
+            )
+            return None
+        self.queue.submit(tracking_id)
+        logger.info(
+            "Flushed %d coalesced %s rows (from %d) for hotel %s as %s",
+            len(rows), message_type.value, buffer.rows.received, hotel_code, tracking_id
+        )
+        return tracking_id
+
+    def _spool_document(self, key, rows: List[Dict[str, Any]]) -> str:
+        """Build, validate and spool the document for a buffer's rows (blocking)"""
+        pms_code, message_type, hotel_code, auth_header = key
+        xml_body, xsd_error = build_document(message_type, hotel_code, rows, pms_code=pms_code)
+        if xsd_error:
+            raise ValueError(f"XML validation error: {xsd_error}")
+        return self.spool.enqueue(xml_body, message_type.value, pms_code, auth_header=auth_header)
+
+    async def flush_all(self) -> List[str]:
+        """
+        Flush every buffer and wait for flushes already under way
+
+        Returns:
+            Tracking ids of the spooled documents
+        """
+        loop = asyncio.get_running_loop()
+        running = [task for task in self._flushes if task.get_loop() is loop]
+        tracking_ids = await asyncio.gather(*running, *(self.flush(key) for key in list(self._buffers)))
+        return [tracking_id for tracking_id in tracking_ids if tracking_id]
+
+    def __len__(self) -> int:
+        return len(self._buffers)
+
+
+# Singleton instance for use throughout the app
+coalescer = Coalescer(delivery_spool, delivery_queue)
@@ -3,7 +3,7 @@ Configuration management for RGBridge PMS Integration Platform
 """
 
 from pydantic_settings import BaseSettings
-from pydantic import Field
+from pydantic import Field, field_validator
 from typing import List, Optional
 import os
 
@@ -35,22 +35,103 @@ class Settings(BaseSettings):
     INTERNAL_API_TIMEOUT: int = Field(default=30, env="INTERNAL_API_TIMEOUT")
     INTERNAL_API_RETRY_ATTEMPTS: int = Field(default=3, env="INTERNAL_API_RETRY_ATTEMPTS")
     INTERNAL_API_RETRY_DELAY: int = Field(default=1, env="INTERNAL_API_RETRY_DELAY")
+    INTERNAL_API_RETRY_MAX_DELAY: int = Field(default=10, env="INTERNAL_API_RETRY_MAX_DELAY")
+    INTERNAL_API_HTTP2: bool = Field(default=True, env="INTERNAL_API_HTTP2")
+    INTERNAL_API_MAX_CONNECTIONS: int = Field(default=100, env="INTERNAL_API_MAX_CONNECTIONS")
+    INTERNAL_API_MAX_KEEPALIVE_CONNECTIONS: int = Field(default=20, env="INTERNAL_API_MAX_KEEPALIVE_CONNECTIONS")
+    INTERNAL_API_KEEPALIVE_EXPIRY: float = Field(default=30.0, env="INTERNAL_API_KEEPALIVE_EXPIRY")
     
+    # Bulk ingestion settings
+    BULK_MAX_CONCURRENCY: int = Field(default=8, env="BULK_MAX_CONCURRENCY")
+
+    # Delivery spool settings (delivery=async)
+    SPOOL_DIR: str = Field(default="spool", env="SPOOL_DIR")
+    SPOOL_WORKERS: int = Field(default=4, env="SPOOL_WORKERS")
+    SPOOL_MAX_ATTEMPTS: int = Field(default=10, env="SPOOL_MAX_ATTEMPTS")
+    SPOOL_RETRY_DELAY: int = Field(default=5, env="SPOOL_RETRY_DELAY")
+    SPOOL_RETRY_MAX_DELAY: int = Field(default=300, env="SPOOL_RETRY_MAX_DELAY")
+    # Seconds delivered and failed jobs are kept for status lookups (0 keeps them forever)
+    SPOOL_RETENTION: int = Field(default=604800, env="SPOOL_RETENTION")
+    # Seconds after which another process may take over a job claimed for delivery
+    SPOOL_CLAIM_TIMEOUT: int = Field(default=600, env="SPOOL_CLAIM_TIMEOUT")
+
+    # Coalescing settings (delivery=coalesce)
+    # Seconds rows are buffered per hotel before one consolidated document is spooled
+    COALESCE_WINDOW: float = Field(default=2.0, env="COALESCE_WINDOW")
+    COALESCE_MAX_ROWS: int = Field(default=10000, env="COALESCE_MAX_ROWS")
+
+    # JSON settings
+    # Codec for PMS payloads and API responses: auto (orjson when installed), orjson or json
+    JSON_CODEC: str = Field(default="auto", env="JSON_CODEC")
+    # Synchronously delivered bodies declaring at least this many bytes are parsed while
+    # they arrive, for PMSs whose mapping names a 'stream' list (0 disables)
+    JSON_STREAMING_MIN_BYTES: int = Field(default=4194304, env="JSON_STREAMING_MIN_BYTES")
+
+    # XML settings
+    # PMS request bodies at least this large are streamed to the internal API (0 disables)
+    XML_STREAMING_MIN_BYTES: int = Field(default=1048576, env="XML_STREAMING_MIN_BYTES")
+
+    # Idempotency settings
+    # Seconds successful outcomes are replayed for retried messages (0 disables),
+    # entries kept in memory, and optional SQLite file persisting them
+    IDEMPOTENCY_TTL: float = Field(default=300.0, env="IDEMPOTENCY_TTL")
+    IDEMPOTENCY_MAX_ENTRIES: int = Field(default=10000, env="IDEMPOTENCY_MAX_ENTRIES")
+    IDEMPOTENCY_DB: str = Field(default="", env="IDEMPOTENCY_DB")
+
+    # Translation settings
+    # Messages translating to at least this many rows use the columnar path (0 disables)
+    COLUMNAR_MIN_ROWS: int = Field(default=5000, env="COLUMNAR_MIN_ROWS")
+    # Merge rows into the fewest maximal date ranges before building row-path documents
+    DATE_RANGE_COMPRESSION: bool = Field(default=True, env="DATE_RANGE_COMPRESSION")
+
+    # Validation settings
+    # Check PMS messages against their translator's schema before translating them
+    MESSAGE_SCHEMA_VALIDATION: bool = Field(default=True, env="MESSAGE_SCHEMA_VALIDATION")
+    # Default for invalid_rows: 'reject' fails a message with any invalid row, 'skip' delivers the valid ones
+    INVALID_ROWS: str = Field(default="reject", env="INVALID_ROWS")
+    # Directory skipped items are written to as JSON lines (empty disables)
+    QUARANTINE_DIR: str = Field(default="", env="QUARANTINE_DIR")
+    # Rows are checked against constraints compiled from the XSDs while documents are
+    # built; this fraction of documents per PMS is also fully XSD-validated (all with DEBUG)
+    XSD_VALIDATION_SAMPLE_RATE: float = Field(default=0.01, env="XSD_VALIDATION_SAMPLE_RATE")
+
     # Logging settings
     LOG_LEVEL: str = Field(default="INFO", env="LOG_LEVEL")
     LOG_FORMAT: str = Field(
         default="%(asctime)s - %(name)s - %(levelname)s - %(filename)s:%(lineno)d - %(message)s",
         env="LOG_FORMAT"
     )
+    # Emit one JSON object per log line instead of LOG_FORMAT
+    LOG_JSON: bool = Field(default=True, env="LOG_JSON")
+    # Log file written outside AWS Lambda (empty disables it)
+    LOG_FILE: str = Field(default="app.log", env="LOG_FILE")
+    # Fraction of PMS payloads and generated XML logged per PMS at DEBUG level, and their size cap
+    LOG_PAYLOAD_SAMPLE_RATE: float = Field(default=0.01, env="LOG_PAYLOAD_SAMPLE_RATE")
+    LOG_PAYLOAD_MAX_BYTES: int = Field(default=2048, env="LOG_PAYLOAD_MAX_BYTES")
     
     # File paths
     MAPPING_DIR: str = Field(default="mappings", env="MAPPING_DIR")
     SCHEMA_DIR: str = Field(default="schemas", env="SCHEMA_DIR")
+    # Seconds between checks of a mapping file for changes (0 checks on every use)
+    MAPPING_RELOAD_INTERVAL: float = Field(default=1.0, env="MAPPING_RELOAD_INTERVAL")
+    # Load every translator and compile its mapping at startup (skipped on AWS Lambda,
+    # where cold starts only load the translator a request needs)
+    TRANSLATOR_WARM_UP: bool = Field(default=True, env="TRANSLATOR_WARM_UP")
+    # Compile XSD schemas and their row constraints at startup (skipped on AWS Lambda)
+    SCHEMA_WARM_UP: bool = Field(default=True, env="SCHEMA_WARM_UP")
     
     # Database settings (for future use)
     DATABASE_URL: Optional[str] = Field(default=None, env="DATABASE_URL")
     
     OPENAI_API_KEY: str | None = None 
+
+    @field_validator("INVALID_ROWS")
+    @classmethod
+    def _check_invalid_rows(cls, value: str) -> str:
+        value = value.lower()
+        if value not in ("reject", "skip"):
+            raise ValueError(f"INVALID_ROWS must be 'reject' or 'skip', not {value!r}")
+        return value
     
     class Config:
         env_file = ".env"
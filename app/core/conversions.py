@@ -0,0 +1,445 @@
+"""
+Conversion expressions for PMS mapping fields
+
+Expressions use a small, safe subset of Python syntax:
+
+    upper                                   # bare function applied to the value
+    date("us")                              # function with extra arguments, applied to the value
+    value / 100 | round_currency("EUR")     # arithmetic, then '|' pipes into a function
+    value * 1.1 | round_currency(row.CurrencyCode)   # row.X reads another field of the row
+    lambda x: x.strip().upper()             # wizard-style lambdas
+
+Only whitelisted functions, arithmetic, constants, 'value' and 'row.X'
+are accepted; anything else is rejected when the mapping is compiled.
+Expressions are parsed once, cached, and evaluated over a whole column of
+values so each node of the tree is dispatched once per column rather than
+once per row.
+"""
+
+import ast
+import contextvars
+import itertools
+import operator
+from decimal import Decimal
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Optional, Sequence, Union
+
+from app.utils.boolean_utils import parse_boolean
+from app.utils.currency_utils import round_currency_many
+from app.utils.date_utils import parse_dates
+from app.utils.los_utils import convert_los_to_binary_pattern
+
+
+# Field whose column is being converted (e.g. "cloudbeds.availability:Start"),
+# keying per-field caches such as the detected date format
+conversion_field_var: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("conversion_field", default=None)
+
+
+class ConversionError(ValueError):
+    """
+    Raised when conversion expressions fail for some values
+
+    Attributes:
+        errors: One dict per failed value with 'field', 'row', 'value' and 'error'
+    """
+
+    def __init__(self, message: str, errors: List[Dict[str, Any]]):
+        super().__init__(message)
+        self.errors = errors
+
+
+def _to_int(value: Any) -> int:
+    return int(float(value)) if isinstance(value, str) else int(value)
+
+
+def _to_decimal(value: Any) -> Decimal:
+    return value if isinstance(value, Decimal) else Decimal(str(value))
+
+
+def _columnar(func: Callable[..., List[Any]]) -> Callable[..., List[Any]]:
+    """Mark a function as taking a whole column of values (plus constant arguments)"""
+    func.columnar = True
+    return func
+
+
+def _columnar_args(func: Callable[..., List[Any]]) -> Callable[..., List[Any]]:
+    """Mark a column function whose extra arguments may also be per-row columns"""
+    func.columnar = True
+    func.columnar_args = True
+    return func
+
+
+@_columnar
+def _to_dates(values: Sequence[Any], format_hint: Optional[str] = None) -> List[str]:
+    parsed = parse_dates(values, format_hint, cache_key=conversion_field_var.get())
+    for value, day in zip(values, parsed):
+        if day is None:
+            raise ValueError(f"Unrecognized date: {value!r}")
+    return [day.isoformat() for day in parsed]
+
+
+@_columnar_args
+def _round_currency(values: Sequence[Any], currency_code: Union[str, Sequence[str]] = "USD") -> List[Decimal]:
+    return round_currency_many([_to_decimal(value) for value in values], currency_code)
+
+
+FUNCTIONS: Dict[str, Callable[..., Any]] = {
+    "str": str,
+    "int": _to_int,
+    "float": float,
+    "decimal": _to_decimal,
+    "bool": parse_boolean,
+    "upper": lambda value: str(value).upper(),
+    "lower": lambda value: str(value).lower(),
+    "strip": lambda value: str(value).strip(),
+    "title": lambda value: str(value).title(),
+    "round": round,
+    "abs": abs,
+    "min": min,
+    "max": max,
+    "date": _to_dates,
+    "round_currency": _round_currency,
+    "los": convert_los_to_binary_pattern,
+}
+
+# String methods allowed in wizard-style lambdas, e.g. x.upper()
+_METHODS = ("upper", "lower", "strip", "title")
+
+
+def _numeric(value: Any) -> Any:
+    if isinstance(value, str):
+        return Decimal(value.strip())
+    if isinstance(value, bool):
+        return int(value)
+    return value
+
+
+def _arithmetic(op: Callable[[Any, Any], Any]) -> Callable[[Any, Any], Any]:
+    """Wrap a binary operator to accept numeric strings and mix Decimal with float"""
+    def apply(left, right):
+        left, right = _numeric(left), _numeric(right)
+        if isinstance(left, Decimal) and isinstance(right, float):
+            right = Decimal(str(right))
+        elif isinstance(right, Decimal) and isinstance(left, float):
+            left = Decimal(str(left))
+        return op(left, right)
+    return apply
+
+
+_BINARY_OPERATORS = {
+    ast.Add: _arithmetic(operator.add),
+    ast.Sub: _arithmetic(operator.sub),
+    ast.Mult: _arithmetic(operator.mul),
+    ast.Div: _arithmetic(operator.truediv),
+    ast.FloorDiv: _arithmetic(operator.floordiv),
+    ast.Mod: _arithmetic(operator.mod),
+}
+
+_UNARY_OPERATORS = {
+    ast.USub: lambda value: -_numeric(value),
+    ast.UAdd: lambda value: +_numeric(value),
+}
+
+
+class ColumnRows:
+    """
+    Rows held as columns, so row.X references read a whole column at once
+
+    Used when translating in columnar mode, where no per-row dicts exist.
+    """
+
+    def __init__(self, columns: Dict[str, List[Any]], length: int, indexes: Optional[List[int]] = None):
+        """
+        Args:
+            columns: Column values keyed by field
+            length: Number of rows
+            indexes: Optional subset of row indexes this view covers
+        """
+        self._columns = columns
+        self._length = length if indexes is None else len(indexes)
+        self._indexes = indexes
+
+    def column(self, field: str) -> List[Any]:
+        values = self._columns.get(field)
+        if values is None:
+            return [None] * self._length
+        if self._indexes is None:
+            return values
+        return [values[index] for index in self._indexes]
+
+    def take(self, indexes: List[int]) -> "ColumnRows":
+        if self._indexes is not None:
+            indexes = [self._indexes[index] for index in indexes]
+        return ColumnRows(self._columns, self._length, indexes)
+
+    def __len__(self) -> int:
+        return self._length
+
+
+def _row_column(rows, field: str) -> List[Any]:
+    if isinstance(rows, ColumnRows):
+        return rows.column(field)
+    return [row.get(field) if isinstance(row, dict) else None for row in rows]
+
+
+def _take(rows, indexes: List[int]):
+    if isinstance(rows, ColumnRows):
+        return rows.take(indexes)
+    return [rows[index] for index in indexes]
+
+
+class _Const:
+    """A value that is the same for every row of the column"""
+
+    __slots__ = ("value",)
+
+    def __init__(self, value: Any):
+        self.value = value
+
+
+# A compiled node maps (values, rows) to a column or a _Const
+Node = Callable[[Sequence[Any], Sequence[Dict[str, Any]]], Union[List[Any], _Const]]
+
+
+def _apply(func: Callable[..., Any], args: List[Union[List[Any], _Const]]) -> Union[List[Any], _Const]:
+    """Apply a function element-wise over columns, broadcasting constants"""
+    if getattr(func, "columnar", False):
+        column, extra = args[0], args[1:]
+        if all(isinstance(arg, _Const) for arg in extra):
+            constants = [arg.value for arg in extra]
+            if isinstance(column, _Const):
+                return _Const(func([column.value], *constants)[0])
+            return func(column, *constants)
+        if getattr(func, "columnar_args", False):
+            if isinstance(column, _Const):
+                column = [column.value] * len(next(arg for arg in extra if not isinstance(arg, _Const)))
+            return func(column, *(arg.value if isinstance(arg, _Const) else arg for arg in extra))
+        # Per-row extra arguments: call the column function one value at a time
+        columnar_func = func
+        func = lambda value, *rest: columnar_func([value], *rest)[0]
+    if all(isinstance(arg, _Const) for arg in args):
+        return _Const(func(*(arg.value for arg in args)))
+    columns = [itertools.repeat(arg.value) if isinstance(arg, _Const) else arg for arg in args]
+    return list(map(func, *columns))
+
+
+class _Compiler:
+    """Translate a whitelisted Python AST into column-evaluating closures"""
+
+    def __init__(self, source: str):
+        self.source = source
+        self.value_names = {"value"}
+
+    def error(self, node: ast.AST, reason: str) -> ValueError:
+        return ValueError(f"Invalid conversion {self.source!r}: {reason}")
+
+    def compile_root(self, node: ast.AST) -> Node:
+        if isinstance(node, ast.Lambda):
+            args = node.args
+            if len(args.args) != 1 or args.vararg or args.kwarg or args.kwonlyargs or args.defaults:
+                raise self.error(node, "lambdas must take exactly one argument")
+            self.value_names = {args.args[0].arg}
+            node = node.body
+        if isinstance(node, ast.Name) and node.id in FUNCTIONS:
+            # A bare function name is applied to the value
+            return self.call(node, FUNCTIONS[node.id], [self.value_node], [])
+        if (isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id in FUNCTIONS
+                and not self.uses_value(node)):
+            # So is a call that doesn't mention the value, e.g. date("us")
+            self.check_call(node)
+            return self.call(node, FUNCTIONS[node.func.id], [self.value_node], node.args)
+        return self.compile(node)
+
+    def uses_value(self, node: ast.AST) -> bool:
+        return any(isinstance(child, ast.Name) and child.id in self.value_names for child in ast.walk(node))
+
+    @staticmethod
+    def value_node(values, rows):
+        return values
+
+    def call(self, node: ast.AST, func: Callable[..., Any], first: List[Node], args: List[ast.AST]) -> Node:
+        compiled = first + [self.compile(arg) for arg in args]
+
+        def evaluate(values, rows):
+            return _apply(func, [arg(values, rows) for arg in compiled])
+        return evaluate
+
+    def compile(self, node: ast.AST) -> Node:
+        if isinstance(node, ast.Constant) and isinstance(node.value, (int, float, str, bool, type(None))):
+            const = _Const(node.value)
+            return lambda values, rows: const
+
+        if isinstance(node, ast.Name):
+            if node.id in self.value_names:
+                return self.value_node
+            raise self.error(node, f"unknown name '{node.id}'")
+
+        if isinstance(node, ast.Attribute) and isinstance(node.value, ast.Name) and node.value.id == "row":
+            field = node.attr
+            return lambda values, rows: _row_column(rows, field)
+
+        if isinstance(node, ast.BinOp) and isinstance(node.op, ast.BitOr):
+            # value | f(args) pipes the left side in as f's first argument
+            left = self.compile(node.left)
+            target = node.right
+            if isinstance(target, ast.Name) and target.id in FUNCTIONS:
+                return self.call(target, FUNCTIONS[target.id], [left], [])
+            if isinstance(target, ast.Call) and isinstance(target.func, ast.Name) and target.func.id in FUNCTIONS:
+                self.check_call(target)
+                return self.call(target, FUNCTIONS[target.func.id], [left], target.args)
+            raise self.error(node, "'|' must be followed by a function")
+
+        if isinstance(node, ast.BinOp) and type(node.op) in _BINARY_OPERATORS:
+            return self.call(node, _BINARY_OPERATORS[type(node.op)], [self.compile(node.left), self.compile(node.right)], [])
+
+        if isinstance(node, ast.UnaryOp) and type(node.op) in _UNARY_OPERATORS:
+            return self.call(node, _UNARY_OPERATORS[type(node.op)], [self.compile(node.operand)], [])
+
+        if isinstance(node, ast.Call):
+            self.check_call(node)
+            if isinstance(node.func, ast.Name) and node.func.id in FUNCTIONS:
+                return self.call(node, FUNCTIONS[node.func.id], [], node.args)
+            if isinstance(node.func, ast.Attribute) and node.func.attr in _METHODS and not node.args:
+                return self.call(node, FUNCTIONS[node.func.attr], [self.compile(node.func.value)], [])
+            raise self.error(node, f"unsupported function '{ast.get_source_segment(self.source, node.func)}'")
+
+        raise self.error(node, f"unsupported syntax '{ast.get_source_segment(self.source, node)}'")
+
+    def check_call(self, node: ast.Call) -> None:
+        if node.keywords or any(isinstance(arg, ast.Starred) for arg in node.args):
+            raise self.error(node, "only positional arguments are supported")
+
+
+class Expression:
+    """A parsed conversion expression"""
+
+    def __init__(self, source: str):
+        """
+        Parse a conversion expression
+
+        Args:
+            source: Expression source
+
+        Raises:
+            ValueError: If the expression is not valid
+        """
+        self.source = source
+        try:
+            tree = ast.parse(source.strip(), mode="eval")
+        except SyntaxError as e:
+            raise ValueError(f"Invalid conversion {source!r}: {e.msg}") from e
+        self._evaluate = _Compiler(source.strip()).compile_root(tree.body)
+
+    def _run(self, values: Sequence[Any], rows: Sequence[Dict[str, Any]]) -> List[Any]:
+        result = self._evaluate(values, rows)
+        if isinstance(result, _Const):
+            return [result.value] * len(values)
+        return result
+
+    def evaluate(
+        self,
+        values: Sequence[Any],
+        rows: Optional[Sequence[Dict[str, Any]]] = None,
+        field: str = None,
+        cache_key: Optional[str] = None
+    ) -> List[Any]:
+        """
+        Convert a column of values
+
+        None values are passed through unconverted.
+
+        Args:
+            values: Values to convert
+            rows: Rows the values belong to (for row.X references), as dicts or ColumnRows
+            field: Field name used in error reports
+            cache_key: Identifies the field across columns (e.g. PMS, section and
+                field), so per-field state like the detected date format is reused
+
+        Returns:
+            Converted values
+
+        Raises:
+            ConversionError: Listing every value that failed to convert
+        """
+        if rows is None:
+            rows = [{}] * len(values)
+        present = [index for index, value in enumerate(values) if value is not None]
+        if not present:
+            return list(values)
+        dense = len(present) == len(values)
+        dense_values = values if dense else [values[index] for index in present]
+        dense_rows = rows if dense else _take(rows, present)
+        token = conversion_field_var.set(cache_key)
+        try:
+            converted = self._run(dense_values, dense_rows)
+        except Exception:
+            self._raise_errors(present, dense_values, dense_rows, field)
+        finally:
+            conversion_field_var.reset(token)
+        if dense:
+            return converted
+        result = list(values)
+        for index, value in zip(present, converted):
+            result[index] = value
+        return result
+
+    def _raise_errors(self, indexes, values, rows, field):
+        """Re-run a failed column one value at a time to report every bad value"""
+        errors = []
+        for position, (index, value) in enumerate(zip(indexes, values)):
+            try:
+                self._run([value], _take(rows, [position]))
+            except Exception as e:
+                errors.append({"field": field, "row": index, "value": value, "error": str(e) or type(e).__name__})
+        if not errors:
+            errors.append({"field": field, "row": None, "value": None, "error": "conversion failed"})
+        raise ConversionError(format_errors(errors, self.source), errors)
+
+    def __call__(self, value: Any, row: Optional[Dict[str, Any]] = None) -> Any:
+        """
+        Convert a single value
+        """
+        return self.evaluate([value], [row or {}])[0]
+
+    def __repr__(self) -> str:
+        return f"Expression({self.source!r})"
+
+
+def format_errors(errors: List[Dict[str, Any]], source: Optional[str] = None, limit: int = 5) -> str:
+    """
+    Summarize conversion errors in one message
+
+    Args:
+        errors: Error dicts as stored on ConversionError
+        source: Expression that failed
+        limit: Maximum number of errors spelled out
+
+    Returns:
+        Error message
+    """
+    parts = [
+        f"{error['field'] or 'value'}" + (f" (row {error['row']})" if error["row"] is not None else "")
+        + f" {error['value']!r}: {error['error']}"
+        for error in errors[:limit]
+    ]
+    if len(errors) > limit:
+        parts.append(f"and {len(errors) - limit} more")
+    prefix = f"Conversion {source!r} failed for " if source else "Conversion failed for "
+    return prefix + "; ".join(parts)
+
+
+@lru_cache(maxsize=1024)
+def compile_expression(source: str) -> Expression:
+    """
+    Parse a conversion expression, reusing previously parsed ones
+
+    Args:
+        source: Expression source
+
+    Returns:
+        Parsed expression
+
+    Raises:
+        ValueError: If the expression is not valid
+    """
+    return Expression(source)
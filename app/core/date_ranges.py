@@ -0,0 +1,204 @@
+"""
+Date-range explosion and compression of RGBridge ARI rows
+
+PMSs send rows over arbitrary Start/End ranges, and some send one row per
+day. Rows are exploded onto a per-day grid (day ordinal to row values) per
+InvCode/RatePlanCode and the facets they set, later rows overwriting the
+days they cover, and then compressed back into the fewest maximal ranges
+with identical values. Day-of-week flags (Mon..Sun) are honored both ways,
+so per-day feeds closing weekends collapse into one row with Sat/Sun set.
+"""
+
+from datetime import date
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional, Tuple
+
+from app.utils.date_utils import compress_ordinals, date_to_ordinal, expand_date_range
+
+# Fields identifying what a row applies to rather than what it sets
+IDENTITY_FIELDS = frozenset(["HotelCode", "InvCode", "RatePlanCode", "Start", "End"])
+WEEKDAY_FIELDS = ("Mon", "Tue", "Weds", "Thur", "Fri", "Sat", "Sun")
+
+_CONTROL_FIELDS = frozenset(["Start", "End", *WEEKDAY_FIELDS])
+
+
+def row_controls(row: Dict[str, Any]) -> Dict[str, Any]:
+    """Dict holding a row's StatusApplicationControl fields (nested or flat)"""
+    sac = row.get("StatusApplicationControl")
+    return sac if isinstance(sac, dict) else row
+
+
+def parse_row_date(value: Any) -> Optional[date]:
+    """Date of a Start/End value, None if it is not an ISO date"""
+    ordinal = date_to_ordinal(value)
+    return date.fromordinal(ordinal) if ordinal is not None else None
+
+
+def weekday_mask(sac: Dict[str, Any]) -> Tuple[bool, ...]:
+    """Days of week a row applies to (absent flags count as set)"""
+    return tuple(sac.get(day) is None or str(sac[day]).lower() in ("true", "1") for day in WEEKDAY_FIELDS)
+
+
+def row_facets(row: Dict[str, Any]) -> FrozenSet[Any]:
+    """
+    What a row sets, e.g. a booking limit or a specific restriction type
+
+    Only rows setting the same facets supersede each other; a row closing
+    arrival does not undo an earlier booking limit for the same dates.
+    """
+    fields = set()
+    for source in (row, row.get("StatusApplicationControl") or {}):
+        for key, value in source.items():
+            if key in IDENTITY_FIELDS or key in WEEKDAY_FIELDS or key == "StatusApplicationControl" or value is None:
+                continue
+            if key == "RestrictionStatus" and isinstance(value, dict):
+                fields.add((key, value.get("Restriction")))
+            else:
+                fields.add(key)
+    return frozenset(fields)
+
+
+def with_dates(
+    row: Dict[str, Any],
+    start: date,
+    end: date,
+    weekdays: Optional[Tuple[bool, ...]] = None,
+    set_weekdays: bool = False
+) -> Dict[str, Any]:
+    """
+    Copy a row narrowed to [start, end]
+
+    Args:
+        row: RGBridge row
+        start: New Start
+        end: New End
+        weekdays: Mon..Sun flags to write (None clears them)
+        set_weekdays: Whether to rewrite the day-of-week flags
+
+    Returns:
+        Copy of the row
+    """
+    row = dict(row)
+    target = row
+    if isinstance(row.get("StatusApplicationControl"), dict):
+        target = row["StatusApplicationControl"] = dict(row["StatusApplicationControl"])
+    target.update(Start=start.isoformat(), End=end.isoformat())
+    if set_weekdays:
+        for index, day in enumerate(WEEKDAY_FIELDS):
+            if weekdays is None:
+                target.pop(day, None)
+            else:
+                target[day] = weekdays[index]
+    return row
+
+
+def _freeze(value: Any) -> Any:
+    """Hashable form of a row value"""
+    if isinstance(value, dict):
+        return tuple(sorted((key, _freeze(item)) for key, item in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+
+def _signature(row: Dict[str, Any]) -> Any:
+    """Everything a row sets and applies to, except its dates and days of week"""
+    items = []
+    for key, value in row.items():
+        if key in _CONTROL_FIELDS:
+            continue
+        if key == "StatusApplicationControl" and isinstance(value, dict):
+            value = {k: v for k, v in value.items() if k not in _CONTROL_FIELDS}
+        items.append((key, _freeze(value)))
+    return tuple(sorted(items))
+
+
+class _Identity:
+    """Rows and per-day grids for one InvCode/RatePlanCode"""
+
+    __slots__ = ("rows", "grids")
+
+    def __init__(self):
+        # (seq, row) as received, used if the grids cannot be compressed safely
+        self.rows: List[Tuple[int, Dict[str, Any]]] = []
+        # facets -> day ordinal -> signature index
+        self.grids: Dict[FrozenSet[Any], Dict[int, int]] = {}
+
+    def conflicting(self) -> bool:
+        """
+        Whether rows with different but overlapping facets share days
+
+        Such rows depend on the order they are applied in (e.g. a booking
+        limit row followed by a row setting the limit and a restriction),
+        which compressed rows cannot preserve.
+        """
+        grids = list(self.grids.items())
+        for index, (facets, days) in enumerate(grids):
+            for other_facets, other_days in grids[index + 1:]:
+                if facets & other_facets and days.keys() & other_days.keys():
+                    return True
+        return False
+
+
+def compress_date_ranges(rows: Iterable[Dict[str, Any]], weekdays: bool = True) -> List[Dict[str, Any]]:
+    """
+    Rewrite RGBridge rows for one hotel as the fewest maximal date ranges
+
+    Args:
+        rows: RGBridge rows in the order they were received
+        weekdays: Whether output rows may use day-of-week flags (the rate
+            document does not render them, so rate rows ignore the flags)
+
+    Returns:
+        Compressed rows, ordered by the first row each derives from; the
+        input rows unchanged if compression would not reduce their number
+    """
+    rows = list(rows)
+    identities: Dict[Tuple[Any, Any], _Identity] = {}
+    signatures: Dict[Any, int] = {}
+    templates: List[Dict[str, Any]] = []
+    first_seen: List[int] = []
+    passthrough: List[Tuple[int, Dict[str, Any]]] = []
+
+    # Explode every row onto the per-day grid of its InvCode/RatePlanCode and facets
+    for seq, row in enumerate(rows):
+        sac = row_controls(row)
+        start, end = date_to_ordinal(sac.get("Start")), date_to_ordinal(sac.get("End"))
+        if start is None or end is None or end < start:
+            # Rows without a usable range are passed through untouched
+            passthrough.append((seq, row))
+            continue
+        signature = _signature(row)
+        index = signatures.get(signature)
+        if index is None:
+            index = signatures[signature] = len(templates)
+            templates.append(row)
+            first_seen.append(seq)
+        identity = identities.get((sac.get("InvCode"), sac.get("RatePlanCode")))
+        if identity is None:
+            identity = identities[(sac.get("InvCode"), sac.get("RatePlanCode"))] = _Identity()
+        identity.rows.append((seq, row))
+        days = expand_date_range(start, end, weekday_mask(sac) if weekdays else None)
+        identity.grids.setdefault(row_facets(row), {}).update(dict.fromkeys(days, index))
+
+    # Compress each signature's days back into ranges
+    output: List[Tuple[Tuple[int, int], Dict[str, Any]]] = [((seq, 0), row) for seq, row in passthrough]
+    for identity in identities.values():
+        if identity.conflicting():
+            output.extend(((seq, 0), row) for seq, row in identity.rows)
+            continue
+        for grid in identity.grids.values():
+            by_signature: Dict[int, List[int]] = {}
+            for day, index in grid.items():
+                by_signature.setdefault(index, []).append(day)
+            for index, days in by_signature.items():
+                for start, end, mask in compress_ordinals(days, weekdays=weekdays):
+                    row = with_dates(
+                        templates[index], date.fromordinal(start), date.fromordinal(end),
+                        weekdays=mask, set_weekdays=weekdays
+                    )
+                    output.append(((first_seen[index], start), row))
+
+    if len(output) >= len(rows):
+        return rows
+    output.sort(key=lambda item: item[0])
+    return [row for _, row in output]
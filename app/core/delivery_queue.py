@@ -0,0 +1,493 @@
+"""
+Durable delivery queue for posting RGBridge XML to the internal API
+
+Documents are written to an on-disk spool and drained by a pool of async
+workers, so PMS requests don't wait on the internal API and queued work
+survives a restart. Spool files are written and read in worker threads so
+the event loop is never blocked on disk I/O or fsync.
+
+Several processes may share a spool: a job is claimed with a lock file
+before it is delivered, so each job is posted by one process at a time.
+Authorization headers are kept in a separate owner-only file per job, so
+jobs recovered after a restart or claimed by another process are posted
+with the same credentials.
+"""
+
+import asyncio
+import json
+import os
+import random
+import re
+import time
+import uuid
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, Iterable, Iterator, List, Optional, Union
+
+import httpx
+
+from app.core.config import settings
+from app.core.internal_api_client import post_xml_to_internal_api
+from app.core.json_stream import aiter_in_thread
+from app.core.logging import get_logger
+
+logger = get_logger("delivery_queue")
+
+# Delivery job statuses
+QUEUED = "queued"
+DELIVERING = "delivering"
+DELIVERED = "delivered"
+FAILED = "failed"
+
+_TRACKING_ID_RE = re.compile(r"^[0-9a-f]{32}$")
+_READ_CHUNK_SIZE = 64 * 1024
+
+# Seconds between removals of finished jobs older than SPOOL_RETENTION
+PRUNE_INTERVAL = 3600
+
+
+def _write_atomic(path: str, chunks: Iterable[bytes]) -> None:
+    """Write a file via a temporary sibling so readers never see partial data"""
+    tmp_path = f"{path}.tmp"
+    try:
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "wb") as f:
+            for chunk in chunks:
+                f.write(chunk)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+class DeliverySpool:
+    """
+    On-disk spool of XML documents awaiting delivery
+
+    Each job is stored as ``<tracking_id>.xml`` plus ``<tracking_id>.json``
+    metadata holding its status and retry state, ``<tracking_id>.auth``
+    (mode 0600) when an Authorization header is forwarded, and
+    ``<tracking_id>.lock`` while a process delivers it. Methods block on disk I/O; call them from
+    worker threads when on the event loop.
+    """
+
+    def __init__(self, spool_dir: Optional[str] = None):
+        """
+        Initialize delivery spool
+
+        Args:
+            spool_dir: Spool directory (defaults to settings.SPOOL_DIR)
+        """
+        self._spool_dir = spool_dir
+
+    @property
+    def spool_dir(self) -> str:
+        return self._spool_dir or settings.SPOOL_DIR
+
+    def _path(self, tracking_id: str, ext: str) -> str:
+        return os.path.join(self.spool_dir, f"{tracking_id}.{ext}")
+
+    def enqueue(
+        self,
+        xml_body: Union[bytes, Iterable[bytes]],
+        message_type: str,
+        pms_code: str,
+        auth_header: Optional[str] = None
+    ) -> str:
+        """
+        Write an XML document to the spool
+
+        Args:
+            xml_body: XML bytes or an iterator of byte chunks
+            message_type: Type of message
+            pms_code: PMS the document came from
+            auth_header: Authorization header to forward upstream
+
+        Returns:
+            Tracking id of the queued job
+        """
+        os.makedirs(self.spool_dir, exist_ok=True)
+        tracking_id = uuid.uuid4().hex
+        chunks = [xml_body] if isinstance(xml_body, bytes) else xml_body
+        _write_atomic(self._path(tracking_id, "xml"), chunks)
+        now = datetime.utcnow().isoformat()
+        self._write_meta(tracking_id, {
+            "tracking_id": tracking_id,
+            "pms_code": pms_code,
+            "message_type": message_type,
+            "status": QUEUED,
+            "attempts": 0,
+            "created_at": now,
+            "updated_at": now,
+            "next_attempt_at": time.time(),
+        })
+        if auth_header:
+            _write_atomic(self._path(tracking_id, "auth"), [auth_header.encode("utf-8")])
+        logger.info("Spooled %s document %s for PMS: %s", message_type, tracking_id, pms_code)
+        return tracking_id
+
+    def auth_header(self, tracking_id: str) -> Optional[str]:
+        """Authorization header to forward for a job, if one was spooled with it"""
+        try:
+            with open(self._path(tracking_id, "auth"), "rb") as f:
+                return f.read().decode("utf-8")
+        except FileNotFoundError:
+            return None
+
+    def forget_auth_header(self, tracking_id: str) -> None:
+        """Remove the Authorization header of a finished job"""
+        try:
+            os.remove(self._path(tracking_id, "auth"))
+        except FileNotFoundError:
+            pass
+
+    def _write_meta(self, tracking_id: str, meta: Dict[str, Any]) -> None:
+        _write_atomic(self._path(tracking_id, "json"), [json.dumps(meta).encode("utf-8")])
+
+    def get(self, tracking_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Get job metadata
+
+        Args:
+            tracking_id: Tracking id returned by enqueue
+
+        Returns:
+            Job metadata or None if not found
+        """
+        if not _TRACKING_ID_RE.match(tracking_id):
+            return None
+        try:
+            with open(self._path(tracking_id, "json"), "rb") as f:
+                return json.loads(f.read())
+        except FileNotFoundError:
+            return None
+
+    def update(self, tracking_id: str, **fields: Any) -> Dict[str, Any]:
+        """
+        Update job metadata
+
+        Args:
+            tracking_id: Tracking id
+            **fields: Fields to set
+
+        Returns:
+            Updated metadata
+        """
+        meta = self.get(tracking_id)
+        if meta is None:
+            raise KeyError(tracking_id)
+        meta.update(fields, updated_at=datetime.utcnow().isoformat())
+        self._write_meta(tracking_id, meta)
+        return meta
+
+    def iter_xml(self, tracking_id: str) -> Iterator[bytes]:
+        """
+        Read a spooled document in chunks
+
+        Args:
+            tracking_id: Tracking id
+
+        Returns:
+            Iterator of XML byte chunks
+        """
+        with open(self._path(tracking_id, "xml"), "rb") as f:
+            while True:
+                chunk = f.read(_READ_CHUNK_SIZE)
+                if not chunk:
+                    return
+                yield chunk
+
+    def aiter_xml(self, tracking_id: str) -> AsyncIterator[bytes]:
+        """
+        Read a spooled document in chunks from the event loop, each read in a worker thread
+
+        Args:
+            tracking_id: Tracking id
+
+        Returns:
+            Async iterator of XML byte chunks
+        """
+        return aiter_in_thread(self.iter_xml(tracking_id))
+
+    def claim(self, tracking_id: str) -> bool:
+        """
+        Claim a job for delivery by this process
+
+        A claim older than SPOOL_CLAIM_TIMEOUT is considered abandoned (its
+        process died mid-delivery) and is taken over.
+
+        Args:
+            tracking_id: Tracking id
+
+        Returns:
+            True if the job was claimed, False if another process holds it
+        """
+        path = self._path(tracking_id, "lock")
+        for _ in range(2):
+            try:
+                fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+            except FileExistsError:
+                if not self._is_stale(path):
+                    return False
+                # Move the stale lock aside first, so only one process takes it over
+                stale_path = f"{path}.{uuid.uuid4().hex}.stale"
+                try:
+                    os.rename(path, stale_path)
+                except FileNotFoundError:
+                    continue
+                os.remove(stale_path)
+                continue
+            with os.fdopen(fd, "w") as f:
+                f.write(str(os.getpid()))
+            return True
+        return False
+
+    def release(self, tracking_id: str) -> None:
+        """Release the claim on a job"""
+        try:
+            os.remove(self._path(tracking_id, "lock"))
+        except FileNotFoundError:
+            pass
+
+    def is_claimed(self, tracking_id: str) -> bool:
+        """Whether a live claim is held on a job"""
+        path = self._path(tracking_id, "lock")
+        return os.path.exists(path) and not self._is_stale(path)
+
+    @staticmethod
+    def _is_stale(path: str) -> bool:
+        try:
+            return time.time() - os.path.getmtime(path) > settings.SPOOL_CLAIM_TIMEOUT
+        except FileNotFoundError:
+            return True
+
+    def prune(self, retention: Optional[float] = None) -> int:
+        """
+        Remove delivered and failed jobs last updated before the retention period
+
+        Args:
+            retention: Seconds finished jobs are kept (defaults to
+                settings.SPOOL_RETENTION; 0 keeps them forever)
+
+        Returns:
+            Number of jobs removed
+        """
+        retention = settings.SPOOL_RETENTION if retention is None else retention
+        if retention <= 0 or not os.path.isdir(self.spool_dir):
+            return 0
+        cutoff = time.time() - retention
+        removed = 0
+        for filename in os.listdir(self.spool_dir):
+            if not filename.endswith(".json"):
+                continue
+            tracking_id = filename[:-len(".json")]
+            try:
+                if os.path.getmtime(self._path(tracking_id, "json")) >= cutoff:
+                    continue
+            except FileNotFoundError:
+                continue
+            meta = self.get(tracking_id)
+            if meta is None or meta["status"] not in (DELIVERED, FAILED):
+                continue
+            for ext in ("json", "xml", "auth", "lock"):
+                try:
+                    os.remove(self._path(tracking_id, ext))
+                except FileNotFoundError:
+                    pass
+            self.forget_auth_header(tracking_id)
+            removed += 1
+        if removed:
+            logger.info("Pruned %d finished delivery jobs from %s", removed, self.spool_dir)
+        return removed
+
+    def discard_xml(self, tracking_id: str) -> None:
+        """Remove the document of a finished job, keeping its metadata"""
+        try:
+            os.remove(self._path(tracking_id, "xml"))
+        except FileNotFoundError:
+            pass
+
+    def pending(self) -> List[Dict[str, Any]]:
+        """
+        List jobs that still need delivery, oldest first
+
+        Returns:
+            Metadata of queued and interrupted jobs not claimed by a live process
+        """
+        if not os.path.isdir(self.spool_dir):
+            return []
+        jobs = []
+        for filename in os.listdir(self.spool_dir):
+            if not filename.endswith(".json"):
+                continue
+            meta = self.get(filename[:-len(".json")])
+            if meta and meta["status"] in (QUEUED, DELIVERING) and not self.is_claimed(meta["tracking_id"]):
+                jobs.append(meta)
+        return sorted(jobs, key=lambda meta: meta["created_at"])
+
+
+class DeliveryQueue:
+    """
+    Pool of async workers draining the spool to the internal API
+
+    Concurrency is bounded by the number of workers. Failed deliveries are
+    rescheduled with exponential backoff and jitter until SPOOL_MAX_ATTEMPTS
+    is reached; client errors from the internal API are not retried.
+    """
+
+    def __init__(self, spool: DeliverySpool):
+        """
+        Initialize delivery queue
+
+        Args:
+            spool: Spool to drain
+        """
+        self.spool = spool
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+        self._timers: List[asyncio.TimerHandle] = []
+        self._pruner: Optional[asyncio.Task] = None
+
+    @property
+    def is_running(self) -> bool:
+        """Whether workers are draining the spool"""
+        return bool(self._workers)
+
+    async def start(self, workers: Optional[int] = None) -> None:
+        """
+        Start the workers and re-queue jobs left over from a previous run
+
+        Args:
+            workers: Number of workers (defaults to settings.SPOOL_WORKERS)
+        """
+        if self.is_running:
+            return
+        self._queue = asyncio.Queue()
+        for meta in await asyncio.to_thread(self.spool.pending):
+            self._schedule(meta["tracking_id"], meta.get("next_attempt_at", 0) - time.time())
+        count = workers or settings.SPOOL_WORKERS
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(count)]
+        self._pruner = asyncio.create_task(self._prune_periodically())
+        logger.info("Delivery queue started with %d workers", count)
+
+    async def stop(self) -> None:
+        """Stop the workers; queued jobs stay in the spool"""
+        for timer in self._timers:
+            timer.cancel()
+        tasks = self._workers + ([self._pruner] if self._pruner is not None else [])
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._workers, self._timers, self._queue, self._pruner = [], [], None, None
+        logger.info("Delivery queue stopped")
+
+    async def _prune_periodically(self) -> None:
+        while True:
+            try:
+                await asyncio.to_thread(self.spool.prune)
+            except Exception as e:
+                logger.error("Failed to prune the delivery spool: %s", e, exc_info=True)
+            await asyncio.sleep(PRUNE_INTERVAL)
+
+    def submit(self, tracking_id: str) -> None:
+        """
+        Hand a spooled job to the workers
+
+        Jobs submitted while the queue is stopped are picked up on the next start.
+        """
+        if self._queue is not None:
+            self._queue.put_nowait(tracking_id)
+
+    def _schedule(self, tracking_id: str, delay: float) -> None:
+        if delay <= 0:
+            self.submit(tracking_id)
+            return
+        loop = asyncio.get_running_loop()
+        self._timers = [timer for timer in self._timers if not timer.cancelled()]
+        self._timers.append(loop.call_later(delay, self.submit, tracking_id))
+
+    async def _worker(self) -> None:
+        while True:
+            tracking_id = await self._queue.get()
+            try:
+                await self.deliver(tracking_id)
+            except Exception as e:
+                logger.error("Unexpected error delivering %s: %s", tracking_id, e, exc_info=True)
+            finally:
+                self._queue.task_done()
+
+    async def deliver(self, tracking_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Attempt delivery of one spooled job
+
+        The job is claimed first; a job claimed by another process, or
+        already finished, is left alone.
+
+        Args:
+            tracking_id: Tracking id
+
+        Returns:
+            Updated job metadata (current metadata if the job was not attempted)
+        """
+        if not await asyncio.to_thread(self.spool.claim, tracking_id):
+            logger.info("Delivery job %s is claimed by another process", tracking_id)
+            return await asyncio.to_thread(self.spool.get, tracking_id)
+        try:
+            return await self._deliver_claimed(tracking_id)
+        finally:
+            await asyncio.to_thread(self.spool.release, tracking_id)
+
+    async def _deliver_claimed(self, tracking_id: str) -> Optional[Dict[str, Any]]:
+        meta = await asyncio.to_thread(self.spool.get, tracking_id)
+        if meta is None or meta["status"] in (DELIVERED, FAILED):
+            return meta
+        # Another process may have failed an attempt and pushed the retry back
+        wait = meta.get("next_attempt_at", 0) - time.time()
+        if meta["status"] == QUEUED and wait > 0:
+            self._schedule(tracking_id, wait)
+            return meta
+        attempts = meta["attempts"] + 1
+        await asyncio.to_thread(self.spool.update, tracking_id, status=DELIVERING, attempts=attempts)
+        auth_header = await asyncio.to_thread(self.spool.auth_header, tracking_id)
+        try:
+            response = await post_xml_to_internal_api(
+                self.spool.aiter_xml(tracking_id), meta["message_type"], auth_header=auth_header
+            )
+        except Exception as e:
+            return await self._handle_failure(tracking_id, attempts, e)
+
+        logger.info("Delivered %s after %d attempt(s)", tracking_id, attempts)
+        return await asyncio.to_thread(
+            self._finish, tracking_id, status=DELIVERED, upstream_status=response.status_code,
+            upstream_response=response.text, error=None
+        )
+
+    def _finish(self, tracking_id: str, **fields: Any) -> Dict[str, Any]:
+        self.spool.discard_xml(tracking_id)
+        self.spool.forget_auth_header(tracking_id)
+        return self.spool.update(tracking_id, **fields)
+
+    async def _handle_failure(self, tracking_id: str, attempts: int, error: Exception) -> Dict[str, Any]:
+        retryable = True
+        if isinstance(error, httpx.HTTPStatusError):
+            status = error.response.status_code
+            retryable = status >= 500 or status in (408, 429)
+        if not retryable or attempts >= settings.SPOOL_MAX_ATTEMPTS:
+            logger.error("Giving up on %s after %d attempt(s): %s", tracking_id, attempts, error)
+            return await asyncio.to_thread(self._finish, tracking_id, status=FAILED, error=str(error))
+
+        delay = min(settings.SPOOL_RETRY_MAX_DELAY, settings.SPOOL_RETRY_DELAY * 2 ** (attempts - 1))
+        delay += random.uniform(0, settings.SPOOL_RETRY_DELAY)
+        logger.warning("Delivery of %s failed (attempt %d), retrying in %.1fs: %s", tracking_id, attempts, delay, error)
+        meta = await asyncio.to_thread(
+            self.spool.update, tracking_id, status=QUEUED, error=str(error), next_attempt_at=time.time() + delay
+        )
+        self._schedule(tracking_id, delay)
+        return meta
+
+
+# Singleton instances for use throughout the app
+delivery_spool = DeliverySpool()
+delivery_queue = DeliveryQueue(delivery_spool)
@@ -0,0 +1,312 @@
+"""
+Idempotency layer suppressing duplicate PMS messages
+
+PMSs retry messages they did not get a timely answer for. Successful
+outcomes are remembered for IDEMPOTENCY_TTL seconds, keyed by PMS, message
+type, delivery mode, caller and the message id (or a hash of the body), and
+replayed for duplicates instead of re-translating and re-posting them. A
+duplicate arriving while the original is still being processed waits for
+its outcome. Recent outcomes are looked up in memory on the event loop;
+the optional SQLite store is read and written from worker threads.
+"""
+
+import asyncio
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, NamedTuple, Optional, Tuple
+
+from app.core.config import settings
+from app.core.logging import get_logger
+
+logger = get_logger("idempotency")
+
+# Expired rows are pruned from the persistent store every this many writes
+_PRUNE_EVERY = 1000
+
+
+class CachedResponse(NamedTuple):
+    """Outcome replayed for duplicate messages"""
+    status_code: int
+    body: bytes
+    media_type: Optional[str]
+
+
+def message_key(
+    pms_code: str,
+    message_type: str,
+    delivery: str,
+    body: bytes,
+    message_id: Optional[str] = None,
+    auth_header: Optional[str] = None
+) -> str:
+    """
+    Build the idempotency key of a message
+
+    Args:
+        pms_code: PMS the message came from
+        message_type: Type of message
+        delivery: Delivery mode
+        body: Raw request body, hashed when there is no message id
+        message_id: Id extracted from the message, if any
+        auth_header: Authorization header, so callers never see each other's responses
+
+    Returns:
+        Idempotency key
+    """
+    identity = f"id:{message_id}" if message_id else "sha256:" + hashlib.sha256(body).hexdigest()
+    caller = hashlib.sha256(auth_header.encode("utf-8")).hexdigest()[:16] if auth_header else "-"
+    return f"{pms_code}:{message_type}:{delivery}:{caller}:{identity}"
+
+
+class SQLiteIdempotencyStore:
+    """Idempotency records persisted in SQLite, surviving restarts and shared by local workers"""
+
+    def __init__(self, path: str):
+        """
+        Open (and create if needed) the store
+
+        Args:
+            path: SQLite database file
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS idempotency ("
+            "key TEXT PRIMARY KEY, expires_at REAL NOT NULL, "
+            "status_code INTEGER NOT NULL, media_type TEXT, body BLOB NOT NULL)"
+        )
+        self._lock = threading.Lock()
+
+    def get(self, key: str, now: float) -> Optional[Tuple[float, CachedResponse]]:
+        """
+        Get an unexpired record
+
+        Args:
+            key: Idempotency key
+            now: Current time (epoch seconds)
+
+        Returns:
+            Tuple of expiry time and response, or None
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT expires_at, status_code, body, media_type FROM idempotency WHERE key = ? AND expires_at > ?",
+                (key, now)
+            ).fetchone()
+        if row is None:
+            return None
+        return row[0], CachedResponse(row[1], bytes(row[2]), row[3])
+
+    def put(self, key: str, response: CachedResponse, expires_at: float) -> None:
+        """Insert or replace a record"""
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO idempotency (key, expires_at, status_code, media_type, body) VALUES (?, ?, ?, ?, ?)",
+                (key, expires_at, response.status_code, response.media_type, response.body)
+            )
+
+    def prune(self, now: float) -> int:
+        """
+        Delete expired records
+
+        Returns:
+            Number of records deleted
+        """
+        with self._lock:
+            return self._conn.execute("DELETE FROM idempotency WHERE expires_at <= ?", (now,)).rowcount
+
+    def clear(self) -> None:
+        """Delete all records"""
+        with self._lock:
+            self._conn.execute("DELETE FROM idempotency")
+
+    def close(self) -> None:
+        """Close the database"""
+        with self._lock:
+            self._conn.close()
+
+
+class IdempotencyStore:
+    """
+    Bounded LRU of recent outcomes, optionally backed by SQLite
+
+    Only successful outcomes are stored, so a PMS retrying after an error
+    gets its message processed again.
+    """
+
+    def __init__(
+        self,
+        ttl: Optional[float] = None,
+        max_entries: Optional[int] = None,
+        db_path: Optional[str] = None
+    ):
+        """
+        Initialize idempotency store
+
+        Args:
+            ttl: Seconds outcomes are kept (defaults to settings.IDEMPOTENCY_TTL, 0 disables)
+            max_entries: Outcomes kept in memory (defaults to settings.IDEMPOTENCY_MAX_ENTRIES)
+            db_path: SQLite file for the persistent store (defaults to settings.IDEMPOTENCY_DB, empty disables)
+        """
+        self._ttl = ttl
+        self._max_entries = max_entries
+        self._db_path = db_path
+        self._db: Optional[SQLiteIdempotencyStore] = None
+        self._entries: "OrderedDict[str, Tuple[float, CachedResponse]]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Event] = {}
+        self._lock = threading.Lock()
+        self._writes = 0
+
+    @property
+    def ttl(self) -> float:
+        return self._ttl if self._ttl is not None else settings.IDEMPOTENCY_TTL
+
+    @property
+    def enabled(self) -> bool:
+        """Whether duplicate suppression is on"""
+        return self.ttl > 0
+
+    @property
+    def max_entries(self) -> int:
+        return self._max_entries if self._max_entries is not None else settings.IDEMPOTENCY_MAX_ENTRIES
+
+    @property
+    def db_path(self) -> str:
+        return self._db_path if self._db_path is not None else settings.IDEMPOTENCY_DB
+
+    def _persistent(self) -> Optional[SQLiteIdempotencyStore]:
+        path = self.db_path
+        if self._db is None and path:
+            self._db = SQLiteIdempotencyStore(path)
+            logger.info("Idempotency records persisted to %s", path)
+        return self._db
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        """
+        Get the stored outcome for a key
+
+        Args:
+            key: Idempotency key
+
+        Returns:
+            Stored response, or None if unknown or expired
+        """
+        return self._recall(key) or self._load(key)
+
+    def _recall(self, key: str) -> Optional[CachedResponse]:
+        """Outcome for a key from the in-memory LRU"""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._entries.move_to_end(key)
+                    return entry[1]
+                del self._entries[key]
+        return None
+
+    def _load(self, key: str) -> Optional[CachedResponse]:
+        """Outcome for a key from the persistent store, remembered in memory"""
+        db = self._persistent()
+        if db is None:
+            return None
+        entry = db.get(key, time.time())
+        if entry is None:
+            return None
+        self._remember(key, *entry)
+        return entry[1]
+
+    def put(self, key: str, response: CachedResponse) -> None:
+        """
+        Store the outcome for a key
+
+        Args:
+            key: Idempotency key
+            response: Outcome to replay
+        """
+        expires_at = time.time() + self.ttl
+        self._remember(key, expires_at, response)
+        self._persist(key, response, expires_at)
+
+    async def store(self, key: str, response: CachedResponse) -> None:
+        """
+        Store the outcome for a key from the event loop, writing the persistent store in a worker thread
+
+        Args:
+            key: Idempotency key
+            response: Outcome to replay
+        """
+        expires_at = time.time() + self.ttl
+        self._remember(key, expires_at, response)
+        if self.db_path:
+            await asyncio.to_thread(self._persist, key, response, expires_at)
+
+    def _persist(self, key: str, response: CachedResponse, expires_at: float) -> None:
+        db = self._persistent()
+        if db is None:
+            return
+        db.put(key, response, expires_at)
+        with self._lock:
+            self._writes += 1
+            prune = self._writes % _PRUNE_EVERY == 0
+        if prune:
+            db.prune(time.time())
+
+    def _remember(self, key: str, expires_at: float, response: CachedResponse) -> None:
+        with self._lock:
+            self._entries[key] = (expires_at, response)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    async def acquire(self, key: str) -> Optional[CachedResponse]:
+        """
+        Claim a key, or get the outcome of an earlier message with the same key
+
+        If another request holds the key, waits until it is released.
+        A caller getting None owns the key and must call release().
+
+        Args:
+            key: Idempotency key
+
+        Returns:
+            Stored response for a duplicate, or None if the caller should process the message
+        """
+        while True:
+            cached = self._recall(key)
+            if cached is None and self.db_path:
+                cached = await asyncio.to_thread(self._load, key)
+            if cached is not None:
+                return cached
+            event = self._inflight.get(key)
+            if event is None:
+                self._inflight[key] = asyncio.Event()
+                return None
+            await event.wait()
+
+    def release(self, key: str) -> None:
+        """Release a claimed key, waking duplicates waiting for it"""
+        event = self._inflight.pop(key, None)
+        if event is not None:
+            event.set()
+
+    def clear(self) -> None:
+        """Drop all stored outcomes"""
+        with self._lock:
+            self._entries.clear()
+        if self._db is not None:
+            self._db.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+# Singleton instance for use throughout the app
+idempotency_store = IdempotencyStore()
@@ -2,38 +2,202 @@
 Internal API client for posting RGBridge XML
 """
 
+import asyncio
 import httpx
 from app.core.config import settings
-from tenacity import retry, stop_after_attempt, wait_fixed, retry_if_exception_type
+from tenacity import AsyncRetrying, RetryCallState, stop_after_attempt, wait_exponential_jitter, retry_if_exception_type
+from typing import AsyncIterable, AsyncIterator, Dict, Iterable, Optional, Union
 import logging
 
+from app.core.logging import REQUEST_ID_HEADER, request_id_var
+from app.core.metrics import UPSTREAM_CONNECTIONS, UPSTREAM_REQUESTS, UPSTREAM_RETRIES, metrics_registry
+
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
 logger = logging.getLogger("rgbridge.internal_api")
 
-@retry(
-    stop=stop_after_attempt(settings.INTERNAL_API_RETRY_ATTEMPTS),
-    wait=wait_fixed(settings.INTERNAL_API_RETRY_DELAY),
-    retry=retry_if_exception_type(httpx.RequestError)
-)
-def post_xml_to_internal_api(xml_string: str, message_type: str, auth_header: str = None) -> httpx.Response:
+XMLBody = Union[str, bytes, Iterable[bytes], AsyncIterable[bytes]]
+
+
+async def _aiter_chunks(chunks: Iterable[bytes]) -> AsyncIterator[bytes]:
+    """Adapt a sync chunk iterator to the async stream httpx.AsyncClient expects"""
+    for chunk in chunks:
+        yield chunk
+
+
+class InternalAPIClient:
     """
-    Post XML to the internal API endpoint with retries
+    Long-lived async client for the internal API
+
+    Wraps a pooled httpx.AsyncClient (keep-alive, HTTP/2 when available)
+    that is opened and closed through the application lifespan. Callers
+    outside the lifespan (scripts, tests) get a client started lazily.
     """
-    url = settings.INTERNAL_API_URL.rstrip("/") #+ f"/{message_type}"
-    headers = {
-        "Content-Type": "application/xml"
-    }
-    if auth_header:
-        headers["Authorization"] = auth_header
-    logger.info(f"Posting XML to internal API: {url}")
-    try:
-        with httpx.Client(timeout=settings.INTERNAL_API_TIMEOUT) as client:
-            response = client.post(url, content=xml_string.encode("utf-8"), headers=headers)
+
+    def __init__(self, transport: Optional[httpx.AsyncBaseTransport] = None):
+        """
+        Initialize internal API client
+
+        Args:
+            transport: Optional httpx transport (used for testing)
+        """
+        self._transport = transport
+        self._client: Optional[httpx.AsyncClient] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    @property
+    def is_started(self) -> bool:
+        """Whether the underlying HTTP client is open"""
+        return self._client is not None
+
+    def _create_client(self) -> httpx.AsyncClient:
+        http2 = settings.INTERNAL_API_HTTP2
+        if http2 and not HTTP2_AVAILABLE:
+            logger.warning("HTTP/2 requested for internal API but 'h2' is not installed, using HTTP/1.1")
+            http2 = False
+        limits = httpx.Limits(
+            max_connections=settings.INTERNAL_API_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.INTERNAL_API_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=settings.INTERNAL_API_KEEPALIVE_EXPIRY
+        )
+        return httpx.AsyncClient(
+            timeout=settings.INTERNAL_API_TIMEOUT,
+            limits=limits,
+            http2=http2,
+            transport=self._transport
+        )
+
+    async def start(self) -> None:
+        """Open the pooled HTTP client"""
+        if self._client is None:
+            self._client = self._create_client()
+            self._loop = asyncio.get_running_loop()
+            logger.info("Internal API client started")
+
+    async def close(self) -> None:
+        """Close the pooled HTTP client and its connections"""
+        if self._client is not None:
+            client, self._client, self._loop = self._client, None, None
+            await client.aclose()
+            logger.info("Internal API client closed")
+
+    def pool_stats(self) -> Dict[str, int]:
+        """
+        Get connection counts of the pooled HTTP client
+
+        Returns:
+            Number of active and idle connections (empty if the client is not
+            started or its transport has no connection pool)
+        """
+        pool = getattr(getattr(self._client, "_transport", None), "_pool", None)
+        if pool is None:
+            return {}
+        connections = list(pool.connections)
+        idle = sum(1 for connection in connections if connection.is_idle())
+        return {"active": len(connections) - idle, "idle": idle}
+
+    def collect_metrics(self) -> None:
+        """Refresh the upstream pool gauges"""
+        stats = self.pool_stats()
+        for state in ("active", "idle"):
+            UPSTREAM_CONNECTIONS.set(stats.get(state, 0), state=state)
+
+    async def _get_client(self) -> httpx.AsyncClient:
+        # Connections are bound to the loop that opened them
+        if self._client is not None and self._loop is not asyncio.get_running_loop():
+            client, loop, self._client, self._loop = self._client, self._loop, None, None
+            await self._close_stale(client, loop)
+        await self.start()
+        return self._client
+
+    @staticmethod
+    async def _close_stale(client: httpx.AsyncClient, loop: Optional[asyncio.AbstractEventLoop]) -> None:
+        """Close a client opened on another event loop, on that loop while it still runs"""
+        if loop is not None and loop.is_running() and not loop.is_closed():
+            asyncio.run_coroutine_threadsafe(client.aclose(), loop)
+            return
+        try:
+            await client.aclose()
+        except Exception as e:
+            logger.debug("Failed to close internal API client of a finished event loop: %s", e)
+
+    async def _post_once(self, url: str, content, headers: dict) -> httpx.Response:
+        client = await self._get_client()
+        try:
+            response = await client.post(url, content=content, headers=headers)
+            UPSTREAM_REQUESTS.inc(status=response.status_code)
             response.raise_for_status()
-            logger.info(f"Internal API response: {response.status_code}")
+            logger.info("Internal API response: %s", response.status_code)
             return response
-    except httpx.RequestError as e:
-        logger.error(f"Request error posting to internal API: {e}")
-        raise
-    except httpx.HTTPStatusError as e:
-        logger.error(f"HTTP error posting to internal API: {e.response.status_code} {e.response.text}")
-        raise 
\ No newline at end of file
+        except httpx.RequestError as e:
+            UPSTREAM_REQUESTS.inc(status="error")
+            logger.error("Request error posting to internal API: %s", e)
+            raise
+        except httpx.HTTPStatusError as e:
+            logger.error("HTTP error posting to internal API: %s %s", e.response.status_code, e.response.text)
+            raise
+
+    @staticmethod
+    def _log_retry(retry_state: RetryCallState) -> None:
+        UPSTREAM_RETRIES.inc()
+        logger.warning(
+            "Retrying internal API post (attempt %d) in %.2fs",
+            retry_state.attempt_number, retry_state.next_action.sleep
+        )
+
+    async def post_xml(self, xml_body: XMLBody, message_type: str, auth_header: str = None) -> httpx.Response:
+        """
+        Post XML to the internal API endpoint with retries
+
+        The body may be a string, bytes, or a sync or async iterator of byte
+        chunks that is streamed as the request body. Request errors are retried with
+        exponential backoff and jitter; a streamed body cannot be replayed
+        and gets a single attempt. HTTP error responses are raised
+        immediately.
+        """
+        url = settings.INTERNAL_API_URL.rstrip("/") #+ f"/{message_type}"
+        headers = {
+            "Content-Type": "application/xml"
+        }
+        if auth_header:
+            headers["Authorization"] = auth_header
+        request_id = request_id_var.get()
+        if request_id != "-":
+            headers[REQUEST_ID_HEADER] = request_id
+        if isinstance(xml_body, str):
+            xml_body = xml_body.encode("utf-8")
+        if isinstance(xml_body, bytes):
+            content, attempts = xml_body, settings.INTERNAL_API_RETRY_ATTEMPTS
+        elif hasattr(xml_body, "__aiter__"):
+            content, attempts = xml_body, 1
+        else:
+            content, attempts = _aiter_chunks(xml_body), 1
+        logger.info("Posting XML to internal API: %s", url)
+        retrying = AsyncRetrying(
+            stop=stop_after_attempt(attempts),
+            wait=wait_exponential_jitter(
+                initial=settings.INTERNAL_API_RETRY_DELAY,
+                max=settings.INTERNAL_API_RETRY_MAX_DELAY,
+                jitter=settings.INTERNAL_API_RETRY_DELAY
+            ),
+            retry=retry_if_exception_type(httpx.RequestError),
+            before_sleep=self._log_retry,
+            reraise=True
+        )
+        return await retrying(self._post_once, url, content, headers)
+
+
+# Singleton instance for use throughout the app
+internal_api_client = InternalAPIClient()
+metrics_registry.add_collector(internal_api_client.collect_metrics)
+
+
+async def post_xml_to_internal_api(xml_body: XMLBody, message_type: str, auth_header: str = None) -> httpx.Response:
+    """
+    Post XML to the internal API endpoint with retries
+    """
+    return await internal_api_client.post_xml(xml_body, message_type, auth_header=auth_header)
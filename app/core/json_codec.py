@@ -0,0 +1,136 @@
+"""
+JSON codec for request and response bodies
+
+PMS payloads are decoded and API responses encoded through loads() and
+dumps() here instead of the stdlib json module, so the fastest available
+library is used. orjson is preferred when installed; the stdlib codec is
+the fallback and can be forced with JSON_CODEC=json.
+
+Both codecs reject NaN and Infinity when encoding. orjson would write them
+as null, so its output is checked for non-finite floats whenever it
+contains a null, and it raises ValueError like json.dumps(allow_nan=False).
+"""
+
+import json
+import math
+from functools import lru_cache
+from typing import Any, Callable, Dict, NamedTuple, Union
+
+from fastapi.responses import JSONResponse
+
+from app.core.config import settings
+from app.core.logging import get_logger
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+logger = get_logger("json_codec")
+
+JSONInput = Union[str, bytes, bytearray, memoryview]
+
+
+class JSONCodec(NamedTuple):
+    """
+    A JSON implementation: loads() raises ValueError on invalid input, dumps() returns
+    UTF-8 bytes and raises ValueError for NaN and Infinity
+    """
+    name: str
+    loads: Callable[[JSONInput], Any]
+    dumps: Callable[[Any], bytes]
+
+
+def _json_dumps(obj: Any) -> bytes:
+    # Same output as Starlette's JSONResponse
+    return json.dumps(obj, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+CODECS: Dict[str, JSONCodec] = {"json": JSONCodec("json", json.loads, _json_dumps)}
+
+def _has_non_finite(obj: Any) -> bool:
+    """Whether a value holds a NaN or infinite float"""
+    if isinstance(obj, float):
+        return not math.isfinite(obj)
+    if isinstance(obj, dict):
+        return any(map(_has_non_finite, obj.values()))
+    if isinstance(obj, (list, tuple)):
+        return any(map(_has_non_finite, obj))
+    return False
+
+
+if ORJSON_AVAILABLE:
+    def _orjson_dumps(obj: Any) -> bytes:
+        data = orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+        # orjson writes NaN and Infinity as null; only output with a null can hold one
+        if b"null" in data and _has_non_finite(obj):
+            raise ValueError("Out of range float values are not JSON compliant")
+        return data
+
+    CODECS["orjson"] = JSONCodec("orjson", orjson.loads, _orjson_dumps)
+
+
+@lru_cache(maxsize=None)
+def get_codec(name: str = "auto") -> JSONCodec:
+    """
+    Get a codec by name
+
+    Args:
+        name: 'orjson', 'json', or 'auto' for the fastest installed codec
+
+    Returns:
+        The codec; the stdlib codec if the requested library is not installed
+
+    Raises:
+        ValueError: If the name is unknown
+    """
+    name = name.lower()
+    if name == "auto":
+        return CODECS["orjson"] if ORJSON_AVAILABLE else CODECS["json"]
+    if name == "orjson" and not ORJSON_AVAILABLE:
+        logger.warning("JSON codec 'orjson' requested but it is not installed, using the stdlib json module")
+        return CODECS["json"]
+    if name not in CODECS:
+        raise ValueError(f"Unknown JSON codec {name!r}, expected one of: auto, {', '.join(CODECS)}")
+    return CODECS[name]
+
+
+def loads(data: JSONInput) -> Any:
+    """
+    Decode a JSON document with the configured codec
+
+    Args:
+        data: JSON text or UTF-8 bytes
+
+    Returns:
+        Decoded value
+
+    Raises:
+        ValueError: If the document is not valid JSON
+    """
+    return get_codec(settings.JSON_CODEC).loads(data)
+
+
+def dumps(obj: Any) -> bytes:
+    """
+    Encode a value as compact UTF-8 JSON with the configured codec
+
+    Args:
+        obj: Value made of JSON types
+
+    Returns:
+        JSON bytes
+
+    Raises:
+        TypeError: If the value holds types JSON cannot represent
+        ValueError: If the value holds NaN or Infinity
+    """
+    return get_codec(settings.JSON_CODEC).dumps(obj)
+
+
+class CodecJSONResponse(JSONResponse):
+    """JSONResponse rendered with the configured codec"""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
@@ -0,0 +1,387 @@
+"""
+Incremental parsing of large PMS JSON payloads
+
+A PMS sync is usually one top-level object with a few header fields and
+one huge list (e.g. Cloudbeds' ``Inventory``). StreamingJSONParser reads
+the header fields as soon as their bytes arrive and then yields the list's
+items one at a time, so translation and the streaming XML writer can start
+before the request body has been received and only one item is held in
+memory. Values are decoded by the stdlib's C scanner; only the top-level
+object and the streamed list are walked here.
+
+The streamed list must be the last field of the object: rows are
+translated while it is being read, so later fields could not reach them.
+"""
+
+import asyncio
+import codecs
+import json
+import queue
+import threading
+from typing import Any, AsyncIterable, AsyncIterator, Callable, Dict, Iterable, Iterator, Optional, TypeVar
+
+T = TypeVar("T")
+
+_WHITESPACE = " \t\r\n"
+_decoder = json.JSONDecoder()
+
+# Parser states
+_START, _FIELD, _ITEMS, _END = range(4)
+_DONE = object()
+
+# Consumed text kept before the buffer is compacted
+_COMPACT_AT = 64 * 1024
+
+
+class StreamedJSONError(ValueError):
+    """Raised when a streamed payload is not valid JSON or not streamable"""
+
+
+class _NeedMore(Exception):
+    """More input is needed to make progress"""
+
+
+class StreamingJSONParser:
+    """
+    Push parser for a JSON object whose `stream_key` list is read item by item
+
+    Feed bytes with feed() and close(); parse_header() reports when the
+    fields before the list are known, and next_item() returns list items.
+    """
+
+    def __init__(self, stream_key: str):
+        """
+        Initialize parser
+
+        Args:
+            stream_key: Top-level field holding the list to stream
+        """
+        self.stream_key = stream_key
+        # Fields preceding the streamed list (all fields if there is no list)
+        self.header: Dict[str, Any] = {}
+        # Whether the streamed list was found
+        self.streaming = False
+        self.bytes_read = 0
+        self._text_decoder = codecs.getincrementaldecoder("utf-8")()
+        self._buffer = ""
+        self._pos = 0
+        self._eof = False
+        self._state = _START
+        # Whether a ',' must precede the next field or item
+        self._separated = False
+        # Buffer length to reach before retrying an incomplete value
+        self._retry_at = 0
+
+    def feed(self, data: bytes) -> None:
+        """Append body bytes"""
+        self.bytes_read += len(data)
+        try:
+            text = self._text_decoder.decode(data)
+        except UnicodeDecodeError as e:
+            raise StreamedJSONError(f"Invalid UTF-8 in payload: {e}") from e
+        if self._pos > _COMPACT_AT:
+            self._buffer = self._buffer[self._pos:]
+            self._retry_at -= self._pos
+            self._pos = 0
+        self._buffer += text
+
+    def close(self) -> None:
+        """Mark the end of the body"""
+        try:
+            self._buffer += self._text_decoder.decode(b"", final=True)
+        except UnicodeDecodeError as e:
+            raise StreamedJSONError(f"Invalid UTF-8 in payload: {e}") from e
+        self._eof = True
+
+    def parse_header(self) -> bool:
+        """
+        Parse fields until the streamed list starts
+
+        Returns:
+            True once the header is known (the list started or the object
+            ended), False if more input is needed
+
+        Raises:
+            StreamedJSONError: If the payload is invalid
+        """
+        try:
+            while self._state in (_START, _FIELD):
+                self._step()
+            return True
+        except _NeedMore:
+            if self._eof:
+                raise StreamedJSONError("Payload ended unexpectedly")
+            return False
+
+    def next_item(self) -> Any:
+        """
+        Parse the next item of the streamed list
+
+        Returns:
+            The item, or the module's _DONE marker once the object is complete
+
+        Raises:
+            _NeedMore: If more input is needed
+            StreamedJSONError: If the payload is invalid
+        """
+        while True:
+            if self._state == _ITEMS:
+                item = self._item()
+                if item is not _DONE:
+                    return item
+            elif self._state == _END:
+                if self._skip() is not None:
+                    raise StreamedJSONError(f"Extra data after the payload at character {self._pos}")
+                if not self._eof:
+                    raise _NeedMore()
+                return _DONE
+            else:
+                self._step()
+
+    def iter_items(self, read: Callable[[], Optional[bytes]]) -> Iterator[Any]:
+        """
+        Yield the streamed list's items, reading input as needed
+
+        Args:
+            read: Returns the next body chunk, None at the end of the body
+
+        Returns:
+            Iterator of items
+        """
+        while True:
+            try:
+                item = self.next_item()
+            except _NeedMore:
+                if self._eof:
+                    raise StreamedJSONError("Payload ended unexpectedly")
+                chunk = read()
+                if chunk is None:
+                    self.close()
+                else:
+                    self.feed(chunk)
+                continue
+            if item is _DONE:
+                return
+            yield item
+
+    def _skip(self) -> Optional[str]:
+        """Skip whitespace, returning the next character (None if the buffer is exhausted)"""
+        buffer, pos = self._buffer, self._pos
+        while pos < len(buffer) and buffer[pos] in _WHITESPACE:
+            pos += 1
+        self._pos = pos
+        return buffer[pos] if pos < len(buffer) else None
+
+    def _expect(self, char: Optional[str], expected: str) -> None:
+        if char is None:
+            raise _NeedMore()
+        if char not in expected:
+            raise StreamedJSONError(f"Expected {' or '.join(map(repr, expected))} at character {self._pos}, got {char!r}")
+
+    def _value(self, pos: int) -> Any:
+        """Decode the value starting at pos, returning it and its end"""
+        buffer = self._buffer
+        if not self._eof and len(buffer) < self._retry_at:
+            raise _NeedMore()
+        try:
+            value, end = _decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError as e:
+            if self._eof:
+                raise StreamedJSONError(f"Invalid JSON payload: {e}") from e
+            # Probably cut off; retry once the pending text has doubled, so a
+            # large value is not re-decoded for every chunk
+            self._retry_at = len(buffer) + max(len(buffer) - pos, 1)
+            raise _NeedMore()
+        # A number at the very end may continue in the next chunk; any other
+        # complete value is followed by at least a ',', ']' or '}'
+        if end >= len(buffer) and not self._eof:
+            self._retry_at = len(buffer) + 1
+            raise _NeedMore()
+        return value, end
+
+    def _step(self) -> None:
+        """Consume the object start or one field, committing only complete steps"""
+        start = self._pos
+        try:
+            char = self._skip()
+            if self._state == _START:
+                self._expect(char, "{")
+                self._pos += 1
+                self._state, self._separated = _FIELD, False
+                return
+            self._expect(char, "},\"" if self._separated else "}\"")
+            if char == "}":
+                self._pos += 1
+                self._state = _END
+                return
+            if self._separated:
+                self._expect(char, ",")
+                self._pos += 1
+                self._expect(self._skip(), "\"")
+            key, self._pos = self._value(self._pos)
+            self._expect(self._skip(), ":")
+            self._pos += 1
+            char = self._skip()
+            if char is None:
+                raise _NeedMore()
+            if self.streaming:
+                raise StreamedJSONError(
+                    f"Field {key!r} follows {self.stream_key!r}; the streamed list must be the last field"
+                )
+            if key == self.stream_key and char == "[":
+                self._pos += 1
+                self.streaming = True
+                self._state, self._separated = _ITEMS, False
+                return
+            self.header[key], self._pos = self._value(self._pos)
+            self._separated = True
+        except _NeedMore:
+            self._pos = start
+            raise
+
+    def _item(self) -> Any:
+        """Consume one item, or the end of the list (returning _DONE)"""
+        start = self._pos
+        try:
+            char = self._skip()
+            if char is None:
+                raise _NeedMore()
+            if char == "]":
+                self._pos += 1
+                self._state, self._separated = _FIELD, True
+                return _DONE
+            if not self._separated:
+                if char == ",":
+                    raise StreamedJSONError(f"Unexpected ',' at character {self._pos}")
+            else:
+                self._expect(char, ",")
+                self._pos += 1
+                char = self._skip()
+                if char is None:
+                    raise _NeedMore()
+                if char == "]":
+                    raise StreamedJSONError(f"Trailing ',' at character {self._pos}")
+            item, self._pos = self._value(self._pos)
+            self._separated = True
+            return item
+        except _NeedMore:
+            self._pos = start
+            raise
+
+
+class StreamedList:
+    """
+    The streamed list of a payload, parsed while it is iterated
+
+    Stands in for the list in the parsed message handed to translators; it
+    can only be iterated once.
+    """
+
+    def __init__(
+        self,
+        parser: StreamingJSONParser,
+        read: Callable[[], Optional[bytes]],
+        validate_item: Optional[Callable[[Any, int], None]] = None
+    ):
+        """
+        Initialize list
+
+        Args:
+            parser: Parser positioned at the start of the list
+            read: Returns the next body chunk, None at the end of the body
+            validate_item: Called with each item and its index before it is yielded
+        """
+        self._parser = parser
+        self._read = read
+        self._validate_item = validate_item
+        self._consumed = False
+
+    def __iter__(self) -> Iterator[Any]:
+        if self._consumed:
+            raise StreamedJSONError(f"Streamed list {self._parser.stream_key!r} can only be read once")
+        self._consumed = True
+        items = self._parser.iter_items(self._read)
+        if self._validate_item is None:
+            return items
+        return self._validated(items)
+
+    def _validated(self, items: Iterator[Any]) -> Iterator[Any]:
+        for index, item in enumerate(items):
+            self._validate_item(item, index)
+            yield item
+
+
+class ChunkChannel:
+    """
+    Bounded hand-off of request body chunks from the event loop to a worker thread
+
+    The event loop pumps the body in with pump(); the thread reads it with
+    get(), blocking until a chunk arrives. close() releases a pump blocked on
+    a full channel once the reader has gone away, and a reader blocked on an
+    empty one once the upload has been abandoned (e.g. the request was
+    cancelled), so neither side holds a worker thread forever.
+    """
+
+    def __init__(self, max_chunks: int = 8):
+        """
+        Initialize channel
+
+        Args:
+            max_chunks: Chunks buffered before the pump waits for the reader
+        """
+        self._queue: "queue.Queue[Optional[bytes]]" = queue.Queue(max_chunks)
+        self._closed = threading.Event()
+
+    def _put(self, chunk: Optional[bytes]) -> bool:
+        while not self._closed.is_set():
+            try:
+                self._queue.put(chunk, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    async def pump(self, chunks: AsyncIterable[bytes]) -> None:
+        """
+        Feed chunks into the channel, then the end-of-body marker
+
+        Args:
+            chunks: Request body chunks
+        """
+        try:
+            async for chunk in chunks:
+                if chunk and not await asyncio.to_thread(self._put, chunk):
+                    return
+        finally:
+            await asyncio.to_thread(self._put, None)
+
+    def get(self) -> Optional[bytes]:
+        """Next chunk, None at the end of the body or once closed (blocks)"""
+        while not self._closed.is_set():
+            try:
+                return self._queue.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return None
+
+    def close(self) -> None:
+        """Stop accepting chunks"""
+        self._closed.set()
+
+
+async def aiter_in_thread(items: Iterable[T]) -> AsyncIterator[T]:
+    """
+    Iterate a blocking iterator from the event loop, one step per worker-thread call
+
+    Args:
+        items: Iterator whose steps may block (e.g. on a ChunkChannel)
+
+    Returns:
+        Async iterator of the items
+    """
+    iterator = iter(items)
+    while True:
+        item = await asyncio.to_thread(next, iterator, _DONE)
+        if item is _DONE:
+            return
+        yield item
@@ -2,12 +2,75 @@
 Logging configuration for RGBridge PMS Integration Platform
 """
 
+import atexit
+import contextvars
+import copy
+import json
 import logging
+import logging.handlers
+import queue
 import sys
-from typing import Optional
+import threading
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional, Union
 from app.core.config import settings
 import os
 
+# Header carrying the request id in and out, and forwarded to the internal API
+REQUEST_ID_HEADER = "X-Request-ID"
+
+# Id of the request being handled, attached to every log record
+request_id_var: contextvars.ContextVar[str] = contextvars.ContextVar("request_id", default="-")
+
+# Attributes every LogRecord has; anything else was passed through `extra`
+_RECORD_ATTRS = frozenset(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime", "request_id"}
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+class RequestIdFilter(logging.Filter):
+    """Attach the current request id to log records"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get()
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """Format log records as one JSON object per line"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry: Dict[str, Any] = {
+            "timestamp": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "request_id": getattr(record, "request_id", request_id_var.get()),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler for an in-process queue
+
+    The stock handler formats records before queueing them, which flattens
+    tracebacks into the message. Records here never leave the process, so
+    only the message arguments are merged (they may be mutated after the
+    call) and formatting is left to the listener's handlers.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
 
 def setup_logging(
     log_level: Optional[str] = None,
@@ -15,11 +78,18 @@ def setup_logging(
 ) -> None:
     """
     Setup application logging
-    
+
+    Records are handed to a QueueHandler and written to stdout and the log
+    file by a background QueueListener, so request handlers never block on
+    file I/O. On AWS Lambda, where there is no log file and the process is
+    frozen between invocations, records are written to stdout directly.
+
     Args:
         log_level: Logging level (DEBUG, INFO, WARNING, ERROR, CRITICAL)
-        log_format: Log message format
+        log_format: Log message format (used when LOG_JSON is disabled)
     """
+    global _listener
+
     # Use settings if not provided
     log_level = log_level or settings.LOG_LEVEL
     log_format = log_format or settings.LOG_FORMAT
@@ -27,37 +97,158 @@ def setup_logging(
     # Detect if running in AWS Lambda
     is_lambda = 'AWS_LAMBDA_FUNCTION_NAME' in os.environ
 
+    formatter = JsonFormatter() if settings.LOG_JSON else logging.Formatter(log_format)
     handlers = [logging.StreamHandler(sys.stdout)]
-    if not is_lambda:
-        handlers.append(logging.FileHandler("app.log"))
+    if not is_lambda and settings.LOG_FILE:
+        handlers.append(logging.FileHandler(settings.LOG_FILE))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    stop_logging()
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+        handler.close()
+
+    if is_lambda:
+        root_handlers = handlers
+    else:
+        log_queue: queue.SimpleQueue = queue.SimpleQueue()
+        _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+        _listener.start()
+        root_handlers = [_QueueHandler(log_queue)]
 
     # Configure root logger
-    logging.basicConfig(
-        level=getattr(logging, log_level.upper()),
-        format=log_format,
-        handlers=handlers
-    )
-    
+    for handler in root_handlers:
+        handler.addFilter(RequestIdFilter())
+        root.addHandler(handler)
+    root.setLevel(getattr(logging, log_level.upper()))
+
     # Set specific loggers
     logging.getLogger("uvicorn").setLevel(logging.INFO)
     logging.getLogger("uvicorn.access").setLevel(logging.INFO)
-    
+
     # Create logger for this application
     logger = logging.getLogger("rgbridge")
     logger.setLevel(getattr(logging, log_level.upper()))
-    
+
     # Log startup message
-    logger.info(f"Logging initialized with level: {log_level}")
+    logger.info("Logging initialized with level: %s", log_level)
+
+
+def stop_logging() -> None:
+    """Flush queued records and stop the background log writer"""
+    global _listener
+    if _listener is not None:
+        listener, _listener = _listener, None
+        listener.stop()
+
+
+atexit.register(stop_logging)
 
 
 def get_logger(name: str) -> logging.Logger:
     """
     Get a logger instance with the specified name
-    
+
     Args:
         name: Logger name
-        
+
     Returns:
         Logger instance
     """
-    return logging.getLogger(f"rgbridge.{name}") 
\ No newline at end of file
+    return logging.getLogger(f"rgbridge.{name}")
+
+
+class PayloadSampler:
+    """
+    Decides which payloads are logged, independently per PMS
+
+    Each PMS accumulates LOG_PAYLOAD_SAMPLE_RATE per payload and a payload
+    is logged whenever a whole one has built up, so the first payload of
+    every PMS is logged and then roughly one in 1/rate after it.
+    """
+
+    def __init__(self, rate: Optional[float] = None):
+        """
+        Initialize payload sampler
+
+        Args:
+            rate: Fraction of payloads to log (defaults to settings.LOG_PAYLOAD_SAMPLE_RATE)
+        """
+        self._rate = rate
+        self._credit: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def rate(self) -> float:
+        return self._rate if self._rate is not None else settings.LOG_PAYLOAD_SAMPLE_RATE
+
+    def should_log(self, pms_code: str) -> bool:
+        """
+        Check whether the next payload of a PMS is logged
+
+        Args:
+            pms_code: PMS the payload came from
+
+        Returns:
+            True if the payload should be logged
+        """
+        rate = self.rate
+        if rate <= 0:
+            return False
+        with self._lock:
+            credit = self._credit.get(pms_code, 1.0)
+            if credit >= 1.0:
+                self._credit[pms_code] = credit - 1.0 + rate
+                return True
+            self._credit[pms_code] = credit + rate
+            return False
+
+
+class CappedPayload:
+    """
+    Payload rendered only when a log record is formatted, cut to a byte limit
+
+    Bytes and strings are sliced before decoding, so logging a sample of a
+    multi-megabyte body never copies or decodes all of it.
+    """
+
+    __slots__ = ("payload", "max_bytes")
+
+    def __init__(self, payload: Union[bytes, str, Any], max_bytes: int):
+        self.payload = payload
+        self.max_bytes = max_bytes
+
+    def __str__(self) -> str:
+        payload = self.payload
+        if not isinstance(payload, (bytes, str)):
+            payload = json.dumps(payload, default=str)
+        size = len(payload)
+        text = payload[:self.max_bytes]
+        if isinstance(text, bytes):
+            text = text.decode("utf-8", errors="replace")
+        if size > self.max_bytes:
+            text += f"... [{size - self.max_bytes} more bytes]"
+        return text
+
+
+payload_sampler = PayloadSampler()
+
+
+def log_payload(logger: logging.Logger, pms_code: str, label: str, payload: Union[bytes, str, Any]) -> None:
+    """
+    Log a sampled, size-capped payload at DEBUG level
+
+    Args:
+        logger: Logger to use
+        pms_code: PMS the payload belongs to (sampling key)
+        label: What the payload is, e.g. "PMS payload"
+        payload: Raw body, XML or a JSON-serializable object
+    """
+    if not logger.isEnabledFor(logging.DEBUG) or not payload_sampler.should_log(pms_code):
+        return
+    logger.debug(
+        "%s: %s", label, CappedPayload(payload, settings.LOG_PAYLOAD_MAX_BYTES),
+        extra={"pms_code": pms_code}
+    )
@@ -1,30 +1,636 @@
 """
-Mapping loader and validator for PMS to RGBridge mappings
+Mapping loader, validator and compiler for PMS to RGBridge mappings
+
+A mapping section maps RGBridge fields to PMS message paths:
+
+    availability:
+      HotelCode: ota_property_id              # plain path
+      Start: Inventory[].start_date           # '[]' emits one row per list item
+      InvCode: [Inventory[].room, room]       # first path with a value wins
+      BookingLimit:                           # typed conversion and default
+        path: Inventory[].units
+        type: int
+        default: 0
+      BaseRate:                               # conversion expression (see conversions)
+        path: Inventory[].rate
+        convert: value | round_currency(row.CurrencyCode)
+      RestrictionStatus:                      # nested group, omitted when empty
+        Status:
+          flags:                              # first flag that is true
+            Close: Inventory[].close
+            ClosedOnArrival: Inventory[].closearr
+
+A top-level 'conversions' section may also map PMS paths to conversion
+expressions, 'message_id' gives the path (or paths) of the id used to
+suppress duplicate messages, and 'stream' names the top-level list (e.g.
+Inventory) that large payloads may be parsed from incrementally. Sections are compiled once into accessor functions and cached
+per PMS until the mapping file changes.
 """
 
+import itertools
 import os
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
 import yaml
-from typing import Dict, Any
+
 from app.core.config import settings
+from app.core.conversions import ColumnRows, ConversionError, Expression, compile_expression, format_errors
+
+FAN_OUT = "[]"
+
+# Rows converted together, so each conversion runs once per column batch
+CONVERSION_BATCH_SIZE = 1024
+
+# Rows per batch in columnar translation
+COLUMN_BATCH_SIZE = 4096
+
+# Columns keyed by RGBridge field; groups hold a dict (or None) per row
+Columns = Dict[str, List[Any]]
+
+# Top-level mapping key holding the path of the message id
+MESSAGE_ID_KEY = "message_id"
+
+# Top-level mapping key naming the list that large payloads are parsed item by item from
+STREAM_KEY = "stream"
+
+# Keys that make a mapping dict a field spec rather than a nested group
+_SPEC_KEYS = frozenset(["path", "type", "convert", "default", "flags"])
+
+Getter = Callable[[Any], Any]
+
+
+def _to_bool(value: Any) -> bool:
+    if isinstance(value, str):
+        return value.strip().lower() in ("true", "1", "yes", "y")
+    return bool(value)
+
+
+def _key_getter(keys: Tuple[str, ...]) -> Getter:
+    """Build a getter that follows dict keys, returning None on any miss"""
+    if not keys:
+        return lambda obj: obj
+    if len(keys) == 1:
+        (k1,) = keys
+        return lambda obj: obj.get(k1) if isinstance(obj, dict) else None
+    if len(keys) == 2:
+        k1, k2 = keys
+
+        def getter(obj):
+            obj = obj.get(k1) if isinstance(obj, dict) else None
+            return obj.get(k2) if isinstance(obj, dict) else None
+        return getter
+
+    def getter(obj):
+        for key in keys:
+            if not isinstance(obj, dict):
+                return None
+            obj = obj.get(key)
+        return obj
+    return getter
+
+
+def _split_path(path: str) -> List[Tuple[str, ...]]:
+    """
+    Split a path into the key chains between fan-outs
+
+    'Inventory[].rates[].amount' -> [('Inventory',), ('rates',), ('amount',)]
+    """
+    if not isinstance(path, str) or not path:
+        raise ValueError(f"Invalid mapping path: {path!r}")
+    return [tuple(key for key in part.split(".") if key) for part in path.split(FAN_OUT)]
+
+
+class _Field:
+    """A compiled leaf field: alternative paths and default"""
+
+    __slots__ = ("getters", "default")
+
+    def __init__(self, getters: List[Tuple[int, Getter]], default):
+        self.getters = getters
+        self.default = default
+
+    def __call__(self, context: List[Any]) -> Any:
+        for level, getter in self.getters:
+            value = getter(context[level])
+            if value is not None:
+                return value
+        return self.default
+
+
+class _Flags:
+    """A compiled flags field: the name of the first flag that is true"""
+
+    __slots__ = ("flags",)
+
+    def __init__(self, flags: List[Tuple[str, int, Getter]]):
+        self.flags = flags
+
+    def __call__(self, context: List[Any]) -> Any:
+        for value, level, getter in self.flags:
+            if _to_bool(getter(context[level]) or False):
+                return value
+        return None
+
+
+class _Group:
+    """A compiled nested group, omitted when none of its fields has a value"""
+
+    __slots__ = ("fields",)
+
+    def __init__(self, fields: List[Tuple[str, Callable[[List[Any]], Any]]]):
+        self.fields = fields
+
+    def __call__(self, context: List[Any]) -> Any:
+        group = {}
+        for name, field in self.fields:
+            value = field(context)
+            if value is not None:
+                group[name] = value
+        return group or None
+
+
+class CompiledMapping:
+    """
+    A mapping section compiled into accessor functions
+
+    Each '[]' in the paths is a fan-out level; all fan-out paths in a
+    section must share the same chain of lists (e.g. 'Inventory[]', or
+    'Inventory[].rates[]' for nested lists). Conversions run per batch of
+    rows, one column at a time, in mapping order.
+    """
+
+    def __init__(self, section: Dict[str, Any], conversions: Optional[Dict[str, Any]] = None, name: Optional[str] = None):
+        """
+        Compile a mapping section
+
+        Args:
+            section: Mapping of RGBridge fields to PMS paths or specs
+            conversions: Optional conversion expressions keyed by PMS path
+            name: Section identity (e.g. "cloudbeds.availability"), so conversions
+                can keep per-field state such as detected date formats
+
+        Raises:
+            ValueError: If the section is not a valid mapping
+        """
+        if not isinstance(section, dict):
+            raise ValueError("Mapping section must be a dictionary.")
+        self._conversions = conversions or {}
+        self.name = name
+        # Key chains leading to each fan-out list, outermost first
+        self._levels: List[Tuple[str, ...]] = []
+        # (keys within the row, expression) for every converted field
+        self._converted: List[Tuple[Tuple[str, ...], Expression]] = []
+        self.fields = [(name, self._compile_spec((name,), spec)) for name, spec in section.items()]
+
+    def _compile_path(self, path: str) -> Tuple[int, Getter]:
+        parts = _split_path(path)
+        fan_outs = parts[:-1]
+        for depth, keys in enumerate(fan_outs):
+            if depth == len(self._levels):
+                self._levels.append(keys)
+            elif self._levels[depth] != keys:
+                raise ValueError(f"Path {path!r} fans out over a different list than {self._render_levels()!r}")
+        return len(fan_outs), _key_getter(parts[-1])
+
+    def _render_levels(self) -> str:
+        return FAN_OUT.join(".".join(keys) for keys in self._levels) + FAN_OUT
+
+    def _expression(self, keys: Tuple[str, ...], spec: Dict[str, Any], paths: List[str]) -> Optional[Expression]:
+        source = spec.get("convert") or spec.get("type")
+        if source is None:
+            source = next((self._conversions[path] for path in paths if self._conversions.get(path)), None)
+        if source is None:
+            return None
+        try:
+            return compile_expression(str(source))
+        except ValueError as e:
+            raise ValueError(f"Field {'.'.join(keys)}: {e}") from e
+
+    def _compile_spec(self, keys: Tuple[str, ...], spec: Any):
+        name = ".".join(keys)
+        if isinstance(spec, (str, list)):
+            spec = {"path": spec}
+        if not isinstance(spec, dict) or not spec:
+            raise ValueError(f"Invalid mapping for field {name}: {spec!r}")
+
+        if "flags" in spec:
+            if not isinstance(spec["flags"], dict):
+                raise ValueError(f"Flags for field {name} must map values to paths")
+            return _Flags([(value, *self._compile_path(path)) for value, path in spec["flags"].items()])
+        if "path" in spec or "default" in spec:
+            unknown = set(spec) - _SPEC_KEYS
+            if unknown:
+                raise ValueError(f"Unknown keys for field {name}: {', '.join(sorted(unknown))}")
+            paths = spec.get("path", [])
+            paths = paths if isinstance(paths, list) else [paths]
+            expression = self._expression(keys, spec, paths)
+            if expression is not None:
+                self._converted.append((keys, expression))
+            return _Field([self._compile_path(path) for path in paths], spec.get("default"))
+        return _Group([(sub_name, self._compile_spec(keys + (sub_name,), sub_spec)) for sub_name, sub_spec in spec.items()])
+
+    def _iter_contexts(self, context: List[Any]) -> Iterator[List[Any]]:
+        """Yield [message, item, nested item, ...] for every innermost list item"""
+        depth = len(context) - 1
+        if depth == len(self._levels):
+            yield context
+            return
+        for item in _key_getter(self._levels[depth])(context[-1]) or []:
+            yield from self._iter_contexts(context + [item])
+
+    def iter_rows(self, message: Any) -> Iterator[Dict[str, Any]]:
+        """
+        Translate a PMS message into RGBridge rows
+
+        Args:
+            message: Parsed PMS message
+
+        Returns:
+            Iterator of rows, one per item of the innermost fan-out list
+            (a single row if the section has no fan-out)
+
+        Raises:
+            ConversionError: If conversions fail for some rows
+        """
+        rows = self._iter_raw_rows(message)
+        if not self._converted:
+            return rows
+        return self._iter_converted(rows)
+
+    def _iter_raw_rows(self, message: Any) -> Iterator[Dict[str, Any]]:
+        for context in self._iter_contexts([message]):
+            yield self._build_row(context)
+
+    def _build_row(self, context: List[Any]) -> Dict[str, Any]:
+        row = {}
+        for name, field in self.fields:
+            value = field(context)
+            if value is not None or not isinstance(field, _Group):
+                row[name] = value
+        return row
+
+    def _iter_converted(self, rows: Iterator[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        offset = 0
+        while True:
+            batch = list(itertools.islice(rows, CONVERSION_BATCH_SIZE))
+            if not batch:
+                return
+            self.convert_rows(batch, offset)
+            yield from batch
+            offset += len(batch)
+
+    def convert_rows(self, rows: List[Dict[str, Any]], offset: int = 0) -> None:
+        """
+        Apply the section's conversions to raw rows in place
+
+        Args:
+            rows: Rows built from the mapping paths
+            offset: Index of the first row, used in error reports
+
+        Raises:
+            ConversionError: Listing every field and row that failed to convert
+        """
+        errors = []
+        for keys, expression in self._converted:
+            *group_keys, key = keys
+            targets = rows
+            for group_key in group_keys:
+                targets = [target.get(group_key) if isinstance(target, dict) else None for target in targets]
+            values = [target.get(key) if isinstance(target, dict) else None for target in targets]
+            try:
+                converted = expression.evaluate(values, rows, field=".".join(keys), cache_key=self._cache_key(keys))
+            except ConversionError as e:
+                for error in e.errors:
+                    if error["row"] is not None:
+                        error["row"] += offset
+                errors.extend(e.errors)
+                continue
+            for target, value in zip(targets, converted):
+                if isinstance(target, dict):
+                    target[key] = value
+        if errors:
+            raise ConversionError(format_errors(errors), errors)
+
+    def _cache_key(self, keys: Tuple[str, ...]) -> Optional[str]:
+        return f"{self.name}:{'.'.join(keys)}" if self.name else None
+
+    def translate(self, message: Any) -> List[Dict[str, Any]]:
+        """
+        Translate a PMS message into a list of RGBridge rows
+        """
+        return list(self.iter_rows(message))
+
+    def count_rows(self, message: Any) -> int:
+        """
+        Count the rows a PMS message translates to, without translating it
+        """
+        if not self._levels:
+            return 1
+        if len(self._levels) == 1:
+            return len(_key_getter(self._levels[0])(message) or [])
+        return sum(1 for _ in self._iter_contexts([message]))
+
+    def iter_column_batches(self, message: Any, batch_size: int = COLUMN_BATCH_SIZE) -> Iterator[Columns]:
+        """
+        Translate a PMS message into batches of columns
+
+        The fan-out lists are pivoted into one list per field, and flags,
+        defaults and conversions are applied a column at a time, so no
+        per-row dicts are built. Each batch yields the same fields as
+        iter_rows, with groups as a column of dicts (None where empty).
+
+        Args:
+            message: Parsed PMS message
+            batch_size: Maximum rows per batch
+
+        Returns:
+            Iterator of column batches
+
+        Raises:
+            ConversionError: If conversions fail for some rows
+        """
+        offset = 0
+        for length, levels in self._iter_level_batches(message, batch_size):
+            yield self._build_columns(message, length, levels, offset)
+            offset += length
+
+    def _iter_level_batches(self, message: Any, batch_size: int) -> Iterator[Tuple[int, Dict[int, List[Any]]]]:
+        """Yield (row count, objects each fan-out level points at for every row) per batch"""
+        if not self._levels:
+            yield 1, {}
+            return
+        if len(self._levels) == 1:
+            items = _key_getter(self._levels[0])(message) or []
+            items = items if isinstance(items, list) else list(items)
+            for start in range(0, len(items), batch_size):
+                batch = items[start:start + batch_size]
+                yield len(batch), {1: batch}
+            return
+        contexts = self._iter_contexts([message])
+        while True:
+            batch = list(itertools.islice(contexts, batch_size))
+            if not batch:
+                return
+            yield len(batch), {level: [context[level] for context in batch] for level in range(1, len(self._levels) + 1)}
+
+    def _column(self, field, message: Any, length: int, levels: Dict[int, List[Any]]) -> List[Any]:
+        def values(level: int, getter: Getter) -> List[Any]:
+            return [getter(message)] * length if level == 0 else list(map(getter, levels[level]))
+
+        if isinstance(field, _Flags):
+            column = [None] * length
+            for value, level, getter in reversed(field.flags):
+                column = [value if flag and _to_bool(flag) else current for flag, current in zip(values(level, getter), column)]
+            return column
+
+        column = None
+        for level, getter in field.getters:
+            if column is None:
+                column = values(level, getter)
+            else:
+                column = [current if current is not None else alternative
+                          for current, alternative in zip(column, values(level, getter))]
+            if None not in column:
+                break
+        if column is None:
+            column = [None] * length
+        if field.default is not None:
+            column = [field.default if value is None else value for value in column]
+        return column
+
+    def _collect_columns(self, fields, prefix: Tuple[str, ...], message, length, levels, leaves) -> None:
+        for name, field in fields:
+            keys = prefix + (name,)
+            if isinstance(field, _Group):
+                self._collect_columns(field.fields, keys, message, length, levels, leaves)
+            else:
+                leaves[keys] = self._column(field, message, length, levels)
+
+    def _assemble(self, keys: Tuple[str, ...], field, leaves, length: int) -> List[Any]:
+        if not isinstance(field, _Group):
+            return leaves[keys]
+        names = [name for name, _ in field.fields]
+        sub_columns = [self._assemble(keys + (name,), sub_field, leaves, length) for name, sub_field in field.fields]
+        return [
+            {name: value for name, value in zip(names, values) if value is not None} or None
+            for values in zip(*sub_columns)
+        ] if sub_columns else [None] * length
+
+    def _build_columns(self, message: Any, length: int, levels: Dict[int, List[Any]], offset: int) -> Columns:
+        leaves: Dict[Tuple[str, ...], List[Any]] = {}
+        self._collect_columns(self.fields, (), message, length, levels, leaves)
+
+        # row.X references see top-level fields, converted ones included
+        top_level = {keys[0]: column for keys, column in leaves.items() if len(keys) == 1}
+        rows = ColumnRows(top_level, length)
+        errors = []
+        for keys, expression in self._converted:
+            try:
+                converted = expression.evaluate(leaves[keys], rows, field=".".join(keys), cache_key=self._cache_key(keys))
+            except ConversionError as e:
+                for error in e.errors:
+                    if error["row"] is not None:
+                        error["row"] += offset
+                errors.extend(e.errors)
+                continue
+            leaves[keys] = converted
+            if len(keys) == 1:
+                top_level[keys[0]] = converted
+        if errors:
+            raise ConversionError(format_errors(errors), errors)
+
+        return {name: self._assemble((name,), field, leaves, length) for name, field in self.fields}
+
+
+def translate_sections(sections: List[CompiledMapping], message: Any) -> List[List[Dict[str, Any]]]:
+    """
+    Translate a PMS message with several mapping sections in one pass
+
+    Sections fanning out over the same lists (e.g. 'availability' and 'rate'
+    both over 'Inventory[]') share a single walk of the message, building
+    each section's row from the same list item.
+
+    Args:
+        sections: Compiled mapping sections
+        message: Parsed PMS message
+
+    Returns:
+        Rows for each section, in the order of the sections
+
+    Raises:
+        ConversionError: If conversions fail for some rows
+    """
+    if not sections or any(section._levels != sections[0]._levels for section in sections):
+        return [section.translate(message) for section in sections]
+    results: List[List[Dict[str, Any]]] = [[] for _ in sections]
+    for context in sections[0]._iter_contexts([message]):
+        for section, rows in zip(sections, results):
+            rows.append(section._build_row(context))
+    for section, rows in zip(sections, results):
+        if section._converted:
+            section.convert_rows(rows)
+    return results
+
 
 class MappingLoader:
     """
-    Loads and validates PMS mapping YAML files
+    Loads, validates and compiles PMS mapping YAML files
+
+    Loaded mappings and their compiled sections are cached per PMS and
+    reloaded when the mapping file's modification time changes. The file is
+    checked at most once per reload interval, so the hot path does not stat
+    it on every request.
     """
-    def __init__(self, mapping_dir: str = None):
-        pass  # mapping_dir is no longer used
+    def __init__(self, mapping_dir: str = None, reload_interval: Optional[float] = None):
+        """
+        Initialize mapping loader
+
+        Args:
+            mapping_dir: Unused, kept for compatibility
+            reload_interval: Seconds between file checks (defaults to settings.MAPPING_RELOAD_INTERVAL)
+        """
+        self._cache: Dict[str, Tuple[int, Dict[str, Any], Dict[str, CompiledMapping]]] = {}
+        self._checked: Dict[str, float] = {}
+        self._reload_interval = reload_interval
+        self._lock = threading.Lock()
+
+    @property
+    def reload_interval(self) -> float:
+        if self._reload_interval is not None:
+            return self._reload_interval
+        return settings.MAPPING_RELOAD_INTERVAL
 
     def get_mapping_path(self, pms_code: str) -> str:
         return os.path.join("pms", pms_code, "mapping.yaml")
 
-    def load_mapping(self, pms_code: str) -> Dict[str, Any]:
+    def _load(self, pms_code: str) -> Tuple[int, Dict[str, Any], Dict[str, CompiledMapping]]:
+        now = time.monotonic()
+        cached = self._cache.get(pms_code)
+        if cached is not None and now - self._checked.get(pms_code, 0) < self.reload_interval:
+            return cached
+
         path = self.get_mapping_path(pms_code)
         if not os.path.exists(path):
             raise FileNotFoundError(f"Mapping file not found: {path}")
-        with open(path, 'r', encoding='utf-8') as f:
-            mapping = yaml.safe_load(f)
-        self.validate_mapping(mapping)
-        return mapping
+        mtime = os.stat(path).st_mtime_ns
+        if cached is not None and cached[0] == mtime:
+            self._checked[pms_code] = now
+            return cached
+
+        with self._lock:
+            cached = self._cache.get(pms_code)
+            if cached is None or cached[0] != mtime:
+                with open(path, 'r', encoding='utf-8') as f:
+                    mapping = yaml.safe_load(f)
+                self.validate_mapping(mapping)
+                cached = (mtime, mapping, {})
+                self._cache[pms_code] = cached
+            self._checked[pms_code] = now
+            return cached
+
+    def load_mapping(self, pms_code: str) -> Dict[str, Any]:
+        return self._load(pms_code)[1]
+
+    def get_compiled_mapping(self, pms_code: str, section: str) -> CompiledMapping:
+        """
+        Get a compiled mapping section for a PMS
+
+        Args:
+            pms_code: PMS identifier
+            section: Mapping section ('availability' or 'rate')
+
+        Returns:
+            Compiled mapping
+
+        Raises:
+            FileNotFoundError: If the PMS has no mapping file
+            ValueError: If the section is missing or invalid
+        """
+        _, mapping, compiled = self._load(pms_code)
+        if section not in compiled:
+            if section not in mapping:
+                raise ValueError(f"Mapping for {pms_code} has no '{section}' section.")
+            compiled[section] = compile_mapping(mapping, section, name=f"{pms_code}.{section}")
+        return compiled[section]
+
+    def get_message_id(self, pms_code: str, message: Any) -> Optional[str]:
+        """
+        Extract the message id configured by the mapping's 'message_id' path
+
+        Args:
+            pms_code: PMS identifier
+            message: Parsed PMS message
+
+        Returns:
+            Message id, or None if the mapping has no 'message_id' or the message lacks it
+
+        Raises:
+            FileNotFoundError: If the PMS has no mapping file
+        """
+        _, mapping, compiled = self._load(pms_code)
+        if MESSAGE_ID_KEY not in compiled:
+            path = mapping.get(MESSAGE_ID_KEY)
+            compiled[MESSAGE_ID_KEY] = CompiledMapping({"MessageId": path}) if path else None
+        getter = compiled[MESSAGE_ID_KEY]
+        if getter is None:
+            return None
+        rows = getter.translate(message)
+        message_id = rows[0].get("MessageId") if rows else None
+        return str(message_id) if message_id not in (None, "") else None
+
+    def get_stream_key(self, pms_code: str) -> Optional[str]:
+        """
+        Get the top-level list large payloads of a PMS can be streamed from
+
+        Args:
+            pms_code: PMS identifier
+
+        Returns:
+            Field name from the mapping's 'stream' key, or None if the PMS
+            does not support streamed ingest (or has no mapping file)
+        """
+        try:
+            mapping = self._load(pms_code)[1]
+        except FileNotFoundError:
+            return None
+        return mapping.get(STREAM_KEY)
+
+    def warm_up(self, pms_code: str, sections: Iterable[str] = ("availability", "rate")) -> int:
+        """
+        Load a PMS mapping and compile its sections ahead of the first request
+
+        Args:
+            pms_code: PMS identifier
+            sections: Sections to compile (missing ones are skipped)
+
+        Returns:
+            Number of sections compiled
+
+        Raises:
+            FileNotFoundError: If the PMS has no mapping file
+            ValueError: If the mapping or a section is invalid
+        """
+        mapping = self.load_mapping(pms_code)
+        compiled = 0
+        for section in sections:
+            if section in mapping:
+                self.get_compiled_mapping(pms_code, section)
+                compiled += 1
+        return compiled
+
+    def invalidate(self, pms_code: str) -> None:
+        """Drop the cached mapping of a PMS so the next use reloads it"""
+        with self._lock:
+            self._cache.pop(pms_code, None)
+            self._checked.pop(pms_code, None)
+
+    def clear(self) -> None:
+        """Drop all cached mappings"""
+        with self._lock:
+            self._cache.clear()
+            self._checked.clear()
 
     def validate_mapping(self, mapping: Dict[str, Any]) -> None:
         # Basic validation: must have 'availability' and/or 'rate' keys
@@ -32,7 +638,26 @@ class MappingLoader:
             raise ValueError("Mapping file must be a dictionary at the top level.")
         if not ("availability" in mapping or "rate" in mapping):
             raise ValueError("Mapping file must contain at least 'availability' or 'rate' section.")
+        stream_key = mapping.get(STREAM_KEY)
+        if stream_key is not None and (not isinstance(stream_key, str) or "." in stream_key or FAN_OUT in stream_key):
+            raise ValueError(f"'{STREAM_KEY}' must name a top-level field, got {stream_key!r}")
         # Optionally, add more validation rules here
 
+
+def compile_mapping(mapping: Dict[str, Any], section: str, name: Optional[str] = None) -> CompiledMapping:
+    """
+    Compile one section of a loaded mapping
+
+    Args:
+        mapping: Loaded mapping file
+        section: Section to compile ('availability' or 'rate')
+        name: Section identity for per-field conversion state
+
+    Returns:
+        Compiled mapping
+    """
+    return CompiledMapping(mapping[section] or {}, mapping.get("conversions"), name=name)
+
+
 # Singleton instance for use throughout the app
-mapping_loader = MappingLoader() 
\ No newline at end of file
+mapping_loader = MappingLoader()
@@ -0,0 +1,126 @@
+"""
+Compiled schemas for inbound PMS messages
+
+A translator declares the shape of its PMS's messages as TypedDicts and
+wraps them in a MessageSchema, which compiles them into a pydantic-core
+validator once. Messages are checked before any translation or XML
+building, and every problem is reported with its location (e.g.
+``Inventory[3].units``), so a malformed row rejects the message up front
+instead of failing deep in the pipeline or at XSD time.
+
+Schemas only check messages: translators keep reading the decoded dicts
+through their compiled mappings, so a schema never changes the output.
+"""
+
+from typing import Any, Dict, List, Optional, Sequence, Union, get_args, get_type_hints
+
+from pydantic import TypeAdapter, ValidationError
+
+from app.core.json_stream import StreamedList
+
+# Errors quoted in the exception message (all are kept in `errors`)
+MAX_REPORTED_ERRORS = 5
+
+
+class MessageValidationError(ValueError):
+    """Raised when a message does not match its schema"""
+
+    def __init__(self, errors: List[Dict[str, Any]]):
+        """
+        Initialize error
+
+        Args:
+            errors: One dict per problem with 'loc', 'msg' and 'type'
+        """
+        self.errors = errors
+        summary = "; ".join(f"{error['loc']}: {error['msg']}" for error in errors[:MAX_REPORTED_ERRORS])
+        if len(errors) > MAX_REPORTED_ERRORS:
+            summary += f" (and {len(errors) - MAX_REPORTED_ERRORS} more)"
+        super().__init__(summary)
+
+
+def format_location(loc: Sequence[Union[str, int]]) -> str:
+    """
+    Format a pydantic error location as a path
+
+    Args:
+        loc: Location tuple, e.g. ('Inventory', 3, 'units')
+
+    Returns:
+        Path such as 'Inventory[3].units'
+    """
+    path = ""
+    for part in loc:
+        if isinstance(part, int):
+            path += f"[{part}]"
+        else:
+            path += f".{part}" if path else str(part)
+    return path or "message"
+
+
+def _errors(exc: ValidationError, prefix: Sequence[Union[str, int]] = ()) -> List[Dict[str, Any]]:
+    return [
+        {"loc": format_location((*prefix, *error["loc"])), "msg": error["msg"], "type": error["type"]}
+        for error in exc.errors(include_url=False, include_input=False)
+    ]
+
+
+class MessageSchema:
+    """
+    Validator compiled from a TypedDict describing a PMS message
+
+    With a `list_key`, items of that list can also be checked one at a time,
+    for messages whose list is streamed (see app.core.json_stream).
+    """
+
+    def __init__(self, message_type: type, list_key: Optional[str] = None):
+        """
+        Compile a schema
+
+        Args:
+            message_type: TypedDict of the message
+            list_key: Field holding the message's item list, if any
+        """
+        self.message_type = message_type
+        self.list_key = list_key
+        self._adapter = TypeAdapter(message_type)
+        self._item_adapter = None
+        if list_key is not None:
+            (item_type,) = get_args(get_type_hints(message_type)[list_key])
+            self._item_adapter = TypeAdapter(item_type)
+
+    def validate(self, message: Any) -> None:
+        """
+        Check a decoded message
+
+        A streamed list is left out; check its items with validate_item()
+        as they are read.
+
+        Args:
+            message: Decoded message
+
+        Raises:
+            MessageValidationError: If the message does not match the schema
+        """
+        if self.list_key is not None and isinstance(message, dict) and isinstance(message.get(self.list_key), StreamedList):
+            message = {**message, self.list_key: []}
+        try:
+            self._adapter.validate_python(message)
+        except ValidationError as e:
+            raise MessageValidationError(_errors(e)) from None
+
+    def validate_item(self, item: Any, index: int) -> None:
+        """
+        Check one item of the message's list
+
+        Args:
+            item: Decoded item
+            index: Position of the item, for error locations
+
+        Raises:
+            MessageValidationError: If the item does not match the schema
+        """
+        try:
+            self._item_adapter.validate_python(item)
+        except ValidationError as e:
+            raise MessageValidationError(_errors(e, (self.list_key, index))) from None
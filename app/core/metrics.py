@@ -0,0 +1,382 @@
+"""
+In-process metrics exported in the Prometheus text exposition format
+
+Stage timers, row/byte counters and upstream pool stats are kept in memory
+and rendered on ``GET /metrics``. Only the counter, gauge and histogram
+types the pipeline needs are implemented, so no client library is required.
+"""
+
+import bisect
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, TypeVar
+
+from app.core.logging import get_logger
+
+logger = get_logger("metrics")
+
+T = TypeVar("T")
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Histogram buckets in seconds, from sub-millisecond parsing to slow upstream posts
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + "}"
+
+
+class _Metric:
+    """Base class holding one value per label combination"""
+
+    type_name = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        """
+        Initialize metric
+
+        Args:
+            name: Metric name
+            documentation: Help text
+            labelnames: Names of the labels every sample must set
+        """
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, object]) -> Tuple[str, ...]:
+        if len(labels) != len(self.labelnames) or set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def clear(self) -> None:
+        """Drop all samples"""
+        with self._lock:
+            self._values.clear()
+
+    def _samples(self) -> Iterator[Tuple[str, Tuple[str, ...], Tuple[str, ...], float]]:
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            yield self.name, self.labelnames, key, value
+
+    def collect(self) -> List[str]:
+        """
+        Render the metric
+
+        Returns:
+            Lines in the Prometheus text format
+        """
+        lines = [f"# HELP {self.name} {_escape(self.documentation)}", f"# TYPE {self.name} {self.type_name}"]
+        for name, labelnames, labelvalues, value in self._samples():
+            lines.append(f"{name}{_format_labels(labelnames, labelvalues)} {_format_value(value)}")
+        return lines
+
+
+class Counter(_Metric):
+    """Monotonically increasing count"""
+
+    type_name = "counter"
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        """
+        Increment the counter
+
+        Args:
+            amount: Non-negative amount to add
+            **labels: Label values
+        """
+        if amount < 0:
+            raise ValueError("Counters can only be incremented")
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def get(self, **labels) -> float:
+        """Current value for a label combination"""
+        return self._values.get(self._key(labels), 0)
+
+
+class Gauge(_Metric):
+    """Value that can go up and down, usually set when metrics are scraped"""
+
+    type_name = "gauge"
+
+    def set(self, value: float, **labels) -> None:
+        """
+        Set the gauge
+
+        Args:
+            value: New value
+            **labels: Label values
+        """
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def get(self, **labels) -> float:
+        """Current value for a label combination"""
+        return self._values.get(self._key(labels), 0)
+
+
+class _HistogramValue:
+    __slots__ = ("buckets", "sum", "count")
+
+    def __init__(self, size: int):
+        self.buckets = [0] * size
+        self.sum = 0.0
+        self.count = 0
+
+
+class Histogram(_Metric):
+    """Distribution of observed values in cumulative buckets"""
+
+    type_name = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS
+    ):
+        """
+        Initialize histogram
+
+        Args:
+            name: Metric name
+            documentation: Help text
+            labelnames: Names of the labels every sample must set
+            buckets: Upper bounds of the buckets (+Inf is added)
+        """
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels) -> None:
+        """
+        Record an observation
+
+        Args:
+            value: Observed value
+            **labels: Label values
+        """
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            histogram = self._values.get(key)
+            if histogram is None:
+                histogram = self._values[key] = _HistogramValue(len(self.buckets) + 1)
+            histogram.buckets[index] += 1
+            histogram.sum += value
+            histogram.count += 1
+
+    @contextmanager
+    def time(self, **labels) -> Iterator[None]:
+        """
+        Observe the duration of a block in seconds
+
+        Args:
+            **labels: Label values
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def get_count(self, **labels) -> int:
+        """Number of observations for a label combination"""
+        histogram = self._values.get(self._key(labels))
+        return histogram.count if histogram else 0
+
+    def _samples(self) -> Iterator[Tuple[str, Tuple[str, ...], Tuple[str, ...], float]]:
+        with self._lock:
+            items = [(key, list(value.buckets), value.sum, value.count) for key, value in self._values.items()]
+        bucket_labels = self.labelnames + ("le",)
+        for key, buckets, total, count in items:
+            cumulative = 0
+            for bound, observations in zip(self.buckets + (math.inf,), buckets):
+                cumulative += observations
+                yield f"{self.name}_bucket", bucket_labels, key + (_format_value(bound),), cumulative
+            yield f"{self.name}_sum", self.labelnames, key, total
+            yield f"{self.name}_count", self.labelnames, key, count
+
+
+class MetricsRegistry:
+    """
+    Collection of metrics rendered together
+
+    Collectors are callbacks run before rendering, used to refresh gauges
+    from state owned by other components (e.g. the upstream connection pool).
+    """
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: List[Callable[[], None]] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        """
+        Register a metric
+
+        Args:
+            metric: Metric to register
+
+        Returns:
+            The registered metric
+
+        Raises:
+            ValueError: If a metric with the same name is already registered
+        """
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric already registered: {metric.name}")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        """Create and register a counter"""
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        """Create and register a gauge"""
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS
+    ) -> Histogram:
+        """Create and register a histogram"""
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def add_collector(self, collector: Callable[[], None]) -> None:
+        """
+        Register a callback run before each render
+
+        Args:
+            collector: Callback updating gauges
+        """
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        """
+        Render every metric
+
+        Returns:
+            Metrics in the Prometheus text format
+        """
+        for collector in self._collectors:
+            try:
+                collector()
+            except Exception as e:
+                logger.warning("Metrics collector failed: %s", e)
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.collect())
+        return "\n".join(lines) + "\n"
+
+    def clear(self) -> None:
+        """Drop all samples (used for testing)"""
+        for metric in self._metrics.values():
+            metric.clear()
+
+
+def counted(
+    items: Iterable[T],
+    counter: Counter,
+    weight: Optional[Callable[[T], float]] = None,
+    **labels
+) -> Iterator[T]:
+    """
+    Pass items through, adding them to a counter once the iterator is done
+
+    Args:
+        items: Items to pass through
+        counter: Counter to increment
+        weight: Amount each item adds (defaults to 1)
+        **labels: Label values
+
+    Returns:
+        Iterator of the items
+    """
+    total = 0
+    try:
+        for item in items:
+            total += weight(item) if weight else 1
+            yield item
+    finally:
+        counter.inc(total, **labels)
+
+
+# Singleton registry and the pipeline's metrics
+metrics_registry = MetricsRegistry()
+
+STAGE_SECONDS = metrics_registry.histogram(
+    "rgbridge_stage_duration_seconds",
+    "Time spent in each pipeline stage",
+    ("stage", "pms_code", "message_type")
+)
+ROWS_TRANSLATED = metrics_registry.counter(
+    "rgbridge_rows_translated_total",
+    "RGBridge rows translated from PMS messages",
+    ("pms_code", "message_type")
+)
+XML_BYTES = metrics_registry.counter(
+    "rgbridge_xml_bytes_total",
+    "Bytes of OTA XML produced",
+    ("pms_code", "message_type")
+)
+VALIDATION_FAILURES = metrics_registry.counter(
+    "rgbridge_validation_failures_total",
+    "Messages rejected by PMS schema or message validation, or XSD validation",
+    ("stage", "pms_code", "message_type")
+)
+DOCUMENT_CHECKS = metrics_registry.counter(
+    "rgbridge_document_checks_total",
+    "OTA documents checked by row constraints only (check=constraints) or by full XSD validation (check=xsd)",
+    ("check", "pms_code", "message_type")
+)
+ROWS_REJECTED = metrics_registry.counter(
+    "rgbridge_rows_rejected_total",
+    "PMS message items skipped as invalid (invalid_rows=skip)",
+    ("stage", "pms_code", "message_type")
+)
+IDEMPOTENT_REPLAYS = metrics_registry.counter(
+    "rgbridge_idempotent_replays_total",
+    "Duplicate PMS messages answered from the idempotency store",
+    ("pms_code", "message_type")
+)
+UPSTREAM_REQUESTS = metrics_registry.counter(
+    "rgbridge_upstream_requests_total",
+    "Posts to the internal API by response status (error for request errors)",
+    ("status",)
+)
+UPSTREAM_RETRIES = metrics_registry.counter(
+    "rgbridge_upstream_retries_total",
+    "Retried posts to the internal API"
+)
+UPSTREAM_CONNECTIONS = metrics_registry.gauge(
+    "rgbridge_upstream_connections",
+    "Connections in the internal API pool by state",
+    ("state",)
+)
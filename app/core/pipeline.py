@@ -0,0 +1,403 @@
+"""
+Shared ARI processing stages: translation, grouping and OTA document building
+"""
+
+import os
+from typing import Any, Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple, TypeVar
+
+from lxml import etree
+
+from app.core.config import settings
+from app.core.date_ranges import compress_date_ranges
+from app.core.logging import get_logger
+from app.core.metrics import DOCUMENT_CHECKS, ROWS_TRANSLATED, STAGE_SECONDS, VALIDATION_FAILURES, XML_BYTES, counted
+from app.core.xml_builder import (
+    build_avail_notif_tree, build_rate_amount_notif_tree, serialize_xml_bytes,
+    iter_avail_notif_xml, iter_rate_amount_notif_xml,
+    build_avail_notif_tree_from_columns, build_rate_amount_notif_tree_from_columns,
+    iter_avail_notif_xml_from_columns, iter_rate_amount_notif_xml_from_columns,
+    AVAIL_STATUS_MESSAGE_LAYOUT, RATE_AMOUNT_MESSAGE_LAYOUT, ElementLayout
+)
+from app.core.xml_constraints import DocumentConstraints, get_constraints
+from app.core.xsd_validator import iter_validated_xml, validate_xml_tree, validation_sampler
+from app.plugins.base import BasePMSTranslator, MessageType
+
+
+logger = get_logger("pipeline")
+
+
+class MultipleHotelsError(ValueError):
+    """Raised when rows expected to belong to one hotel span several"""
+
+
+# Batch of columns keyed by RGBridge field
+Columns = Dict[str, List[Any]]
+
+T = TypeVar("T")
+
+
+class DocumentSpec(NamedTuple):
+    """How to build and validate the OTA document for a message type"""
+    build_tree: Callable[..., etree._Element]
+    iter_xml: Callable[..., Iterator[bytes]]
+    xsd_name: str
+    build_tree_from_columns: Callable[..., etree._Element]
+    iter_xml_from_columns: Callable[..., Iterator[bytes]]
+    layout: ElementLayout
+
+
+DOCUMENT_SPECS: Dict[MessageType, DocumentSpec] = {
+    MessageType.AVAILABILITY: DocumentSpec(
+        build_avail_notif_tree, iter_avail_notif_xml, "OTA_HotelAvailNotifRQ.xsd",
+        build_avail_notif_tree_from_columns, iter_avail_notif_xml_from_columns, AVAIL_STATUS_MESSAGE_LAYOUT
+    ),
+    MessageType.RATE: DocumentSpec(
+        build_rate_amount_notif_tree, iter_rate_amount_notif_xml, "OTA_HotelRateAmountNotifRQ.xsd",
+        build_rate_amount_notif_tree_from_columns, iter_rate_amount_notif_xml_from_columns, RATE_AMOUNT_MESSAGE_LAYOUT
+    ),
+}
+
+
+def get_xsd_path(message_type: MessageType) -> str:
+    """
+    Get the XSD path used to validate documents of a message type
+
+    Args:
+        message_type: Type of message
+
+    Returns:
+        Path to the XSD file
+    """
+    return os.path.join(settings.SCHEMA_DIR, DOCUMENT_SPECS[message_type].xsd_name)
+
+
+def get_document_constraints(message_type: MessageType) -> Optional[DocumentConstraints]:
+    """
+    Get the constraints rows of a message type are checked against
+
+    Args:
+        message_type: Type of message
+
+    Returns:
+        Constraints compiled from the message type's XSD, or None if
+        documents must always be XSD-validated
+    """
+    return get_constraints(get_xsd_path(message_type), DOCUMENT_SPECS[message_type].layout)
+
+
+def iter_translated(translator: BasePMSTranslator, message_type: MessageType, message: Any) -> Iterator[Dict[str, Any]]:
+    """
+    Lazily translate a PMS message into RGBridge rows
+
+    Args:
+        translator: Translator for the PMS
+        message_type: Type of message
+        message: PMS message
+
+    Returns:
+        Iterator of RGBridge rows
+
+    Raises:
+        ValueError: If the message type is not supported
+    """
+    if message_type == MessageType.AVAILABILITY:
+        rows = translator.iter_availability(message)
+    elif message_type == MessageType.RATE:
+        rows = translator.iter_rate(message)
+    else:
+        raise ValueError(f"Unsupported message_type: {message_type}")
+    return counted(rows, ROWS_TRANSLATED, pms_code=translator.pms_code, message_type=message_type.value)
+
+
+def translate_combined(translator: BasePMSTranslator, message: Any) -> Dict[MessageType, List[Dict[str, Any]]]:
+    """
+    Translate a PMS message carrying both availability and rates
+
+    Args:
+        translator: Translator for the PMS
+        message: PMS message
+
+    Returns:
+        Dictionary of message type to RGBridge rows
+    """
+    translated = translator.translate_combined(message)
+    for message_type, rows in translated.items():
+        ROWS_TRANSLATED.inc(len(rows), pms_code=translator.pms_code, message_type=message_type.value)
+    return translated
+
+
+def iter_translated_columns(translator: BasePMSTranslator, message_type: MessageType, message: Any) -> Optional[Iterator[Columns]]:
+    """
+    Translate a large PMS message into batches of columns, if the translator supports it
+
+    Args:
+        translator: Translator for the PMS
+        message_type: Type of message
+        message: PMS message
+
+    Returns:
+        Iterator of column batches, or None to use the row path (columnar
+        translation disabled, unsupported, or the message is too small)
+    """
+    if settings.COLUMNAR_MIN_ROWS <= 0:
+        return None
+    batches = translator.iter_columns(message_type, message, min_rows=settings.COLUMNAR_MIN_ROWS)
+    if batches is None:
+        return None
+    return counted(
+        batches, ROWS_TRANSLATED, weight=column_batch_length,
+        pms_code=translator.pms_code, message_type=message_type.value
+    )
+
+
+def column_batch_length(columns: Columns) -> int:
+    """Number of rows in a column batch"""
+    return len(next(iter(columns.values()), ()))
+
+
+def group_by_hotel(rows: Iterable[Dict[str, Any]]) -> Dict[Optional[str], List[Dict[str, Any]]]:
+    """
+    Group RGBridge rows by their HotelCode, preserving row order
+
+    Args:
+        rows: RGBridge rows
+
+    Returns:
+        Dictionary of HotelCode to rows (rows without a HotelCode are keyed by None)
+    """
+    groups: Dict[Optional[str], List[Dict[str, Any]]] = {}
+    for row in rows:
+        groups.setdefault(row.get("HotelCode"), []).append(row)
+    return groups
+
+
+def ensure_single_hotel(rows: Iterable[Dict[str, Any]], hotel_code: str) -> Iterator[Dict[str, Any]]:
+    """
+    Pass rows through, failing as soon as one belongs to a different hotel
+
+    Args:
+        rows: RGBridge rows
+        hotel_code: Expected HotelCode (rows without one count as "UNKNOWN")
+
+    Raises:
+        MultipleHotelsError: If a row has a different HotelCode
+    """
+    for row in rows:
+        if (row.get("HotelCode") or "UNKNOWN") != hotel_code:
+            raise MultipleHotelsError(f"Payload spans multiple hotels ({hotel_code}, {row.get('HotelCode')})")
+        yield row
+
+
+def ensure_single_hotel_columns(batches: Iterable[Columns], hotel_code: str) -> Iterator[Columns]:
+    """
+    Pass column batches through, failing as soon as one holds a different hotel
+
+    Args:
+        batches: Column batches
+        hotel_code: Expected HotelCode (rows without one count as "UNKNOWN")
+
+    Raises:
+        MultipleHotelsError: If a row has a different HotelCode
+    """
+    for columns in batches:
+        for code in set(columns.get("HotelCode") or [None]):
+            if (code or "UNKNOWN") != hotel_code:
+                raise MultipleHotelsError(f"Payload spans multiple hotels ({hotel_code}, {code})")
+        yield columns
+
+
+def _build_and_validate(
+    message_type: MessageType,
+    prepare: Callable[[], T],
+    build_tree: Callable[[T], etree._Element],
+    check: Callable[[DocumentConstraints, T], Optional[str]],
+    pms_code: str
+) -> Tuple[bytes, Optional[str]]:
+    """
+    Build, serialize and validate a document, recording stage metrics
+
+    The prepared rows are checked against the constraints compiled from the
+    XSD; only documents picked by the validation sampler (or whose XSD the
+    constraints cannot be derived from) are fully XSD-validated.
+    """
+    labels = {"pms_code": pms_code, "message_type": message_type.value}
+    with STAGE_SECONDS.time(stage="build", **labels):
+        data = prepare()
+        xml_tree = build_tree(data)
+        xml_body = serialize_xml_bytes(xml_tree)
+    XML_BYTES.inc(len(xml_body), **labels)
+    with STAGE_SECONDS.time(stage="xsd_validate", **labels):
+        constraints = get_document_constraints(message_type)
+        xsd_error = check(constraints, data) if constraints is not None else None
+        if constraints is not None and (xsd_error is not None or not validation_sampler.should_validate(pms_code)):
+            DOCUMENT_CHECKS.inc(check="constraints", **labels)
+        else:
+            DOCUMENT_CHECKS.inc(check="xsd", **labels)
+            xsd_error = validate_xml_tree(xml_tree, get_xsd_path(message_type))
+            if xsd_error and constraints is not None:
+                logger.error("%s document passed its row constraints but not the XSD: %s", message_type.value, xsd_error)
+    if xsd_error:
+        VALIDATION_FAILURES.inc(stage="xsd", **labels)
+    return xml_body, xsd_error
+
+
+def build_document(
+    message_type: MessageType,
+    hotel_code: str,
+    rows: Iterable[Dict[str, Any]],
+    pms_code: str = "unknown"
+) -> Tuple[bytes, Optional[str]]:
+    """
+    Build and validate the OTA document for one hotel
+
+    Rows are merged into maximal date ranges first (DATE_RANGE_COMPRESSION).
+
+    Args:
+        message_type: Type of message
+        hotel_code: Hotel the rows belong to
+        rows: RGBridge rows
+        pms_code: PMS the rows came from (metrics label)
+
+    Returns:
+        Tuple of serialized XML and validation error (None if valid)
+    """
+    build_tree = DOCUMENT_SPECS[message_type].build_tree
+
+    def prepare() -> List[Dict[str, Any]]:
+        if settings.DATE_RANGE_COMPRESSION:
+            # Only availability documents render day-of-week flags
+            return compress_date_ranges(rows, weekdays=message_type == MessageType.AVAILABILITY)
+        return list(rows)
+
+    return _build_and_validate(
+        message_type, prepare, lambda rows: build_tree(hotel_code, rows), DocumentConstraints.check_rows, pms_code
+    )
+
+
+def check_document_rows(
+    message_type: MessageType,
+    hotel_code: str,
+    rows: List[Dict[str, Any]],
+    pms_code: str = "unknown"
+) -> Optional[str]:
+    """
+    Check rows would build a valid OTA document, without building it
+
+    Rows are checked against the constraints compiled from the XSD; when
+    these cannot be derived the document is built and XSD-validated.
+
+    Args:
+        message_type: Type of message
+        hotel_code: Hotel the rows belong to
+        rows: RGBridge rows
+        pms_code: PMS the rows came from (metrics label)
+
+    Returns:
+        Validation error, or None if valid
+    """
+    constraints = get_document_constraints(message_type)
+    if constraints is None:
+        return build_document(message_type, hotel_code, rows, pms_code=pms_code)[1]
+    labels = {"pms_code": pms_code, "message_type": message_type.value}
+    with STAGE_SECONDS.time(stage="xsd_validate", **labels):
+        error = constraints.check_rows(rows)
+    DOCUMENT_CHECKS.inc(check="constraints", **labels)
+    if error:
+        VALIDATION_FAILURES.inc(stage="xsd", **labels)
+    return error
+
+
+def build_document_from_columns(
+    message_type: MessageType,
+    hotel_code: str,
+    batches: Iterable[Columns],
+    pms_code: str = "unknown"
+) -> Tuple[bytes, Optional[str]]:
+    """
+    Build and validate the OTA document for one hotel from column batches
+
+    Args:
+        message_type: Type of message
+        hotel_code: Hotel the rows belong to
+        batches: Column batches
+        pms_code: PMS the rows came from (metrics label)
+
+    Returns:
+        Tuple of serialized XML and validation error (None if valid)
+    """
+    build_tree = DOCUMENT_SPECS[message_type].build_tree_from_columns
+    return _build_and_validate(
+        message_type, lambda: list(batches), lambda batches: build_tree(hotel_code, batches),
+        DocumentConstraints.check_columns, pms_code
+    )
+
+
+def iter_document_xml(
+    message_type: MessageType,
+    hotel_code: str,
+    rows: Iterable[Dict[str, Any]],
+    pms_code: str = "unknown"
+) -> Iterator[bytes]:
+    """
+    Incrementally write and validate the OTA document for one hotel
+
+    Rows are checked against the XSD's constraints a batch at a time as
+    they are written; documents picked by the validation sampler are
+    validated by a pull parser as they are written instead.
+
+    Args:
+        message_type: Type of message
+        hotel_code: Hotel the rows belong to
+        rows: RGBridge rows
+        pms_code: PMS the rows came from (metrics label)
+
+    Returns:
+        Iterator of UTF-8 chunks
+
+    Raises:
+        XMLStreamValidationError: While iterating, as soon as the document is found invalid
+    """
+    spec = DOCUMENT_SPECS[message_type]
+    constraints = _streamed_constraints(message_type, pms_code)
+    if constraints is None:
+        return iter_validated_xml(spec.iter_xml(hotel_code, rows), get_xsd_path(message_type))
+    return spec.iter_xml(hotel_code, constraints.iter_checked_rows(rows))
+
+
+def iter_document_xml_from_columns(
+    message_type: MessageType,
+    hotel_code: str,
+    batches: Iterable[Columns],
+    pms_code: str = "unknown"
+) -> Iterator[bytes]:
+    """
+    Incrementally write and validate the OTA document for one hotel from column batches
+
+    Args:
+        message_type: Type of message
+        hotel_code: Hotel the rows belong to
+        batches: Column batches
+        pms_code: PMS the rows came from (metrics label)
+
+    Returns:
+        Iterator of UTF-8 chunks
+
+    Raises:
+        XMLStreamValidationError: While iterating, as soon as the document is found invalid
+    """
+    spec = DOCUMENT_SPECS[message_type]
+    constraints = _streamed_constraints(message_type, pms_code)
+    if constraints is None:
+        return iter_validated_xml(spec.iter_xml_from_columns(hotel_code, batches), get_xsd_path(message_type))
+    return spec.iter_xml_from_columns(hotel_code, constraints.iter_checked_columns(batches))
+
+
+def _streamed_constraints(message_type: MessageType, pms_code: str) -> Optional[DocumentConstraints]:
+    """Constraints to check a streamed document with, None to XSD-validate it"""
+    labels = {"pms_code": pms_code, "message_type": message_type.value}
+    constraints = get_document_constraints(message_type)
+    if constraints is None or validation_sampler.should_validate(pms_code):
+        DOCUMENT_CHECKS.inc(check="xsd", **labels)
+        return None
+    DOCUMENT_CHECKS.inc(check="constraints", **labels)
+    return constraints
@@ -0,0 +1,89 @@
+"""
+Quarantine of PMS items skipped as invalid
+
+Items left out of a message with ``invalid_rows=skip`` are appended, with
+their rejection reasons, to one JSON-lines file per PMS and day under
+QUARANTINE_DIR, so they can be inspected and replayed once fixed.
+"""
+
+import os
+import threading
+from datetime import datetime, timezone
+from typing import Iterable, Optional
+
+from app.core import json_codec
+from app.core.config import settings
+from app.core.logging import get_logger, request_id_var
+from app.core.row_screening import RejectedItem
+
+logger = get_logger("quarantine")
+
+
+class RowQuarantine:
+    """Append-only store of rejected items"""
+
+    def __init__(self, directory: Optional[str] = None):
+        """
+        Initialize quarantine
+
+        Args:
+            directory: Quarantine directory (defaults to settings.QUARANTINE_DIR; empty disables)
+        """
+        self._directory = directory
+        self._lock = threading.Lock()
+
+    @property
+    def directory(self) -> str:
+        return self._directory if self._directory is not None else settings.QUARANTINE_DIR
+
+    @property
+    def enabled(self) -> bool:
+        """Whether rejected items are kept"""
+        return bool(self.directory)
+
+    def add(
+        self,
+        pms_code: str,
+        message_type: str,
+        rejected: Iterable[RejectedItem],
+        message_id: Optional[str] = None
+    ) -> Optional[str]:
+        """
+        Record rejected items
+
+        Args:
+            pms_code: PMS the items came from
+            message_type: Message type the message was processed as
+            rejected: Rejected items
+            message_id: Id of the message, if it has one
+
+        Returns:
+            Path of the file written to, None if the quarantine is disabled
+        """
+        if not self.enabled:
+            return None
+        now = datetime.now(timezone.utc)
+        received_at = now.isoformat()
+        lines = [
+            json_codec.dumps({
+                "received_at": received_at,
+                "pms_code": pms_code,
+                "message_type": message_type,
+                "message_id": message_id,
+                "request_id": request_id_var.get(),
+                **item.to_dict(),
+                "item": item.item,
+            }) + b"\n"
+            for item in rejected
+        ]
+        path = os.path.join(self.directory, pms_code, f"{now:%Y-%m-%d}.jsonl")
+        with self._lock:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "ab") as f:
+                f.writelines(lines)
+        logger.info("Quarantined %s items from PMS %s in %s", len(lines), pms_code, path)
+        return path
+
+
+# Singleton instance
+row_quarantine = RowQuarantine()
@@ -0,0 +1,155 @@
+"""
+Row-level error isolation for partially valid PMS messages
+
+When a message fails schema validation, translation or XSD validation and
+the PMS asked for invalid rows to be skipped (``invalid_rows=skip``),
+screen_items() finds the items of the message's item list that cause the
+failure. The endpoint then processes the message again without them, so
+one bad row no longer makes the PMS retry a whole batch.
+
+Screening only runs after a failure; valid messages are processed once.
+"""
+
+import re
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from app.core.config import settings
+from app.core.date_ranges import compress_date_ranges
+from app.core.message_schema import MessageValidationError
+from app.core.pipeline import DOCUMENT_SPECS, get_xsd_path
+from app.core.xsd_validator import validate_xml_tree
+from app.plugins.base import BasePMSTranslator, MessageType
+
+# Stages an item can be rejected at
+STAGE_SCHEMA = "schema"
+STAGE_TRANSLATE = "translate"
+STAGE_XSD = "xsd"
+
+# Items and the RGBridge rows each translated to
+ItemRows = List[Tuple[int, List[Dict[str, Any]]]]
+
+
+class RejectedItem(NamedTuple):
+    """An item left out of a message, with the reasons"""
+    index: int
+    stage: str
+    errors: List[str]
+    item: Any
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Outcome reported to the PMS (without the item itself)"""
+        return {"index": self.index, "stage": self.stage, "errors": self.errors}
+
+
+def _translate(translator: BasePMSTranslator, message_type: MessageType, message: Any) -> List[Dict[str, Any]]:
+    # Not through pipeline.iter_translated: screening must not count rows twice
+    if message_type == MessageType.AVAILABILITY:
+        return list(translator.iter_availability(message))
+    return list(translator.iter_rate(message))
+
+
+def _document_error(message_type: MessageType, rows: List[Dict[str, Any]]) -> Optional[str]:
+    """XSD error of the document built from rows (as build_document builds it), None if valid"""
+    hotel_code = rows[0].get("HotelCode") or "UNKNOWN"
+    if settings.DATE_RANGE_COMPRESSION:
+        rows = compress_date_ranges(rows, weekdays=message_type == MessageType.AVAILABILITY)
+    try:
+        tree = DOCUMENT_SPECS[message_type].build_tree(hotel_code, rows)
+    except Exception as e:
+        return str(e)
+    return validate_xml_tree(tree, get_xsd_path(message_type))
+
+
+def _xsd_failures(message_type: MessageType, item_rows: ItemRows) -> Dict[int, str]:
+    """
+    Find the items whose rows make the document invalid
+
+    Halves of a failing document are validated separately until single
+    items are left, so k bad items among n cost O(k log n) validations.
+    """
+    item_rows = [(index, rows) for index, rows in item_rows if rows]
+    if not item_rows:
+        return {}
+    error = _document_error(message_type, [row for _, rows in item_rows for row in rows])
+    if error is None:
+        return {}
+    if len(item_rows) == 1:
+        return {item_rows[0][0]: error}
+    middle = len(item_rows) // 2
+    return {**_xsd_failures(message_type, item_rows[:middle]), **_xsd_failures(message_type, item_rows[middle:])}
+
+
+def _translate_items(
+    translator: BasePMSTranslator,
+    message_type: MessageType,
+    message: Dict[str, Any],
+    list_key: str,
+    items: List[Tuple[int, Any]],
+    rejected: Dict[int, RejectedItem]
+) -> ItemRows:
+    """
+    Translate the items, rejecting those that fail; returns the rows of each remaining item
+
+    Items are translated one at a time: a translator may emit any number of
+    rows per item (or merge rows across items), so rows of a whole-message
+    translation cannot be attributed to items.
+    """
+    item_rows = []
+    for index, item in items:
+        try:
+            item_rows.append((index, _translate(translator, message_type, {**message, list_key: [item]})))
+        except Exception as e:
+            rejected[index] = RejectedItem(index, STAGE_TRANSLATE, [f"{message_type.value}: {e}"], item)
+    return item_rows
+
+
+def screen_items(
+    translator: BasePMSTranslator,
+    message_types: List[MessageType],
+    message: Any,
+    list_key: str
+) -> Tuple[Dict[str, Any], List[RejectedItem]]:
+    """
+    Separate the items of a message that fail validation, translation or the XSD
+
+    Args:
+        translator: Translator for the PMS
+        message_types: Message types the message is processed as
+        message: Decoded PMS message
+        list_key: Top-level field holding the message's items
+
+    Returns:
+        Tuple of the message without the rejected items, and the rejected
+        items by index
+
+    Raises:
+        ValueError: If the message has no item list, or fails for reasons
+            outside its items (e.g. an invalid header field)
+    """
+    items = message.get(list_key) if isinstance(message, dict) else None
+    if not isinstance(items, list):
+        raise ValueError(f"Message has no {list_key!r} list")
+
+    rejected: Dict[int, RejectedItem] = {}
+    if translator.message_schema is not None and settings.MESSAGE_SCHEMA_VALIDATION:
+        location = re.compile(rf"^{re.escape(list_key)}\[(\d+)\]\.?(.*)$")
+        try:
+            translator.check_schema(message)
+        except MessageValidationError as e:
+            for error in e.errors:
+                match = location.match(error["loc"])
+                if match is None:
+                    raise
+                index = int(match.group(1))
+                reason = f"{match.group(2) or 'item'}: {error['msg']}"
+                rejected.setdefault(index, RejectedItem(index, STAGE_SCHEMA, [], items[index])).errors.append(reason)
+
+    remaining = [(index, item) for index, item in enumerate(items) if index not in rejected]
+    for message_type in message_types:
+        item_rows = _translate_items(translator, message_type, message, list_key, remaining, rejected)
+        for index, error in _xsd_failures(message_type, item_rows).items():
+            rejected[index] = RejectedItem(index, STAGE_XSD, [f"{message_type.value}: {error}"], items[index])
+        remaining = [(index, item) for index, item in remaining if index not in rejected]
+
+    screened = {**message, list_key: [item for _, item in remaining]}
+    return screened, [rejected[index] for index in sorted(rejected)]
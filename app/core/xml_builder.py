@@ -4,11 +4,268 @@ XML builder utility for RGBridge OTA_HotelAvailNotifRQ
 
 from lxml import etree
 from datetime import datetime
-from typing import List, Dict, Any
+import itertools
+from typing import List, Dict, Any, Iterable, Iterator, NamedTuple, Optional, Tuple
+
+from app.utils.los_utils import LOSPattern
 
 NAMESPACE = "http://www.opentravel.org/OTA/2003/05"
 NSMAP = {None: NAMESPACE}
 
+# Bytes buffered by the streaming writers before a chunk is yielded
+STREAM_CHUNK_SIZE = 64 * 1024
+
+# Flat row fields written to StatusApplicationControl, in attribute order
+AVAIL_SAC_FIELDS = ["Start", "End", "InvCode", "RatePlanCode", "Mon", "Tue", "Weds", "Thur", "Fri", "Sat", "Sun"]
+RATE_SAC_FIELDS = ["InvCode", "RatePlanCode", "Start", "End"]
+RATE_FIELDS = ["CurrencyCode", "UnitMultiplier"]
+RATE_DETAIL_FIELDS = ["BaseByGuestAmts", "GuaranteePolicies", "CancelPolicies", "MealsIncluded"]
+
+
+class ElementLayout(NamedTuple):
+    """
+    Where the builders write row data, for checking it against the XSD (see app.core.xml_constraints)
+
+    An element's attributes are the `attributes` fields of its data, or when
+    None every key of its data dict not written as a child. `children` are
+    keys of the data holding a dict (a list of dicts with `many`) written as
+    child elements; None stands for a child without data-driven attributes.
+    `flat_children` are written from fields of the same data, unless its
+    `replaced_by` key is set or (without `always`) none of their attributes is.
+    """
+    name: str
+    attributes: Optional[Tuple[str, ...]] = None
+    children: Tuple[Tuple[str, Optional["ElementLayout"]], ...] = ()
+    flat_children: Tuple["ElementLayout", ...] = ()
+    lower_bools: bool = False
+    many: bool = False
+    always: bool = False
+    replaced_by: Optional[str] = None
+
+
+AVAIL_STATUS_MESSAGE_LAYOUT = ElementLayout(
+    "AvailStatusMessage",
+    attributes=("BookingLimit",),
+    flat_children=(
+        ElementLayout(
+            "StatusApplicationControl", tuple(AVAIL_SAC_FIELDS), lower_bools=True, replaced_by="StatusApplicationControl"
+        ),
+    ),
+    children=(
+        ("StatusApplicationControl", ElementLayout("StatusApplicationControl", lower_bools=True)),
+        ("LengthsOfStay", ElementLayout("LengthOfStay", many=True, children=(("LOS_Pattern", None),))),
+        ("RestrictionStatus", ElementLayout("RestrictionStatus")),
+    ),
+)
+
+RATE_AMOUNT_MESSAGE_LAYOUT = ElementLayout(
+    "RateAmountMessage",
+    attributes=(),
+    flat_children=(
+        ElementLayout("StatusApplicationControl", tuple(RATE_SAC_FIELDS), always=True),
+        ElementLayout("Rate", tuple(RATE_FIELDS), always=True, children=(
+            ("BaseByGuestAmts", ElementLayout("BaseByGuestAmt", many=True)),
+            ("GuaranteePolicies", ElementLayout("GuaranteePolicy", many=True)),
+            ("CancelPolicies", ElementLayout("CancelPenalty", many=True, lower_bools=True, children=(
+                ("Deadline", ElementLayout("Deadline")),
+                ("AmountPercent", ElementLayout("AmountPercent")),
+                ("PenaltyDescription", None),
+            ))),
+            ("MealsIncluded", ElementLayout("MealsIncluded")),
+        )),
+    ),
+)
+
+
+def _qname(tag: str, namespace: Optional[str] = NAMESPACE) -> str:
+    """
+    Qualify a tag with the OTA namespace
+
+    Streamed messages are built without one (namespace=None) and inherit the
+    default namespace declared on the root, so xmlns is written only once.
+    """
+    return f"{{{namespace}}}{tag}" if namespace else tag
+
+
+def _root_attrs(timestamp: str, target: str, version: str, echo_token: str) -> Dict[str, str]:
+    """Attributes shared by every OTA notification root element"""
+    if not timestamp:
+        timestamp = datetime.utcnow().isoformat()
+    if not echo_token:
+        echo_token = str(int(datetime.utcnow().timestamp()))
+    return {"TimeStamp": timestamp, "Target": target, "Version": version, "EchoToken": echo_token}
+
+
+def serialize_xml_bytes(root: etree._Element) -> bytes:
+    """
+    Serialize an OTA element tree to pretty-printed UTF-8 bytes
+    """
+    return etree.tostring(root, pretty_print=True, encoding="utf-8", xml_declaration=False)
+
+
+def serialize_xml(root: etree._Element) -> str:
+    """
+    Serialize an OTA element tree to a pretty-printed XML string
+    """
+    return serialize_xml_bytes(root).decode("utf-8")
+
+
+def _build_avail_status_message(msg: Dict[str, Any], namespace: Optional[str] = NAMESPACE) -> etree._Element:
+    """
+    Build a single AvailStatusMessage element
+    """
+    attrs = {}
+    if msg.get("BookingLimit") is not None:
+        attrs["BookingLimit"] = str(msg["BookingLimit"])
+        attrs["BookingLimitMessageType"] = "SetLimit"
+    avail_status_msg_el = etree.Element(_qname("AvailStatusMessage", namespace), **attrs)
+
+    # StatusApplicationControl
+    sac = msg.get("StatusApplicationControl")
+    if sac:
+        sac_attrs = {k: str(v).lower() if isinstance(v, bool) else str(v) for k, v in sac.items() if v is not None}
+        etree.SubElement(avail_status_msg_el, _qname("StatusApplicationControl", namespace), **sac_attrs)
+    else:
+        # Flat fields
+        sac_attrs = {}
+        for k in AVAIL_SAC_FIELDS:
+            if msg.get(k) is not None:
+                val = msg[k]
+                if isinstance(val, bool):
+                    val = str(val).lower()
+                sac_attrs[k] = str(val)
+        if sac_attrs:
+            etree.SubElement(avail_status_msg_el, _qname("StatusApplicationControl", namespace), **sac_attrs)
+
+    # LengthsOfStay
+    if msg.get("LengthsOfStay"):
+        _append_lengths_of_stay(avail_status_msg_el, msg["LengthsOfStay"], namespace)
+
+    # RestrictionStatus
+    if msg.get("RestrictionStatus"):
+        _append_restriction_status(avail_status_msg_el, msg["RestrictionStatus"], namespace)
+
+    return avail_status_msg_el
+
+
+def _append_lengths_of_stay(
+    avail_status_msg_el: etree._Element, lengths_of_stay: List[Dict[str, Any]], namespace: Optional[str] = NAMESPACE
+) -> None:
+    lengths_el = etree.SubElement(avail_status_msg_el, _qname("LengthsOfStay", namespace))
+    for los in lengths_of_stay:
+        los_attrs = {k: str(v) for k, v in los.items() if k != "LOS_Pattern" and v is not None}
+        los_el = etree.SubElement(lengths_el, _qname("LengthOfStay", namespace), **los_attrs)
+        pattern = los.get("LOS_Pattern")
+        if pattern:
+            if isinstance(pattern, LOSPattern):
+                pattern = pattern.full_pattern_los
+            etree.SubElement(los_el, _qname("LOS_Pattern", namespace), FullPatternLOS=pattern)
+
+
+def _append_restriction_status(
+    avail_status_msg_el: etree._Element, rs: Dict[str, Any], namespace: Optional[str] = NAMESPACE
+) -> None:
+    rs_attrs = {k: str(v) for k, v in rs.items() if v is not None}
+    etree.SubElement(avail_status_msg_el, _qname("RestrictionStatus", namespace), **rs_attrs)
+
+
+def _build_rate_amount_message(msg: Dict[str, Any], namespace: Optional[str] = NAMESPACE) -> etree._Element:
+    """
+    Build a single RateAmountMessage element
+    """
+    ram_el = etree.Element(_qname("RateAmountMessage", namespace))
+    # StatusApplicationControl
+    sac_attrs = {}
+    for k in RATE_SAC_FIELDS:
+        if msg.get(k) is not None:
+            sac_attrs[k] = str(msg[k])
+    etree.SubElement(ram_el, _qname("StatusApplicationControl", namespace), **sac_attrs)
+    # Rates
+    rates_el = etree.SubElement(ram_el, _qname("Rates", namespace))
+    rate_attrs = {}
+    for k in RATE_FIELDS:
+        if msg.get(k) is not None:
+            rate_attrs[k] = str(msg[k])
+    rate_el = etree.SubElement(rates_el, _qname("Rate", namespace), **rate_attrs)
+    _append_rate_details(rate_el, msg, namespace)
+    return ram_el
+
+
+def _append_rate_details(rate_el: etree._Element, msg: Dict[str, Any], namespace: Optional[str] = NAMESPACE) -> None:
+    """
+    Append guest amounts, policies and meals to a Rate element
+    """
+    # BaseByGuestAmts
+    if msg.get("BaseByGuestAmts"):
+        bbga_el = etree.SubElement(rate_el, _qname("BaseByGuestAmts", namespace))
+        for amt in msg["BaseByGuestAmts"]:
+            etree.SubElement(bbga_el, _qname("BaseByGuestAmt", namespace), **{k: str(v) for k, v in amt.items() if v is not None})
+    # GuaranteePolicies
+    if msg.get("GuaranteePolicies"):
+        gp_el = etree.SubElement(rate_el, _qname("GuaranteePolicies", namespace))
+        for gp in msg["GuaranteePolicies"]:
+            etree.SubElement(gp_el, _qname("GuaranteePolicy", namespace), **{k: str(v) for k, v in gp.items() if v is not None})
+    # CancelPolicies
+    if msg.get("CancelPolicies"):
+        cp_el = etree.SubElement(rate_el, _qname("CancelPolicies", namespace))
+        for cp in msg["CancelPolicies"]:
+            cp_el2 = etree.SubElement(cp_el, _qname("CancelPenalty", namespace), **{k: str(v).lower() if isinstance(v, bool) else str(v) for k, v in cp.items() if k not in ["Deadline", "AmountPercent", "PenaltyDescription"] and v is not None})
+            if cp.get("Deadline"):
+                etree.SubElement(cp_el2, _qname("Deadline", namespace), **{k: str(v) for k, v in cp["Deadline"].items() if v is not None})
+            if cp.get("AmountPercent"):
+                etree.SubElement(cp_el2, _qname("AmountPercent", namespace), **{k: str(v) for k, v in cp["AmountPercent"].items() if v is not None})
+            if cp.get("PenaltyDescription"):
+                pd_el = etree.SubElement(cp_el2, _qname("PenaltyDescription", namespace))
+                if cp["PenaltyDescription"].get("Text"):
+                    etree.SubElement(pd_el, _qname("Text", namespace)).text = cp["PenaltyDescription"]["Text"]
+    # MealsIncluded
+    if msg.get("MealsIncluded"):
+        etree.SubElement(rate_el, _qname("MealsIncluded", namespace), **{k: str(v) for k, v in msg["MealsIncluded"].items() if v is not None})
+
+
+def build_avail_notif_tree(
+    hotel_code: str,
+    avail_status_messages: List[Dict[str, Any]],
+    timestamp: str = None,
+    target: str = "Production",
+    version: str = "1",
+    echo_token: str = None
+) -> etree._Element:
+    """
+    Build OTA_HotelAvailNotifRQ element tree from data
+    """
+    root = etree.Element(
+        _qname("OTA_HotelAvailNotifRQ"),
+        nsmap=NSMAP,
+        **_root_attrs(timestamp, target, version, echo_token)
+    )
+    avail_status_messages_el = etree.SubElement(root, _qname("AvailStatusMessages"), HotelCode=hotel_code)
+    for msg in avail_status_messages:
+        avail_status_messages_el.append(_build_avail_status_message(msg))
+    return root
+
+
+def build_rate_amount_notif_tree(
+    hotel_code: str,
+    rate_amount_messages: List[Dict[str, Any]],
+    timestamp: str = None,
+    target: str = "Production",
+    version: str = "1.0",
+    echo_token: str = None
+) -> etree._Element:
+    """
+    Build OTA_HotelRateAmountNotifRQ element tree from data
+    """
+    root = etree.Element(
+        _qname("OTA_HotelRateAmountNotifRQ"),
+        nsmap=NSMAP,
+        **_root_attrs(timestamp, target, version, echo_token)
+    )
+    rate_amount_messages_el = etree.SubElement(root, _qname("RateAmountMessages"), HotelCode=hotel_code)
+    for msg in rate_amount_messages:
+        rate_amount_messages_el.append(_build_rate_amount_message(msg))
+    return root
+
 
 def build_avail_notif_xml(
     hotel_code: str,
@@ -21,129 +278,258 @@ def build_avail_notif_xml(
     """
     Build OTA_HotelAvailNotifRQ XML from data
     """
-    if not timestamp:
-        timestamp = datetime.utcnow().isoformat()
-    if not echo_token:
-        echo_token = str(int(datetime.utcnow().timestamp()))
+    return serialize_xml(build_avail_notif_tree(
+        hotel_code, avail_status_messages, timestamp, target, version, echo_token
+    ))
 
-    root = etree.Element(
-        "OTA_HotelAvailNotifRQ",
-        nsmap=NSMAP,
-        TimeStamp=timestamp,
-        Target=target,
-        Version=version,
-        EchoToken=echo_token
+
+def build_rate_amount_notif_xml(
+    hotel_code: str,
+    rate_amount_messages: List[Dict[str, Any]],
+    timestamp: str = None,
+    target: str = "Production",
+    version: str = "1.0",
+    echo_token: str = None
+) -> str:
+    """
+    Build OTA_HotelRateAmountNotifRQ XML from data
+    """
+    return serialize_xml(build_rate_amount_notif_tree(
+        hotel_code, rate_amount_messages, timestamp, target, version, echo_token
+    ))
+
+
+class _ChunkBuffer:
+    """Write target that collects the bytes produced by etree.xmlfile"""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        self.size = 0
+
+    def write(self, data: bytes) -> None:
+        self._chunks.append(data)
+        self.size += len(data)
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        self.size = 0
+        return data
+
+
+def _iter_notif_xml(
+    root_tag: str,
+    container_tag: str,
+    hotel_code: str,
+    messages: Iterable[Dict[str, Any]],
+    build_message,
+    root_attrs: Dict[str, str],
+    chunk_size: int
+) -> Iterator[bytes]:
+    buffer = _ChunkBuffer()
+    with etree.xmlfile(buffer, encoding="utf-8") as xf:
+        with xf.element(_qname(root_tag), nsmap=NSMAP, **root_attrs):
+            with xf.element(_qname(container_tag), HotelCode=hotel_code):
+                for msg in messages:
+                    # Each message is built, written and released before the next one
+                    xf.write(build_message(msg, None))
+                    if buffer.size >= chunk_size:
+                        yield buffer.drain()
+    if buffer.size:
+        yield buffer.drain()
+
+
+def iter_avail_notif_xml(
+    hotel_code: str,
+    avail_status_messages: Iterable[Dict[str, Any]],
+    timestamp: str = None,
+    target: str = "Production",
+    version: str = "1",
+    echo_token: str = None,
+    chunk_size: int = STREAM_CHUNK_SIZE
+) -> Iterator[bytes]:
+    """
+    Incrementally write OTA_HotelAvailNotifRQ XML as UTF-8 byte chunks
+
+    Messages are consumed one at a time, so memory stays flat regardless
+    of how many the iterable yields.
+    """
+    return _iter_notif_xml(
+        "OTA_HotelAvailNotifRQ", "AvailStatusMessages", hotel_code, avail_status_messages,
+        _build_avail_status_message, _root_attrs(timestamp, target, version, echo_token), chunk_size
     )
-    avail_status_messages_el = etree.SubElement(root, "AvailStatusMessages", HotelCode=hotel_code)
 
-    for msg in avail_status_messages:
-        attrs = {}
-        if msg.get("BookingLimit") is not None:
-            attrs["BookingLimit"] = str(msg["BookingLimit"])
-            attrs["BookingLimitMessageType"] = "SetLimit"
-        avail_status_msg_el = etree.SubElement(avail_status_messages_el, "AvailStatusMessage", **attrs)
-
-        # StatusApplicationControl
-        sac = msg.get("StatusApplicationControl")
+
+def iter_rate_amount_notif_xml(
+    hotel_code: str,
+    rate_amount_messages: Iterable[Dict[str, Any]],
+    timestamp: str = None,
+    target: str = "Production",
+    version: str = "1.0",
+    echo_token: str = None,
+    chunk_size: int = STREAM_CHUNK_SIZE
+) -> Iterator[bytes]:
+    """
+    Incrementally write OTA_HotelRateAmountNotifRQ XML as UTF-8 byte chunks
+
+    Messages are consumed one at a time, so memory stays flat regardless
+    of how many the iterable yields.
+    """
+    return _iter_notif_xml(
+        "OTA_HotelRateAmountNotifRQ", "RateAmountMessages", hotel_code, rate_amount_messages,
+        _build_rate_amount_message, _root_attrs(timestamp, target, version, echo_token), chunk_size
+    )
+
+
+def _column_length(columns: Dict[str, List[Any]]) -> int:
+    return len(next(iter(columns.values()))) if columns else 0
+
+
+def _attr_column(values: List[Any], lower_bools: bool = False) -> List[Any]:
+    """Stringify a column of attribute values once, keeping None for absent ones"""
+    if lower_bools:
+        return [None if v is None else str(v).lower() if isinstance(v, bool) else str(v) for v in values]
+    return [None if v is None else str(v) for v in values]
+
+
+def _attr_columns(columns: Dict[str, List[Any]], fields: List[str], lower_bools: bool = False) -> List[tuple]:
+    return [(k, _attr_column(columns[k], lower_bools)) for k in fields if k in columns and any(v is not None for v in columns[k])]
+
+
+def iter_avail_status_messages(
+    columns: Dict[str, List[Any]], namespace: Optional[str] = NAMESPACE
+) -> Iterator[etree._Element]:
+    """
+    Build AvailStatusMessage elements from columns of RGBridge fields
+
+    Produces the same elements as building each row separately, but
+    attribute values are stringified a whole column at a time.
+    """
+    length = _column_length(columns)
+    limits = _attr_column(columns.get("BookingLimit") or [None] * length)
+    sac_columns = _attr_columns(columns, AVAIL_SAC_FIELDS, lower_bools=True)
+    nested_sac = columns.get("StatusApplicationControl")
+    lengths_of_stay = columns.get("LengthsOfStay")
+    restrictions = columns.get("RestrictionStatus")
+    tag, sac_tag = _qname("AvailStatusMessage", namespace), _qname("StatusApplicationControl", namespace)
+    for i in range(length):
+        limit = limits[i]
+        if limit is not None:
+            msg_el = etree.Element(tag, BookingLimit=limit, BookingLimitMessageType="SetLimit")
+        else:
+            msg_el = etree.Element(tag)
+        sac = nested_sac[i] if nested_sac else None
         if sac:
-            sac_attrs = {k: str(v).lower() if isinstance(v, bool) else str(v) for k, v in sac.items() if v is not None}
-            etree.SubElement(avail_status_msg_el, "StatusApplicationControl", **sac_attrs)
+            etree.SubElement(msg_el, sac_tag, **{k: str(v).lower() if isinstance(v, bool) else str(v) for k, v in sac.items() if v is not None})
         else:
-            # Flat fields
-            sac_attrs = {}
-            for k in ["Start", "End", "InvCode", "RatePlanCode", "Mon", "Tue", "Weds", "Thur", "Fri", "Sat", "Sun"]:
-                if msg.get(k) is not None:
-                    val = msg[k]
-                    if isinstance(val, bool):
-                        val = str(val).lower()
-                    sac_attrs[k] = str(val)
+            sac_attrs = {k: column[i] for k, column in sac_columns if column[i] is not None}
             if sac_attrs:
-                etree.SubElement(avail_status_msg_el, "StatusApplicationControl", **sac_attrs)
+                etree.SubElement(msg_el, sac_tag, **sac_attrs)
+        if lengths_of_stay and lengths_of_stay[i]:
+            _append_lengths_of_stay(msg_el, lengths_of_stay[i], namespace)
+        if restrictions and restrictions[i]:
+            _append_restriction_status(msg_el, restrictions[i], namespace)
+        yield msg_el
 
-        # LengthsOfStay
-        if msg.get("LengthsOfStay"):
-            lengths_el = etree.SubElement(avail_status_msg_el, "LengthsOfStay")
-            for los in msg["LengthsOfStay"]:
-                los_attrs = {k: str(v) for k, v in los.items() if k != "LOS_Pattern" and v is not None}
-                los_el = etree.SubElement(lengths_el, "LengthOfStay", **los_attrs)
-                if los.get("LOS_Pattern"):
-                    etree.SubElement(los_el, "LOS_Pattern", FullPatternLOS=los["LOS_Pattern"])
 
-        # RestrictionStatus
-        if msg.get("RestrictionStatus"):
-            rs = msg["RestrictionStatus"]
-            rs_attrs = {k: str(v) for k, v in rs.items() if v is not None}
-            etree.SubElement(avail_status_msg_el, "RestrictionStatus", **rs_attrs)
+def iter_rate_amount_messages(
+    columns: Dict[str, List[Any]], namespace: Optional[str] = NAMESPACE
+) -> Iterator[etree._Element]:
+    """
+    Build RateAmountMessage elements from columns of RGBridge fields
 
-    return etree.tostring(root, pretty_print=True, encoding="utf-8", xml_declaration=False).decode("utf-8")
+    Produces the same elements as building each row separately, but
+    attribute values are stringified a whole column at a time.
+    """
+    length = _column_length(columns)
+    sac_columns = _attr_columns(columns, RATE_SAC_FIELDS)
+    rate_columns = _attr_columns(columns, RATE_FIELDS)
+    detail_columns = [(k, columns[k]) for k in RATE_DETAIL_FIELDS if k in columns and any(columns[k])]
+    tag = _qname("RateAmountMessage", namespace)
+    sac_tag, rates_tag, rate_tag = (
+        _qname("StatusApplicationControl", namespace), _qname("Rates", namespace), _qname("Rate", namespace)
+    )
+    for i in range(length):
+        ram_el = etree.Element(tag)
+        etree.SubElement(ram_el, sac_tag, **{k: column[i] for k, column in sac_columns if column[i] is not None})
+        rates_el = etree.SubElement(ram_el, rates_tag)
+        rate_el = etree.SubElement(rates_el, rate_tag, **{k: column[i] for k, column in rate_columns if column[i] is not None})
+        if detail_columns:
+            _append_rate_details(rate_el, {k: column[i] for k, column in detail_columns}, namespace)
+        yield ram_el
 
 
-def build_rate_amount_notif_xml(
+def build_avail_notif_tree_from_columns(
     hotel_code: str,
-    rate_amount_messages: List[Dict[str, Any]],
+    column_batches: Iterable[Dict[str, List[Any]]],
+    timestamp: str = None,
+    target: str = "Production",
+    version: str = "1",
+    echo_token: str = None
+) -> etree._Element:
+    """
+    Build OTA_HotelAvailNotifRQ element tree from batches of columns
+    """
+    root = build_avail_notif_tree(hotel_code, [], timestamp, target, version, echo_token)
+    for columns in column_batches:
+        root[0].extend(iter_avail_status_messages(columns))
+    return root
+
+
+def build_rate_amount_notif_tree_from_columns(
+    hotel_code: str,
+    column_batches: Iterable[Dict[str, List[Any]]],
     timestamp: str = None,
     target: str = "Production",
     version: str = "1.0",
     echo_token: str = None
-) -> str:
+) -> etree._Element:
     """
-    Build OTA_HotelRateAmountNotifRQ XML from data
+    Build OTA_HotelRateAmountNotifRQ element tree from batches of columns
     """
-    if not timestamp:
-        timestamp = datetime.utcnow().isoformat()
-    if not echo_token:
-        echo_token = str(int(datetime.utcnow().timestamp()))
+    root = build_rate_amount_notif_tree(hotel_code, [], timestamp, target, version, echo_token)
+    for columns in column_batches:
+        root[0].extend(iter_rate_amount_messages(columns))
+    return root
 
-    root = etree.Element(
-        "OTA_HotelRateAmountNotifRQ",
-        nsmap=NSMAP,
-        TimeStamp=timestamp,
-        Target=target,
-        Version=version,
-        EchoToken=echo_token
+
+def _written_as_is(element: etree._Element, namespace: Optional[str]) -> etree._Element:
+    return element
+
+
+def iter_avail_notif_xml_from_columns(
+    hotel_code: str,
+    column_batches: Iterable[Dict[str, List[Any]]],
+    timestamp: str = None,
+    target: str = "Production",
+    version: str = "1",
+    echo_token: str = None,
+    chunk_size: int = STREAM_CHUNK_SIZE
+) -> Iterator[bytes]:
+    """
+    Incrementally write OTA_HotelAvailNotifRQ XML from batches of columns
+    """
+    elements = itertools.chain.from_iterable(iter_avail_status_messages(columns, None) for columns in column_batches)
+    return _iter_notif_xml(
+        "OTA_HotelAvailNotifRQ", "AvailStatusMessages", hotel_code, elements,
+        _written_as_is, _root_attrs(timestamp, target, version, echo_token), chunk_size
     )
-    rate_amount_messages_el = etree.SubElement(root, "RateAmountMessages", HotelCode=hotel_code)
 
-    for msg in rate_amount_messages:
-        ram_el = etree.SubElement(rate_amount_messages_el, "RateAmountMessage")
-        # StatusApplicationControl
-        sac_attrs = {}
-        for k in ["InvCode", "RatePlanCode", "Start", "End"]:
-            if msg.get(k) is not None:
-                sac_attrs[k] = str(msg[k])
-        etree.SubElement(ram_el, "StatusApplicationControl", **sac_attrs)
-        # Rates
-        rates_el = etree.SubElement(ram_el, "Rates")
-        rate_attrs = {}
-        for k in ["CurrencyCode", "UnitMultiplier"]:
-            if msg.get(k) is not None:
-                rate_attrs[k] = str(msg[k])
-        rate_el = etree.SubElement(rates_el, "Rate", **rate_attrs)
-        # BaseByGuestAmts
-        if msg.get("BaseByGuestAmts"):
-            bbga_el = etree.SubElement(rate_el, "BaseByGuestAmts")
-            for amt in msg["BaseByGuestAmts"]:
-                etree.SubElement(bbga_el, "BaseByGuestAmt", **{k: str(v) for k, v in amt.items() if v is not None})
-        # GuaranteePolicies
-        if msg.get("GuaranteePolicies"):
-            gp_el = etree.SubElement(rate_el, "GuaranteePolicies")
-            for gp in msg["GuaranteePolicies"]:
-                etree.SubElement(gp_el, "GuaranteePolicy", **{k: str(v) for k, v in gp.items() if v is not None})
-        # CancelPolicies
-        if msg.get("CancelPolicies"):
-            cp_el = etree.SubElement(rate_el, "CancelPolicies")
-            for cp in msg["CancelPolicies"]:
-                cp_el2 = etree.SubElement(cp_el, "CancelPenalty", **{k: str(v).lower() if isinstance(v, bool) else str(v) for k, v in cp.items() if k not in ["Deadline", "AmountPercent", "PenaltyDescription"] and v is not None})
-                if cp.get("Deadline"):
-                    etree.SubElement(cp_el2, "Deadline", **{k: str(v) for k, v in cp["Deadline"].items() if v is not None})
-                if cp.get("AmountPercent"):
-                    etree.SubElement(cp_el2, "AmountPercent", **{k: str(v) for k, v in cp["AmountPercent"].items() if v is not None})
-                if cp.get("PenaltyDescription"):
-                    pd_el = etree.SubElement(cp_el2, "PenaltyDescription")
-                    if cp["PenaltyDescription"].get("Text"):
-                        etree.SubElement(pd_el, "Text").text = cp["PenaltyDescription"]["Text"]
-        # MealsIncluded
-        if msg.get("MealsIncluded"):
-            etree.SubElement(rate_el, "MealsIncluded", **{k: str(v) for k, v in msg["MealsIncluded"].items() if v is not None})
-
-    return etree.tostring(root, pretty_print=True, encoding="utf-8", xml_declaration=False).decode("utf-8") 
\ No newline at end of file
+
+def iter_rate_amount_notif_xml_from_columns(
+    hotel_code: str,
+    column_batches: Iterable[Dict[str, List[Any]]],
+    timestamp: str = None,
+    target: str = "Production",
+    version: str = "1.0",
+    echo_token: str = None,
+    chunk_size: int = STREAM_CHUNK_SIZE
+) -> Iterator[bytes]:
+    """
+    Incrementally write OTA_HotelRateAmountNotifRQ XML from batches of columns
+    """
+    elements = itertools.chain.from_iterable(iter_rate_amount_messages(columns, None) for columns in column_batches)
+    return _iter_notif_xml(
+        "OTA_HotelRateAmountNotifRQ", "RateAmountMessages", hotel_code, elements,
+        _written_as_is, _root_attrs(timestamp, target, version, echo_token), chunk_size
+    )
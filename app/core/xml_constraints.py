@@ -0,0 +1,548 @@
+"""
+OTA schema constraints enforced on the rows documents are built from
+
+The structure of the OTA documents is fixed by xml_builder; only attribute
+values, and whether optional parts are written, come from translated data.
+DocumentConstraints compiles, from a document's XSD, the type, enumeration
+and use of every attribute the builder writes from row data (as declared
+by its ElementLayout), and checks rows against them before the document is
+built. Each distinct value is checked once, so this costs a fraction of
+full XSD validation, which becomes a sampled check (see
+pipeline.build_document).
+
+Layouts are compiled against the XSD when first used: a builder writing an
+attribute the schema does not declare fails to compile, and schemas using
+constructs these checks do not cover (named types, facets other than
+enumerations, other built-in types) are left to full XSD validation.
+"""
+
+import calendar
+import itertools
+import os
+import re
+from functools import lru_cache
+from typing import (
+    Any, Callable, Collection, Dict, FrozenSet, Iterable, Iterator, List, NamedTuple, Optional, Sequence, Set, Tuple, Union
+)
+
+from lxml import etree
+
+from app.core.logging import get_logger
+from app.core.xml_builder import ElementLayout
+from app.core.xsd_validator import XMLStreamValidationError
+
+logger = get_logger("xml_constraints")
+
+XS = "{http://www.w3.org/2001/XMLSchema}"
+
+# Distinct valid values remembered per type
+MAX_REMEMBERED_VALUES = 65536
+
+# Rows checked at a time when they are streamed
+STREAM_CHECK_BATCH = 1000
+
+_INTEGER = re.compile(r"[+-]?[0-9]+")
+_DECIMAL = re.compile(r"[+-]?(?:[0-9]+(?:\.[0-9]*)?|\.[0-9]+)")
+_DATE = r"(-?)([1-9][0-9]{4,}|[0-9]{4})-([0-9]{2})-([0-9]{2})"
+_TIME = r"([0-9]{2}):([0-9]{2}):([0-9]{2})(?:\.[0-9]+)?"
+_TIMEZONE = r"(Z|[+-]([0-9]{2}):([0-9]{2}))?"
+_DATE_VALUE = re.compile(_DATE + _TIMEZONE)
+_DATETIME_VALUE = re.compile(_DATE + "T" + _TIME + _TIMEZONE)
+_XML_WHITESPACE = " \t\n\r"
+
+
+def _valid_date(sign: str, year: str, month: str, day: str) -> bool:
+    year, month, day = int(year), int(month), int(day)
+    if year == 0 or not 1 <= month <= 12:
+        return False
+    return 1 <= day <= calendar.monthrange(year if year <= 9999 and not sign else 2000 + year % 400, month)[1]
+
+
+def _valid_timezone(timezone: Optional[str], hours: Optional[str], minutes: Optional[str]) -> bool:
+    if timezone is None or timezone == "Z":
+        return True
+    return int(minutes) <= 59 and (int(hours), int(minutes)) <= (14, 0)
+
+
+def _is_date(text: str) -> bool:
+    match = _DATE_VALUE.fullmatch(text)
+    return match is not None and _valid_date(*match.group(1, 2, 3, 4)) and _valid_timezone(*match.group(5, 6, 7))
+
+
+def _is_datetime(text: str) -> bool:
+    match = _DATETIME_VALUE.fullmatch(text)
+    if match is None or not _valid_date(*match.group(1, 2, 3, 4)):
+        return False
+    hour, minute, second = int(match.group(5)), int(match.group(6)), int(match.group(7))
+    if hour == 24:
+        time_valid = minute == 0 and second == 0 and "." not in text[match.end(7):match.start(8) if match.group(8) else None]
+    else:
+        time_valid = hour <= 23 and minute <= 59 and second <= 59
+    return time_valid and _valid_timezone(*match.group(8, 9, 10))
+
+
+# Lexical checks of the built-in types, on values with whitespace collapsed
+# where libxml2 collapses it
+_BUILTIN_TYPES: Dict[str, Tuple[Optional[Callable[[str], bool]], bool]] = {
+    "string": (None, False),
+    "boolean": (lambda text: text in ("true", "false", "1", "0"), True),
+    "integer": (lambda text: _INTEGER.fullmatch(text) is not None, True),
+    "decimal": (lambda text: _DECIMAL.fullmatch(text) is not None, True),
+    "date": (_is_date, False),
+    "dateTime": (_is_datetime, False),
+}
+
+
+class ValueType:
+    """An XSD simple type: a built-in type, optionally restricted to an enumeration"""
+
+    def __init__(self, base: str, enumeration: Optional[FrozenSet[str]] = None):
+        """
+        Initialize value type
+
+        Args:
+            base: Built-in type name without prefix, e.g. 'date'
+            enumeration: Allowed values, if the type is an enumeration
+
+        Raises:
+            ValueError: If the built-in type is not supported
+        """
+        if base not in _BUILTIN_TYPES:
+            raise ValueError(f"Unsupported XSD type: xs:{base}")
+        self.name = f"xs:{base}"
+        self._check, self._collapse = _BUILTIN_TYPES[base]
+        self.enumeration = enumeration
+        self._valid: Set[str] = set()
+
+    @property
+    def unchecked(self) -> bool:
+        """Whether every string is a valid value"""
+        return self._check is None and self.enumeration is None
+
+    def is_valid(self, text: str) -> bool:
+        """
+        Check a rendered attribute value
+
+        Args:
+            text: Attribute value as written to the document
+
+        Returns:
+            True if the value is valid
+        """
+        if text in self._valid:
+            return True
+        value = text.strip(_XML_WHITESPACE) if self._collapse else text
+        valid = (self._check is None or self._check(value)) and (self.enumeration is None or value in self.enumeration)
+        if valid and len(self._valid) < MAX_REMEMBERED_VALUES:
+            self._valid.add(text)
+        return valid
+
+    def describe(self) -> str:
+        if self.enumeration is not None:
+            return f"{self.name} enumeration {sorted(self.enumeration)}"
+        return self.name
+
+
+@lru_cache(maxsize=None)
+def _value_type(base: str, enumeration: Optional[FrozenSet[str]] = None) -> ValueType:
+    # Shared by every attribute of the type, so valid values are remembered across documents
+    return ValueType(base, enumeration)
+
+
+class ElementSpec(NamedTuple):
+    """Attributes the XSD declares for an element"""
+    attributes: Dict[str, ValueType]
+    required: FrozenSet[str]
+    min_occurs: int
+
+
+def _builtin_name(qname: str, element: etree._Element) -> str:
+    prefix, _, local = qname.rpartition(":")
+    if element.nsmap.get(prefix or None) != XS[1:-1]:
+        raise ValueError(f"Unsupported XSD type: {qname} (only built-in types are checked)")
+    return local
+
+
+def _attribute_type(attribute: etree._Element) -> ValueType:
+    if attribute.get("name") is None or attribute.get("fixed") is not None:
+        raise ValueError(f"Unsupported attribute declaration: {dict(attribute.attrib)}")
+    if attribute.get("type") is not None:
+        return _value_type(_builtin_name(attribute.get("type"), attribute))
+    restriction = attribute.find(f"{XS}simpleType/{XS}restriction")
+    if restriction is None:
+        raise ValueError(f"Unsupported declaration of attribute {attribute.get('name')!r}")
+    facets = {facet.tag for facet in restriction}
+    if facets != {f"{XS}enumeration"}:
+        raise ValueError(f"Unsupported facets on attribute {attribute.get('name')!r}: {sorted(facets)}")
+    enumeration = frozenset(facet.get("value") for facet in restriction)
+    return _value_type(_builtin_name(restriction.get("base"), restriction), enumeration)
+
+
+def load_element_specs(xsd_path: str) -> Dict[str, ElementSpec]:
+    """
+    Read the attributes declared for each element of an XSD
+
+    Args:
+        xsd_path: Path to the XSD file
+
+    Returns:
+        Dictionary of element name to its spec
+
+    Raises:
+        ValueError: If an element name is declared twice, or an attribute
+            uses a construct these checks do not support
+    """
+    specs: Dict[str, ElementSpec] = {}
+    for element in etree.parse(xsd_path).iter(f"{XS}element"):
+        name = element.get("name")
+        if name is None:
+            raise ValueError(f"Unsupported element reference: {element.get('ref')}")
+        if name in specs:
+            raise ValueError(f"Element {name!r} is declared more than once")
+        attributes, required = {}, set()
+        complex_type = element.find(f"{XS}complexType")
+        if complex_type is not None:
+            for tag in ("attributeGroup", "anyAttribute", "simpleContent", "complexContent"):
+                if complex_type.find(f"{XS}{tag}") is not None:
+                    raise ValueError(f"Unsupported xs:{tag} in element {name!r}")
+        for attribute in complex_type.findall(f"{XS}attribute") if complex_type is not None else ():
+            attributes[attribute.get("name")] = _attribute_type(attribute)
+            if attribute.get("use") == "required":
+                required.add(attribute.get("name"))
+        specs[name] = ElementSpec(attributes, frozenset(required), int(element.get("minOccurs", "1")))
+    return specs
+
+
+def _render(value: Any, lower_bools: bool) -> str:
+    # As xml_builder writes attribute values
+    if lower_bools and isinstance(value, bool):
+        return str(value).lower()
+    return str(value)
+
+
+class _CompiledElement(NamedTuple):
+    layout: ElementLayout
+    # Data-driven attributes and their types (None: any string)
+    attributes: Dict[str, Optional[ValueType]]
+    required: FrozenSet[str]
+    children: Tuple[Tuple[str, "_CompiledElement"], ...]
+    flat_children: Tuple["_CompiledElement", ...]
+    # Keys of the data written as child elements rather than attributes
+    child_keys: FrozenSet[str]
+
+
+def _compile_element(layout: ElementLayout, specs: Dict[str, ElementSpec]) -> _CompiledElement:
+    spec = specs.get(layout.name)
+    if spec is None:
+        raise ValueError(f"Element {layout.name!r} is not declared in the schema")
+    if layout.attributes is not None:
+        undeclared = [name for name in layout.attributes if name not in spec.attributes]
+        if undeclared:
+            raise ValueError(f"{layout.name} attributes {undeclared} are not declared in the schema")
+        unwritten = sorted(spec.required - set(layout.attributes))
+        if unwritten:
+            raise ValueError(f"{layout.name} attributes {unwritten} are required but never written")
+        names = layout.attributes
+    else:
+        names = spec.attributes
+    attributes = {name: None if spec.attributes[name].unchecked else spec.attributes[name] for name in names}
+    children = tuple((key, _compile_element(child, specs)) for key, child in layout.children if child is not None)
+    flat_children = tuple(_compile_element(child, specs) for child in layout.flat_children)
+    return _CompiledElement(layout, attributes, spec.required, children, flat_children, frozenset(dict(layout.children)))
+
+
+class DocumentConstraints:
+    """
+    Checks rows against the XSD of the document they are written to
+
+    Errors name the first invalid attribute with its location in the
+    document, e.g. ``AvailStatusMessage[3]/StatusApplicationControl/@Start:
+    '2025-02-30' is not a valid value of xs:date``.
+    """
+
+    def __init__(self, xsd_path: str, layout: ElementLayout):
+        """
+        Compile constraints
+
+        Args:
+            xsd_path: XSD of the document
+            layout: Layout of the document's repeated message element
+
+        Raises:
+            ValueError: If the layout writes attributes the XSD does not
+                declare, or the XSD uses constructs these checks do not support
+        """
+        specs = load_element_specs(xsd_path)
+        self.layout = layout
+        self._message = _compile_element(layout, specs)
+        self._min_messages = specs[layout.name].min_occurs
+
+    def check_rows(self, rows: Sequence[Dict[str, Any]]) -> Optional[str]:
+        """
+        Check the rows of a whole document
+
+        Args:
+            rows: RGBridge rows, one per message element
+
+        Returns:
+            None if the document built from the rows is valid, or an error message
+        """
+        return self._check(_RowData(rows), 0) or self._check_count(len(rows))
+
+    def check_columns(self, batches: Sequence[Dict[str, List[Any]]]) -> Optional[str]:
+        """
+        Check the column batches of a whole document
+
+        Args:
+            batches: Column batches, one row per message element
+
+        Returns:
+            None if the document built from the batches is valid, or an error message
+        """
+        offset = 0
+        for columns in batches:
+            data = _ColumnData(columns)
+            error = self._check(data, offset)
+            if error is not None:
+                return error
+            offset += len(data)
+        return self._check_count(offset)
+
+    def iter_checked_rows(self, rows: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        """
+        Pass streamed rows through, checking them a batch at a time
+
+        Raises:
+            XMLStreamValidationError: As soon as a batch is found invalid
+        """
+        rows = iter(rows)
+        offset = 0
+        while True:
+            batch = list(itertools.islice(rows, STREAM_CHECK_BATCH))
+            if not batch:
+                break
+            error = self._check(_RowData(batch), offset)
+            if error is not None:
+                raise XMLStreamValidationError(error)
+            yield from batch
+            offset += len(batch)
+        error = self._check_count(offset)
+        if error is not None:
+            raise XMLStreamValidationError(error)
+
+    def iter_checked_columns(self, batches: Iterable[Dict[str, List[Any]]]) -> Iterator[Dict[str, List[Any]]]:
+        """
+        Pass streamed column batches through, checking each
+
+        Raises:
+            XMLStreamValidationError: As soon as a batch is found invalid
+        """
+        offset = 0
+        for columns in batches:
+            data = _ColumnData(columns)
+            error = self._check(data, offset)
+            if error is not None:
+                raise XMLStreamValidationError(error)
+            yield columns
+            offset += len(data)
+        error = self._check_count(offset)
+        if error is not None:
+            raise XMLStreamValidationError(error)
+
+    def _check_count(self, count: int) -> Optional[str]:
+        if count < self._min_messages:
+            return f"{self.layout.name}: expected at least {self._min_messages} element(s), got {count}"
+        return None
+
+    def _check(self, data: "_Data", offset: int) -> Optional[str]:
+        return self._check_element(self._message, data, offset, "")
+
+    def _check_element(self, element: _CompiledElement, data: "_Data", offset: int, path: str) -> Optional[str]:
+        """Check an element written from fields of the message rows, across all messages"""
+        layout = element.layout
+        fields = data.fields()
+        # The message element is always written; flat children only for some rows
+        written = element is self._message
+        for name, value_type in element.attributes.items():
+            if value_type is None or name not in fields:
+                continue
+            for value in data.distinct(name):
+                if value is None:
+                    continue
+                text = _render(value, layout.lower_bools)
+                if not value_type.is_valid(text):
+                    index = data.find(lambda row: row.get(name) is not None and _render(row[name], layout.lower_bools) == text)
+                    return _invalid_value(self._location(offset + index, path), name, text, value_type)
+        for name in sorted(element.required):
+            if name in fields and None not in data.distinct(name):
+                continue
+            index = data.find(lambda row: row.get(name) is None and (written or _flat_written(layout, row)))
+            if index is not None:
+                return f"{self._location(offset + index, path)}: the attribute '{name}' is required but missing"
+
+        for child in element.flat_children:
+            error = self._check_element(child, data, offset, f"{path}/{child.layout.name}")
+            if error is not None:
+                return error
+        for key, child in element.children:
+            if key not in fields:
+                continue
+            for index, value in data.items(key):
+                error = _check_values(key, child, value, self._location(offset + index, path))
+                if error is not None:
+                    return error
+        return None
+
+    def _location(self, index: int, path: str) -> str:
+        """Location of an element of the index-th message (numbered from 1, as in XPath)"""
+        return f"{self.layout.name}[{index + 1}]{path}"
+
+
+def _flat_written(layout: ElementLayout, row: Dict[str, Any]) -> bool:
+    """Whether the builder writes a flat element for a row"""
+    if layout.replaced_by is not None and row.get(layout.replaced_by):
+        return False
+    return layout.always or any(row.get(name) is not None for name in layout.attributes)
+
+
+def _check_values(key: str, element: _CompiledElement, value: Any, parent: str) -> Optional[str]:
+    """Check the element(s) written from a dict, or list of dicts (in a container named after the key), held in a field"""
+    if not value:
+        return None
+    if not element.layout.many:
+        return _check_dict(element, value, f"{parent}/{element.layout.name}")
+    for position, item in enumerate(value):
+        error = _check_dict(element, item, f"{parent}/{key}/{element.layout.name}[{position + 1}]")
+        if error is not None:
+            return error
+    return None
+
+
+def _check_dict(element: _CompiledElement, item: Dict[str, Any], path: str) -> Optional[str]:
+    """Check an element written from the keys of a dict"""
+    layout = element.layout
+    for name, value in item.items():
+        if name in element.child_keys or value is None:
+            continue
+        if name not in element.attributes:
+            return f"{path}/@{name}: the attribute '{name}' is not allowed"
+        value_type = element.attributes[name]
+        if value_type is not None:
+            text = _render(value, layout.lower_bools)
+            if not value_type.is_valid(text):
+                return _invalid_value(path, name, text, value_type)
+    for name in sorted(element.required):
+        if item.get(name) is None:
+            return f"{path}: the attribute '{name}' is required but missing"
+    for key, child in element.children:
+        error = _check_values(key, child, item.get(key), path)
+        if error is not None:
+            return error
+    return None
+
+
+def _invalid_value(path: str, name: str, text: str, value_type: ValueType) -> str:
+    return f"{path}/@{name}: '{text}' is not a valid value of {value_type.describe()}"
+
+
+class _RowData:
+    """Message rows as dicts"""
+
+    def __init__(self, rows: Sequence[Dict[str, Any]]):
+        self._rows = rows
+        self._fields: Optional[Set[str]] = None
+        self._distinct: Dict[str, Collection[Any]] = {}
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def fields(self) -> Set[str]:
+        if self._fields is None:
+            self._fields = set().union(*self._rows)
+        return self._fields
+
+    def distinct(self, name: str) -> Collection[Any]:
+        if name not in self._distinct:
+            self._distinct[name] = _distinct(list(map(dict.get, self._rows, itertools.repeat(name))))
+        return self._distinct[name]
+
+    def items(self, name: str) -> Iterator[Tuple[int, Any]]:
+        values = list(map(dict.get, self._rows, itertools.repeat(name)))
+        return itertools.compress(enumerate(values), values)
+
+    def find(self, predicate: Callable[[Dict[str, Any]], bool]) -> Optional[int]:
+        return next((index for index, row in enumerate(self._rows) if predicate(row)), None)
+
+
+class _ColumnData:
+    """Message rows as columns keyed by field"""
+
+    def __init__(self, columns: Dict[str, List[Any]]):
+        self._columns = columns
+        self._distinct: Dict[str, Collection[Any]] = {}
+
+    def __len__(self) -> int:
+        return len(next(iter(self._columns.values()), ()))
+
+    def fields(self) -> Set[str]:
+        return set(self._columns)
+
+    def distinct(self, name: str) -> Collection[Any]:
+        if name not in self._distinct:
+            self._distinct[name] = _distinct(self._columns[name])
+        return self._distinct[name]
+
+    def items(self, name: str) -> Iterator[Tuple[int, Any]]:
+        values = self._columns[name]
+        return itertools.compress(enumerate(values), values)
+
+    def find(self, predicate: Callable[[Dict[str, Any]], bool]) -> Optional[int]:
+        names = list(self._columns)
+        rows = (dict(zip(names, values)) for values in zip(*self._columns.values()))
+        return next((index for index, row in enumerate(rows) if predicate(row)), None)
+
+
+_Data = Union[_RowData, _ColumnData]
+
+
+def _distinct(values: List[Any]) -> Collection[Any]:
+    """Distinct values of a column, keeping equal values of different types (1, True, 1.0) apart"""
+    try:
+        distinct = set(values)
+    except TypeError:
+        # Unhashable values are rendered one by one
+        return values
+    if len({value.__class__ for value in distinct} - {str, type(None)}) > 1:
+        return {(value.__class__, value): value for value in values}.values()
+    return distinct
+
+
+@lru_cache(maxsize=None)
+def _compile(xsd_path: str, mtime: int, layout: ElementLayout) -> Optional[DocumentConstraints]:
+    try:
+        constraints = DocumentConstraints(xsd_path, layout)
+    except (OSError, ValueError, etree.XMLSyntaxError) as e:
+        logger.warning("Rows cannot be checked against %s, documents are always XSD-validated: %s", xsd_path, e)
+        return None
+    logger.info("Compiled %s constraints from %s", layout.name, xsd_path)
+    return constraints
+
+
+def get_constraints(xsd_path: str, layout: ElementLayout) -> Optional[DocumentConstraints]:
+    """
+    Get the constraints of a document, compiled once per XSD version
+
+    Args:
+        xsd_path: XSD of the document
+        layout: Layout of the document's repeated message element
+
+    Returns:
+        Compiled constraints, or None if they cannot be derived from the
+        XSD (documents must then be XSD-validated)
+    """
+    path = os.path.abspath(xsd_path)
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+    return _compile(path, mtime, layout)
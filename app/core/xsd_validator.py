@@ -2,8 +2,147 @@
 XSD validator utility for RGBridge XML
 """
 
+import os
+import threading
 from lxml import etree
-from typing import Optional
+from typing import Dict, Iterable, Iterator, Optional, Tuple
+
+from app.core.config import settings
+from app.core.logging import PayloadSampler, get_logger
+
+logger = get_logger("xsd_validator")
+
+
+class XMLStreamValidationError(ValueError):
+    """Raised when a streamed XML document fails XSD validation"""
+
+
+class SchemaRegistry:
+    """
+    Process-wide cache of compiled XSD schemas
+
+    Schemas are keyed by absolute path and recompiled when the file's
+    modification time changes.
+    """
+
+    def __init__(self):
+        self._schemas: Dict[str, Tuple[int, etree.XMLSchema]] = {}
+        self._lock = threading.Lock()
+
+    def get_schema(self, xsd_path: str) -> etree.XMLSchema:
+        """
+        Get the compiled schema for an XSD file
+
+        Args:
+            xsd_path: Path to the XSD file
+
+        Returns:
+            Compiled XMLSchema
+
+        Raises:
+            OSError: If the XSD file cannot be read
+            etree.XMLSchemaParseError: If the XSD file is not a valid schema
+        """
+        path = os.path.abspath(xsd_path)
+        mtime = os.stat(path).st_mtime_ns
+        cached = self._schemas.get(path)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+
+        with self._lock:
+            cached = self._schemas.get(path)
+            if cached is not None and cached[0] == mtime:
+                return cached[1]
+            schema = etree.XMLSchema(etree.parse(path))
+            self._schemas[path] = (mtime, schema)
+            logger.info("Compiled XSD schema: %s", path)
+            return schema
+
+    def warm_up(self, schema_dir: Optional[str] = None) -> int:
+        """
+        Compile every XSD file in a directory
+
+        Args:
+            schema_dir: Directory to scan (defaults to settings.SCHEMA_DIR)
+
+        Returns:
+            Number of schemas compiled
+        """
+        schema_dir = schema_dir or settings.SCHEMA_DIR
+        if not os.path.isdir(schema_dir):
+            logger.warning("Schema directory not found: %s", schema_dir)
+            return 0
+
+        count = 0
+        for filename in sorted(os.listdir(schema_dir)):
+            if not filename.endswith(".xsd"):
+                continue
+            try:
+                self.get_schema(os.path.join(schema_dir, filename))
+                count += 1
+            except (OSError, etree.XMLSyntaxError, etree.XMLSchemaParseError) as e:
+                logger.warning("Failed to compile XSD schema %s: %s", filename, e)
+        return count
+
+    def clear(self) -> None:
+        """Drop all compiled schemas"""
+        with self._lock:
+            self._schemas.clear()
+
+    def __len__(self) -> int:
+        return len(self._schemas)
+
+    def __contains__(self, xsd_path: str) -> bool:
+        return os.path.abspath(xsd_path) in self._schemas
+
+
+# Singleton instance for use throughout the app
+schema_registry = SchemaRegistry()
+
+
+class ValidationSampler(PayloadSampler):
+    """
+    Decides which documents are fully XSD-validated, independently per PMS
+
+    Documents whose rows passed the constraints compiled from their XSD
+    (see app.core.xml_constraints) are only validated for a sample: the
+    first of every PMS and roughly one in 1/XSD_VALIDATION_SAMPLE_RATE after
+    it. With DEBUG every document is validated.
+    """
+
+    @property
+    def rate(self) -> float:
+        if settings.DEBUG:
+            return 1.0
+        return self._rate if self._rate is not None else settings.XSD_VALIDATION_SAMPLE_RATE
+
+    def should_validate(self, pms_code: str) -> bool:
+        """
+        Check whether the next document of a PMS is XSD-validated
+
+        Args:
+            pms_code: PMS the document's rows came from
+
+        Returns:
+            True if the document should be validated
+        """
+        return self.should_log(pms_code)
+
+
+validation_sampler = ValidationSampler()
+
+
+def validate_xml_tree(xml_tree: etree._Element, xsd_path: str) -> Optional[str]:
+    """
+    Validate an lxml element tree against XSD file.
+    Returns None if valid, or error message if invalid.
+    """
+    try:
+        schema = schema_registry.get_schema(xsd_path)
+        schema.assertValid(xml_tree)
+        return None
+    except Exception as e:
+        return str(e)
 
 
 def validate_xml_with_xsd(xml_string: str, xsd_path: str) -> Optional[str]:
@@ -13,10 +152,41 @@ def validate_xml_with_xsd(xml_string: str, xsd_path: str) -> Optional[str]:
     """
     try:
         xml_doc = etree.fromstring(xml_string.encode("utf-8"))
-        with open(xsd_path, "rb") as f:
-            xsd_doc = etree.parse(f)
-        schema = etree.XMLSchema(xsd_doc)
-        schema.assertValid(xml_doc)
-        return None
     except Exception as e:
-        return str(e) 
\ No newline at end of file
+        return str(e)
+    return validate_xml_tree(xml_doc, xsd_path)
+
+
+def iter_validated_xml(chunks: Iterable[bytes], xsd_path: str) -> Iterator[bytes]:
+    """
+    Validate streamed XML against XSD file while passing the chunks through.
+
+    Each chunk is fed to a validating pull parser before it is yielded, and
+    completed messages are discarded so memory stays bounded. The last chunk
+    is held back until the document is known to be valid, so a consumer
+    never receives a complete but invalid document.
+
+    Raises:
+        XMLStreamValidationError: As soon as the stream is found invalid
+    """
+    schema = schema_registry.get_schema(xsd_path)
+    parser = etree.XMLPullParser(events=("end",), schema=schema)
+    pending = None
+    try:
+        for chunk in chunks:
+            parser.feed(chunk)
+            for _, element in parser.read_events():
+                parent = element.getparent()
+                # Drop finished messages (root -> container -> message)
+                if parent is not None and parent.getparent() is not None and parent.getparent().getparent() is None:
+                    element.clear()
+                    while element.getprevious() is not None:
+                        del parent[0]
+            if pending is not None:
+                yield pending
+            pending = chunk
+        parser.close()
+    except etree.XMLSyntaxError as e:
+        raise XMLStreamValidationError(str(e)) from e
+    if pending is not None:
+        yield pending
@@ -4,28 +4,83 @@ RGBridge PMS Integration Platform - Main Application
 
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import Response
+import asyncio
+import importlib
 import logging
+import os
+import sys
+import uuid
+from contextlib import asynccontextmanager
 from datetime import datetime
+from typing import List, Tuple
 
 from app.core.config import settings
-from app.core.logging import setup_logging
-from app.api.endpoints import router as api_router
-from app.api.advanced_pms import router as advanced_pms_router
-from app.api.wizard import router as wizard_router
+from app.core.logging import REQUEST_ID_HEADER, request_id_var, setup_logging
+from app.core.json_codec import CodecJSONResponse
+from app.core.metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, metrics_registry
 from mangum import Mangum
 
 # Setup logging
 setup_logging()
 logger = logging.getLogger(__name__)
 
+# Routers, the path prefixes that need them and the prefix they are included
+# under. Each is imported on the first request under one of its paths, so a
+# cold start only loads the modules (pipeline, XSD validation, delivery
+# spool, wizard) its request needs.
+LAZY_ROUTERS: List[Tuple[str, Tuple[str, ...], str]] = [
+    ("app.api.endpoints", ("/api/v1/pms/", "/api/v1/deliveries/"), "/api/v1"),
+    ("app.api.advanced_pms", (
+        "/api/v1/pms", "/api/v1/mappings", "/api/v1/schemas", "/api/v1/translators", "/api/v1/translate/"
+    ), ""),
+    ("app.api.wizard", ("/api/v1/wizard/",), ""),
+]
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Application startup and shutdown"""
+    from app.core.delivery_queue import delivery_queue
+    from app.core.internal_api_client import internal_api_client
+
+    # On AWS Lambda schemas, constraints and translators are compiled on first
+    # use instead, so a cold start only pays for what its request needs
+    on_lambda = "AWS_LAMBDA_FUNCTION_NAME" in os.environ
+    if settings.SCHEMA_WARM_UP and not on_lambda:
+        from app.core.pipeline import DOCUMENT_SPECS, get_document_constraints
+        from app.core.xsd_validator import schema_registry
+
+        # Compile XSD schemas once so the first requests don't pay for it
+        compiled = schema_registry.warm_up(settings.SCHEMA_DIR)
+        logger.info(f"Compiled {compiled} XSD schemas from {settings.SCHEMA_DIR}")
+        for message_type in DOCUMENT_SPECS:
+            get_document_constraints(message_type)
+    # Create translators and compile their mappings before traffic arrives
+    if settings.TRANSLATOR_WARM_UP and not on_lambda:
+        from app.plugins import plugin_registry
+
+        warmed = plugin_registry.warm_up()
+        logger.info(f"Warmed up {warmed} PMS translators")
+    await internal_api_client.start()
+    await delivery_queue.start()
+    yield
+    # Spool whatever is still buffered so it is delivered after a restart
+    coalescer_module = sys.modules.get("app.core.coalescer")
+    if coalescer_module is not None:
+        await coalescer_module.coalescer.flush_all()
+    await delivery_queue.stop()
+    await internal_api_client.close()
+
 # Create FastAPI app
 app = FastAPI(
     title="RGBridge PMS Integration Platform",
     description="Automated integration platform for Property Management Systems",
     version="1.0.0",
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    default_response_class=CodecJSONResponse,
+    lifespan=lifespan
 )
 
 # Add CORS middleware
@@ -37,10 +92,53 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Include API routes
-app.include_router(api_router, prefix="/api/v1")
-app.include_router(advanced_pms_router)
-app.include_router(wizard_router)
+_included_routers = set()
+_include_lock = asyncio.Lock()
+
+
+async def include_routers(path: str = None) -> None:
+    """
+    Include the lazily loaded routers a path needs (all of them without a path)
+
+    Args:
+        path: Request path
+    """
+    needed = [
+        (module, prefix) for module, paths, prefix in LAZY_ROUTERS
+        if module not in _included_routers and (path is None or path.startswith(paths))
+    ]
+    if not needed:
+        return
+    async with _include_lock:
+        for module, prefix in needed:
+            if module in _included_routers:
+                continue
+            router = (await asyncio.to_thread(importlib.import_module, module)).router
+            app.include_router(router, prefix=prefix)
+            _included_routers.add(module)
+            logger.info("Loaded router %s", module)
+    # Regenerate the OpenAPI schema with the new routes
+    app.openapi_schema = None
+
+
+@app.middleware("http")
+async def lazy_router_middleware(request: Request, call_next):
+    """Load the routers a request needs before it is routed"""
+    path = request.url.path
+    await include_routers(None if path in (app.openapi_url, app.docs_url, app.redoc_url) else path)
+    return await call_next(request)
+
+@app.middleware("http")
+async def request_id_middleware(request: Request, call_next):
+    """Tag log records and the response with the request id (taken from X-Request-ID or generated)"""
+    request_id = (request.headers.get(REQUEST_ID_HEADER) or uuid.uuid4().hex)[:128]
+    token = request_id_var.set(request_id)
+    try:
+        response = await call_next(request)
+    finally:
+        request_id_var.reset(token)
+    response.headers[REQUEST_ID_HEADER] = request_id
+    return response
 
 @app.get("/")
 async def root():
@@ -62,11 +160,16 @@ async def health_check():
         "timestamp": datetime.utcnow().isoformat()
     }
 
+@app.get("/metrics")
+async def metrics():
+    """Prometheus metrics endpoint"""
+    return Response(content=metrics_registry.render(), media_type=METRICS_CONTENT_TYPE)
+
 @app.exception_handler(Exception)
 async def global_exception_handler(request: Request, exc: Exception):
     """Global exception handler"""
     logger.error(f"Unhandled exception: {exc}", exc_info=True)
-    return JSONResponse(
+    return CodecJSONResponse(
         status_code=500,
         content={"detail": "Internal server error", "timestamp": datetime.utcnow().isoformat()}
     )
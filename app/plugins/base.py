@@ -3,12 +3,14 @@ Base class for PMS translators
 """
 
 from abc import ABC, abstractmethod
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, Iterator
 from enum import Enum
 import logging
 
+from app.core.config import settings
 from app.core.logging import get_logger
-from app.core.mapping_loader import mapping_loader
+from app.core.mapping_loader import CompiledMapping, mapping_loader
+from app.core.message_schema import MessageSchema
 
 
 class MessageType(Enum):
@@ -24,6 +26,9 @@ class BasePMSTranslator(ABC):
     All PMS translators must inherit from this class and implement
     the required methods.
     """
+
+    # Compiled schema of the PMS's inbound messages, None to skip schema checks
+    message_schema: Optional[MessageSchema] = None
     
     def __init__(self, pms_code: str):
         """
@@ -34,16 +39,48 @@ class BasePMSTranslator(ABC):
         """
         self.pms_code = pms_code
         self.logger = get_logger(f"translator.{pms_code}")
-        self._mapping = None
         
     @property
     def mapping(self) -> Dict[str, Any]:
         """
-        Load and cache the mapping for this PMS
+        Mapping for this PMS
+
+        Translators are long-lived, so the mapping is not kept on the
+        instance; the mapping loader caches it and reloads it when the
+        file changes.
+        """
+        return mapping_loader.load_mapping(self.pms_code)
+
+    def get_compiled_mapping(self, message_type: "MessageType") -> CompiledMapping:
+        """
+        Get the compiled mapping section for a message type
+
+        Compiled mappings are cached by the mapping loader and rebuilt when
+        the mapping file changes.
+
+        Args:
+            message_type: Type of message
+
+        Returns:
+            Compiled mapping for the message type
+        """
+        return mapping_loader.get_compiled_mapping(self.pms_code, message_type.value)
+
+    def check_schema(self, message: Any) -> None:
         """
-        if self._mapping is None:
-            self._mapping = mapping_loader.load_mapping(self.pms_code)
-        return self._mapping
+        Check a message against the translator's message_schema
+
+        Runs once per message, before validate_message() and any translation
+        (a no-op without a schema or with MESSAGE_SCHEMA_VALIDATION off).
+
+        Args:
+            message: Decoded PMS message
+
+        Raises:
+            MessageValidationError: If the message does not match the schema
+        """
+        if self.message_schema is not None and settings.MESSAGE_SCHEMA_VALIDATION:
+            self.message_schema.validate(message)
     
     @property
     @abstractmethod
@@ -110,6 +147,73 @@ class BasePMSTranslator(ABC):
         """
         pass
     
+    def iter_availability(self, message: Any) -> Iterator[Dict[str, Any]]:
+        """
+        Lazily translate availability message to RGBridge format
+
+        Translators that can produce rows one at a time should override this
+        so large messages can be streamed without materializing every row.
+
+        Args:
+            message: PMS availability message
+
+        Returns:
+            Iterator of RGBridge availability rows
+        """
+        return iter(self.translate_availability(message))
+
+    def iter_rate(self, message: Any) -> Iterator[Dict[str, Any]]:
+        """
+        Lazily translate rate message to RGBridge format
+
+        Translators that can produce rows one at a time should override this
+        so large messages can be streamed without materializing every row.
+
+        Args:
+            message: PMS rate message
+
+        Returns:
+            Iterator of RGBridge rate rows
+        """
+        return iter(self.translate_rate(message))
+
+    def translate_combined(self, message: Any) -> Dict[MessageType, List[Dict[str, Any]]]:
+        """
+        Translate a message carrying both availability and rates
+
+        The default translates the message once per message type. Translators
+        whose availability and rate rows come from the same items should
+        override this to walk the message once.
+
+        Args:
+            message: PMS message
+
+        Returns:
+            Dictionary of message type to RGBridge rows
+        """
+        return {
+            MessageType.AVAILABILITY: list(self.iter_availability(message)),
+            MessageType.RATE: list(self.iter_rate(message)),
+        }
+
+    def iter_columns(self, message_type: MessageType, message: Any, min_rows: int = 0) -> Optional[Iterator[Dict[str, List[Any]]]]:
+        """
+        Translate a message into batches of columns instead of rows
+
+        Columnar translation avoids building a dict per row for large
+        messages. Translators without a columnar path return None and the
+        row methods are used instead.
+
+        Args:
+            message_type: Type of message
+            message: PMS message
+            min_rows: Return None if the message has fewer rows than this
+
+        Returns:
+            Iterator of column batches keyed by RGBridge field, or None
+        """
+        return None
+
     def get_mapping_file(self) -> str:
         """
         Get the mapping file path for this PMS
@@ -129,9 +233,9 @@ class BasePMSTranslator(ABC):
             error: Error message if translation failed
         """
         if success:
-            self.logger.info(f"Successfully translated {message_type.value} message")
+            self.logger.info("Successfully translated %s message", message_type.value)
         else:
-            self.logger.error(f"Failed to translate {message_type.value} message: {error}")
+            self.logger.error("Failed to translate %s message: %s", message_type.value, error)
     
     def __str__(self) -> str:
         return f"{self.__class__.__name__}(pms_code={self.pms_code})"
@@ -3,23 +3,79 @@ Plugin registry for PMS translators
 """
 
 from typing import Dict, List, Type, Optional
+import importlib.util
 import logging
+import os
+import threading
 from .base import BasePMSTranslator, MessageType
 
 from app.core.logging import get_logger
+from app.core.mapping_loader import mapping_loader
 
 
 class PluginRegistry:
     """
     Registry for PMS translator plugins
     
-    Handles auto-discovery and registration of PMS translators
+    Handles auto-discovery and registration of PMS translators, and holds
+    one long-lived translator instance per PMS. Translators keep no
+    per-request state, so the shared instances are safe to use from
+    concurrent requests.
+
+    Discovered translator modules are only indexed by path; a module is
+    imported the first time its PMS is used, keeping cold starts short.
     """
     
     def __init__(self):
         """Initialize plugin registry"""
         self._translators: Dict[str, Type[BasePMSTranslator]] = {}
+        self._instances: Dict[str, BasePMSTranslator] = {}
+        self._index: Dict[str, str] = {}
+        self._lock = threading.Lock()
+        self._load_lock = threading.RLock()
         self.logger = get_logger("plugin_registry")
+
+    def index_plugins(self, pms_root: str) -> int:
+        """
+        Index pms/<code>/translator.py modules without importing them
+
+        Args:
+            pms_root: Directory holding one sub-directory per PMS
+
+        Returns:
+            Number of translator modules indexed
+        """
+        if not os.path.isdir(pms_root):
+            return 0
+        indexed = 0
+        for pms_name in sorted(os.listdir(pms_root)):
+            translator_path = os.path.join(pms_root, pms_name, "translator.py")
+            if os.path.isfile(translator_path) and pms_name not in self._translators:
+                self._index[pms_name] = translator_path
+                indexed += 1
+        return indexed
+
+    def _load_plugin(self, pms_code: str) -> Optional[Type[BasePMSTranslator]]:
+        """Import an indexed translator module, which registers its translator"""
+        global _loading_registry
+        with self._load_lock:
+            translator_path = self._index.pop(pms_code, None)
+            if translator_path is None:
+                return self._translators.get(pms_code)
+            spec = importlib.util.spec_from_file_location(f"pms.{pms_code}.translator", translator_path)
+            if not spec or not spec.loader:
+                return None
+            previous, _loading_registry = _loading_registry, self
+            try:
+                module = importlib.util.module_from_spec(spec)
+                spec.loader.exec_module(module)
+            except Exception as e:
+                self.logger.error(f"Failed to load translator for PMS {pms_code} from {translator_path}: {e}", exc_info=True)
+                return None
+            finally:
+                _loading_registry = previous
+            self.logger.info(f"Loaded translator module for PMS {pms_code} from {translator_path}")
+            return self._translators.get(pms_code)
     
     def register(self, pms_code: str, translator_class: Type[BasePMSTranslator]) -> None:
         """
@@ -32,7 +88,9 @@ class PluginRegistry:
         if not issubclass(translator_class, BasePMSTranslator):
             raise ValueError(f"Translator class must inherit from BasePMSTranslator")
         
-        self._translators[pms_code] = translator_class
+        with self._lock:
+            self._translators[pms_code] = translator_class
+            self._instances.pop(pms_code, None)
         self.logger.info(f"Registered translator for PMS: {pms_code}")
     
     def unregister(self, pms_code: str) -> None:
@@ -42,8 +100,11 @@ class PluginRegistry:
         Args:
             pms_code: PMS identifier to unregister
         """
+        self._index.pop(pms_code, None)
         if pms_code in self._translators:
-            del self._translators[pms_code]
+            with self._lock:
+                del self._translators[pms_code]
+                self._instances.pop(pms_code, None)
             self.logger.info(f"Unregistered translator for PMS: {pms_code}")
     
     def get_translator(self, pms_code: str) -> Optional[Type[BasePMSTranslator]]:
@@ -56,7 +117,10 @@ class PluginRegistry:
         Returns:
             Translator class or None if not found
         """
-        return self._translators.get(pms_code)
+        translator_class = self._translators.get(pms_code)
+        if translator_class is None and pms_code in self._index:
+            translator_class = self._load_plugin(pms_code)
+        return translator_class
     
     def create_translator(self, pms_code: str) -> Optional[BasePMSTranslator]:
         """
@@ -73,14 +137,61 @@ class PluginRegistry:
             return translator_class(pms_code)
         return None
     
+    def get_translator_instance(self, pms_code: str) -> Optional[BasePMSTranslator]:
+        """
+        Get the shared translator instance for a PMS
+
+        The instance is created on first use and replaced when a different
+        translator is registered for the PMS.
+
+        Args:
+            pms_code: PMS identifier
+
+        Returns:
+            Translator instance or None if not found
+        """
+        translator = self._instances.get(pms_code)
+        if translator is not None:
+            return translator
+        translator_class = self.get_translator(pms_code)
+        if translator_class is None:
+            return None
+        with self._lock:
+            translator = self._instances.get(pms_code)
+            if translator is None:
+                translator = self._instances[pms_code] = translator_class(pms_code)
+            return translator
+
+    def warm_up(self) -> int:
+        """
+        Create every translator and compile its mapping ahead of the first request
+
+        Translators whose mapping is missing or invalid are logged and skipped.
+
+        Returns:
+            Number of translators warmed up
+        """
+        warmed = 0
+        for pms_code in self.list_translators():
+            translator = self.get_translator_instance(pms_code)
+            if translator is None:
+                continue
+            try:
+                mapping_loader.warm_up(pms_code, [mt.value for mt in translator.supported_message_types])
+            except Exception as e:
+                self.logger.warning(f"Could not warm up mapping for PMS {pms_code}: {e}")
+                continue
+            warmed += 1
+        return warmed
+
     def list_translators(self) -> List[str]:
         """
         List all registered PMS codes
         
         Returns:
-            List of registered PMS codes
+            List of registered PMS codes, including indexed ones not loaded yet
         """
-        return list(self._translators.keys())
+        return list(self._translators) + [pms_code for pms_code in self._index if pms_code not in self._translators]
     
     def get_translator_info(self, pms_code: str) -> Optional[Dict]:
         """
@@ -92,19 +203,16 @@ class PluginRegistry:
         Returns:
             Dictionary with translator information or None if not found
         """
-        translator_class = self.get_translator(pms_code)
-        if not translator_class:
+        translator = self.get_translator_instance(pms_code)
+        if not translator:
             return None
         
-        # Create temporary instance to get info
-        temp_instance = translator_class(pms_code)
-        
         return {
             "pms_code": pms_code,
-            "class_name": translator_class.__name__,
-            "supported_formats": temp_instance.supported_formats,
-            "supported_message_types": [mt.value for mt in temp_instance.supported_message_types],
-            "mapping_file": temp_instance.get_mapping_file()
+            "class_name": translator.__class__.__name__,
+            "supported_formats": translator.supported_formats,
+            "supported_message_types": [mt.value for mt in translator.supported_message_types],
+            "mapping_file": translator.get_mapping_file()
         }
     
     def is_registered(self, pms_code: str) -> bool:
@@ -115,17 +223,21 @@ class PluginRegistry:
             pms_code: PMS identifier
             
         Returns:
-            True if translator is registered
+            True if translator is registered or indexed
         """
-        return pms_code in self._translators
+        return pms_code in self._translators or pms_code in self._index
     
     def __len__(self) -> int:
         """Number of registered translators"""
-        return len(self._translators)
+        return len(self.list_translators())
     
     def __contains__(self, pms_code: str) -> bool:
         """Check if PMS code is registered"""
-        return pms_code in self._translators
+        return self.is_registered(pms_code)
+
+
+# Registry importing a translator module, which its @register_translator targets
+_loading_registry: Optional[PluginRegistry] = None
 
 
 def register_translator(pms_code: str):
@@ -140,6 +252,7 @@ def register_translator(pms_code: str):
     def decorator(translator_class: Type[BasePMSTranslator]) -> Type[BasePMSTranslator]:
         # Import here to avoid circular imports
         from . import plugin_registry
-        plugin_registry.register(pms_code, translator_class)
+        registry = _loading_registry if _loading_registry is not None else plugin_registry
+        registry.register(pms_code, translator_class)
         return translator_class
     return decorator 
\ No newline at end of file
@@ -2,34 +2,218 @@
 Currency utility functions for RGBridge PMS Integration Platform
 """
 
-from typing import Optional, Union
+from types import MappingProxyType
+from typing import Any, Dict, Iterable, List, Mapping, NamedTuple, Optional, Sequence, Union
 import re
-from decimal import Decimal, ROUND_HALF_UP
-
-
-# Common currency codes
-CURRENCY_CODES = {
-    "USD": "US Dollar",
-    "EUR": "Euro",
-    "GBP": "British Pound",
-    "CAD": "Canadian Dollar",
-    "AUD": "Australian Dollar",
-    "JPY": "Japanese Yen",
-    "CHF": "Swiss Franc",
-    "CNY": "Chinese Yuan",
-    "INR": "Indian Rupee",
-    "BRL": "Brazilian Real",
-    "MXN": "Mexican Peso",
-    "SGD": "Singapore Dollar",
-    "HKD": "Hong Kong Dollar",
-    "KRW": "South Korean Won",
-    "SEK": "Swedish Krona",
-    "NOK": "Norwegian Krone",
-    "DKK": "Danish Krone",
-    "PLN": "Polish Zloty",
-    "CZK": "Czech Koruna",
-    "HUF": "Hungarian Forint",
-}
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+
+
+class CurrencyInfo(NamedTuple):
+    """ISO 4217 currency metadata"""
+    code: str
+    name: str
+    precision: int
+    # Exponent template for Decimal.quantize, e.g. Decimal("0.01")
+    quantizer: Decimal
+
+
+# ISO 4217 currencies: code, name and minor units
+_ISO_4217 = (
+    ("AED", "UAE Dirham", 2),
+    ("AFN", "Afghan Afghani", 2),
+    ("ALL", "Albanian Lek", 2),
+    ("AMD", "Armenian Dram", 2),
+    ("ANG", "Netherlands Antillean Guilder", 2),
+    ("AOA", "Angolan Kwanza", 2),
+    ("ARS", "Argentine Peso", 2),
+    ("AUD", "Australian Dollar", 2),
+    ("AWG", "Aruban Florin", 2),
+    ("AZN", "Azerbaijani Manat", 2),
+    ("BAM", "Bosnia-Herzegovina Convertible Mark", 2),
+    ("BBD", "Barbadian Dollar", 2),
+    ("BDT", "Bangladeshi Taka", 2),
+    ("BGN", "Bulgarian Lev", 2),
+    ("BHD", "Bahraini Dinar", 3),
+    ("BIF", "Burundian Franc", 0),
+    ("BMD", "Bermudian Dollar", 2),
+    ("BND", "Brunei Dollar", 2),
+    ("BOB", "Bolivian Boliviano", 2),
+    ("BRL", "Brazilian Real", 2),
+    ("BSD", "Bahamian Dollar", 2),
+    ("BTN", "Bhutanese Ngultrum", 2),
+    ("BWP", "Botswana Pula", 2),
+    ("BYN", "Belarusian Ruble", 2),
+    ("BZD", "Belize Dollar", 2),
+    ("CAD", "Canadian Dollar", 2),
+    ("CDF", "Congolese Franc", 2),
+    ("CHF", "Swiss Franc", 2),
+    ("CLP", "Chilean Peso", 0),
+    ("CNY", "Chinese Yuan", 2),
+    ("COP", "Colombian Peso", 2),
+    ("CRC", "Costa Rican Colon", 2),
+    ("CUP", "Cuban Peso", 2),
+    ("CVE", "Cape Verdean Escudo", 2),
+    ("CZK", "Czech Koruna", 2),
+    ("DJF", "Djiboutian Franc", 0),
+    ("DKK", "Danish Krone", 2),
+    ("DOP", "Dominican Peso", 2),
+    ("DZD", "Algerian Dinar", 2),
+    ("EGP", "Egyptian Pound", 2),
+    ("ERN", "Eritrean Nakfa", 2),
+    ("ETB", "Ethiopian Birr", 2),
+    ("EUR", "Euro", 2),
+    ("FJD", "Fijian Dollar", 2),
+    ("FKP", "Falkland Islands Pound", 2),
+    ("GBP", "British Pound", 2),
+    ("GEL", "Georgian Lari", 2),
+    ("GHS", "Ghanaian Cedi", 2),
+    ("GIP", "Gibraltar Pound", 2),
+    ("GMD", "Gambian Dalasi", 2),
+    ("GNF", "Guinean Franc", 0),
+    ("GTQ", "Guatemalan Quetzal", 2),
+    ("GYD", "Guyanese Dollar", 2),
+    ("HKD", "Hong Kong Dollar", 2),
+    ("HNL", "Honduran Lempira", 2),
+    ("HTG", "Haitian Gourde", 2),
+    ("HUF", "Hungarian Forint", 2),
+    ("IDR", "Indonesian Rupiah", 2),
+    ("ILS", "Israeli New Shekel", 2),
+    ("INR", "Indian Rupee", 2),
+    ("IQD", "Iraqi Dinar", 3),
+    ("IRR", "Iranian Rial", 2),
+    ("ISK", "Icelandic Krona", 0),
+    ("JMD", "Jamaican Dollar", 2),
+    ("JOD", "Jordanian Dinar", 3),
+    ("JPY", "Japanese Yen", 0),
+    ("KES", "Kenyan Shilling", 2),
+    ("KGS", "Kyrgyzstani Som", 2),
+    ("KHR", "Cambodian Riel", 2),
+    ("KMF", "Comorian Franc", 0),
+    ("KPW", "North Korean Won", 2),
+    ("KRW", "South Korean Won", 0),
+    ("KWD", "Kuwaiti Dinar", 3),
+    ("KYD", "Cayman Islands Dollar", 2),
+    ("KZT", "Kazakhstani Tenge", 2),
+    ("LAK", "Lao Kip", 2),
+    ("LBP", "Lebanese Pound", 2),
+    ("LKR", "Sri Lankan Rupee", 2),
+    ("LRD", "Liberian Dollar", 2),
+    ("LSL", "Lesotho Loti", 2),
+    ("LYD", "Libyan Dinar", 3),
+    ("MAD", "Moroccan Dirham", 2),
+    ("MDL", "Moldovan Leu", 2),
+    ("MGA", "Malagasy Ariary", 2),
+    ("MKD", "Macedonian Denar", 2),
+    ("MMK", "Myanmar Kyat", 2),
+    ("MNT", "Mongolian Tugrik", 2),
+    ("MOP", "Macanese Pataca", 2),
+    ("MRU", "Mauritanian Ouguiya", 2),
+    ("MUR", "Mauritian Rupee", 2),
+    ("MVR", "Maldivian Rufiyaa", 2),
+    ("MWK", "Malawian Kwacha", 2),
+    ("MXN", "Mexican Peso", 2),
+    ("MYR", "Malaysian Ringgit", 2),
+    ("MZN", "Mozambican Metical", 2),
+    ("NAD", "Namibian Dollar", 2),
+    ("NGN", "Nigerian Naira", 2),
+    ("NIO", "Nicaraguan Cordoba", 2),
+    ("NOK", "Norwegian Krone", 2),
+    ("NPR", "Nepalese Rupee", 2),
+    ("NZD", "New Zealand Dollar", 2),
+    ("OMR", "Omani Rial", 3),
+    ("PAB", "Panamanian Balboa", 2),
+    ("PEN", "Peruvian Sol", 2),
+    ("PGK", "Papua New Guinean Kina", 2),
+    ("PHP", "Philippine Peso", 2),
+    ("PKR", "Pakistani Rupee", 2),
+    ("PLN", "Polish Zloty", 2),
+    ("PYG", "Paraguayan Guarani", 0),
+    ("QAR", "Qatari Riyal", 2),
+    ("RON", "Romanian Leu", 2),
+    ("RSD", "Serbian Dinar", 2),
+    ("RUB", "Russian Ruble", 2),
+    ("RWF", "Rwandan Franc", 0),
+    ("SAR", "Saudi Riyal", 2),
+    ("SBD", "Solomon Islands Dollar", 2),
+    ("SCR", "Seychellois Rupee", 2),
+    ("SDG", "Sudanese Pound", 2),
+    ("SEK", "Swedish Krona", 2),
+    ("SGD", "Singapore Dollar", 2),
+    ("SHP", "Saint Helena Pound", 2),
+    ("SLE", "Sierra Leonean Leone", 2),
+    ("SOS", "Somali Shilling", 2),
+    ("SRD", "Surinamese Dollar", 2),
+    ("SSP", "South Sudanese Pound", 2),
+    ("STN", "Sao Tome and Principe Dobra", 2),
+    ("SVC", "Salvadoran Colon", 2),
+    ("SYP", "Syrian Pound", 2),
+    ("SZL", "Swazi Lilangeni", 2),
+    ("THB", "Thai Baht", 2),
+    ("TJS", "Tajikistani Somoni", 2),
+    ("TMT", "Turkmenistani Manat", 2),
+    ("TND", "Tunisian Dinar", 3),
+    ("TOP", "Tongan Pa'anga", 2),
+    ("TRY", "Turkish Lira", 2),
+    ("TTD", "Trinidad and Tobago Dollar", 2),
+    ("TWD", "New Taiwan Dollar", 2),
+    ("TZS", "Tanzanian Shilling", 2),
+    ("UAH", "Ukrainian Hryvnia", 2),
+    ("UGX", "Ugandan Shilling", 0),
+    ("USD", "US Dollar", 2),
+    ("UYU", "Uruguayan Peso", 2),
+    ("UZS", "Uzbekistani Som", 2),
+    ("VES", "Venezuelan Bolivar", 2),
+    ("VND", "Vietnamese Dong", 0),
+    ("VUV", "Vanuatu Vatu", 0),
+    ("WST", "Samoan Tala", 2),
+    ("XAF", "Central African CFA Franc", 0),
+    ("XCD", "East Caribbean Dollar", 2),
+    ("XOF", "West African CFA Franc", 0),
+    ("XPF", "CFP Franc", 0),
+    ("YER", "Yemeni Rial", 2),
+    ("ZAR", "South African Rand", 2),
+    ("ZMW", "Zambian Kwacha", 2),
+    ("ZWL", "Zimbabwean Dollar", 2),
+)
+
+# Precision of currencies missing from the table
+DEFAULT_PRECISION = 2
+
+
+def _quantizer(precision: int) -> Decimal:
+    return Decimal(1).scaleb(-precision)
+
+
+# Immutable table built once at import, quantizers included
+CURRENCIES: Mapping[str, CurrencyInfo] = MappingProxyType({
+    code: CurrencyInfo(code, name, precision, _quantizer(precision)) for code, name, precision in _ISO_4217
+})
+
+# Currency names by code
+CURRENCY_CODES: Mapping[str, str] = MappingProxyType({code: info.name for code, info in CURRENCIES.items()})
+
+_DEFAULT_QUANTIZER = _quantizer(DEFAULT_PRECISION)
+
+# Amount strings Decimal parses exactly as parse_currency_amount would
+_PLAIN_AMOUNT = re.compile(r"-?\d+(?:\.\d+)?")
+
+
+def get_currency_info(currency_code: Optional[str]) -> Optional[CurrencyInfo]:
+    """
+    Get ISO 4217 metadata for a currency
+
+    Args:
+        currency_code: Currency code (any case)
+
+    Returns:
+        Currency metadata or None if the code is unknown
+    """
+    if not currency_code:
+        return None
+    info = CURRENCIES.get(currency_code)
+    if info is None:
+        info = CURRENCIES.get(currency_code.upper())
+    return info
 
 
 def is_valid_currency_code(currency_code: str) -> bool:
@@ -151,10 +335,39 @@ def parse_currency_amount(amount_str: str) -> Optional[Decimal]:
     
     try:
         return Decimal(cleaned)
-    except (ValueError, TypeError):
+    except (ValueError, TypeError, InvalidOperation):
         return None
 
 
+def parse_currency_amounts(values: Iterable[Any]) -> List[Optional[Decimal]]:
+    """
+    Parse a column of amounts to Decimals
+
+    Plain numeric strings like "15.00", which most PMS rate columns hold,
+    are handed to Decimal directly; anything with symbols or separators
+    goes through parse_currency_amount.
+
+    Args:
+        values: Amount strings (numbers and Decimals are accepted as-is)
+
+    Returns:
+        Parsed amounts, None where parsing fails
+    """
+    match = _PLAIN_AMOUNT.fullmatch
+    amounts: List[Optional[Decimal]] = []
+    append = amounts.append
+    for value in values:
+        if isinstance(value, str):
+            append(Decimal(value) if match(value) else parse_currency_amount(value))
+        elif isinstance(value, Decimal):
+            append(value)
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            append(_to_amount(value))
+        else:
+            append(None)
+    return amounts
+
+
 def normalize_currency_code(currency_code: str) -> str:
     """
     Normalize currency code to uppercase
@@ -175,40 +388,75 @@ def normalize_currency_code(currency_code: str) -> str:
 def get_currency_precision(currency_code: str) -> int:
     """
     Get decimal precision for currency
-    
+
     Args:
         currency_code: Currency code
-        
+
     Returns:
-        Number of decimal places
+        ISO 4217 minor units (2 for unknown currencies)
     """
-    # Most currencies use 2 decimal places
-    # Some like JPY typically use 0
-    if currency_code.upper() in ["JPY", "KRW"]:
-        return 0
-    else:
-        return 2
+    info = get_currency_info(currency_code)
+    return info.precision if info is not None else DEFAULT_PRECISION
+
+
+def _quantizer_for(currency_code: Optional[str]) -> Decimal:
+    info = get_currency_info(currency_code)
+    return info.quantizer if info is not None else _DEFAULT_QUANTIZER
+
+
+def _to_amount(amount: Any) -> Decimal:
+    """Decimal of an amount (anything unsupported counts as zero)"""
+    if isinstance(amount, Decimal):
+        return amount
+    if isinstance(amount, str):
+        return Decimal(amount)
+    if isinstance(amount, float):
+        return Decimal(str(amount))
+    if isinstance(amount, int) and not isinstance(amount, bool):
+        return Decimal(amount)
+    return Decimal('0')
 
 
 def round_currency(amount: Union[float, Decimal], currency_code: str = "USD") -> Decimal:
     """
     Round amount to appropriate precision for currency
-    
+
     Args:
         amount: Amount to round
         currency_code: Currency code
-        
+
     Returns:
         Rounded amount
     """
-    if isinstance(amount, float):
-        amount = Decimal(str(amount))
-    elif isinstance(amount, str):
-        amount = Decimal(amount)
-    elif not isinstance(amount, Decimal):
-        amount = Decimal('0')
-    
-    precision = get_currency_precision(currency_code)
-    decimal_places = Decimal('0.' + '0' * precision)
-    
-    return amount.quantize(decimal_places, rounding=ROUND_HALF_UP) 
\ No newline at end of file
+    return _to_amount(amount).quantize(_quantizer_for(currency_code), rounding=ROUND_HALF_UP)
+
+
+def round_currency_many(
+    amounts: Iterable[Union[float, Decimal, str]],
+    currency_code: Union[str, Sequence[Optional[str]], None] = "USD"
+) -> List[Decimal]:
+    """
+    Round a column of amounts to their currencies' precision
+
+    Args:
+        amounts: Amounts to round
+        currency_code: One currency code for every amount, or one per amount
+
+    Returns:
+        Rounded amounts
+
+    Raises:
+        decimal.InvalidOperation: If an amount string is not a number
+    """
+    if currency_code is None or isinstance(currency_code, str):
+        quantizer = _quantizer_for(currency_code)
+        return [_to_amount(amount).quantize(quantizer, rounding=ROUND_HALF_UP) for amount in amounts]
+
+    quantizers: Dict[Optional[str], Decimal] = {}
+    rounded = []
+    for amount, code in zip(amounts, currency_code):
+        quantizer = quantizers.get(code)
+        if quantizer is None:
+            quantizer = quantizers[code] = _quantizer_for(code)
+        rounded.append(_to_amount(amount).quantize(quantizer, rounding=ROUND_HALF_UP))
+    return rounded
@@ -3,9 +3,92 @@ Date utility functions for RGBridge PMS Integration Platform
 """
 
 from datetime import datetime, date
-from typing import Optional, Union
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+import bisect
+import itertools
 import re
 
+# A day range with the days of week (Mon..Sun) it applies to; None means every day
+OrdinalRange = Tuple[int, int, Optional[Tuple[bool, ...]]]
+
+
+# Date formats tried in order when a value's format is unknown
+DATE_FORMATS: Dict[str, str] = {
+    "iso": "%Y-%m-%d",                    # 2025-11-08
+    "eu": "%d/%m/%Y",                     # 08/11/2025
+    "us": "%m/%d/%Y",                     # 11/08/2025
+    "iso_datetime": "%Y-%m-%dT%H:%M:%S",  # 2025-11-08T10:30:00
+    "iso_datetime_z": "%Y-%m-%dT%H:%M:%SZ",  # 2025-11-08T10:30:00Z
+    "eu_dash": "%d-%m-%Y",                # 08-11-2025
+    "us_dash": "%m-%d-%Y",                # 11-08-2025
+}
+
+# Values inspected to detect the format of a column
+DETECT_SAMPLE_SIZE = 64
+
+
+def _parse_iso(value: str) -> date:
+    if len(value) != 10 or value[4] != "-" or value[7] != "-":
+        raise ValueError(f"Not an ISO date: {value!r}")
+    return date.fromisoformat(value)
+
+
+def _parse_iso_datetime(value: str) -> date:
+    if len(value) != 19 or value[10] != "T":
+        raise ValueError(f"Not an ISO datetime: {value!r}")
+    return datetime.fromisoformat(value).date()
+
+
+def _parse_iso_datetime_z(value: str) -> date:
+    if not value.endswith("Z"):
+        raise ValueError(f"Not an ISO datetime: {value!r}")
+    return _parse_iso_datetime(value[:-1])
+
+
+def _numeric_parser(separator: str, day_first: bool) -> Callable[[str], date]:
+    """Parser for dd/mm/yyyy-style formats, accepting unpadded days and months like strptime"""
+    def parse(value: str) -> date:
+        parts = value.split(separator)
+        if len(parts) != 3 or len(parts[2]) != 4 or not all(0 < len(part) <= 2 for part in parts[:2]):
+            raise ValueError(f"Date {value!r} does not match the format")
+        if not all(part.isdigit() for part in parts):
+            raise ValueError(f"Date {value!r} does not match the format")
+        first, second, year = map(int, parts)
+        return date(year, second, first) if day_first else date(year, first, second)
+    return parse
+
+
+# Fixed-format parsers accepting a subset of what the strptime format accepts
+_FAST_PARSERS: Dict[str, Callable[[str], date]] = {
+    "iso": _parse_iso,
+    "eu": _numeric_parser("/", day_first=True),
+    "us": _numeric_parser("/", day_first=False),
+    "iso_datetime": _parse_iso_datetime,
+    "iso_datetime_z": _parse_iso_datetime_z,
+    "eu_dash": _numeric_parser("-", day_first=True),
+    "us_dash": _numeric_parser("-", day_first=False),
+}
+
+
+def _parse_with_format(value: str, format_name: str) -> date:
+    """
+    Parse a date in a named format
+
+    Raises:
+        ValueError: If the value does not match the format
+    """
+    try:
+        return _FAST_PARSERS[format_name](value)
+    except ValueError:
+        return datetime.strptime(value, DATE_FORMATS[format_name]).date()
+
+
+def _format_order(format_hint: Optional[str]) -> List[str]:
+    """Format names in the order they are tried, the hinted one first"""
+    if format_hint in DATE_FORMATS:
+        return [format_hint] + [name for name in DATE_FORMATS if name != format_hint]
+    return list(DATE_FORMATS)
+
 
 def parse_date(date_str: str, format_hint: Optional[str] = None) -> Optional[date]:
     """
@@ -13,7 +96,7 @@ def parse_date(date_str: str, format_hint: Optional[str] = None) -> Optional[dat
     
     Args:
         date_str: Date string to parse
-        format_hint: Optional format hint (e.g., 'iso', 'us', 'eu')
+        format_hint: Optional format hint (e.g., 'iso', 'us', 'eu'), tried first
         
     Returns:
         Parsed date or None if parsing fails
@@ -21,22 +104,10 @@ def parse_date(date_str: str, format_hint: Optional[str] = None) -> Optional[dat
     if not date_str:
         return None
     
-    # Common date formats
-    formats = [
-        "%Y-%m-%d",           # ISO format: 2025-11-08
-        "%d/%m/%Y",           # EU format: 08/11/2025
-        "%m/%d/%Y",           # US format: 11/08/2025
-        "%Y-%m-%dT%H:%M:%S",  # ISO datetime: 2025-11-08T10:30:00
-        "%Y-%m-%dT%H:%M:%SZ", # ISO datetime with Z: 2025-11-08T10:30:00Z
-        "%d-%m-%Y",           # EU with dashes: 08-11-2025
-        "%m-%d-%Y",           # US with dashes: 11-08-2025
-    ]
-    
     # Try parsing with different formats
-    for fmt in formats:
+    for format_name in _format_order(format_hint):
         try:
-            parsed = datetime.strptime(date_str, fmt)
-            return parsed.date()
+            return _parse_with_format(date_str, format_name)
         except ValueError:
             continue
     
@@ -50,6 +121,152 @@ def parse_date(date_str: str, format_hint: Optional[str] = None) -> Optional[dat
     return None
 
 
+def detect_date_format(
+    values: Iterable[Any],
+    format_hint: Optional[str] = None,
+    sample_size: Optional[int] = DETECT_SAMPLE_SIZE
+) -> Optional[str]:
+    """
+    Detect the format of a column of date strings
+
+    Formats are ruled out by the values they cannot parse, so a column
+    holding 25/11/2025 is day-first even if its first values are ambiguous.
+    Formats still ambiguous after the sample are resolved by format_hint,
+    then by the order of DATE_FORMATS.
+
+    Args:
+        values: Date strings (None, empty values and date objects are skipped)
+        format_hint: Preferred format when several match
+        sample_size: Values inspected (None inspects all of them)
+
+    Returns:
+        Format name, or None if no single format parses the sampled values
+    """
+    candidates = _format_order(format_hint)
+    sample = itertools.islice((value for value in values if value and isinstance(value, str)), sample_size)
+    for value in sample:
+        remaining = []
+        for format_name in candidates:
+            try:
+                _parse_with_format(value, format_name)
+            except ValueError:
+                continue
+            remaining.append(format_name)
+        candidates = remaining
+        if not candidates:
+            return None
+    return candidates[0]
+
+
+class DateFormatCache:
+    """
+    Detected date format per field, e.g. per PMS mapping field
+
+    Keys identify one field of one PMS mapping (and its format hint), so
+    formats never carry over between fields or PMSs. A field's format is
+    detected from its first column of values and reused for later ones; a
+    column with a value that no longer matches it is re-detected as a whole.
+    """
+
+    def __init__(self, max_entries: int = 4096):
+        """
+        Initialize date format cache
+
+        Args:
+            max_entries: Fields remembered before the cache is reset
+        """
+        self._formats: Dict[str, Optional[str]] = {}
+        self._max_entries = max_entries
+
+    def get(self, key: str) -> Optional[str]:
+        return self._formats.get(key)
+
+    def set(self, key: str, format_name: Optional[str]) -> None:
+        if len(self._formats) >= self._max_entries:
+            self._formats.clear()
+        self._formats[key] = format_name
+
+    def discard(self, key: str) -> None:
+        self._formats.pop(key, None)
+
+    def clear(self) -> None:
+        self._formats.clear()
+
+    def __len__(self) -> int:
+        return len(self._formats)
+
+
+# Singleton cache shared by the conversions
+date_format_cache = DateFormatCache()
+
+
+def _parse_column(values: Sequence[Any], format_name: str) -> Optional[List[Optional[date]]]:
+    """Parse every value of a column in one format, None if a value does not match it"""
+    fast_parse = _FAST_PARSERS[format_name]
+    parsed: List[Optional[date]] = []
+    for value in values:
+        if not value:
+            parsed.append(None)
+        elif isinstance(value, datetime):
+            parsed.append(value.date())
+        elif isinstance(value, date):
+            parsed.append(value)
+        else:
+            try:
+                parsed.append(fast_parse(str(value)))
+            except ValueError:
+                try:
+                    parsed.append(_parse_with_format(str(value), format_name))
+                except ValueError:
+                    return None
+    return parsed
+
+
+def parse_dates(
+    values: Sequence[Any],
+    format_hint: Optional[str] = None,
+    cache_key: Optional[str] = None
+) -> List[Optional[date]]:
+    """
+    Parse a column of dates, detecting their format once
+
+    The format is taken from the cache (or detected from a sample and
+    cached) and every value is parsed with that format's fixed fast path.
+    If a value does not match it, the format is re-detected from the whole
+    column, so a column is never parsed in a mix of formats. Only a column
+    that no single format parses falls back to parse_date per value.
+
+    Args:
+        values: Date strings, dates or datetimes (None and empty values give None)
+        format_hint: Preferred format when the column is ambiguous
+        cache_key: Field the values belong to (e.g. PMS mapping and field), for
+            reusing its detected format
+
+    Returns:
+        Parsed dates (None where parsing failed)
+    """
+    if cache_key and format_hint:
+        cache_key = f"{cache_key}|{format_hint}"
+    format_name = date_format_cache.get(cache_key) if cache_key else None
+    if format_name is None:
+        format_name = detect_date_format(values, format_hint)
+    parsed = _parse_column(values, format_name) if format_name else None
+    if parsed is None:
+        format_name = detect_date_format(values, format_hint, sample_size=None)
+        parsed = _parse_column(values, format_name) if format_name else None
+    if parsed is None:
+        if cache_key:
+            date_format_cache.discard(cache_key)
+        return [
+            value.date() if isinstance(value, datetime) else value if isinstance(value, date)
+            else parse_date(str(value), format_hint) if value else None
+            for value in values
+        ]
+    if cache_key:
+        date_format_cache.set(cache_key, format_name)
+    return parsed
+
+
 def format_date(date_obj: Union[date, datetime], format_type: str = "iso") -> str:
     """
     Format date object to string
@@ -154,4 +371,110 @@ def get_date_difference(start_date: date, end_date: date) -> int:
     Returns:
         Number of days
     """
-    return (end_date - start_date).days 
\ No newline at end of file
+    return (end_date - start_date).days 
+
+
+def date_to_ordinal(value: Any) -> Optional[int]:
+    """
+    Get the proleptic Gregorian ordinal of an ISO date
+
+    Args:
+        value: date, datetime or ISO string (a time part is ignored)
+
+    Returns:
+        Day ordinal or None if the value is not an ISO date
+    """
+    if isinstance(value, datetime):
+        return value.date().toordinal()
+    if isinstance(value, date):
+        return value.toordinal()
+    try:
+        return date.fromisoformat(str(value)[:10]).toordinal()
+    except ValueError:
+        return None
+
+
+def ordinal_weekday(ordinal: int) -> int:
+    """
+    Get the day of week of a day ordinal
+
+    Args:
+        ordinal: Day ordinal
+
+    Returns:
+        Day of week (Monday is 0)
+    """
+    # Ordinal 1 (0001-01-01) is a Monday
+    return (ordinal - 1) % 7
+
+
+def expand_date_range(start: int, end: int, weekdays: Optional[Sequence[bool]] = None) -> Sequence[int]:
+    """
+    Expand an inclusive range of day ordinals to its days
+
+    Args:
+        start: First day ordinal
+        end: Last day ordinal
+        weekdays: Seven Mon..Sun flags limiting the days (None for every day)
+
+    Returns:
+        Day ordinals in the range (a range object when every day applies)
+    """
+    if weekdays is None or all(weekdays):
+        return range(start, end + 1)
+    return [day for day in range(start, end + 1) if weekdays[(day - 1) % 7]]
+
+
+def compress_ordinals(days: Iterable[int], weekdays: bool = False) -> List[OrdinalRange]:
+    """
+    Compress day ordinals into maximal ranges
+
+    Without weekdays, consecutive days form a range. With weekdays, a range
+    may also skip the same days of every week (e.g. weekends only), as long
+    as it covers exactly the given days; ranges are grown greedily from the
+    earliest day.
+
+    Args:
+        days: Day ordinals (any order, duplicates allowed)
+        weekdays: Whether ranges may carry day-of-week flags
+
+    Returns:
+        List of (start, end, weekday flags or None) in date order
+    """
+    ordered = sorted(set(days))
+    if not ordered:
+        return []
+    ranges: List[OrdinalRange] = []
+    if not weekdays:
+        start = previous = ordered[0]
+        for day in ordered[1:]:
+            if day != previous + 1:
+                ranges.append((start, previous, None))
+                start = day
+            previous = day
+        ranges.append((start, previous, None))
+        return ranges
+
+    present = set(ordered)
+    last = ordered[-1]
+    index = 0
+    while index < len(ordered):
+        start = end = ordered[index]
+        # Whether each day of week is in the range, decided by its first occurrence
+        decided: List[Optional[bool]] = [None] * 7
+        day = start
+        while day <= last:
+            weekday = (day - 1) % 7
+            inside = day in present
+            if decided[weekday] is None:
+                decided[weekday] = inside
+            elif decided[weekday] != inside:
+                break
+            if inside:
+                end = day
+            day += 1
+        next_index = bisect.bisect_right(ordered, end, index)
+        contiguous = next_index - index == end - start + 1
+        ranges.append((start, end, None if contiguous else tuple(bool(flag) for flag in decided)))
+        index = next_index
+    return ranges
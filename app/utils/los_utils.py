@@ -1,12 +1,249 @@
 """
 Length of Stay (LOS) utility functions for RGBridge PMS Integration Platform
+
+Patterns are parsed once into interned LOSPattern values backed by an int
+bitmask, so the same pattern repeated across thousands of rows costs a
+cache lookup instead of a regex pass and a fresh day dictionary.
 """
 
-from typing import List, Dict, Optional, Union
+from functools import lru_cache
+from typing import Any, Dict, Iterator, List, Tuple, Union
 import re
 
+DAYS = ('Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun')
+_DAY_INDEX = {day: index for index, day in enumerate(DAYS)}
+
+# Patterns up to this many positions are interned (at most 2**9 - 2 instances)
+INTERN_MAX_LENGTH = 8
+
+_BINARY_RE = re.compile(r'[01]+')
+_TRUE_FALSE_RE = re.compile(r'[TFtf]+')
+_YES_NO_RE = re.compile(r'[YNyn]+')
+_NON_NUMERIC_RE = re.compile(r'[^\d\s,]')
+_SEPARATOR_RE = re.compile(r'[\s,]+')
+_TRUE_FALSE = str.maketrans('TtFf', '1100')
+_YES_NO = str.maketrans('YyNn', '1100')
+
 
-def convert_los_to_binary_pattern(los_pattern: Union[str, List[bool], List[int]]) -> str:
+class LOSPattern:
+    """
+    Immutable LOS pattern, e.g. FullPatternLOS "10001111"
+
+    Bit i of `bits` is set when position i (counted from the left) is open;
+    `length` keeps trailing closed positions. Create patterns with parse(),
+    from_binary() or from_days(): short patterns are interned, so equal
+    patterns are the same object.
+    """
+
+    __slots__ = ("bits", "length", "text")
+
+    def __init__(self, bits: int, length: int):
+        """
+        Initialize pattern (use from_bits() to get interned instances)
+
+        Args:
+            bits: Open positions, bit 0 being the first position
+            length: Number of positions
+        """
+        if length < 0 or bits < 0 or bits >> length:
+            raise ValueError(f"Invalid LOS pattern bits {bits:#b} for length {length}")
+        object.__setattr__(self, "bits", bits)
+        object.__setattr__(self, "length", length)
+        object.__setattr__(self, "text", ''.join('1' if bits >> index & 1 else '0' for index in range(length)))
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        raise AttributeError("LOSPattern is immutable")
+
+    @classmethod
+    def from_bits(cls, bits: int, length: int) -> "LOSPattern":
+        """Pattern with the given open positions, interned when short"""
+        if length > INTERN_MAX_LENGTH:
+            return cls(bits, length)
+        key = (bits, length)
+        pattern = _INTERNED.get(key)
+        if pattern is None:
+            pattern = _INTERNED.setdefault(key, cls(bits, length))
+        return pattern
+
+    @classmethod
+    def from_binary(cls, text: str) -> "LOSPattern":
+        """
+        Pattern from a binary string
+
+        Args:
+            text: String of '0' and '1'
+
+        Raises:
+            ValueError: If the string is not binary
+        """
+        if not _BINARY_RE.fullmatch(text):
+            raise ValueError(f"Not a binary LOS pattern: {text!r}")
+        # int() reads the most significant digit first, i.e. the last position
+        return cls.from_bits(int(text[::-1], 2), len(text))
+
+    @classmethod
+    def from_days(cls, days: Union[Dict[str, Any], List[str], Tuple[str, ...]]) -> "LOSPattern":
+        """
+        Seven-day pattern from a day dictionary or a list of open day names
+
+        Args:
+            days: {'Mon': True, ...} or ['Mon', 'Fri', ...]
+        """
+        if isinstance(days, dict):
+            days = [day for day, available in days.items() if available]
+        bits = 0
+        for day in days:
+            index = _DAY_INDEX.get(day)
+            if index is not None:
+                bits |= 1 << index
+        return cls.from_bits(bits, len(DAYS))
+
+    @classmethod
+    def parse(cls, value: Any) -> "LOSPattern":
+        """
+        Parse a pattern from any supported format
+
+        Binary, T/F and Y/N strings, separated counts ("1, 0, 0, 1, 1, 1, 1"),
+        lists of bools or ints and day dictionaries are accepted; anything
+        else is read as all days open. Strings are parsed once and cached.
+
+        Args:
+            value: LOS pattern in any supported format
+
+        Returns:
+            Parsed pattern
+
+        Raises:
+            ValueError: If a separated count is not a number
+        """
+        if isinstance(value, LOSPattern):
+            return value
+        if isinstance(value, str):
+            return _parse_string(value)
+        if isinstance(value, dict):
+            return cls.from_days(value)
+        if isinstance(value, (list, tuple)):
+            if all(isinstance(item, bool) for item in value):
+                return cls.from_flags(value[:7])
+            if all(isinstance(item, int) for item in value):
+                return cls.from_flags([item > 0 for item in value[:7]])
+        return ALL_DAYS_OPEN
+
+    @classmethod
+    def from_flags(cls, flags: Union[List[Any], Tuple[Any, ...]]) -> "LOSPattern":
+        """Pattern with position i open when flags[i] is truthy"""
+        bits = 0
+        for index, flag in enumerate(flags):
+            if flag:
+                bits |= 1 << index
+        return cls.from_bits(bits, len(flags))
+
+    @property
+    def full_pattern_los(self) -> str:
+        """FullPatternLOS attribute value"""
+        return self.text
+
+    def is_open(self, position: int) -> bool:
+        """Whether a position (0-based) is open; positions past the end are closed"""
+        return 0 <= position < self.length and bool(self.bits >> position & 1)
+
+    def is_day_available(self, day: str) -> bool:
+        """Whether a day (Mon..Sun) is open"""
+        index = _DAY_INDEX.get(day)
+        return index is not None and self.is_open(index)
+
+    def open_days(self) -> List[str]:
+        """Names of the open days"""
+        return [day for index, day in enumerate(DAYS) if self.is_open(index)]
+
+    def closed_days(self) -> List[str]:
+        """Names of the closed days"""
+        return [day for index, day in enumerate(DAYS) if not self.is_open(index)]
+
+    def to_days(self) -> Dict[str, bool]:
+        """Day dictionary, e.g. {'Mon': True, 'Tue': False, ...}"""
+        return {day: self.is_open(index) for index, day in enumerate(DAYS)}
+
+    def count(self) -> int:
+        """Number of open positions"""
+        return bin(self.bits).count('1')
+
+    def _combine(self, other: Any, combine) -> "LOSPattern":
+        if not isinstance(other, LOSPattern):
+            return NotImplemented
+        length = max(self.length, other.length)
+        return LOSPattern.from_bits(combine(self.bits, other.bits), length)
+
+    def __and__(self, other: "LOSPattern") -> "LOSPattern":
+        return self._combine(other, lambda a, b: a & b)
+
+    def __or__(self, other: "LOSPattern") -> "LOSPattern":
+        return self._combine(other, lambda a, b: a | b)
+
+    def __xor__(self, other: "LOSPattern") -> "LOSPattern":
+        return self._combine(other, lambda a, b: a ^ b)
+
+    def __sub__(self, other: "LOSPattern") -> "LOSPattern":
+        return self._combine(other, lambda a, b: a & ~b)
+
+    def __invert__(self) -> "LOSPattern":
+        return LOSPattern.from_bits(~self.bits & ((1 << self.length) - 1), self.length)
+
+    def __getitem__(self, position: int) -> bool:
+        if not -self.length <= position < self.length:
+            raise IndexError("LOS pattern position out of range")
+        return self.is_open(position % self.length)
+
+    def __iter__(self) -> Iterator[bool]:
+        return (self.is_open(index) for index in range(self.length))
+
+    def __len__(self) -> int:
+        return self.length
+
+    def __bool__(self) -> bool:
+        return self.length > 0
+
+    def __eq__(self, other: Any) -> bool:
+        if self is other:
+            return True
+        if isinstance(other, LOSPattern):
+            return self.bits == other.bits and self.length == other.length
+        return NotImplemented
+
+    def __hash__(self) -> int:
+        return hash((self.bits, self.length))
+
+    def __str__(self) -> str:
+        return self.text
+
+    def __repr__(self) -> str:
+        return f"LOSPattern({self.text!r})"
+
+    def __reduce__(self):
+        return LOSPattern.from_bits, (self.bits, self.length)
+
+
+_INTERNED: Dict[Tuple[int, int], LOSPattern] = {}
+
+ALL_DAYS_OPEN = LOSPattern.from_bits(0b1111111, 7)
+
+
+@lru_cache(maxsize=4096)
+def _parse_string(los_pattern: str) -> LOSPattern:
+    if _BINARY_RE.fullmatch(los_pattern):
+        return LOSPattern.from_binary(los_pattern)
+    if _TRUE_FALSE_RE.fullmatch(los_pattern):
+        return LOSPattern.from_binary(los_pattern.translate(_TRUE_FALSE))
+    if _YES_NO_RE.fullmatch(los_pattern):
+        return LOSPattern.from_binary(los_pattern.translate(_YES_NO))
+    # Try to parse as comma-separated or space-separated counts
+    parts = _SEPARATOR_RE.split(_NON_NUMERIC_RE.sub('', los_pattern))
+    if len(parts) >= 7:
+        return LOSPattern.from_flags([int(part) > 0 for part in parts[:7]])
+    return ALL_DAYS_OPEN
+
+
+def convert_los_to_binary_pattern(los_pattern: Union[str, List[bool], List[int], LOSPattern]) -> str:
     """
     Convert LOS pattern to RGBridge binary format (e.g., "10001111")
     
@@ -16,35 +253,7 @@ def convert_los_to_binary_pattern(los_pattern: Union[str, List[bool], List[int]]
     Returns:
         Binary pattern string
     """
-    if isinstance(los_pattern, str):
-        # Handle string formats
-        if re.match(r'^[01]+$', los_pattern):
-            # Already binary
-            return los_pattern
-        elif re.match(r'^[TFtf]+$', los_pattern):
-            # True/False format
-            return ''.join('1' if c.upper() == 'T' else '0' for c in los_pattern)
-        elif re.match(r'^[YNyn]+$', los_pattern):
-            # Yes/No format
-            return ''.join('1' if c.upper() == 'Y' else '0' for c in los_pattern)
-        else:
-            # Try to parse as comma-separated or space-separated
-            pattern = re.sub(r'[^\d\s,]', '', los_pattern)
-            parts = re.split(r'[\s,]+', pattern)
-            if len(parts) >= 7:
-                return ''.join('1' if int(p) > 0 else '0' for p in parts[:7])
-    
-    elif isinstance(los_pattern, list):
-        # Handle list formats
-        if all(isinstance(x, bool) for x in los_pattern):
-            # Boolean list
-            return ''.join('1' if x else '0' for x in los_pattern[:7])
-        elif all(isinstance(x, int) for x in los_pattern):
-            # Integer list
-            return ''.join('1' if x > 0 else '0' for x in los_pattern[:7])
-    
-    # Default pattern (all days available)
-    return "1111111"
+    return LOSPattern.parse(los_pattern).text
 
 
 def convert_binary_pattern_to_los(binary_pattern: str) -> Dict[str, bool]:
@@ -83,11 +292,7 @@ def parse_los_pattern(los_pattern: Union[str, List, Dict]) -> Dict[str, bool]:
         # Already in day format
         return los_pattern
     
-    # Convert to binary first
-    binary = convert_los_to_binary_pattern(los_pattern)
-    
-    # Convert to day format
-    return convert_binary_pattern_to_los(binary)
+    return LOSPattern.parse(los_pattern).to_days()
 
 
 def format_los_pattern(los_data: Union[str, List, Dict], format_type: str = "binary") -> str:
@@ -141,8 +346,9 @@ def get_available_days(los_pattern: Union[str, List, Dict]) -> List[str]:
     Returns:
         List of available day names
     """
-    days_dict = parse_los_pattern(los_pattern)
-    return [day for day, available in days_dict.items() if available]
+    if isinstance(los_pattern, dict):
+        return [day for day, available in los_pattern.items() if available]
+    return LOSPattern.parse(los_pattern).open_days()
 
 
 def get_unavailable_days(los_pattern: Union[str, List, Dict]) -> List[str]:
@@ -155,8 +361,9 @@ def get_unavailable_days(los_pattern: Union[str, List, Dict]) -> List[str]:
     Returns:
         List of unavailable day names
     """
-    days_dict = parse_los_pattern(los_pattern)
-    return [day for day, available in days_dict.items() if not available]
+    if isinstance(los_pattern, dict):
+        return [day for day, available in los_pattern.items() if not available]
+    return LOSPattern.parse(los_pattern).closed_days()
 
 
 def is_day_available(los_pattern: Union[str, List, Dict], day: str) -> bool:
@@ -170,8 +377,9 @@ def is_day_available(los_pattern: Union[str, List, Dict], day: str) -> bool:
     Returns:
         True if day is available
     """
-    days_dict = parse_los_pattern(los_pattern)
-    return days_dict.get(day, False)
+    if isinstance(los_pattern, dict):
+        return los_pattern.get(day, False)
+    return LOSPattern.parse(los_pattern).is_day_available(day)
 
 
 def create_los_pattern(available_days: List[str]) -> str:
@@ -184,10 +392,4 @@ def create_los_pattern(available_days: List[str]) -> str:
     Returns:
         Binary pattern string
     """
-    days = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun']
-    pattern = []
-    
-    for day in days:
-        pattern.append('1' if day in available_days else '0')
-    
-    return ''.join(pattern) 
\ No newline at end of file
+    return LOSPattern.from_days(available_days).text 
\ No newline at end of file
@@ -0,0 +1,76 @@
+"""
+Cold-start benchmark for the AWS Lambda handler
+
+Imports app.main in a fresh interpreter with ``python -X importtime`` and
+reports the cumulative import time of the slowest modules. Exits non-zero
+when the total exceeds the budget, so it can guard the Lambda cold path in CI.
+
+Usage:
+    python benchmarks/bench_cold_start.py [--budget-ms 1500] [--runs 3] [--top 15]
+"""
+
+import argparse
+import os
+import re
+import subprocess
+import sys
+from typing import Dict
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+# "import time:  self [us] | cumulative | imported package"
+_IMPORTTIME_RE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def measure_imports(module: str) -> Dict[str, int]:
+    """
+    Import a module in a fresh interpreter
+
+    Args:
+        module: Module to import
+
+    Returns:
+        Cumulative import time in microseconds of every module imported
+        directly by the interpreter or by the target module
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=REPO_ROOT, capture_output=True, text=True, check=True
+    )
+    timings = {}
+    for line in result.stderr.splitlines():
+        match = _IMPORTTIME_RE.match(line)
+        if match:
+            _, cumulative, indent, name = match.groups()
+            # Top-level imports have one leading space, their children more
+            if len(indent) <= 3:
+                timings[name] = int(cumulative)
+    return timings
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--module", default="app.main", help="Module to import (default: app.main)")
+    parser.add_argument("--budget-ms", type=float, default=1500.0, help="Maximum import time in milliseconds")
+    parser.add_argument("--runs", type=int, default=3, help="Runs to take the fastest of")
+    parser.add_argument("--top", type=int, default=15, help="Number of modules to report")
+    args = parser.parse_args()
+
+    runs = [measure_imports(args.module) for _ in range(args.runs)]
+    # Fastest run per module filters out noise from the machine
+    best = {name: min(run.get(name, 0) for run in runs) for name in runs[0]}
+    total_ms = best.get(args.module, 0) / 1000
+
+    print(f"{'module':<50} {'cumulative ms':>14}")
+    for name, micros in sorted(best.items(), key=lambda item: item[1], reverse=True)[:args.top]:
+        print(f"{name:<50} {micros / 1000:>14.1f}")
+    print(f"\nimport {args.module}: {total_ms:.1f} ms (budget {args.budget_ms:.0f} ms)")
+
+    if total_ms > args.budget_ms:
+        print("Cold start budget exceeded", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
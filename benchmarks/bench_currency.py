@@ -0,0 +1,92 @@
+"""
+Currency parsing and rounding benchmark
+
+Times the bulk helpers in app.utils.currency_utils against calling the
+per-value functions in a loop, and against the previous round_currency,
+which built its quantizer from a string on every call. Rates are synthetic
+PMS rate strings: mostly plain "123.45" values with some formatted ones.
+
+Usage:
+    python benchmarks/bench_currency.py [--rows 100000] [--repeat 5]
+"""
+
+import argparse
+import os
+import random
+import sys
+import timeit
+from decimal import Decimal, ROUND_HALF_UP
+from typing import Callable, Dict, List
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app.utils.currency_utils import (  # noqa: E402
+    parse_currency_amount, parse_currency_amounts, round_currency, round_currency_many
+)
+
+CURRENCY_MIX = ("USD", "EUR", "GBP", "JPY", "KWD")
+
+
+def _legacy_round_currency(amount: Decimal, currency_code: str = "USD") -> Decimal:
+    """round_currency as it was before the precomputed currency table"""
+    precision = 0 if currency_code.upper() in ["JPY", "KRW"] else 2
+    return amount.quantize(Decimal('0.' + '0' * precision), rounding=ROUND_HALF_UP)
+
+
+def generate_rates(rows: int, formatted_share: float = 0.1, seed: int = 42) -> List[str]:
+    """
+    Generate rate strings
+
+    Args:
+        rows: Number of rates
+        formatted_share: Fraction of rates with symbols or thousands separators
+        seed: Random seed
+
+    Returns:
+        Rate strings
+    """
+    rng = random.Random(seed)
+    rates = []
+    for _ in range(rows):
+        amount = rng.uniform(40, 2500)
+        if rng.random() < formatted_share:
+            rates.append(f"$ {amount:,.2f}")
+        else:
+            rates.append(f"{amount:.3f}")
+    return rates
+
+
+def best_of(func: Callable[[], object], repeat: int) -> float:
+    """Fastest of `repeat` runs in seconds"""
+    return min(timeit.repeat(func, number=1, repeat=repeat))
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=100_000, help="Rates per column")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs to take the fastest of")
+    args = parser.parse_args()
+
+    rates = generate_rates(args.rows)
+    amounts = parse_currency_amounts(rates)
+    codes = [CURRENCY_MIX[index % len(CURRENCY_MIX)] for index in range(args.rows)]
+
+    cases: Dict[str, Callable[[], object]] = {
+        "parse: parse_currency_amount loop": lambda: [parse_currency_amount(rate) for rate in rates],
+        "parse: parse_currency_amounts": lambda: parse_currency_amounts(rates),
+        "round: legacy round_currency loop": lambda: [
+            _legacy_round_currency(amount, code) for amount, code in zip(amounts, codes)
+        ],
+        "round: round_currency loop": lambda: [round_currency(amount, code) for amount, code in zip(amounts, codes)],
+        "round: round_currency_many": lambda: round_currency_many(amounts, codes),
+    }
+
+    print(f"{'case':<40} {'ms':>10} {'ns/value':>10}")
+    for name, func in cases.items():
+        seconds = best_of(func, args.repeat)
+        print(f"{name:<40} {seconds * 1000:>10.1f} {seconds * 1e9 / args.rows:>10.0f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
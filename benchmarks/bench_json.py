@@ -0,0 +1,85 @@
+"""
+JSON codec benchmark
+
+Times decoding a Cloudbeds ARIUpdate shaped like pms/cloudbeds/sample_message.json
+with its Inventory scaled to --rows items, and encoding a translation
+preview response for it, with every codec in app.core.json_codec.
+
+Usage:
+    python benchmarks/bench_json.py [--rows 10000] [--repeat 5]
+"""
+
+import argparse
+import json
+import os
+import sys
+import timeit
+from datetime import date, timedelta
+from typing import Any, Callable, Dict
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, REPO_ROOT)
+
+from app.core.json_codec import CODECS, get_codec  # noqa: E402
+
+SAMPLE_MESSAGE = os.path.join(REPO_ROOT, "pms", "cloudbeds", "sample_message.json")
+
+
+def scale_sample(rows: int) -> Dict[str, Any]:
+    """
+    Scale the sample message's Inventory to `rows` per-day items
+
+    Args:
+        rows: Inventory items
+
+    Returns:
+        Message with the sample's header fields
+    """
+    with open(SAMPLE_MESSAGE, encoding="utf-8") as f:
+        message = json.load(f)
+    templates = message["Inventory"]
+    start = date(2025, 1, 1)
+    inventory = []
+    for index in range(rows):
+        day = (start + timedelta(days=index % 365)).isoformat()
+        item = dict(templates[index % len(templates)], start_date=day, end_date=day)
+        item["ota_room_id"] = f"{item['ota_room_id']}-{index // 365}"
+        item["rate"] = f"{80 + index % 50}.00"
+        inventory.append(item)
+    message["Inventory"] = inventory
+    return message
+
+
+def best_of(func: Callable[[], object], repeat: int) -> float:
+    """Fastest of `repeat` runs in seconds"""
+    return min(timeit.repeat(func, number=1, repeat=repeat))
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=10_000, help="Inventory items")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs to take the fastest of")
+    args = parser.parse_args()
+
+    message = scale_sample(args.rows)
+    body = json.dumps(message).encode("utf-8")
+    preview = {
+        "rate": {"translated": message["Inventory"], "xml": "<OTA_HotelRateAmountNotifRQ/>", "valid": True},
+    }
+    print(f"Payload: {args.rows} Inventory items, {len(body) / 1e6:.1f} MB; default codec: {get_codec().name}")
+
+    cases: Dict[str, Callable[[], object]] = {}
+    for name, codec in CODECS.items():
+        cases[f"decode: {name}"] = lambda codec=codec: codec.loads(body)
+    for name, codec in CODECS.items():
+        cases[f"encode: {name}"] = lambda codec=codec: codec.dumps(preview)
+
+    print(f"{'case':<20} {'ms':>10} {'MB/s':>10}")
+    for name, func in cases.items():
+        seconds = best_of(func, args.repeat)
+        print(f"{name:<20} {seconds * 1000:>10.1f} {len(body) / 1e6 / seconds:>10.0f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,298 @@
+"""
+End-to-end pipeline benchmark on synthetic ARI payloads
+
+Times each stage of the PMS -> OTA pipeline on payloads from
+generate_ari.py: translation, building the OTA XML, XSD validation,
+checking rows against the constraints compiled from the XSD, the full
+document build (date-range compression included) and a TestClient
+round-trip through the API to a local stub of the internal API. Results
+can be saved as a JSON baseline and compared against a later run; the
+comparison exits non-zero when a case got slower than the threshold.
+
+Usage:
+    python benchmarks/bench_pipeline.py [--pms cloudbeds] [--hotels 1] [--room-types 10]
+        [--rate-plans 3] [--days 365] [--repeat 5] [--stages translate,build_xml,...]
+        [--save baseline.json] [--compare baseline.json] [--threshold 0.2]
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, REPO_ROOT)
+os.chdir(REPO_ROOT)
+
+from app.core.config import settings  # noqa: E402
+
+# Keep request logging and the log file out of the measurements
+settings.LOG_LEVEL = "ERROR"
+settings.LOG_FILE = ""
+# Every round-trip re-posts the same payload; measure processing, not replays
+settings.IDEMPOTENCY_TTL = 0
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+from app.core.pipeline import (  # noqa: E402
+    build_document, get_document_constraints, get_xsd_path, group_by_hotel, iter_translated
+)
+from app.core.xml_builder import build_avail_notif_xml, build_rate_amount_notif_xml  # noqa: E402
+from app.core.xsd_validator import validate_xml_with_xsd  # noqa: E402
+from app.main import app  # noqa: E402
+from app.plugins import plugin_registry  # noqa: E402
+from app.plugins.base import MessageType  # noqa: E402
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from generate_ari import PMS_CODES, generate  # noqa: E402
+
+STAGES = ("translate", "build_xml", "validate_xml", "check_rows", "document", "roundtrip")
+
+BUILDERS = {
+    MessageType.AVAILABILITY: build_avail_notif_xml,
+    MessageType.RATE: build_rate_amount_notif_xml,
+}
+
+
+class _AckHandler(BaseHTTPRequestHandler):
+    """Internal API stub acknowledging every post"""
+
+    protocol_version = "HTTP/1.1"
+    # Headers and body are written separately; don't let Nagle hold the body back
+    disable_nagle_algorithm = True
+
+    def do_POST(self) -> None:
+        if self.headers.get("Transfer-Encoding", "").lower() == "chunked":
+            while True:
+                size = int(self.rfile.readline().split(b";")[0], 16)
+                self.rfile.read(size + 2)
+                if size == 0:
+                    break
+        else:
+            self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        body = b"<Ack/>"
+        self.send_response(200)
+        self.send_header("Content-Type", "application/xml")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+
+def start_stub_upstream() -> ThreadingHTTPServer:
+    """
+    Start the internal API stub on a free local port
+
+    Returns:
+        Running server (call shutdown() to stop it)
+    """
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _AckHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def measure(func: Callable[[], Any], repeat: int) -> Dict[str, float]:
+    """
+    Time a case
+
+    Args:
+        func: Case to run
+        repeat: Number of timed runs (after one warm-up run)
+
+    Returns:
+        Fastest, median and mean run in seconds
+    """
+    func()
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return {"min": min(timings), "median": statistics.median(timings), "mean": statistics.fmean(timings)}
+
+
+def iter_cases(
+    pms_code: str,
+    messages: List[Dict[str, Any]],
+    stages: Tuple[str, ...],
+    client: Optional[TestClient]
+) -> Iterator[Tuple[str, int, Callable[[], Any]]]:
+    """
+    Yield the benchmark cases
+
+    Inputs of each stage are prepared from the previous stage up front, so a
+    case only times its own stage.
+
+    Args:
+        pms_code: PMS the messages are for
+        messages: Generated messages
+        stages: Stages to run
+        client: TestClient for the round-trip stage
+
+    Returns:
+        Iterator of (case name, rows processed, case)
+    """
+    translator = plugin_registry.create_translator(pms_code)
+    for message_type in (MessageType.AVAILABILITY, MessageType.RATE):
+        name = message_type.value
+        translate = lambda: [list(iter_translated(translator, message_type, message)) for message in messages]
+        by_hotel = group_by_hotel(row for rows in translate() for row in rows)
+        rows = sum(len(hotel_rows) for hotel_rows in by_hotel.values())
+        builder = BUILDERS[message_type]
+        xsd_path = get_xsd_path(message_type)
+        documents = [builder(hotel or "UNKNOWN", hotel_rows) for hotel, hotel_rows in by_hotel.items()]
+
+        if "translate" in stages:
+            yield f"{name}.translate", rows, translate
+        if "build_xml" in stages:
+            yield f"{name}.build_xml", rows, lambda: [
+                builder(hotel or "UNKNOWN", hotel_rows) for hotel, hotel_rows in by_hotel.items()
+            ]
+        if "validate_xml" in stages:
+            yield f"{name}.validate_xml", rows, lambda: [validate_xml_with_xsd(xml, xsd_path) for xml in documents]
+        constraints = get_document_constraints(message_type)
+        if "check_rows" in stages and constraints is not None:
+            yield f"{name}.check_rows", rows, lambda: [constraints.check_rows(hotel_rows) for hotel_rows in by_hotel.values()]
+        if "document" in stages:
+            yield f"{name}.document", rows, lambda: [
+                build_document(message_type, hotel or "UNKNOWN", hotel_rows, pms_code)
+                for hotel, hotel_rows in by_hotel.items()
+            ]
+        if "roundtrip" in stages and client is not None:
+            url = f"/api/v1/pms/{pms_code}?message_type={name}"
+
+            def roundtrip(url=url):
+                for message in messages:
+                    response = client.post(url, json=message)
+                    if response.status_code != 200:
+                        raise RuntimeError(f"{url} returned {response.status_code}: {response.text[:200]}")
+
+            yield f"{name}.roundtrip", rows, roundtrip
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> List[str]:
+    """
+    Compare results against a baseline
+
+    Args:
+        results: Results of this run
+        baseline: Saved results
+        threshold: Allowed slowdown of the fastest run, e.g. 0.2 for 20%
+
+    Returns:
+        Names of the cases that regressed
+    """
+    if baseline.get("params") != results["params"]:
+        print(f"Warning: baseline parameters differ: {baseline.get('params')}", file=sys.stderr)
+    regressions = []
+    print(f"\nAgainst {baseline.get('commit') or 'baseline'}:")
+    print(f"{'case':<28} {'baseline ms':>12} {'ms':>10} {'change':>8}")
+    for name, current in results["cases"].items():
+        previous = baseline.get("cases", {}).get(name)
+        if previous is None:
+            continue
+        ratio = current["min"] / previous["min"] if previous["min"] else 1.0
+        flag = ""
+        if ratio > 1 + threshold:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        print(f"{name:<28} {previous['min'] * 1000:>12.1f} {current['min'] * 1000:>10.1f} {ratio - 1:>+8.0%}{flag}")
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--pms", choices=PMS_CODES, default="cloudbeds", help="PMS format")
+    parser.add_argument("--hotels", type=int, default=1, help="Hotels")
+    parser.add_argument("--room-types", type=int, default=10, help="Room types per hotel")
+    parser.add_argument("--rate-plans", type=int, default=3, help="Rate plans per room type")
+    parser.add_argument("--days", type=int, default=365, help="Days covered")
+    parser.add_argument("--seed", type=int, default=42, help="Random seed")
+    parser.add_argument("--repeat", type=int, default=5, help="Timed runs per case")
+    parser.add_argument("--stages", default=",".join(STAGES), help=f"Comma-separated stages ({', '.join(STAGES)})")
+    parser.add_argument("--save", help="Write results to this JSON file")
+    parser.add_argument("--compare", help="Compare against a JSON file written by --save")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Slowdown reported as a regression")
+    args = parser.parse_args()
+
+    stages = tuple(stage.strip() for stage in args.stages.split(",") if stage.strip())
+    unknown = set(stages) - set(STAGES)
+    if unknown:
+        parser.error(f"Unknown stages: {', '.join(sorted(unknown))}")
+
+    params = {
+        "pms": args.pms, "hotels": args.hotels, "room_types": args.room_types,
+        "rate_plans": args.rate_plans, "days": args.days, "seed": args.seed
+    }
+    messages = generate(
+        args.pms, hotels=args.hotels, room_types=args.room_types, rate_plans=args.rate_plans,
+        days=args.days, seed=args.seed
+    )
+
+    upstream = None
+    client = None
+    if "roundtrip" in stages:
+        upstream = start_stub_upstream()
+        settings.INTERNAL_API_URL = f"http://127.0.0.1:{upstream.server_address[1]}"
+        client = TestClient(app)
+        client.__enter__()
+        if settings.API_KEYS:
+            client.headers[settings.API_KEY_HEADER] = settings.API_KEYS[0]
+
+    results = {
+        "commit": _git_commit(),
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "params": params,
+        "cases": {},
+    }
+    try:
+        print(f"{'case':<28} {'rows':>8} {'min ms':>10} {'median ms':>10} {'rows/s':>10}")
+        for name, rows, case in iter_cases(args.pms, messages, stages, client):
+            timing = measure(case, args.repeat)
+            results["cases"][name] = {"rows": rows, **timing}
+            rate = rows / timing["min"] if timing["min"] else 0
+            print(f"{name:<28} {rows:>8} {timing['min'] * 1000:>10.1f} {timing['median'] * 1000:>10.1f} {rate:>10.0f}")
+    finally:
+        if client is not None:
+            client.__exit__(None, None, None)
+        if upstream is not None:
+            upstream.shutdown()
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults saved to {args.save}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"{len(regressions)} case(s) slower than the baseline by more than {args.threshold:.0%}", file=sys.stderr)
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,193 @@
+"""
+Synthetic ARI payload generator for Cloudbeds and cb
+
+Builds per-day inventory feeds like the ones PMSs send after a bulk
+update: every room type and rate plan of every hotel gets one item per
+day, with rates following a weekly and seasonal curve and occasional
+closures, so payloads have realistic repetition for date-range compression.
+
+Usage:
+    python benchmarks/generate_ari.py [--pms cloudbeds] [--hotels 1] [--room-types 10]
+        [--rate-plans 3] [--days 365] [--start 2025-01-01] [--seed 42] [--output payload.json]
+"""
+
+import argparse
+import json
+import random
+import sys
+import uuid
+from datetime import date, timedelta
+from typing import Any, Dict, Iterator, List
+
+PMS_CODES = ("cloudbeds", "cb")
+
+
+def iter_inventory(
+    room_types: int,
+    rate_plans: int,
+    days: int,
+    start: date,
+    rng: random.Random
+) -> Iterator[Dict[str, Any]]:
+    """
+    Yield Cloudbeds-style inventory items, one per room type, rate plan and day
+
+    Args:
+        room_types: Room types per hotel
+        rate_plans: Rate plans per room type
+        days: Consecutive days starting at `start`
+        start: First day
+        rng: Random source
+
+    Returns:
+        Iterator of inventory items
+    """
+    for room in range(room_types):
+        base_rate = 60 + 25 * room
+        units = rng.randint(2, 20)
+        for plan in range(rate_plans):
+            discount = 1 - 0.1 * plan
+            for offset in range(days):
+                day = start + timedelta(days=offset)
+                weekend = day.weekday() >= 4
+                high_season = day.month in (6, 7, 8, 12)
+                rate = base_rate * discount * (1.2 if weekend else 1.0) * (1.3 if high_season else 1.0)
+                if rng.random() < 0.05:
+                    units = rng.randint(0, 20)
+                item = {
+                    "ota_room_id": f"R{room + 1:03d}",
+                    "ota_rate_id": f"P{plan + 1:02d}",
+                    "start_date": day.isoformat(),
+                    "end_date": day.isoformat(),
+                    "units": units,
+                    "rate": f"{rate:.2f}",
+                    "min_los": 2 if weekend else 1,
+                    "max_los": 14,
+                    "close": units == 0,
+                }
+                if plan == 0:
+                    item["rdef_single"] = f"{rate * 0.9:.2f}"
+                yield item
+
+
+def generate_cloudbeds(
+    hotels: int = 1,
+    room_types: int = 10,
+    rate_plans: int = 3,
+    days: int = 365,
+    start: date = date(2025, 1, 1),
+    seed: int = 42
+) -> List[Dict[str, Any]]:
+    """
+    Generate Cloudbeds ARIUpdate messages, one per hotel
+
+    Args:
+        hotels: Number of hotels
+        room_types: Room types per hotel
+        rate_plans: Rate plans per room type
+        days: Days covered
+        start: First day
+        seed: Random seed
+
+    Returns:
+        Messages in the format of pms/cloudbeds/sample_message.json
+    """
+    rng = random.Random(seed)
+    return [
+        {
+            "verb": "ARIUpdate",
+            "ota_property_id": f"hotel_{hotel + 1:04d}",
+            "ota_property_password": "bench-password",
+            "mya_property_id": 10000 + hotel,
+            "guid": str(uuid.UUID(int=rng.getrandbits(128))),
+            "currency": "USD",
+            "Inventory": list(iter_inventory(room_types, rate_plans, days, start, rng)),
+        }
+        for hotel in range(hotels)
+    ]
+
+
+def generate_cb(
+    hotels: int = 1,
+    room_types: int = 10,
+    rate_plans: int = 3,
+    days: int = 365,
+    start: date = date(2025, 1, 1),
+    seed: int = 42
+) -> List[Dict[str, Any]]:
+    """
+    Generate cb messages, one per inventory item
+
+    Args:
+        hotels: Number of hotels
+        room_types: Room types per hotel
+        rate_plans: Rate plans per room type
+        days: Days covered
+        start: First day
+        seed: Random seed
+
+    Returns:
+        Messages holding a single `inventory` object
+    """
+    rng = random.Random(seed)
+    messages = []
+    for hotel in range(hotels):
+        for item in iter_inventory(room_types, rate_plans, days, start, rng):
+            messages.append({
+                "ota_property_id": f"hotel_{hotel + 1:04d}",
+                "currency": "USD",
+                # cb's mapping reads the rate plan from `rate` and the amount from `ota_rate_id`
+                "inventory": {**item, "rate": item["ota_rate_id"], "ota_rate_id": item["rate"]},
+            })
+    return messages
+
+
+GENERATORS = {"cloudbeds": generate_cloudbeds, "cb": generate_cb}
+
+
+def generate(pms_code: str, **params) -> List[Dict[str, Any]]:
+    """
+    Generate messages for a PMS
+
+    Args:
+        pms_code: One of PMS_CODES
+        **params: Generator parameters (hotels, room_types, rate_plans, days, start, seed)
+
+    Returns:
+        Messages
+
+    Raises:
+        ValueError: If there is no generator for the PMS
+    """
+    if pms_code not in GENERATORS:
+        raise ValueError(f"No generator for PMS {pms_code!r}, expected one of {PMS_CODES}")
+    return GENERATORS[pms_code](**params)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--pms", choices=PMS_CODES, default="cloudbeds", help="PMS format")
+    parser.add_argument("--hotels", type=int, default=1, help="Hotels")
+    parser.add_argument("--room-types", type=int, default=10, help="Room types per hotel")
+    parser.add_argument("--rate-plans", type=int, default=3, help="Rate plans per room type")
+    parser.add_argument("--days", type=int, default=365, help="Days covered")
+    parser.add_argument("--start", type=date.fromisoformat, default=date(2025, 1, 1), help="First day (YYYY-MM-DD)")
+    parser.add_argument("--seed", type=int, default=42, help="Random seed")
+    parser.add_argument("--output", help="File to write (default: stdout)")
+    args = parser.parse_args()
+
+    messages = generate(
+        args.pms, hotels=args.hotels, room_types=args.room_types, rate_plans=args.rate_plans,
+        days=args.days, start=args.start, seed=args.seed
+    )
+    payload = messages[0] if len(messages) == 1 else messages
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(payload, f)
+    else:
+        json.dump(payload, sys.stdout)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,32 +1,39 @@
+from app.core.mapping_loader import translate_sections
 from app.plugins.base import BasePMSTranslator, MessageType
 from app.plugins.registry import register_translator
-from typing import Dict, Any, List
-import json
+from app.core import json_codec
+from typing import Dict, Any, Iterator, List
 import xml.etree.ElementTree as ET
-from datetime import datetime
+
 
 @register_translator("cb")
 class CbPMSTranslator(BasePMSTranslator):
     """
     Translator for cloud beds
+
+    Field mappings live in pms/cb/mapping.yaml and are compiled by
+    the mapping loader.
     """
-    
-    def __init__(self, pms_code: str):
-        super().__init__(pms_code)
-        self.supported_formats = ["json"]
-        self.supported_message_types = [MessageType.AVAILABILITY, MessageType.RATE]
+
+    @property
+    def supported_formats(self) -> List[str]:
+        return ["json"]
+
+    @property
+    def supported_message_types(self) -> List[MessageType]:
+        return [MessageType.AVAILABILITY, MessageType.RATE]
 
     def parse_message(self, message: str) -> Dict[str, Any]:
         """Parse JSON message"""
         try:
             if "json" == "json":
-                return json.loads(message)
+                return json_codec.loads(message)
             elif "json" == "xml":
                 root = ET.fromstring(message)
                 return self._xml_to_dict(root)
             else:
                 # GraphQL or other format
-                return json.loads(message)
+                return json_codec.loads(message)
         except Exception as e:
             raise ValueError(f"Failed to parse JSON message: {e}")
     
@@ -40,91 +47,28 @@ class CbPMSTranslator(BasePMSTranslator):
                 result[child.tag] = self._xml_to_dict(child)
         return result
 
+    def validate_message(self, message: Any, message_type: MessageType) -> bool:
+        """Check the message was parsed into a dictionary"""
+        return isinstance(message, dict)
+
     def translate_availability(self, message: Dict[str, Any]) -> List[Dict[str, Any]]:
         """Translate availability message to RGBridge format"""
-        mapping = self._mapping.get('availability', {})
-        result = []
-        
-        # Apply custom conversions
-        converted_message = self._apply_conversions(message)
-        
-        # Map fields
-        rgbridge_data = {}
-        for pms_field, rgbridge_field in mapping.items():
-            value = self._get_nested_value(converted_message, pms_field)
-            if value is not None:
-                rgbridge_data[rgbridge_field] = value
-        
-        # Set defaults
-        if 'HotelCode' not in rgbridge_data:
-            rgbridge_data['HotelCode'] = 'UNKNOWN'
-        if 'InvCode' not in rgbridge_data:
-            rgbridge_data['InvCode'] = 'DEFAULT'
-        if 'RatePlanCode' not in rgbridge_data:
-            rgbridge_data['RatePlanCode'] = 'DEFAULT'
-        
-        result.append(rgbridge_data)
-        return result
+        return list(self.iter_availability(message))
+
+    def iter_availability(self, message: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+        """Lazily translate availability message to RGBridge format"""
+        return self.get_compiled_mapping(MessageType.AVAILABILITY).iter_rows(message)
 
     def translate_rate(self, message: Dict[str, Any]) -> List[Dict[str, Any]]:
         """Translate rate message to RGBridge format"""
-        mapping = self._mapping.get('rate', {})
-        result = []
-        
-        # Apply custom conversions
-        converted_message = self._apply_conversions(message)
-        
-        # Map fields
-        rgbridge_data = {}
-        for pms_field, rgbridge_field in mapping.items():
-            value = self._get_nested_value(converted_message, pms_field)
-            if value is not None:
-                rgbridge_data[rgbridge_field] = value
-        
-        # Set defaults
-        if 'HotelCode' not in rgbridge_data:
-            rgbridge_data['HotelCode'] = 'UNKNOWN'
-        if 'InvCode' not in rgbridge_data:
-            rgbridge_data['InvCode'] = 'DEFAULT'
-        if 'RatePlanCode' not in rgbridge_data:
-            rgbridge_data['RatePlanCode'] = 'DEFAULT'
-        if 'CurrencyCode' not in rgbridge_data:
-            rgbridge_data['CurrencyCode'] = 'USD'
-        
-        result.append(rgbridge_data)
-        return result
+        return list(self.iter_rate(message))
 
-    def _get_nested_value(self, data: Dict[str, Any], field_path: str) -> Any:
-        """Get value from nested dictionary using dot notation"""
-        keys = field_path.split('.')
-        current = data
-        for key in keys:
-            if isinstance(current, dict) and key in current:
-                current = current[key]
-            else:
-                return None
-        return current
-    
-    def _apply_conversions(self, data: Dict[str, Any]) -> Dict[str, Any]:
-        """Apply custom value conversions"""
-        conversions = self._mapping.get('conversions', {{}})
-        result = data.copy()
-        
-        for field, conversion in conversions.items():
-            if field in result:
-                try:
-                    # Simple lambda evaluation (be careful with this in production)
-                    if conversion.startswith('lambda'):
-                        # For now, just apply common conversions
-                        if 'upper()' in conversion:
-                            result[field] = str(result[field]).upper()
-                        elif 'lower()' in conversion:
-                            result[field] = str(result[field]).lower()
-                        elif 'int()' in conversion:
-                            result[field] = int(float(result[field]))
-                        elif 'float()' in conversion:
-                            result[field] = float(result[field])
-                except:
-                    pass
-        
-        return result
+    def iter_rate(self, message: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+        """Lazily translate rate message to RGBridge format"""
+        return self.get_compiled_mapping(MessageType.RATE).iter_rows(message)
+
+    def translate_combined(self, message: Dict[str, Any]) -> Dict[MessageType, List[Dict[str, Any]]]:
+        """Translate availability and rates in one walk of the message"""
+        sections = [MessageType.AVAILABILITY, MessageType.RATE]
+        rows = translate_sections([self.get_compiled_mapping(mt) for mt in sections], message)
+        return dict(zip(sections, rows))
@@ -2,12 +2,60 @@
 Cloudbeds PMS Translator
 """
 
-from typing import Any, Dict, List
+from datetime import date
+from typing import Any, Dict, Iterator, List, Optional, Union
+from pydantic import Field
+from typing_extensions import Annotated, Required, TypedDict
+from app.core.json_stream import StreamedList
+from app.core.mapping_loader import translate_sections
+from app.core.message_schema import MessageSchema
 from app.plugins.base import BasePMSTranslator, MessageType
 from app.plugins.registry import register_translator
 
+# Optional fields may be sent as null; the builder leaves such attributes out
+Count = Optional[Annotated[int, Field(ge=0)]]
+# Rates are checked as numbers; translation still reads them as sent
+Amount = Optional[Annotated[float, Field(ge=0)]]
+Flag = Optional[bool]
+
+
+class InventoryItem(TypedDict, total=False):
+    """One room type / rate plan / date range of an ARIUpdate"""
+    ota_room_id: Required[Union[str, int]]
+    ota_rate_id: Required[Union[str, int]]
+    start_date: Required[date]
+    end_date: Required[date]
+    units: Count
+    rate: Amount
+    rdef_single: Amount
+    adult_3: Amount
+    child_3: Amount
+    min_los: Count
+    max_los: Count
+    min_advanced_offset: Count
+    max_advanced_offset: Count
+    num_adults_included: Count
+    num_children_included: Count
+    close: Flag
+    closearr: Flag
+    closedep: Flag
+
+
+class CloudbedsARIUpdate(TypedDict, total=False):
+    """Cloudbeds ARIUpdate message (fields the mapping does not read are not checked)"""
+    ota_property_id: Required[Union[str, int]]
+    currency: Optional[Annotated[str, Field(pattern=r"^[A-Z]{3}$")]]
+    guid: Optional[str]
+    Inventory: Required[List[InventoryItem]]
+
+
+ARI_UPDATE_SCHEMA = MessageSchema(CloudbedsARIUpdate, list_key="Inventory")
+
+
 @register_translator("cloudbeds")
 class CloudbedsPMSTranslator(BasePMSTranslator):
+    message_schema = ARI_UPDATE_SCHEMA
+
     @property
     def supported_formats(self) -> List[str]:
         return ["JSON"]
@@ -20,7 +68,7 @@ class CloudbedsPMSTranslator(BasePMSTranslator):
         # Basic validation: check required fields
         if not isinstance(message, dict):
             return False
-        if "Inventory" not in message or not isinstance(message["Inventory"], list):
+        if "Inventory" not in message or not isinstance(message["Inventory"], (list, StreamedList)):
             return False
         return True
 
@@ -28,56 +76,39 @@ class CloudbedsPMSTranslator(BasePMSTranslator):
         """
         Translate Cloudbeds ARIUpdate to RGBridge availability format (one per inventory item)
         """
-        mapping = self.mapping["availability"]
-        results = []
-        for inv in message.get("Inventory", []):
-            # RestrictionStatus logic
-            restriction_status = None
-            if inv.get("close") is True:
-                restriction_status = {"Status": "Close"}
-            elif inv.get("closearr") is True:
-                restriction_status = {"Status": "ClosedOnArrival"}
-            elif inv.get("closedep") is True:
-                restriction_status = {"Status": "ClosedOnDeparture"}
-            # Only include RestrictionStatus if set
-            result = {
-                "HotelCode": message.get(mapping["HotelCode"]),
-                "Start": inv.get("start_date"),
-                "End": inv.get("end_date"),
-                "InvCode": inv.get("ota_room_id"),
-                "RatePlanCode": inv.get("ota_rate_id"),
-                "BookingLimit": inv.get("units"),
-                "CurrencyCode": message.get(mapping["CurrencyCode"]),
-                "MinLOS": inv.get("min_los"),
-                "MaxLOS": inv.get("max_los"),
-                "MinAdvancedBookingOffset": inv.get("min_advanced_offset"),
-                "MaxAdvancedBookingOffset": inv.get("max_advanced_offset"),
-                "NumAdultsIncluded": inv.get("num_adults_included"),
-                "NumChildrenIncluded": inv.get("num_children_included"),
-            }
-            if restriction_status:
-                result["RestrictionStatus"] = restriction_status
-            results.append(result)
-        return results
+        return list(self.iter_availability(message))
+
+    def iter_availability(self, message: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+        """
+        Lazily translate Cloudbeds ARIUpdate availability, one inventory item at a time
+        """
+        return self.get_compiled_mapping(MessageType.AVAILABILITY).iter_rows(message)
 
     def translate_rate(self, message: Dict[str, Any]) -> List[Dict[str, Any]]:
         """
         Translate Cloudbeds ARIUpdate to RGBridge rate format (one per inventory item)
         """
-        mapping = self.mapping["rate"]
-        results = []
-        for inv in message.get("Inventory", []):
-            result = {
-                "HotelCode": message.get(mapping["HotelCode"]),
-                "Start": inv.get("start_date"),
-                "End": inv.get("end_date"),
-                "InvCode": inv.get("ota_room_id"),
-                "RatePlanCode": inv.get("ota_rate_id"),
-                "CurrencyCode": message.get(mapping["CurrencyCode"]),
-                "BaseRate": inv.get("rate"),
-                "RdefSingle": inv.get("rdef_single"),
-                "Adult3": inv.get("adult_3"),
-                "Child3": inv.get("child_3"),
-            }
-            results.append(result)
-        return results 
\ No newline at end of file
+        return list(self.iter_rate(message))
+
+    def iter_rate(self, message: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+        """
+        Lazily translate Cloudbeds ARIUpdate rates, one inventory item at a time
+        """
+        return self.get_compiled_mapping(MessageType.RATE).iter_rows(message)
+
+    def translate_combined(self, message: Dict[str, Any]) -> Dict[MessageType, List[Dict[str, Any]]]:
+        """
+        Translate availability and rates in one walk of the Inventory array
+        """
+        sections = [MessageType.AVAILABILITY, MessageType.RATE]
+        rows = translate_sections([self.get_compiled_mapping(mt) for mt in sections], message)
+        return dict(zip(sections, rows))
+
+    def iter_columns(self, message_type: MessageType, message: Any, min_rows: int = 0) -> Optional[Iterator[Dict[str, List[Any]]]]:
+        """
+        Pivot the Inventory array into columns through the compiled mapping
+        """
+        compiled = self.get_compiled_mapping(message_type)
+        if compiled.count_rows(message) < min_rows:
+            return None
+        return compiled.iter_column_batches(message)
@@ -1,19 +1,47 @@
+import asyncio
+import json
+import os
+from xml.etree import ElementTree
+
+import httpx
 import pytest
 from fastapi.testclient import TestClient
 from app.main import app
+from app.api import endpoints
+from app.core.idempotency import idempotency_store
 
 client = TestClient(app)
 
+
+@pytest.fixture(autouse=True)
+def _fresh_idempotency_store():
+    """Tests post the same sample message repeatedly; don't let them see each other's outcomes"""
+    idempotency_store.clear()
+    yield
+    idempotency_store.clear()
+
 def test_health_check():
     response = client.get("/health")
     assert response.status_code == 200
     assert response.json()["status"] == "healthy"
 
+def test_request_id_header():
+    response = client.get("/health")
+    assert len(response.headers["X-Request-ID"]) == 32
+    response = client.get("/health", headers={"X-Request-ID": "abc-123"})
+    assert response.headers["X-Request-ID"] == "abc-123"
+
 def test_root():
     response = client.get("/")
     assert response.status_code == 200
     assert "RGBridge PMS Integration Platform" in response.json().get("message", "")
 
+def test_openapi_lists_lazily_loaded_routes():
+    paths = client.get("/openapi.json").json()["paths"]
+    assert "/api/v1/pms/{pms_code}/bulk" in paths
+    assert "/api/v1/wizard/analyze" in paths
+    assert "/api/v1/mappings" in paths
+
 def test_pms_endpoint():
     # Adjust PMS code as needed for your test data
     response = client.get("/api/v1/pms/cloudbeds")
@@ -57,4 +85,332 @@ def test_update_and_delete_pms():
     assert response.status_code == 200
     # Delete PMS
     response = client.delete(f"/api/v1/pms/{pms_code}")
-    assert response.status_code == 200 
\ No newline at end of file
+    assert response.status_code == 200 
+
+def _load_sample_message():
+    with open("pms/cloudbeds/sample_message.json", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _capture_upstream(monkeypatch):
+    """Replace the internal API post with a stub that records the XML body"""
+    posted = []
+
+    async def fake_post(xml_body, message_type, auth_header=None):
+        if hasattr(xml_body, "__aiter__"):
+            xml_body = [chunk async for chunk in xml_body]
+        posted.append(xml_body if isinstance(xml_body, bytes) else b"".join(xml_body))
+        return httpx.Response(200, text="<Ack/>")
+
+    monkeypatch.setattr(endpoints, "post_xml_to_internal_api", fake_post)
+    return posted
+
+
+def test_pms_post_availability(monkeypatch):
+    posted = _capture_upstream(monkeypatch)
+    response = client.post("/api/v1/pms/cloudbeds?message_type=availability", json=_load_sample_message())
+    assert response.status_code == 200
+    assert response.text == "<Ack/>"
+    assert b'HotelCode="lake_view_hotel"' in posted[0]
+
+
+def test_pms_post_rate_streamed(monkeypatch):
+    posted = _capture_upstream(monkeypatch)
+    monkeypatch.setattr(endpoints.settings, "XML_STREAMING_MIN_BYTES", 1)
+    response = client.post("/api/v1/pms/cloudbeds?message_type=rate", json=_load_sample_message())
+    assert response.status_code == 200
+    assert posted[0].count(b"<RateAmountMessage>") == 2
+    assert posted[0].count(b"xmlns") == 1
+
+
+def _rate_messages(xml):
+    """RateAmountMessage elements of a posted document, independent of formatting"""
+    root = ElementTree.fromstring(xml)
+    ElementTree.indent(root)
+    return [
+        ElementTree.tostring(message)
+        for message in root.iter("{http://www.opentravel.org/OTA/2003/05}RateAmountMessage")
+    ]
+
+
+def test_pms_post_json_streamed(monkeypatch):
+    posted = _capture_upstream(monkeypatch)
+    message = _load_sample_message()
+    response = client.post("/api/v1/pms/cloudbeds?message_type=rate", json=message)
+    assert response.status_code == 200
+    monkeypatch.setattr(endpoints.settings, "JSON_STREAMING_MIN_BYTES", 1)
+    monkeypatch.setattr(endpoints.settings, "IDEMPOTENCY_TTL", 0)
+    response = client.post("/api/v1/pms/cloudbeds?message_type=rate", json=message)
+    assert response.status_code == 200
+    assert response.text == "<Ack/>"
+    buffered, streamed = (_rate_messages(xml) for xml in posted)
+    assert len(buffered) == 2
+    assert streamed == buffered
+
+
+def test_pms_post_json_streamed_invalid(monkeypatch):
+    posted = _capture_upstream(monkeypatch)
+    monkeypatch.setattr(endpoints.settings, "JSON_STREAMING_MIN_BYTES", 1)
+    body = json.dumps(_load_sample_message())[:-40]
+    response = client.post(
+        "/api/v1/pms/cloudbeds?message_type=availability", content=body,
+        headers={"Content-Type": "application/json"}
+    )
+    assert response.status_code == 400
+    assert "Invalid JSON payload" in response.json()["detail"]
+
+
+def test_pms_post_schema_errors(monkeypatch):
+    posted = _capture_upstream(monkeypatch)
+    message = _load_sample_message()
+    message["Inventory"][1]["units"] = "many"
+    message["Inventory"][1]["start_date"] = "2025-02-30"
+    response = client.post("/api/v1/pms/cloudbeds?message_type=availability", json=message)
+    assert response.status_code == 400
+    detail = response.json()["detail"]
+    assert detail.startswith("Message validation failed: ")
+    assert "Inventory[1].start_date" in detail and "Inventory[1].units" in detail
+    assert posted == []
+
+    # Items of streamed lists are checked as they are parsed
+    monkeypatch.setattr(endpoints.settings, "JSON_STREAMING_MIN_BYTES", 1)
+    response = client.post("/api/v1/pms/cloudbeds?message_type=availability", json=message)
+    assert response.status_code == 400
+    assert "Inventory[1].units" in response.json()["detail"]
+
+    monkeypatch.setattr(endpoints.settings, "JSON_STREAMING_MIN_BYTES", 0)
+    monkeypatch.setattr(endpoints.settings, "MESSAGE_SCHEMA_VALIDATION", False)
+    message["Inventory"][1]["start_date"] = "2025-02-03"
+    response = client.post("/api/v1/pms/cloudbeds?message_type=availability", json=message)
+    assert response.status_code == 500  # only caught by the XSD
+
+
+def test_pms_post_explicit_nulls(monkeypatch):
+    posted = _capture_upstream(monkeypatch)
+    monkeypatch.setattr(endpoints.settings, "IDEMPOTENCY_TTL", 0)
+    message = _load_sample_message()
+    message["ota_property_id"] = 12345
+    message["currency"] = None
+    message["Inventory"][0].update(rate=None, units=None)
+    for message_type in ("availability", "rate"):
+        response = client.post(f"/api/v1/pms/cloudbeds?message_type={message_type}", json=message)
+        assert response.status_code == 200, response.text
+    assert len(posted) == 2
+
+
+def test_pms_post_skip_invalid_rows(monkeypatch, tmp_path):
+    posted = _capture_upstream(monkeypatch)
+    monkeypatch.setattr(endpoints.settings, "QUARANTINE_DIR", str(tmp_path))
+    monkeypatch.setattr(endpoints.settings, "IDEMPOTENCY_TTL", 0)
+    message = _load_sample_message()
+    message["Inventory"][1]["units"] = "many"
+    response = client.post("/api/v1/pms/cloudbeds?message_type=availability&invalid_rows=skip", json=message)
+    assert response.status_code == 200
+    data = response.json()
+    assert data["response"] == "<Ack/>"
+    assert data["accepted"] == 1
+    assert data["rejected"] == [{
+        "index": 1, "stage": "schema",
+        "errors": ["units: Input should be a valid integer, unable to parse string as an integer"]
+    }]
+    assert len(posted) == 1 and posted[0].count(b"<AvailStatusMessage ") == 1
+
+    (quarantined,) = (tmp_path / "cloudbeds").iterdir()
+    record = json.loads(quarantined.read_text().splitlines()[0])
+    assert record["index"] == 1 and record["item"]["units"] == "many" and record["message_id"] == message["guid"]
+
+    # Messages without invalid rows report every row as accepted
+    response = client.post(
+        "/api/v1/pms/cloudbeds?message_type=availability&invalid_rows=skip", json=_load_sample_message()
+    )
+    assert response.status_code == 200
+    assert response.json()["accepted"] == 2 and response.json()["rejected"] == []
+
+    # Nothing left to deliver
+    for item in message["Inventory"]:
+        item["units"] = "many"
+    message["guid"] = "another-message"
+    response = client.post("/api/v1/pms/cloudbeds?message_type=availability&invalid_rows=skip", json=message)
+    assert response.status_code == 400
+    assert [item["index"] for item in response.json()["rejected"]] == [0, 1]
+
+    response = client.post("/api/v1/pms/cloudbeds?message_type=availability&invalid_rows=maybe", json=message)
+    assert response.status_code == 400
+
+
+def test_pms_post_columnar(monkeypatch):
+    posted = _capture_upstream(monkeypatch)
+    monkeypatch.setattr(endpoints.settings, "COLUMNAR_MIN_ROWS", 1)
+    response = client.post("/api/v1/pms/cloudbeds?message_type=availability", json=_load_sample_message())
+    assert response.status_code == 200
+    assert b'HotelCode="lake_view_hotel"' in posted[0]
+    assert posted[0].count(b"<AvailStatusMessage ") == len(_load_sample_message()["Inventory"])
+
+
+def test_pms_post_combined(monkeypatch):
+    posted = _capture_upstream(monkeypatch)
+    response = client.post("/api/v1/pms/cloudbeds?message_type=combined", json=_load_sample_message())
+    assert response.status_code == 200
+    data = response.json()
+    assert data["availability"] == {"status_code": 200, "response": "<Ack/>"}
+    assert data["rate"] == {"status_code": 200, "response": "<Ack/>"}
+    assert len(posted) == 2
+    assert sum(b"<OTA_HotelAvailNotifRQ" in xml for xml in posted) == 1
+    assert sum(b"<OTA_HotelRateAmountNotifRQ" in xml for xml in posted) == 1
+
+
+def test_pms_post_combined_partial_failure(monkeypatch):
+    posted = []
+
+    async def fake_post(xml_body, message_type, auth_header=None):
+        posted.append(message_type)
+        if message_type == "rate":
+            response = httpx.Response(503, text="busy", request=httpx.Request("POST", "http://internal"))
+            response.raise_for_status()
+        return httpx.Response(200, text="<Ack/>")
+
+    monkeypatch.setattr(endpoints, "post_xml_to_internal_api", fake_post)
+    message = _load_sample_message()
+    response = client.post("/api/v1/pms/cloudbeds?message_type=combined", json=message)
+    assert response.status_code == 207
+    data = response.json()
+    assert data["availability"] == {"status_code": 200, "response": "<Ack/>"}
+    assert data["rate"]["status_code"] == 503
+    assert data["rate"]["response"] == "busy"
+    assert "503" in data["rate"]["error"]
+
+    # The retry replays the outcome instead of re-sending the delivered document
+    response = client.post("/api/v1/pms/cloudbeds?message_type=combined", json=message)
+    assert response.status_code == 207
+    assert sorted(posted) == ["availability", "rate"]
+
+
+def test_translation_preview_combined():
+    response = client.post("/api/v1/translate/cloudbeds", json=_load_sample_message())
+    assert response.status_code == 200
+    data = response.json()
+    assert data["availability"]["valid"] and data["rate"]["valid"]
+    assert len(data["rate"]["translated"]) == len(_load_sample_message()["Inventory"])
+
+
+def test_pms_post_duplicate_replayed(monkeypatch):
+    posted = _capture_upstream(monkeypatch)
+    message = _load_sample_message()
+    first = client.post("/api/v1/pms/cloudbeds?message_type=availability", json=message)
+    # Same guid, so a retry with a re-serialized body is still a duplicate
+    second = client.post("/api/v1/pms/cloudbeds?message_type=availability", content=json.dumps(message, indent=2))
+    assert first.status_code == second.status_code == 200
+    assert second.text == first.text
+    assert second.headers["X-Idempotent-Replay"] == "true"
+    assert "X-Idempotent-Replay" not in first.headers
+    assert len(posted) == 1
+    # Another message type or caller is processed again
+    client.post("/api/v1/pms/cloudbeds?message_type=rate", json=message)
+    client.post("/api/v1/pms/cloudbeds?message_type=availability", json=message, headers={"Authorization": "Bearer other"})
+    assert len(posted) == 3
+
+
+def test_pms_post_idempotency_disabled(monkeypatch):
+    posted = _capture_upstream(monkeypatch)
+    monkeypatch.setattr(endpoints.settings, "IDEMPOTENCY_TTL", 0)
+    client.post("/api/v1/pms/cloudbeds?message_type=availability", json=_load_sample_message())
+    client.post("/api/v1/pms/cloudbeds?message_type=availability", json=_load_sample_message())
+    assert len(posted) == 2
+
+
+def test_metrics_endpoint(monkeypatch):
+    _capture_upstream(monkeypatch)
+    client.post("/api/v1/pms/cloudbeds?message_type=rate", json=_load_sample_message())
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    for stage in ("parse", "validate", "translate", "build", "xsd_validate", "upstream"):
+        assert f'rgbridge_stage_duration_seconds_count{{stage="{stage}",pms_code="cloudbeds",message_type="rate"}}' in response.text
+    assert 'rgbridge_rows_translated_total{pms_code="cloudbeds",message_type="rate"}' in response.text
+    assert 'rgbridge_upstream_connections{state="active"}' in response.text
+
+
+def test_pms_bulk_groups_by_hotel(monkeypatch):
+    posted = _capture_upstream(monkeypatch)
+    first = _load_sample_message()
+    second = dict(first, ota_property_id="mountain_lodge")
+    third = dict(first, Inventory=first["Inventory"][:1])
+    body = "\n".join([json.dumps(first), "not json", json.dumps(second), json.dumps(third)])
+    response = client.post(
+        "/api/v1/pms/cloudbeds/bulk?message_type=availability&message_type=rate",
+        content=body,
+        headers={"Content-Type": "application/x-ndjson"}
+    )
+    assert response.status_code == 200
+    data = response.json()
+    assert [item["status"] for item in data["items"]] == ["delivered", "invalid", "delivered", "delivered"]
+    documents = {(d["hotel_code"], d["message_type"]): d for d in data["documents"]}
+    assert set(documents) == {
+        ("lake_view_hotel", "availability"), ("lake_view_hotel", "rate"),
+        ("mountain_lodge", "availability"), ("mountain_lodge", "rate"),
+    }
+    assert documents[("lake_view_hotel", "availability")]["rows"] == 3
+    assert documents[("lake_view_hotel", "availability")]["items"] == [0, 3]
+    assert len(posted) == 4
+
+
+def test_pms_bulk_json_array(monkeypatch):
+    _capture_upstream(monkeypatch)
+    response = client.post("/api/v1/pms/cloudbeds/bulk?message_type=rate", json=[_load_sample_message(), {"verb": "x"}])
+    assert response.status_code == 200
+    items = response.json()["items"]
+    assert items[0]["status"] == "delivered"
+    assert items[1] == {
+        "index": 1, "status": "invalid",
+        "error": "Message validation failed: ota_property_id: Field required; Inventory: Field required"
+    }
+
+
+def test_pms_bulk_coalesce_checks_rows_without_building(monkeypatch, tmp_path):
+    monkeypatch.setattr(endpoints.settings, "SPOOL_DIR", str(tmp_path))
+    monkeypatch.setattr(endpoints.settings, "MESSAGE_SCHEMA_VALIDATION", False)
+    built = []
+    monkeypatch.setattr(endpoints, "build_document", lambda *args, **kwargs: built.append(args))
+    valid = _load_sample_message()
+    invalid = dict(valid, ota_property_id="mountain_lodge")
+    invalid["Inventory"] = [dict(invalid["Inventory"][0], units="many")]
+    response = client.post("/api/v1/pms/cloudbeds/bulk?message_type=availability&delivery=coalesce", json=[valid, invalid])
+    assert response.status_code == 200
+    data = response.json()
+    assert [item["status"] for item in data["items"]] == ["queued", "failed"]
+    assert "'many'" in data["items"][1]["errors"][0]
+    assert built == []
+    asyncio.run(endpoints.coalescer.flush_all())
+    assert len(os.listdir(tmp_path)) == 2
+
+
+def test_pms_post_async_delivery(monkeypatch, tmp_path):
+    monkeypatch.setattr(endpoints.settings, "SPOOL_DIR", str(tmp_path))
+    response = client.post(
+        "/api/v1/pms/cloudbeds?message_type=availability&delivery=async", json=_load_sample_message()
+    )
+    assert response.status_code == 202
+    tracking_id = response.json()["tracking_id"]
+
+    response = client.get(f"/api/v1/deliveries/{tracking_id}")
+    assert response.status_code == 200
+    assert response.json()["status"] == "queued"
+    assert "auth_header" not in response.json()
+    assert client.get("/api/v1/deliveries/0123456789abcdef0123456789abcdef").status_code == 404
+
+
+def test_pms_post_invalid_delivery():
+    response = client.post("/api/v1/pms/cloudbeds?message_type=rate&delivery=later", json=_load_sample_message())
+    assert response.status_code == 400
+
+
+def test_pms_post_coalesce_delivery(monkeypatch, tmp_path):
+    monkeypatch.setattr(endpoints.settings, "SPOOL_DIR", str(tmp_path))
+    response = client.post(
+        "/api/v1/pms/cloudbeds?message_type=rate&delivery=coalesce", json=_load_sample_message()
+    )
+    assert response.status_code == 202
+    assert response.json()["status"] == "buffered"
+    assert response.json()["buffered_rows"] > 0
+    asyncio.run(endpoints.coalescer.flush_all())
+    assert len(os.listdir(tmp_path)) == 2
@@ -0,0 +1,1429 @@
+"""
+Unit tests for core pipeline modules
+"""
+
+import asyncio
+import json
+import logging
+import os
+import re
+import shutil
+import sys
+import threading
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+from unittest.mock import ANY
+
+import httpx
+import pytest
+from lxml import etree
+
+from app.core import delivery_queue as delivery_queue_module
+from app.core import json_codec
+from app.core import pipeline as pipeline_module
+from app.core.config import Settings, settings
+from app.core.coalescer import Coalescer, coalesce_rows
+from app.core.conversions import ConversionError, compile_expression
+from app.core.date_ranges import compress_date_ranges
+from app.core.delivery_queue import DeliveryQueue, DeliverySpool
+from app.core.idempotency import CachedResponse, IdempotencyStore, SQLiteIdempotencyStore, message_key
+from app.core.internal_api_client import InternalAPIClient
+from app.core.json_stream import ChunkChannel, StreamedJSONError, StreamedList, StreamingJSONParser
+from app.core.logging import CappedPayload, JsonFormatter, PayloadSampler, RequestIdFilter, _QueueHandler, request_id_var
+from app.core.mapping_loader import CompiledMapping, MappingLoader, mapping_loader, translate_sections
+from app.core.message_schema import MessageValidationError, format_location
+from app.core.metrics import UPSTREAM_REQUESTS, UPSTREAM_RETRIES, MetricsRegistry, counted
+from app.core.xml_builder import (
+    build_avail_notif_tree, build_rate_amount_notif_tree, serialize_xml,
+    iter_avail_notif_xml, iter_rate_amount_notif_xml,
+    build_avail_notif_tree_from_columns, iter_avail_notif_xml_from_columns, iter_rate_amount_notif_xml_from_columns,
+    AVAIL_STATUS_MESSAGE_LAYOUT
+)
+from app.core.xml_constraints import get_constraints
+from app.core.xsd_validator import (
+    SchemaRegistry, ValidationSampler, XMLStreamValidationError, schema_registry,
+    validate_xml_tree, validate_xml_with_xsd, iter_validated_xml
+)
+from app.core.row_screening import screen_items
+from app.core.pipeline import (
+    DOCUMENT_SPECS, MultipleHotelsError, build_document, build_document_from_columns, ensure_single_hotel,
+    ensure_single_hotel_columns, get_document_constraints, get_xsd_path, group_by_hotel, iter_document_xml,
+    iter_translated, iter_translated_columns
+)
+from app.plugins import plugin_registry
+from app.plugins.base import MessageType
+from app.utils.los_utils import LOSPattern
+
+AVAIL_XSD = os.path.join("schemas", "OTA_HotelAvailNotifRQ.xsd")
+RATE_XSD = os.path.join("schemas", "OTA_HotelRateAmountNotifRQ.xsd")
+
+
+@pytest.fixture
+def sample_message():
+    """Cloudbeds ARIUpdate sample message"""
+    with open(os.path.join("pms", "cloudbeds", "sample_message.json"), encoding="utf-8") as f:
+        return json.load(f)
+
+
+class TestSchemaRegistry:
+    """Test compiled XSD schema cache"""
+
+    def test_schema_is_cached(self):
+        """Test compiled schema is reused between calls"""
+        registry = SchemaRegistry()
+        first = registry.get_schema(AVAIL_XSD)
+        assert registry.get_schema(AVAIL_XSD) is first
+        assert AVAIL_XSD in registry
+
+    def test_schema_reloaded_on_mtime_change(self, tmp_path):
+        """Test schema is recompiled when the file changes"""
+        registry = SchemaRegistry()
+        xsd_path = tmp_path / "avail.xsd"
+        shutil.copy(AVAIL_XSD, xsd_path)
+        first = registry.get_schema(str(xsd_path))
+
+        stat = os.stat(xsd_path)
+        os.utime(xsd_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+        assert registry.get_schema(str(xsd_path)) is not first
+
+    def test_warm_up(self, tmp_path):
+        """Test warm-up compiles every XSD and skips broken files"""
+        shutil.copy(AVAIL_XSD, tmp_path / "avail.xsd")
+        shutil.copy(RATE_XSD, tmp_path / "rate.xsd")
+        (tmp_path / "broken.xsd").write_text("<not-a-schema>")
+        (tmp_path / "notes.txt").write_text("ignored")
+
+        registry = SchemaRegistry()
+        assert registry.warm_up(str(tmp_path)) == 2
+        assert len(registry) == 2
+
+    def test_warm_up_missing_dir(self, tmp_path):
+        """Test warm-up of a missing directory"""
+        assert SchemaRegistry().warm_up(str(tmp_path / "missing")) == 0
+
+
+class TestXSDValidation:
+    """Test XML validation entry points"""
+
+    def test_validate_avail_tree(self, sample_message):
+        """Test built availability tree validates without serialization"""
+        translator = plugin_registry.create_translator("cloudbeds")
+        tree = build_avail_notif_tree("lake_view_hotel", translator.translate_availability(sample_message))
+        assert validate_xml_tree(tree, AVAIL_XSD) is None
+
+    def test_validate_rate_tree(self, sample_message):
+        """Test built rate tree validates without serialization"""
+        translator = plugin_registry.create_translator("cloudbeds")
+        tree = build_rate_amount_notif_tree("lake_view_hotel", translator.translate_rate(sample_message))
+        assert validate_xml_tree(tree, RATE_XSD) is None
+
+    def test_validate_invalid_tree(self):
+        """Test invalid tree reports an error"""
+        tree = build_avail_notif_tree("HOTEL", [{"BookingLimit": "many"}])
+        assert validate_xml_tree(tree, AVAIL_XSD) is not None
+
+    def test_validate_xml_string(self):
+        """Test string entry point shares the compiled schema"""
+        xml_string = serialize_xml(build_avail_notif_tree("HOTEL", [{"BookingLimit": 3}]))
+        assert validate_xml_with_xsd(xml_string, AVAIL_XSD) is None
+        assert AVAIL_XSD in schema_registry
+        assert validate_xml_with_xsd("<not-closed", AVAIL_XSD) is not None
+
+
+class TestInternalAPIClient:
+    """Test pooled async internal API client"""
+
+    @pytest.fixture(autouse=True)
+    def no_retry_delay(self, monkeypatch):
+        monkeypatch.setattr(settings, "INTERNAL_API_RETRY_DELAY", 0)
+        monkeypatch.setattr(settings, "INTERNAL_API_RETRY_ATTEMPTS", 3)
+
+    @pytest.mark.asyncio
+    async def test_post_xml(self):
+        """Test XML is posted with forwarded authorization"""
+        seen = []
+
+        def handler(request):
+            seen.append(request)
+            return httpx.Response(200, text="<OK/>")
+
+        client = InternalAPIClient(transport=httpx.MockTransport(handler))
+        await client.start()
+        try:
+            response = await client.post_xml("<Doc/>", "availability", auth_header="Bearer token")
+        finally:
+            await client.close()
+
+        assert response.status_code == 200
+        assert seen[0].content == b"<Doc/>"
+        assert seen[0].headers["Authorization"] == "Bearer token"
+        assert not client.is_started
+
+    @pytest.mark.asyncio
+    async def test_post_xml_retries_request_errors(self):
+        """Test connection errors are retried"""
+        calls = []
+
+        def handler(request):
+            calls.append(request)
+            if len(calls) < 3:
+                raise httpx.ConnectError("refused", request=request)
+            return httpx.Response(200)
+
+        retries = UPSTREAM_RETRIES.get()
+        client = InternalAPIClient(transport=httpx.MockTransport(handler))
+        response = await client.post_xml("<Doc/>", "rate")
+        await client.close()
+        assert response.status_code == 200
+        assert len(calls) == 3
+        assert UPSTREAM_RETRIES.get() == retries + 2
+
+    @pytest.mark.asyncio
+    async def test_post_xml_does_not_retry_http_errors(self):
+        """Test HTTP error responses are raised without retrying"""
+        calls = []
+
+        def handler(request):
+            calls.append(request)
+            return httpx.Response(500, text="boom")
+
+        client = InternalAPIClient(transport=httpx.MockTransport(handler))
+        with pytest.raises(httpx.HTTPStatusError):
+            await client.post_xml("<Doc/>", "rate")
+        await client.close()
+        assert len(calls) == 1
+
+    @pytest.mark.asyncio
+    async def test_post_streamed_body(self):
+        """Test an iterator body is streamed and not retried"""
+        seen = []
+
+        def handler(request):
+            seen.append(request.read())
+            raise httpx.ConnectError("refused", request=request)
+
+        client = InternalAPIClient(transport=httpx.MockTransport(handler))
+        with pytest.raises(httpx.ConnectError):
+            await client.post_xml(iter([b"<Doc>", b"</Doc>"]), "rate")
+        await client.close()
+        assert seen == [b"<Doc></Doc>"]
+
+    def test_client_of_finished_loop_is_closed(self):
+        """Test the client opened on an earlier event loop is closed when replaced"""
+        client = InternalAPIClient(transport=httpx.MockTransport(lambda request: httpx.Response(200)))
+        asyncio.run(client.start())
+        stale = client._client
+        assert asyncio.run(client.post_xml("<Doc/>", "rate")).status_code == 200
+        asyncio.run(client.close())
+        assert stale.is_closed
+
+
+class TestMetrics:
+    """Test in-process metrics and their text exposition"""
+
+    def test_counter_and_gauge(self):
+        """Test labelled samples are rendered with escaped label values"""
+        registry = MetricsRegistry()
+        counter = registry.counter("rows_total", "Rows", ("pms_code",))
+        gauge = registry.gauge("connections", "Connections")
+        counter.inc(2, pms_code='a"b')
+        counter.inc(pms_code='a"b')
+        gauge.set(4)
+        text = registry.render()
+        assert "# TYPE rows_total counter" in text
+        assert 'rows_total{pms_code="a\\"b"} 3' in text
+        assert "connections 4" in text
+
+    def test_labels_must_match(self):
+        """Test samples must set exactly the declared labels"""
+        counter = MetricsRegistry().counter("rows_total", "Rows", ("pms_code",))
+        with pytest.raises(ValueError):
+            counter.inc(message_type="rate")
+        with pytest.raises(ValueError):
+            counter.inc(-1, pms_code="x")
+
+    def test_histogram_buckets(self):
+        """Test histogram buckets are cumulative with sum and count"""
+        registry = MetricsRegistry()
+        histogram = registry.histogram("duration_seconds", "Duration", ("stage",), buckets=(0.1, 1))
+        histogram.observe(0.05, stage="parse")
+        histogram.observe(0.5, stage="parse")
+        histogram.observe(5, stage="parse")
+        with histogram.time(stage="build"):
+            pass
+        text = registry.render()
+        assert 'duration_seconds_bucket{stage="parse",le="0.1"} 1' in text
+        assert 'duration_seconds_bucket{stage="parse",le="1"} 2' in text
+        assert 'duration_seconds_bucket{stage="parse",le="+Inf"} 3' in text
+        assert 'duration_seconds_count{stage="parse"} 3' in text
+        assert histogram.get_count(stage="build") == 1
+
+    def test_collectors_and_counted(self):
+        """Test collectors run on render and counted adds items once exhausted"""
+        registry = MetricsRegistry()
+        gauge = registry.gauge("queued", "Queued")
+        registry.add_collector(lambda: gauge.set(7))
+        assert "queued 7" in registry.render()
+
+        counter = registry.counter("bytes_total", "Bytes")
+        chunks = counted(iter([b"ab", b"cde"]), counter, weight=len)
+        assert counter.get() == 0
+        assert b"".join(chunks) == b"abcde"
+        assert counter.get() == 5
+
+
+class TestLogging:
+    """Test structured logging helpers"""
+
+    def test_json_formatter(self):
+        """Test records are rendered as JSON with the request id and extra fields"""
+        logger = logging.getLogger("rgbridge.test")
+        token = request_id_var.set("req-1")
+        try:
+            record = logger.makeRecord(logger.name, logging.INFO, __file__, 1, "rows: %d", (3,), None, extra={"pms_code": "cb"})
+            RequestIdFilter().filter(record)
+        finally:
+            request_id_var.reset(token)
+        entry = json.loads(JsonFormatter().format(record))
+        assert entry["message"] == "rows: 3"
+        assert entry["request_id"] == "req-1"
+        assert entry["pms_code"] == "cb"
+        assert entry["level"] == "INFO"
+
+    def test_queue_handler_keeps_exception(self):
+        """Test queued records keep their traceback for the formatter"""
+        try:
+            raise ValueError("boom")
+        except ValueError:
+            record = logging.getLogger("rgbridge.test").makeRecord(
+                "rgbridge.test", logging.ERROR, __file__, 1, "failed %s", ("x",), sys.exc_info()
+            )
+        prepared = _QueueHandler(None).prepare(record)
+        entry = json.loads(JsonFormatter().format(prepared))
+        assert entry["message"] == "failed x"
+        assert "ValueError: boom" in entry["exc_info"]
+
+    def test_payload_sampler(self):
+        """Test the first payload per PMS is logged, then one in 1/rate"""
+        sampler = PayloadSampler(rate=0.25)
+        decisions = [sampler.should_log("cb") for _ in range(8)]
+        assert decisions == [True, False, False, False, True, False, False, False]
+        assert sampler.should_log("other") is True
+        assert PayloadSampler(rate=0).should_log("cb") is False
+
+    def test_capped_payload(self):
+        """Test payloads are cut to the byte limit when rendered"""
+        assert str(CappedPayload(b"x" * 10, 4)) == "xxxx... [6 more bytes]"
+        assert str(CappedPayload({"a": 1}, 100)) == '{"a": 1}'
+
+
+class TestIdempotency:
+    """Test duplicate message suppression"""
+
+    def test_message_key(self):
+        """Test keys use the message id when present and the body hash otherwise"""
+        by_id = message_key("cloudbeds", "rate", "sync", b"{}", message_id="abc")
+        assert by_id.endswith(":id:abc")
+        assert by_id == message_key("cloudbeds", "rate", "sync", b'{"a": 1}', message_id="abc")
+        assert message_key("cloudbeds", "rate", "sync", b"{}") != message_key("cloudbeds", "rate", "sync", b"[]")
+        assert by_id != message_key("cloudbeds", "rate", "sync", b"{}", message_id="abc", auth_header="Bearer t")
+        assert by_id != message_key("cloudbeds", "availability", "sync", b"{}", message_id="abc")
+
+    def test_ttl_and_lru(self, monkeypatch):
+        """Test outcomes expire and the least recently used are evicted"""
+        store = IdempotencyStore(ttl=60, max_entries=2, db_path="")
+        ok = CachedResponse(200, b"<Ack/>", "application/xml")
+        store.put("a", ok)
+        store.put("b", ok)
+        assert store.get("a") == ok
+        store.put("c", ok)
+        assert store.get("b") is None
+        assert len(store) == 2
+        now = time.time()
+        monkeypatch.setattr(time, "time", lambda: now + 61)
+        assert store.get("a") is None
+
+    def test_persistent_store(self, tmp_path):
+        """Test outcomes survive a restart when a database is configured"""
+        path = str(tmp_path / "idempotency.db")
+        IdempotencyStore(ttl=60, db_path=path).put("k", CachedResponse(202, b'{"status": "queued"}', "application/json"))
+        assert IdempotencyStore(ttl=60, db_path=path).get("k") == CachedResponse(202, b'{"status": "queued"}', "application/json")
+
+    @pytest.mark.asyncio
+    async def test_persistent_store_off_loop(self, tmp_path, monkeypatch):
+        """Test the database is read and written from worker threads, memory hits stay inline"""
+        calls = []
+        for name in ("get", "put"):
+            method = getattr(SQLiteIdempotencyStore, name)
+
+            def record(self, *args, _method=method, _name=name):
+                calls.append((_name, threading.get_ident()))
+                return _method(self, *args)
+
+            monkeypatch.setattr(SQLiteIdempotencyStore, name, record)
+        store = IdempotencyStore(ttl=60, db_path=str(tmp_path / "idempotency.db"))
+        assert await store.acquire("k") is None
+        await store.store("k", CachedResponse(200, b"<Ack/>", "application/xml"))
+        store.release("k")
+        assert (await store.acquire("k")).body == b"<Ack/>"
+        assert [name for name, _ in calls] == ["get", "put"]
+        assert threading.get_ident() not in {thread for _, thread in calls}
+
+    @pytest.mark.asyncio
+    async def test_concurrent_duplicate_waits(self):
+        """Test a duplicate arriving mid-processing gets the original outcome"""
+        store = IdempotencyStore(ttl=60, db_path="")
+        assert await store.acquire("k") is None
+        waiter = asyncio.ensure_future(store.acquire("k"))
+        await asyncio.sleep(0)
+        assert not waiter.done()
+        store.put("k", CachedResponse(200, b"<Ack/>", "application/xml"))
+        store.release("k")
+        assert (await waiter).body == b"<Ack/>"
+
+    @pytest.mark.asyncio
+    async def test_failed_outcome_not_stored(self):
+        """Test a duplicate of a failed message is processed again"""
+        store = IdempotencyStore(ttl=60, db_path="")
+        assert await store.acquire("k") is None
+        store.release("k")
+        assert await store.acquire("k") is None
+
+    def test_mapping_message_id(self):
+        """Test the message id path declared in a mapping"""
+        assert mapping_loader.get_message_id("cloudbeds", {"guid": "abc"}) == "abc"
+        assert mapping_loader.get_message_id("cloudbeds", {}) is None
+
+
+class TestStreamingXML:
+    """Test incremental XML writer"""
+
+    def test_stream_matches_tree(self, sample_message):
+        """Test streamed document is equivalent to the built tree"""
+        translator = plugin_registry.create_translator("cloudbeds")
+        rows = translator.translate_rate(sample_message)
+        streamed = b"".join(iter_rate_amount_notif_xml("HOTEL", iter(rows), timestamp="T", echo_token="1"))
+        tree = build_rate_amount_notif_tree("HOTEL", rows, timestamp="T", echo_token="1")
+        assert etree.tostring(etree.fromstring(streamed), method="c14n") == etree.tostring(tree, method="c14n")
+
+    @pytest.mark.parametrize("build_tree, iter_xml, iter_xml_from_columns, rows", [
+        (build_avail_notif_tree, iter_avail_notif_xml, iter_avail_notif_xml_from_columns, "FULL_AVAIL_ROWS"),
+        (build_rate_amount_notif_tree, iter_rate_amount_notif_xml, iter_rate_amount_notif_xml_from_columns, "FULL_RATE_ROWS"),
+    ])
+    def test_stream_bytes_match_tree(self, build_tree, iter_xml, iter_xml_from_columns, rows):
+        """Test streamed documents are byte-identical to the serialized tree, without per-message xmlns"""
+        rows = globals()[rows]
+        columns = {field: [row.get(field) for row in rows] for field in dict.fromkeys(k for row in rows for k in row)}
+
+        def normalized(xml_body):
+            return re.sub(rb' (TimeStamp|EchoToken)="[^"]*"', b"", xml_body)
+
+        expected = normalized(etree.tostring(build_tree("HOTEL", rows), encoding="utf-8"))
+        assert normalized(b"".join(iter_xml("HOTEL", rows, chunk_size=64))) == expected
+        assert normalized(b"".join(iter_xml_from_columns("HOTEL", [columns]))) == expected
+        assert expected.count(b"xmlns") == 1
+
+    def test_stream_yields_chunks(self):
+        """Test large batches are emitted in several chunks"""
+        rows = ({"Start": "2025-01-01", "End": "2025-01-02", "InvCode": f"R{i}", "RatePlanCode": "BAR",
+                 "BookingLimit": i} for i in range(2000))
+        chunks = list(iter_avail_notif_xml("HOTEL", rows, chunk_size=4096))
+        assert len(chunks) > 1
+        assert etree.fromstring(b"".join(chunks)).tag.endswith("OTA_HotelAvailNotifRQ")
+
+    def test_los_pattern_value(self):
+        """Test LOSPattern values are written as their FullPatternLOS"""
+        def rows(pattern):
+            return [{"Start": "2025-01-01", "End": "2025-01-02", "InvCode": "R", "RatePlanCode": "BAR",
+                     "LengthsOfStay": [{"Time": 1, "LOS_Pattern": pattern}]}]
+        built = serialize_xml(build_avail_notif_tree("HOTEL", rows(LOSPattern.parse("YNNNYYYY")), timestamp="T", echo_token="1"))
+        assert built == serialize_xml(build_avail_notif_tree("HOTEL", rows("10001111"), timestamp="T", echo_token="1"))
+        assert 'FullPatternLOS="10001111"' in built
+
+    def test_iter_validated_xml(self):
+        """Test validated stream passes a valid document through"""
+        rows = [{"Start": "2025-01-01", "End": "2025-01-02", "InvCode": "R", "RatePlanCode": "BAR", "BookingLimit": 1}]
+        chunks = list(iter_avail_notif_xml("HOTEL", rows, timestamp="2025-01-01T00:00:00", chunk_size=1))
+        assert list(iter_validated_xml(iter(chunks), AVAIL_XSD)) == chunks
+
+    def test_iter_validated_xml_invalid(self):
+        """Test validated stream raises for an invalid document"""
+        rows = [{"Start": "2025-01-01", "End": "2025-01-02", "InvCode": "R", "RatePlanCode": "BAR",
+                 "BookingLimit": "many"}]
+        chunks = iter_avail_notif_xml("HOTEL", rows, timestamp="2025-01-01T00:00:00")
+        with pytest.raises(XMLStreamValidationError):
+            list(iter_validated_xml(chunks, AVAIL_XSD))
+
+
+class TestPipeline:
+    """Test shared pipeline stages"""
+
+    def test_group_by_hotel(self):
+        """Test rows are grouped by HotelCode in order"""
+        rows = [{"HotelCode": "A", "n": 1}, {"HotelCode": "B", "n": 2}, {"HotelCode": "A", "n": 3}]
+        groups = group_by_hotel(rows)
+        assert list(groups) == ["A", "B"]
+        assert [r["n"] for r in groups["A"]] == [1, 3]
+
+    def test_ensure_single_hotel(self):
+        """Test mixed hotels are rejected while streaming"""
+        rows = [{"HotelCode": "A"}, {"HotelCode": "B"}]
+        with pytest.raises(MultipleHotelsError):
+            list(ensure_single_hotel(iter(rows), "A"))
+
+    def test_build_document(self, sample_message):
+        """Test document is built and validated for a message type"""
+        translator = plugin_registry.create_translator("cloudbeds")
+        rows = list(iter_translated(translator, MessageType.RATE, sample_message))
+        xml_body, xsd_error = build_document(MessageType.RATE, "lake_view_hotel", rows)
+        assert xsd_error is None
+        assert xml_body.startswith(b"<OTA_HotelRateAmountNotifRQ")
+
+    def test_columnar_translation_threshold(self, sample_message, monkeypatch):
+        """Test only messages with enough rows are translated column-wise"""
+        translator = plugin_registry.create_translator("cloudbeds")
+        monkeypatch.setattr(settings, "COLUMNAR_MIN_ROWS", 100)
+        assert iter_translated_columns(translator, MessageType.RATE, sample_message) is None
+        monkeypatch.setattr(settings, "COLUMNAR_MIN_ROWS", 1)
+        batches = iter_translated_columns(translator, MessageType.RATE, sample_message)
+        xml_body, xsd_error = build_document_from_columns(MessageType.RATE, "lake_view_hotel", batches)
+        assert xsd_error is None
+        assert xml_body.count(b"<RateAmountMessage>") == 2
+
+    def test_ensure_single_hotel_columns(self):
+        """Test mixed hotels are rejected in column batches"""
+        batches = [{"HotelCode": ["A", "A"]}, {"HotelCode": ["A", "B"]}]
+        with pytest.raises(MultipleHotelsError):
+            list(ensure_single_hotel_columns(iter(batches), "A"))
+
+    @pytest.mark.parametrize("message_type", [MessageType.AVAILABILITY, MessageType.RATE])
+    def test_columns_match_rows(self, sample_message, message_type):
+        """Test column batches hold the same values as the translated rows"""
+        compiled = plugin_registry.create_translator("cloudbeds").get_compiled_mapping(message_type)
+        rows = compiled.translate(sample_message)
+        batches = list(compiled.iter_column_batches(sample_message, batch_size=1))
+        assert len(batches) == len(rows)
+        for row, columns in zip(rows, batches):
+            assert {field: column[0] for field, column in columns.items() if column[0] is not None} == {
+                field: value for field, value in row.items() if value is not None
+            }
+
+    def test_column_xml_matches_row_xml(self, sample_message):
+        """Test documents built from columns are identical to those built from rows"""
+        translator = plugin_registry.create_translator("cloudbeds")
+        attrs = {"timestamp": "2024-01-01T00:00:00", "echo_token": "test"}
+
+        avail = translator.get_compiled_mapping(MessageType.AVAILABILITY)
+        expected = serialize_xml(build_avail_notif_tree("H1", avail.translate(sample_message), **attrs))
+        actual = serialize_xml(build_avail_notif_tree_from_columns("H1", avail.iter_column_batches(sample_message), **attrs))
+        assert actual == expected
+
+        rate = translator.get_compiled_mapping(MessageType.RATE)
+        expected = b"".join(iter_rate_amount_notif_xml("H1", rate.translate(sample_message), **attrs))
+        actual = b"".join(iter_rate_amount_notif_xml_from_columns("H1", rate.iter_column_batches(sample_message), **attrs))
+        assert actual == expected
+
+
+class TestDeliveryQueue:
+    """Test durable delivery spool and workers"""
+
+    @pytest.fixture
+    def spool(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(settings, "SPOOL_RETRY_DELAY", 0)
+        return DeliverySpool(str(tmp_path))
+
+    @pytest.fixture
+    def upstream(self, monkeypatch):
+        """Stub internal API returning queued responses"""
+        calls = []
+        responses = []
+
+        async def fake_post(xml_body, message_type, auth_header=None):
+            calls.append((b"".join([chunk async for chunk in xml_body]), auth_header))
+            response = responses.pop(0) if responses else httpx.Response(200, text="<Ack/>")
+            if response.status_code >= 400:
+                response.request = httpx.Request("POST", "http://internal")
+                response.raise_for_status()
+            return response
+
+        monkeypatch.setattr(delivery_queue_module, "post_xml_to_internal_api", fake_post)
+        return calls, responses
+
+    def test_enqueue(self, spool, tmp_path):
+        """Test document and metadata are written to the spool"""
+        tracking_id = spool.enqueue(iter([b"<Doc>", b"</Doc>"]), "rate", "cloudbeds", auth_header="Bearer t")
+        meta = spool.get(tracking_id)
+        assert meta["status"] == "queued"
+        assert meta["attempts"] == 0
+        assert "auth_header" not in meta
+        assert "Bearer t" not in (tmp_path / f"{tracking_id}.json").read_text()
+        assert (tmp_path / f"{tracking_id}.auth").stat().st_mode & 0o777 == 0o600
+        assert b"".join(spool.iter_xml(tracking_id)) == b"<Doc></Doc>"
+        assert [m["tracking_id"] for m in spool.pending()] == [tracking_id]
+
+    def test_enqueue_failed_stream_leaves_nothing(self, spool, tmp_path):
+        """Test a stream that fails mid-write is not spooled"""
+        def chunks():
+            yield b"<Doc>"
+            raise ValueError("invalid")
+
+        with pytest.raises(ValueError):
+            spool.enqueue(chunks(), "rate", "cloudbeds")
+        assert os.listdir(tmp_path) == []
+
+    def test_get_rejects_bad_ids(self, spool):
+        """Test tracking ids cannot escape the spool directory"""
+        assert spool.get("../config") is None
+
+    @pytest.mark.asyncio
+    async def test_deliver(self, spool, upstream):
+        """Test successful delivery"""
+        calls, _ = upstream
+        tracking_id = spool.enqueue(b"<Doc/>", "rate", "cloudbeds", auth_header="Bearer t")
+        meta = await DeliveryQueue(spool).deliver(tracking_id)
+        assert meta["status"] == "delivered"
+        assert meta["upstream_status"] == 200
+        assert calls == [(b"<Doc/>", "Bearer t")]
+        assert spool.pending() == []
+        assert spool.auth_header(tracking_id) is None
+        assert not spool.is_claimed(tracking_id)
+
+    @pytest.mark.asyncio
+    async def test_recovered_jobs_keep_authorization(self, spool, upstream, tmp_path):
+        """Test a job recovered after a restart is delivered with its Authorization header"""
+        calls, _ = upstream
+        tracking_id = spool.enqueue(b"<Doc/>", "rate", "cloudbeds", auth_header="Bearer t")
+        restarted = DeliverySpool(str(tmp_path))
+        queue = DeliveryQueue(restarted)
+        await queue.start(workers=1)
+        try:
+            for _ in range(100):
+                if restarted.get(tracking_id)["status"] == "delivered":
+                    break
+                await asyncio.sleep(0.01)
+        finally:
+            await queue.stop()
+        assert restarted.get(tracking_id)["status"] == "delivered"
+        assert calls == [(b"<Doc/>", "Bearer t")]
+        assert not (tmp_path / f"{tracking_id}.auth").exists()
+
+    @pytest.mark.asyncio
+    async def test_deliver_skips_jobs_claimed_elsewhere(self, spool, upstream, tmp_path):
+        """Test a job claimed by another process is neither delivered nor listed as pending"""
+        calls, _ = upstream
+        tracking_id = spool.enqueue(b"<Doc/>", "rate", "cloudbeds")
+        other = DeliverySpool(str(tmp_path))
+        assert other.claim(tracking_id)
+        assert not spool.claim(tracking_id)
+        assert spool.pending() == []
+        meta = await DeliveryQueue(spool).deliver(tracking_id)
+        assert meta["status"] == "queued"
+        assert calls == []
+        other.release(tracking_id)
+        assert (await DeliveryQueue(spool).deliver(tracking_id))["status"] == "delivered"
+
+    def test_stale_claims_are_taken_over(self, spool, tmp_path, monkeypatch):
+        """Test a claim left by a dead process expires"""
+        tracking_id = spool.enqueue(b"<Doc/>", "rate", "cloudbeds")
+        assert spool.claim(tracking_id)
+        monkeypatch.setattr(settings, "SPOOL_CLAIM_TIMEOUT", -1)
+        assert [m["tracking_id"] for m in spool.pending()] == [tracking_id]
+        assert DeliverySpool(str(tmp_path)).claim(tracking_id)
+        assert sorted(os.listdir(tmp_path)) == sorted(f"{tracking_id}.{ext}" for ext in ("json", "lock", "xml"))
+
+    @pytest.mark.asyncio
+    async def test_prune_removes_old_finished_jobs(self, spool, upstream, tmp_path):
+        """Test finished jobs past the retention period are removed, queued ones kept"""
+        delivered = spool.enqueue(b"<Doc/>", "rate", "cloudbeds")
+        await DeliveryQueue(spool).deliver(delivered)
+        queued = spool.enqueue(b"<Doc/>", "rate", "cloudbeds", auth_header="Bearer t")
+        assert spool.prune(retention=3600) == 0
+        old = time.time() - 7200
+        for tracking_id in (delivered, queued):
+            os.utime(tmp_path / f"{tracking_id}.json", (old, old))
+        assert spool.prune(retention=3600) == 1
+        assert spool.get(delivered) is None
+        assert spool.get(queued)["status"] == "queued"
+        assert spool.auth_header(queued) == "Bearer t"
+
+    @pytest.mark.asyncio
+    async def test_deliver_retries_server_errors(self, spool, upstream):
+        """Test server errors are rescheduled"""
+        _, responses = upstream
+        responses.append(httpx.Response(503))
+        tracking_id = spool.enqueue(b"<Doc/>", "rate", "cloudbeds")
+        meta = await DeliveryQueue(spool).deliver(tracking_id)
+        assert meta["status"] == "queued"
+        assert meta["attempts"] == 1
+
+    @pytest.mark.asyncio
+    async def test_deliver_gives_up_on_client_errors(self, spool, upstream):
+        """Test client errors fail the job without retrying"""
+        _, responses = upstream
+        responses.append(httpx.Response(400))
+        tracking_id = spool.enqueue(b"<Doc/>", "rate", "cloudbeds")
+        meta = await DeliveryQueue(spool).deliver(tracking_id)
+        assert meta["status"] == "failed"
+
+    @pytest.mark.asyncio
+    async def test_workers_drain_spool_on_start(self, spool, upstream):
+        """Test jobs spooled before start are delivered by the workers"""
+        _, responses = upstream
+        responses.append(httpx.Response(500))
+        tracking_id = spool.enqueue(b"<Doc/>", "rate", "cloudbeds")
+        queue = DeliveryQueue(spool)
+        await queue.start(workers=2)
+        try:
+            for _ in range(100):
+                if spool.get(tracking_id)["status"] == "delivered":
+                    break
+                await asyncio.sleep(0.01)
+        finally:
+            await queue.stop()
+        meta = spool.get(tracking_id)
+        assert meta["status"] == "delivered"
+        assert meta["attempts"] == 2
+
+
+class TestCoalescer:
+    """Test coalescing of superseded ARI rows"""
+
+    @staticmethod
+    def _row(start, end, **fields):
+        return {"HotelCode": "H1", "InvCode": "DBL", "RatePlanCode": "BAR", "Start": start, "End": end, **fields}
+
+    def test_last_write_wins(self):
+        """Test a later row for the same dates replaces the earlier one"""
+        rows = coalesce_rows([
+            self._row("2024-01-01", "2024-01-05", BookingLimit=3),
+            self._row("2024-01-01", "2024-01-05", BookingLimit=1),
+        ])
+        assert rows == [self._row("2024-01-01", "2024-01-05", BookingLimit=1)]
+
+    def test_overlapping_ranges_are_split(self):
+        """Test the earlier row keeps only the dates the later one doesn't cover"""
+        rows = coalesce_rows([
+            self._row("2024-01-01", "2024-01-10", BookingLimit=3),
+            self._row("2024-01-04", "2024-01-06", BookingLimit=0),
+        ])
+        assert rows == [
+            self._row("2024-01-01", "2024-01-03", BookingLimit=3),
+            self._row("2024-01-07", "2024-01-10", BookingLimit=3),
+            self._row("2024-01-04", "2024-01-06", BookingLimit=0),
+        ]
+
+    def test_different_facets_are_kept(self):
+        """Test a restriction doesn't supersede a booking limit for the same dates"""
+        limit = self._row("2024-01-01", "2024-01-05", BookingLimit=3)
+        closed = self._row("2024-01-01", "2024-01-05", RestrictionStatus={"Status": "Close"})
+        assert coalesce_rows([limit, closed]) == [limit, closed]
+
+    def test_different_rooms_are_kept(self):
+        """Test rows for other room types are untouched"""
+        first = self._row("2024-01-01", "2024-01-05", BookingLimit=3)
+        other = dict(self._row("2024-01-01", "2024-01-05", BookingLimit=1), InvCode="SGL")
+        assert coalesce_rows([first, other]) == [first, other]
+
+    def test_weekday_rows(self):
+        """Test a weekday-only row supersedes only rows for the same days"""
+        full = self._row("2024-01-01", "2024-01-31", BookingLimit=3)
+        weekend = self._row("2024-01-01", "2024-01-31", BookingLimit=1, Sat=True, Sun=True,
+                            Mon=False, Tue=False, Weds=False, Thur=False, Fri=False)
+        assert coalesce_rows([full, weekend]) == [full, weekend]
+        assert coalesce_rows([weekend, full]) == [full]
+
+    def test_nested_status_application_control(self):
+        """Test rows with a nested StatusApplicationControl are split too"""
+        def row(start, end, limit):
+            return {"HotelCode": "H1", "BookingLimit": limit,
+                    "StatusApplicationControl": {"Start": start, "End": end, "InvCode": "DBL"}}
+
+        rows = coalesce_rows([row("2024-01-01", "2024-01-10", 3), row("2024-01-01", "2024-01-05", 0)])
+        assert rows == [row("2024-01-06", "2024-01-10", 3), row("2024-01-01", "2024-01-05", 0)]
+
+    def test_rows_without_dates_pass_through(self):
+        """Test rows without a usable date range are not merged"""
+        row = {"HotelCode": "H1", "InvCode": "DBL", "BookingLimit": 1}
+        assert coalesce_rows([row, row]) == [row, row]
+
+    @pytest.mark.asyncio
+    async def test_flush_after_window(self, tmp_path, monkeypatch):
+        """Test buffered rows are spooled as one document once the window ends"""
+        monkeypatch.setattr(settings, "COALESCE_WINDOW", 0.01)
+        spool = DeliverySpool(str(tmp_path))
+        service = Coalescer(spool, DeliveryQueue(spool))
+        service.add("cloudbeds", MessageType.AVAILABILITY, "H1", [self._row("2024-01-01", "2024-01-05", BookingLimit=3)])
+        assert service.add("cloudbeds", MessageType.AVAILABILITY, "H1", [self._row("2024-01-03", "2024-01-05", BookingLimit=0)]) == 2
+        assert spool.pending() == []
+
+        await asyncio.sleep(0.05)
+        assert len(service) == 0
+        [meta] = spool.pending()
+        xml = b"".join(spool.iter_xml(meta["tracking_id"])).decode("utf-8")
+        assert xml.count("<AvailStatusMessage ") == 2
+        assert 'End="2024-01-02"' in xml
+
+    @pytest.mark.asyncio
+    async def test_flush_all_waits_for_running_flushes(self, tmp_path, monkeypatch):
+        """Test a flush started by a full buffer is spooled by the time flush_all returns"""
+        monkeypatch.setattr(settings, "COALESCE_MAX_ROWS", 1)
+        spool = DeliverySpool(str(tmp_path))
+        service = Coalescer(spool, DeliveryQueue(spool))
+        assert service.add("cloudbeds", MessageType.AVAILABILITY, "H1", [self._row("2024-01-01", "2024-01-05", BookingLimit=3)]) == 0
+        service.add("cloudbeds", MessageType.AVAILABILITY, "H2", [self._row("2024-01-01", "2024-01-05", BookingLimit=3)])
+        assert len(await service.flush_all()) == 2
+        assert len(spool.pending()) == 2
+
+
+class TestDateRanges:
+    """Test date-range explosion and compression"""
+
+    @staticmethod
+    def day_rows(days, **values):
+        start = date(2025, 11, 3)
+        rows = []
+        for offset in days:
+            day = (start + timedelta(days=offset)).isoformat()
+            rows.append(dict({"HotelCode": "H1", "InvCode": "DBL", "RatePlanCode": "BAR", "Start": day, "End": day}, **values))
+        return rows
+
+    def test_per_day_rows_merge(self):
+        """Test consecutive per-day rows with identical values become one range"""
+        rows = self.day_rows(range(10), BookingLimit=5) + self.day_rows(range(10, 14), BookingLimit=3)
+        assert compress_date_ranges(rows) == [
+            {"HotelCode": "H1", "InvCode": "DBL", "RatePlanCode": "BAR", "Start": "2025-11-03", "End": "2025-11-12", "BookingLimit": 5},
+            {"HotelCode": "H1", "InvCode": "DBL", "RatePlanCode": "BAR", "Start": "2025-11-13", "End": "2025-11-16", "BookingLimit": 3},
+        ]
+
+    def test_weekday_pattern(self):
+        """Test a weekly pattern becomes one range with day-of-week flags"""
+        closed = {"RestrictionStatus": {"Status": "Close"}}
+        rows = self.day_rows([day for day in range(28) if day % 7 >= 5], **closed)
+        (row,) = compress_date_ranges(rows)
+        assert (row["Start"], row["End"]) == ("2025-11-08", "2025-11-30")
+        assert [row[day] for day in ("Mon", "Tue", "Weds", "Thur", "Fri", "Sat", "Sun")] == [False] * 5 + [True] * 2
+        # Rate documents do not render the flags, so only consecutive days merge
+        assert len(compress_date_ranges(rows, weekdays=False)) == 4
+
+    def test_later_rows_win(self):
+        """Test later rows overwrite the days they cover"""
+        rows = [
+            {"InvCode": "DBL", "Start": "2025-11-01", "End": "2025-11-10", "BookingLimit": 5},
+            {"InvCode": "DBL", "Start": "2025-11-05", "End": "2025-11-05", "BookingLimit": 0},
+            {"InvCode": "DBL", "Start": "2025-11-06", "End": "2025-11-06", "BookingLimit": 5},
+            {"InvCode": "DBL", "Start": "2025-11-07", "End": "2025-11-07", "BookingLimit": 5},
+        ]
+        assert [(r["Start"], r["End"], r["BookingLimit"]) for r in compress_date_ranges(rows, weekdays=False)] == [
+            ("2025-11-01", "2025-11-04", 5), ("2025-11-06", "2025-11-10", 5), ("2025-11-05", "2025-11-05", 0)
+        ]
+        # 2025-11-05 is a Wednesday, so with day-of-week flags the limit of 5 is a single row
+        first, second = compress_date_ranges(rows)
+        assert (first["Start"], first["End"], first["Weds"], first["Thur"]) == ("2025-11-01", "2025-11-10", False, True)
+        assert (second["Start"], second["BookingLimit"]) == ("2025-11-05", 0)
+
+    def test_order_dependent_rows_untouched(self):
+        """Test rows whose outcome depends on their order are kept as sent"""
+        rows = self.day_rows(range(3), BookingLimit=5) + self.day_rows([1], BookingLimit=2, MinLOS=3)
+        assert compress_date_ranges(rows) == rows
+
+    def test_uncompressible_rows_unchanged(self):
+        """Test rows are returned as is when nothing merges"""
+        rows = [{"InvCode": "DBL", "Start": "2025-11-01", "End": "2025-11-03"}, {"InvCode": "SGL", "Start": "bad", "End": "bad"}]
+        assert compress_date_ranges(rows) == rows
+
+    def test_build_document_compresses(self):
+        """Test per-day feeds produce one message per range"""
+        rows = self.day_rows(range(30), BookingLimit=5)
+        xml_body, xsd_error = build_document(MessageType.AVAILABILITY, "H1", rows)
+        assert xsd_error is None
+        assert xml_body.count(b"<AvailStatusMessage ") == 1
+
+
+class TestMappingCompiler:
+    """Test compiled mapping sections"""
+
+    def test_fan_out(self):
+        """Test '[]' emits one row per list item with message-level fields repeated"""
+        compiled = CompiledMapping({"HotelCode": "hotel.id", "InvCode": "Rooms[].code"})
+        rows = compiled.translate({"hotel": {"id": "H1"}, "Rooms": [{"code": "DBL"}, {"code": "SGL"}]})
+        assert rows == [{"HotelCode": "H1", "InvCode": "DBL"}, {"HotelCode": "H1", "InvCode": "SGL"}]
+
+    def test_nested_fan_out(self):
+        """Test nested lists fan out to one row per innermost item"""
+        compiled = CompiledMapping({"InvCode": "Rooms[].code", "RatePlanCode": "Rooms[].rates[].id"})
+        message = {"Rooms": [{"code": "DBL", "rates": [{"id": "BAR"}, {"id": "NR"}]}, {"code": "SGL", "rates": []}]}
+        assert compiled.translate(message) == [
+            {"InvCode": "DBL", "RatePlanCode": "BAR"},
+            {"InvCode": "DBL", "RatePlanCode": "NR"},
+        ]
+
+    def test_no_fan_out(self):
+        """Test a section without '[]' produces a single row"""
+        compiled = CompiledMapping({"HotelCode": "id"})
+        assert compiled.translate({"id": "H1"}) == [{"HotelCode": "H1"}]
+
+    def test_translate_sections_single_pass(self):
+        """Test sections sharing a fan-out translate together as they do separately"""
+        avail = CompiledMapping({"InvCode": "Rooms[].code", "BookingLimit": {"path": "Rooms[].units", "type": "int"}})
+        rate = CompiledMapping({"InvCode": "Rooms[].code", "BaseRate": {"path": "Rooms[].rate", "type": "decimal"}})
+        message = {"Rooms": [{"code": "DBL", "units": "2", "rate": "99.5"}, {"code": "SGL", "units": "1", "rate": "70"}]}
+        assert translate_sections([avail, rate], message) == [avail.translate(message), rate.translate(message)]
+
+    def test_translate_sections_different_fan_outs(self):
+        """Test sections over different lists fall back to separate passes"""
+        rooms = CompiledMapping({"InvCode": "Rooms[].code"})
+        plans = CompiledMapping({"RatePlanCode": "Plans[].id"})
+        message = {"Rooms": [{"code": "DBL"}], "Plans": [{"id": "BAR"}, {"id": "NR"}]}
+        assert translate_sections([rooms, plans], message) == [[{"InvCode": "DBL"}], [{"RatePlanCode": "BAR"}, {"RatePlanCode": "NR"}]]
+
+    def test_alternative_paths_and_defaults(self):
+        """Test the first path with a value wins, then the default"""
+        compiled = CompiledMapping({
+            "HotelCode": {"path": ["ota_id", "id"], "default": "UNKNOWN"},
+            "CurrencyCode": {"default": "USD"},
+        })
+        assert compiled.translate({"id": "H1"}) == [{"HotelCode": "H1", "CurrencyCode": "USD"}]
+        assert compiled.translate({}) == [{"HotelCode": "UNKNOWN", "CurrencyCode": "USD"}]
+
+    def test_typed_conversions(self):
+        """Test typed fields and conversions keyed by PMS path"""
+        compiled = CompiledMapping(
+            {"BookingLimit": {"path": "units", "type": "int"}, "InvCode": "room"},
+            conversions={"room": "lambda x: x.upper()"}
+        )
+        assert compiled.translate({"units": "5", "room": "dbl"}) == [{"BookingLimit": 5, "InvCode": "DBL"}]
+        with pytest.raises(ValueError, match="BookingLimit"):
+            compiled.translate({"units": "many"})
+
+    def test_flags_group(self):
+        """Test a flags group takes the first true flag and is omitted when none is"""
+        compiled = CompiledMapping({
+            "InvCode": "Rooms[].code",
+            "RestrictionStatus": {"Status": {"flags": {"Close": "Rooms[].close", "ClosedOnArrival": "Rooms[].cta"}}},
+        })
+        rows = compiled.translate({"Rooms": [{"code": "DBL", "cta": True}, {"code": "SGL", "close": False}]})
+        assert rows == [{"InvCode": "DBL", "RestrictionStatus": {"Status": "ClosedOnArrival"}}, {"InvCode": "SGL"}]
+
+    def test_invalid_mappings(self):
+        """Test invalid sections are rejected at compile time"""
+        with pytest.raises(ValueError):
+            CompiledMapping({"InvCode": "Rooms[].code", "RatePlanCode": "Rates[].id"})
+        with pytest.raises(ValueError):
+            CompiledMapping({"BookingLimit": {"path": "units", "type": "complex"}})
+
+    def test_loader_cache_invalidation(self, tmp_path, monkeypatch):
+        """Test compiled mappings are cached until the mapping file changes"""
+        monkeypatch.chdir(tmp_path)
+        mapping_path = tmp_path / "pms" / "test_pms" / "mapping.yaml"
+        mapping_path.parent.mkdir(parents=True)
+        mapping_path.write_text("availability:\n  HotelCode: id\n")
+        loader = MappingLoader(reload_interval=0)
+
+        compiled = loader.get_compiled_mapping("test_pms", "availability")
+        assert loader.get_compiled_mapping("test_pms", "availability") is compiled
+
+        mapping_path.write_text("availability:\n  HotelCode: hotel\n")
+        os.utime(mapping_path, ns=(0, os.stat(mapping_path).st_mtime_ns + 1_000_000))
+        reloaded = loader.get_compiled_mapping("test_pms", "availability")
+        assert reloaded is not compiled
+        assert reloaded.translate({"hotel": "H1"}) == [{"HotelCode": "H1"}]
+
+    def test_loader_reload_interval(self, tmp_path, monkeypatch):
+        """Test the mapping file is not checked again within the reload interval unless invalidated"""
+        monkeypatch.chdir(tmp_path)
+        mapping_path = tmp_path / "pms" / "test_pms" / "mapping.yaml"
+        mapping_path.parent.mkdir(parents=True)
+        mapping_path.write_text("availability:\n  HotelCode: id\n")
+        loader = MappingLoader(reload_interval=3600)
+        assert loader.warm_up("test_pms") == 1
+
+        mapping_path.write_text("availability:\n  HotelCode: hotel\n")
+        os.utime(mapping_path, ns=(0, os.stat(mapping_path).st_mtime_ns + 1_000_000))
+        assert loader.load_mapping("test_pms")["availability"]["HotelCode"] == "id"
+        loader.invalidate("test_pms")
+        assert loader.load_mapping("test_pms")["availability"]["HotelCode"] == "hotel"
+
+
+class TestConversions:
+    """Test conversion expressions"""
+
+    def test_functions(self):
+        """Test bare functions, pipes and extra arguments"""
+        assert compile_expression("upper")("dbl") == "DBL"
+        assert compile_expression("date('iso')")("2025-11-08T10:30:00") == "2025-11-08"
+        assert compile_expression("bool")("yes") is True
+        assert compile_expression("los")("TTFFTTT") == "1100111"
+        assert compile_expression("value / 100 | round_currency('JPY')")("12345") == Decimal("123")
+
+    def test_arithmetic_and_row_references(self):
+        """Test arithmetic on numeric strings and row.X references"""
+        expression = compile_expression("value * 1.1 | round_currency(row.CurrencyCode)")
+        values = expression.evaluate(["10.00", None, "3"], [{"CurrencyCode": "EUR"}, {}, {"CurrencyCode": "JPY"}])
+        assert values == [Decimal("11.00"), None, Decimal("3")]
+
+    def test_wizard_lambdas(self):
+        """Test lambda strings written by the wizard"""
+        assert compile_expression("lambda x: x.strip().upper()")(" dbl ") == "DBL"
+        assert compile_expression("lambda x: int(float(x))")("5.0") == 5
+
+    @pytest.mark.parametrize("source", ["__import__('os')", "value.__class__", "open('x')", "x + 1", "value ** 9", "[1]"])
+    def test_unsafe_expressions_rejected(self, source):
+        """Test anything outside the whitelist is rejected when parsed"""
+        with pytest.raises(ValueError):
+            compile_expression(source)
+
+    def test_expressions_are_cached(self):
+        """Test parsed expressions are reused"""
+        assert compile_expression("value + 1") is compile_expression("value + 1")
+
+    def test_errors_per_value(self):
+        """Test every failing value is reported with its row"""
+        with pytest.raises(ConversionError) as exc_info:
+            compile_expression("int").evaluate(["1", "x", "3", "y"], field="BookingLimit")
+        assert [(e["field"], e["row"], e["value"]) for e in exc_info.value.errors] == [
+            ("BookingLimit", 1, "x"), ("BookingLimit", 3, "y")
+        ]
+
+    def test_date_column(self):
+        """Test dates are parsed a column at a time in the column's format"""
+        expression = compile_expression("date")
+        assert expression.evaluate(["05/11/2025", "11/25/2025"]) == ["2025-05-11", "2025-11-25"]
+        assert compile_expression('date("us")').evaluate(["05/11/2025"]) == ["2025-05-11"]
+        with pytest.raises(ConversionError) as exc_info:
+            expression.evaluate(["2025-11-08", "someday"], field="Start")
+        assert [(e["row"], e["value"]) for e in exc_info.value.errors] == [(1, "someday")]
+
+    def test_mapping_conversions(self):
+        """Test conversions on array and nested paths within a mapping"""
+        compiled = CompiledMapping(
+            {
+                "InvCode": "Rooms[].code",
+                "BaseRate": {"path": "Rooms[].rate", "convert": "value | round_currency(row.CurrencyCode)"},
+                "CurrencyCode": "currency",
+                "RestrictionStatus": {"Status": {"path": "Rooms[].status", "convert": "title"}},
+            },
+            conversions={"Rooms[].code": "upper"}
+        )
+        rows = compiled.translate({"currency": "EUR", "Rooms": [{"code": "dbl", "rate": "9.999", "status": "close"}]})
+        assert rows == [{"InvCode": "DBL", "BaseRate": Decimal("10.00"), "CurrencyCode": "EUR",
+                         "RestrictionStatus": {"Status": "Close"}}]
+
+    def test_mapping_conversion_errors(self):
+        """Test conversion errors name the field and row"""
+        compiled = CompiledMapping({"BookingLimit": {"path": "Rooms[].units", "type": "int"}})
+        with pytest.raises(ConversionError, match=r"BookingLimit \(row 1\)"):
+            compiled.translate({"Rooms": [{"units": "2"}, {"units": "many"}]})
+
+    def test_column_batch_conversion_errors(self):
+        """Test conversion errors in later column batches report the message row"""
+        compiled = CompiledMapping({"BookingLimit": {"path": "Rooms[].units", "type": "int"}})
+        message = {"Rooms": [{"units": "1"}, {"units": "2"}, {"units": "3"}, {"units": "many"}]}
+        with pytest.raises(ConversionError, match=r"BookingLimit \(row 3\)"):
+            list(compiled.iter_column_batches(message, batch_size=2))
+
+
+class TestJSONStream:
+    """Test incremental parsing of streamed payloads"""
+
+    @staticmethod
+    def parse(body, chunk_size, stream_key="Inventory"):
+        parser = StreamingJSONParser(stream_key)
+        chunks = iter([body[i:i + chunk_size] for i in range(0, len(body), chunk_size)])
+        while not parser.parse_header():
+            chunk = next(chunks, None)
+            if chunk is None:
+                parser.close()
+            else:
+                parser.feed(chunk)
+        items = list(parser.iter_items(lambda: next(chunks, None)))
+        return parser, items
+
+    @pytest.mark.parametrize("chunk_size", [1, 3, 7, 64, 100000])
+    def test_chunk_boundaries(self, sample_message, chunk_size):
+        """Test header and items match json.loads for any chunking"""
+        body = json.dumps(dict(sample_message, Inventory=sample_message["Inventory"] + [1.5e3, "é"]), ensure_ascii=False).encode()
+        parser, items = self.parse(body, chunk_size)
+        assert parser.streaming
+        assert parser.header == {key: value for key, value in sample_message.items() if key != "Inventory"}
+        assert items == json.loads(body)["Inventory"]
+        assert parser.bytes_read == len(body)
+
+    def test_no_stream_key(self):
+        """Test payloads without the list are parsed whole into the header"""
+        parser, items = self.parse(b'{"a": 1, "Inventory": {"b": 2}}', 4)
+        assert not parser.streaming
+        assert parser.header == {"a": 1, "Inventory": {"b": 2}}
+        assert items == []
+
+    @pytest.mark.parametrize("body", [
+        b'{"Inventory": [1, 2], "guid": "x"}',
+        b'{"Inventory": [1, 2,]}',
+        b'{"Inventory": [1 2]}',
+        b'{"Inventory": [1, 2]} {}',
+        b'{"Inventory": [1, 2',
+    ])
+    def test_invalid(self, body):
+        """Test malformed or unstreamable payloads raise StreamedJSONError"""
+        with pytest.raises(StreamedJSONError):
+            self.parse(body, 2)
+
+    def test_streamed_list_read_once(self):
+        """Test the list stand-in passed to translators can only be iterated once"""
+        parser = StreamingJSONParser("Inventory")
+        parser.feed(b'{"Inventory": [{"a": 1}]}')
+        parser.close()
+        assert parser.parse_header()
+        items = StreamedList(parser, lambda: None)
+        assert list(items) == [{"a": 1}]
+        with pytest.raises(StreamedJSONError):
+            iter(items)
+
+    @pytest.mark.asyncio
+    async def test_closed_channel_releases_reader(self):
+        """Test a reader waiting on an abandoned upload is released by close()"""
+        channel = ChunkChannel()
+        reader = asyncio.ensure_future(asyncio.to_thread(channel.get))
+        await asyncio.sleep(0.05)
+        channel.close()
+        assert await asyncio.wait_for(reader, timeout=1) is None
+
+    def test_mapping_stream_key(self):
+        """Test the mapping names the streamed list"""
+        assert mapping_loader.get_stream_key("cloudbeds") == "Inventory"
+        assert mapping_loader.get_stream_key("no_such_pms") is None
+
+
+class TestJSONCodec:
+    """Test the pluggable JSON codec"""
+
+    @pytest.mark.parametrize("name", list(json_codec.CODECS))
+    def test_round_trip(self, name, sample_message):
+        """Test every codec decodes bytes and text and encodes compact UTF-8"""
+        codec = json_codec.CODECS[name]
+        body = json.dumps(sample_message).encode("utf-8")
+        assert codec.loads(body) == codec.loads(body.decode("utf-8")) == sample_message
+        assert codec.dumps({"a": [1, "é"]}) == '{"a":[1,"é"]}'.encode("utf-8")
+        with pytest.raises(ValueError):
+            codec.loads(b'{"a": ')
+
+    @pytest.mark.parametrize("name", list(json_codec.CODECS))
+    @pytest.mark.parametrize("value", [float("nan"), float("inf"), -float("inf")])
+    def test_non_finite_floats_rejected(self, name, value):
+        """Test every codec refuses NaN and Infinity instead of writing them differently"""
+        codec = json_codec.CODECS[name]
+        with pytest.raises(ValueError):
+            codec.dumps({"rows": [{"rate": value}]})
+        assert codec.dumps({"rate": None, "rows": (1.5,)}) == b'{"rate":null,"rows":[1.5]}'
+
+    def test_get_codec(self, monkeypatch):
+        """Test codec selection and the stdlib fallback"""
+        assert json_codec.get_codec("json").name == "json"
+        assert json_codec.get_codec("auto").name == ("orjson" if json_codec.ORJSON_AVAILABLE else "json")
+        with pytest.raises(ValueError):
+            json_codec.get_codec("yaml")
+        monkeypatch.setattr(json_codec, "ORJSON_AVAILABLE", False)
+        json_codec.get_codec.cache_clear()
+        try:
+            assert json_codec.get_codec("orjson").name == "json"
+            assert json_codec.get_codec("auto").name == "json"
+        finally:
+            json_codec.get_codec.cache_clear()
+
+    def test_response_uses_setting(self, monkeypatch):
+        """Test responses render with the configured codec"""
+        monkeypatch.setattr(settings, "JSON_CODEC", "json")
+        response = json_codec.CodecJSONResponse({"status": "ok", "rows": 2})
+        assert response.body == b'{"status":"ok","rows":2}'
+        assert response.media_type == "application/json"
+
+
+class TestMessageSchema:
+    """Test compiled PMS message schemas"""
+
+    @pytest.fixture
+    def schema(self):
+        return plugin_registry.get_translator_instance("cloudbeds").message_schema
+
+    def test_sample_is_valid(self, schema, sample_message):
+        """Test the sample message passes and is not modified"""
+        before = json.dumps(sample_message)
+        schema.validate(sample_message)
+        assert json.dumps(sample_message) == before
+
+    def test_row_errors(self, schema, sample_message):
+        """Test every problem is reported with its row and field"""
+        sample_message["Inventory"][0]["close"] = "maybe"
+        sample_message["Inventory"][1]["rate"] = "-5"
+        del sample_message["Inventory"][1]["ota_room_id"]
+        with pytest.raises(MessageValidationError) as excinfo:
+            schema.validate(sample_message)
+        assert [error["loc"] for error in excinfo.value.errors] == [
+            "Inventory[0].close", "Inventory[1].ota_room_id", "Inventory[1].rate"
+        ]
+
+    def test_explicit_nulls(self, schema, sample_message):
+        """Test optional fields sent as null and numeric property ids pass"""
+        sample_message["ota_property_id"] = 12345
+        sample_message["currency"] = None
+        sample_message["Inventory"][0].update(rate=None, units=None, min_los=None, close=None)
+        schema.validate(sample_message)
+
+    def test_streamed_items(self, schema):
+        """Test streamed lists are skipped by validate() and checked per item"""
+        parser = StreamingJSONParser("Inventory")
+        parser.feed(b'{"ota_property_id": "H1", "Inventory": [{"ota_room_id": "R1"}]}')
+        parser.close()
+        assert parser.parse_header()
+        items = StreamedList(parser, lambda: None, schema.validate_item)
+        schema.validate({**parser.header, "Inventory": items})
+        with pytest.raises(MessageValidationError, match=r"Inventory\[0\]\.ota_rate_id: Field required"):
+            list(items)
+
+    def test_format_location(self):
+        """Test pydantic locations become paths"""
+        assert format_location(("Inventory", 3, "units")) == "Inventory[3].units"
+        assert format_location(()) == "message"
+
+
+class TestRowScreening:
+    """Test isolation of the items that make a message fail"""
+
+    @pytest.fixture(autouse=True)
+    def no_schema(self, monkeypatch):
+        # Exercise the translation and XSD stages, which the schema would pre-empt
+        monkeypatch.setattr(settings, "MESSAGE_SCHEMA_VALIDATION", False)
+
+    def test_translation_failures(self, monkeypatch, sample_message):
+        """Test items failing translation are rejected and the rest kept"""
+        translator = plugin_registry.create_translator("cloudbeds")
+        iter_rate = translator.iter_rate
+
+        def failing_iter_rate(message):
+            if any(item.get("rate") == "boom" for item in message["Inventory"]):
+                raise ConversionError("Conversion failed for BaseRate 'boom'", [])
+            return iter_rate(message)
+
+        monkeypatch.setattr(translator, "iter_rate", failing_iter_rate)
+        items = sample_message["Inventory"]
+        sample_message["Inventory"] = [items[0], dict(items[1], rate="boom"), items[1]]
+        screened, rejected = screen_items(translator, [MessageType.RATE], sample_message, "Inventory")
+        assert screened["Inventory"] == [items[0], items[1]]
+        assert [(item.index, item.stage) for item in rejected] == [(1, "translate")]
+        assert rejected[0].errors == ["rate: Conversion failed for BaseRate 'boom'"]
+
+    def test_xsd_failures(self, sample_message):
+        """Test items producing invalid XML are found among many valid ones"""
+        translator = plugin_registry.create_translator("cloudbeds")
+        items = [dict(sample_message["Inventory"][0], ota_room_id=f"R{index}") for index in range(40)]
+        items[7]["units"] = "many"
+        items[31]["units"] = "n/a"
+        sample_message["Inventory"] = items
+        screened, rejected = screen_items(translator, [MessageType.AVAILABILITY], sample_message, "Inventory")
+        assert [(item.index, item.stage) for item in rejected] == [(7, "xsd"), (31, "xsd")]
+        assert len(screened["Inventory"]) == 38
+        assert "'many'" in rejected[0].errors[0]
+        assert build_document(MessageType.AVAILABILITY, "H1", translator.translate_availability(screened))[1] is None
+
+    def test_rows_attributed_to_their_item(self, monkeypatch, sample_message):
+        """Test items translating to several rows or none are not blamed for each other's rows"""
+        translator = plugin_registry.create_translator("cloudbeds")
+        iter_availability = translator.iter_availability
+
+        def fanning_iter_availability(message):
+            for item in message["Inventory"]:
+                if item.get("skip"):
+                    continue
+                yield from iter_availability({**message, "Inventory": [item]})
+                if item.get("split"):
+                    yield from iter_availability({**message, "Inventory": [dict(item, units="many")]})
+
+        monkeypatch.setattr(translator, "iter_availability", fanning_iter_availability)
+        item = sample_message["Inventory"][0]
+        sample_message["Inventory"] = [dict(item, split=True), dict(item, skip=True), dict(item, ota_room_id="R2")]
+        screened, rejected = screen_items(translator, [MessageType.AVAILABILITY], sample_message, "Inventory")
+        assert [(item.index, item.stage) for item in rejected] == [(0, "xsd")]
+        assert len(screened["Inventory"]) == 2
+
+    def test_invalid_rows_setting_checked(self, monkeypatch):
+        """Test an unknown INVALID_ROWS mode fails when settings load"""
+        monkeypatch.setenv("INVALID_ROWS", "Skip")
+        assert Settings().INVALID_ROWS == "skip"
+        monkeypatch.setenv("INVALID_ROWS", "drop")
+        with pytest.raises(ValueError, match="INVALID_ROWS"):
+            Settings()
+
+    def test_header_errors_not_isolated(self, monkeypatch, sample_message):
+        """Test schema problems outside the items are not blamed on items"""
+        monkeypatch.setattr(settings, "MESSAGE_SCHEMA_VALIDATION", True)
+        translator = plugin_registry.create_translator("cloudbeds")
+        del sample_message["ota_property_id"]
+        with pytest.raises(MessageValidationError):
+            screen_items(translator, [MessageType.RATE], sample_message, "Inventory")
+
+
+# Fully populated rows: every element and data-driven attribute the builders write
+FULL_AVAIL_ROWS = [
+    {
+        "HotelCode": "H1", "Start": "2025-01-01", "End": "2025-01-31", "InvCode": "DBL", "RatePlanCode": "BAR",
+        "Mon": True, "Tue": False, "Weds": "1", "Thur": "true", "Fri": True, "Sat": True, "Sun": False,
+        "BookingLimit": 5,
+        "LengthsOfStay": [
+            {"MinMaxMessageType": "SetMinLOS", "TimeUnit": "Day", "Time": 2, "LOS_Pattern": LOSPattern.parse("YN")},
+        ],
+        "RestrictionStatus": {"Status": "Close", "MinAdvancedBookingOffset": 1, "MaxAdvancedBookingOffset": 30},
+    },
+    {
+        "StatusApplicationControl": {"Start": "2025-02-01", "End": "2025-02-28", "InvCode": "DBL", "RatePlanCode": "BAR", "Sun": False},
+        "BookingLimit": "0",
+    },
+]
+FULL_RATE_ROWS = [
+    {
+        "HotelCode": "H1", "Start": "2025-01-01", "End": "2025-01-31", "InvCode": "DBL", "RatePlanCode": "BAR",
+        "CurrencyCode": "EUR", "UnitMultiplier": 1,
+        "BaseByGuestAmts": [{"AmountBeforeTax": Decimal("80.50"), "AmountAfterTax": 90, "AgeQualifyingCode": "10", "NumberOfGuests": 2}],
+        "GuaranteePolicies": [{"GuaranteeCode": "CC"}],
+        "CancelPolicies": [{
+            "NonRefundable": True,
+            "Deadline": {"AbsoluteDeadline": "2025-01-01T12:00:00", "OffsetDropTime": "BeforeArrival", "OffsetTimeUnit": "Day", "OffsetUnitMultiplier": 2},
+            "AmountPercent": {"NmbrOfNights": 1, "Amount": "10.00", "Percent": 50, "CurrencyCode": "EUR", "BasisType": "Nights"},
+            "PenaltyDescription": {"Text": "No refunds"},
+        }],
+        "MealsIncluded": {"MealPlanCodes": "1"},
+    },
+]
+
+
+class TestXMLConstraints:
+    """Test rows are checked against constraints compiled from the XSDs"""
+
+    AVAIL_CASES = [
+        {},
+        {"End": "2025-02-29"},
+        {"Start": "2024-02-29"},
+        {"Start": "2025-1-01"},
+        {"Start": date(2025, 3, 1)},
+        {"BookingLimit": True},
+        {"BookingLimit": 1.0},
+        {"BookingLimit": " 7 "},
+        {"Mon": "True"},
+        {"Sat": 1},
+        {"RatePlanCode": None},
+        {"RatePlanCode": None, "StatusApplicationControl": {"Start": "2025-01-01", "End": "2025-01-02", "InvCode": "A", "RatePlanCode": "B"}},
+        {"StatusApplicationControl": {"Start": "2025-01-01", "End": "2025-01-02", "InvCode": "A"}},
+        {"StatusApplicationControl": {"Start": "2025-01-01", "End": "2025-01-02", "InvCode": "A", "RatePlanCode": "B", "Closed": True}},
+        {"LengthsOfStay": [{"Time": 2}, {"Time": 3, "Unit": "Day"}]},
+        {"RestrictionStatus": {"Status": "Open", "MinAdvancedBookingOffset": "P1D"}},
+    ]
+    RATE_CASES = [
+        {},
+        {"UnitMultiplier": "1.5"},
+        {"InvCode": None},
+        {"BaseByGuestAmts": [{"AmountBeforeTax": 1e-05}]},
+        {"BaseByGuestAmts": [{"AmountBeforeTax": float("nan")}]},
+        {"BaseByGuestAmts": [{"AmountBeforeTax": "1."}, {"NumberOfGuests": "two"}]},
+        {"CancelPolicies": [{"Deadline": {"AbsoluteDeadline": "2025-01-01T24:00:00"}}]},
+        {"CancelPolicies": [{"Deadline": {"AbsoluteDeadline": "2025-01-01"}}]},
+        {"CancelPolicies": [{"AmountPercent": {"TaxInclusive": True}}]},
+        {"MealsIncluded": {"MealPlanCodes": "1", "Breakfast": True}},
+    ]
+
+    @staticmethod
+    def _assert_matches_xsd(message_type, rows):
+        constraints = get_document_constraints(message_type)
+        tree = DOCUMENT_SPECS[message_type].build_tree("H1", rows)
+        xsd_error = validate_xml_tree(tree, get_xsd_path(message_type))
+        error = constraints.check_rows(rows)
+        assert (error is None) == (xsd_error is None), (rows, error, xsd_error)
+        columns = {field: [row.get(field) for row in rows] for field in set().union(*rows)}
+        assert (constraints.check_columns([columns]) is None) == (xsd_error is None), (rows, xsd_error)
+        return error
+
+    def test_full_rows_valid(self):
+        """Test documents with every element the builders write are valid"""
+        for message_type, rows in ((MessageType.AVAILABILITY, FULL_AVAIL_ROWS), (MessageType.RATE, FULL_RATE_ROWS)):
+            assert self._assert_matches_xsd(message_type, rows) is None
+
+    @pytest.mark.parametrize("change", AVAIL_CASES)
+    def test_avail_rows_agree_with_xsd(self, change):
+        """Test availability rows are rejected exactly when the XSD rejects the document"""
+        rows = [dict(row) for row in FULL_AVAIL_ROWS]
+        rows[0].update(change)
+        self._assert_matches_xsd(MessageType.AVAILABILITY, rows)
+
+    @pytest.mark.parametrize("change", RATE_CASES)
+    def test_rate_rows_agree_with_xsd(self, change):
+        """Test rate rows are rejected exactly when the XSD rejects the document"""
+        rows = [dict(FULL_RATE_ROWS[0], **change)]
+        self._assert_matches_xsd(MessageType.RATE, rows)
+
+    def test_errors_locate_attribute(self):
+        """Test errors name the message and attribute"""
+        constraints = get_document_constraints(MessageType.AVAILABILITY)
+        rows = [dict(FULL_AVAIL_ROWS[0]) for _ in range(3)]
+        rows[2]["End"] = "2025-02-30"
+        assert constraints.check_rows(rows) == (
+            "AvailStatusMessage[3]/StatusApplicationControl/@End: '2025-02-30' is not a valid value of xs:date"
+        )
+        rows[2] = dict(FULL_AVAIL_ROWS[0], LengthsOfStay=[{"Time": 1}, {"Unit": "Day"}])
+        assert constraints.check_rows(rows) == (
+            "AvailStatusMessage[3]/LengthsOfStay/LengthOfStay[2]/@Unit: the attribute 'Unit' is not allowed"
+        )
+        rows[2] = dict(FULL_AVAIL_ROWS[0], BookingLimit=True)
+        assert constraints.check_rows(rows) == "AvailStatusMessage[3]/@BookingLimit: 'True' is not a valid value of xs:integer"
+        assert constraints.check_rows([]) == "AvailStatusMessage: expected at least 1 element(s), got 0"
+
+    def test_schema_support(self, tmp_path):
+        """Test enumerations are enforced and unsupported schemas fall back to the XSD"""
+        with open(AVAIL_XSD, encoding="utf-8") as f:
+            xsd = f.read()
+        enumerated = xsd.replace(
+            '<xs:attribute name="Status" type="xs:string"/>',
+            '<xs:attribute name="Status"><xs:simpleType><xs:restriction base="xs:string">'
+            '<xs:enumeration value="Open"/><xs:enumeration value="Close"/></xs:restriction></xs:simpleType></xs:attribute>'
+        )
+        (tmp_path / "enumerated.xsd").write_text(enumerated, encoding="utf-8")
+        constraints = get_constraints(str(tmp_path / "enumerated.xsd"), AVAIL_STATUS_MESSAGE_LAYOUT)
+        assert constraints.check_rows(FULL_AVAIL_ROWS) is None
+        rows = [dict(FULL_AVAIL_ROWS[0], RestrictionStatus={"Status": "Closed"})]
+        assert "'Closed' is not a valid value of xs:string enumeration" in constraints.check_rows(rows)
+
+        patterned = xsd.replace('type="xs:integer"/>', '><xs:simpleType><xs:restriction base="xs:integer">'
+                                '<xs:minInclusive value="0"/></xs:restriction></xs:simpleType></xs:attribute>')
+        (tmp_path / "patterned.xsd").write_text(patterned, encoding="utf-8")
+        assert get_constraints(str(tmp_path / "patterned.xsd"), AVAIL_STATUS_MESSAGE_LAYOUT) is None
+        undeclared = xsd.replace('<xs:attribute name="BookingLimit" type="xs:integer"/>', "")
+        (tmp_path / "undeclared.xsd").write_text(undeclared, encoding="utf-8")
+        assert get_constraints(str(tmp_path / "undeclared.xsd"), AVAIL_STATUS_MESSAGE_LAYOUT) is None
+
+    def test_sampled_validation(self, monkeypatch):
+        """Test only sampled documents are XSD-validated, and constraint errors are always reported"""
+        validated = []
+        monkeypatch.setattr(pipeline_module, "validate_xml_tree", lambda tree, path: validated.append(path))
+        monkeypatch.setattr(settings, "XSD_VALIDATION_SAMPLE_RATE", 0.5)
+        sampler = ValidationSampler()
+        monkeypatch.setattr(pipeline_module, "validation_sampler", sampler)
+        for _ in range(4):
+            assert build_document(MessageType.RATE, "H1", FULL_RATE_ROWS, pms_code="sampled") == (ANY, None)
+        assert len(validated) == 2
+
+        bad_rows = [dict(FULL_RATE_ROWS[0], Start="2025-13-01")]
+        assert "'2025-13-01' is not a valid value of xs:date" in build_document(MessageType.RATE, "H1", bad_rows)[1]
+        assert len(validated) == 2
+
+        monkeypatch.setattr(settings, "DEBUG", True)
+        assert sampler.rate == 1.0
+
+    def test_streamed_rows_checked(self, monkeypatch):
+        """Test streamed documents are checked as they are written"""
+        monkeypatch.setattr(pipeline_module, "validation_sampler", ValidationSampler(rate=0))
+        rows = [dict(FULL_RATE_ROWS[0], Start=f"2025-01-{day:02d}", End=f"2025-01-{day:02d}") for day in range(1, 32)]
+        chunks = list(iter_document_xml(MessageType.RATE, "H1", iter(rows)))
+        assert validate_xml_with_xsd(b"".join(chunks).decode("utf-8"), RATE_XSD) is None
+
+        rows[20]["End"] = "2025-01-32"
+        with pytest.raises(XMLStreamValidationError, match=r"RateAmountMessage\[21\]"):
+            list(iter_document_xml(MessageType.RATE, "H1", iter(rows)))
+        with pytest.raises(XMLStreamValidationError, match="expected at least 1"):
+            list(iter_document_xml(MessageType.RATE, "H1", iter([])))
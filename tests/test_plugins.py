@@ -90,6 +90,52 @@ class TestPluginRegistry:
         registry.unregister("test_pms")
         assert not registry.is_registered("test_pms")
     
+    def test_translator_instance_is_shared(self):
+        """Test the registry hands out one long-lived instance per PMS"""
+        registry = PluginRegistry()
+        registry.register("test_pms", MockTranslator)
+        
+        translator = registry.get_translator_instance("test_pms")
+        assert registry.get_translator_instance("test_pms") is translator
+        assert registry.get_translator_instance("missing_pms") is None
+        
+        # Re-registering replaces the shared instance
+        registry.register("test_pms", MockTranslator)
+        assert registry.get_translator_instance("test_pms") is not translator
+    
+    def test_warm_up(self, tmp_path, monkeypatch):
+        """Test warm-up compiles mappings and skips PMSs without one"""
+        monkeypatch.chdir(tmp_path)
+        mapping_path = tmp_path / "pms" / "test_pms" / "mapping.yaml"
+        mapping_path.parent.mkdir(parents=True)
+        mapping_path.write_text("availability:\n  HotelCode: id\nrate:\n  HotelCode: id\n")
+        registry = PluginRegistry()
+        registry.register("test_pms", MockTranslator)
+        registry.register("no_mapping_pms", MockTranslator)
+        
+        assert registry.warm_up() == 1
+    
+    def test_indexed_plugins_load_on_first_use(self, tmp_path):
+        """Test translator modules are indexed at discovery and imported when first used"""
+        plugin_dir = tmp_path / "lazy_pms"
+        plugin_dir.mkdir()
+        (plugin_dir / "translator.py").write_text(
+            "from tests.test_plugins import MockTranslator\n"
+            "from app.plugins.registry import register_translator\n"
+            "LOADED = True\n"
+            "@register_translator('lazy_pms')\n"
+            "class LazyTranslator(MockTranslator):\n"
+            "    pass\n"
+        )
+        registry = PluginRegistry()
+        assert registry.index_plugins(str(tmp_path)) == 1
+        assert "lazy_pms" in registry.list_translators()
+        assert "lazy_pms" not in registry._translators
+        
+        translator = registry.get_translator_instance("lazy_pms")
+        assert translator.__class__.__name__ == "LazyTranslator"
+        assert registry.get_translator("lazy_pms") is translator.__class__
+    
     def test_register_invalid_translator(self):
         """Test registering invalid translator class"""
         registry = PluginRegistry()
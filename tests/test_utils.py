@@ -6,14 +6,19 @@ import pytest
 from datetime import date, datetime
 from decimal import Decimal
 
-from app.utils.date_utils import parse_date, format_date, parse_datetime, format_datetime
+from app.utils.date_utils import (
+    parse_date, format_date, parse_datetime, format_datetime,
+    compress_ordinals, date_to_ordinal, expand_date_range, ordinal_weekday,
+    date_format_cache, detect_date_format, parse_dates
+)
 from app.utils.currency_utils import (
     is_valid_currency_code, format_currency, parse_currency_amount,
-    normalize_currency_code, round_currency
+    normalize_currency_code, round_currency, round_currency_many,
+    parse_currency_amounts, get_currency_precision, CURRENCIES
 )
 from app.utils.los_utils import (
     convert_los_to_binary_pattern, parse_los_pattern, format_los_pattern,
-    validate_los_pattern, get_available_days
+    validate_los_pattern, get_available_days, is_day_available, LOSPattern
 )
 from app.utils.boolean_utils import (
     parse_boolean, format_boolean, normalize_boolean, is_truthy, is_falsy
@@ -53,6 +58,77 @@ class TestDateUtils:
         result = format_date(date(2025, 11, 8), "us")
         assert result == "11/08/2025"
 
+    def test_parse_date_format_hint(self):
+        """Test the format hint resolves ambiguous dates"""
+        assert parse_date("11/08/2025", "us") == date(2025, 11, 8)
+        assert parse_date("11/08/2025", "eu") == date(2025, 8, 11)
+        assert parse_date("2025-11-08", "us") == date(2025, 11, 8)
+
+    def test_detect_date_format(self):
+        """Test a column's format is detected from the values that rule formats out"""
+        assert detect_date_format(["2025-11-08", None, "2025-01-31"]) == "iso"
+        assert detect_date_format(["05/11/2025", "11/25/2025"]) == "us"
+        assert detect_date_format(["05/11/2025", "25/11/2025"]) == "eu"
+        assert detect_date_format(["05/11/2025"], format_hint="us") == "us"
+        assert detect_date_format(["2025-11-08", "08/11/2025"]) is None
+
+    def test_parse_dates(self):
+        """Test bulk parsing with a cached per-field format"""
+        date_format_cache.clear()
+        values = ["05/11/2025", "11/25/2025", None, date(2025, 1, 1)]
+        assert parse_dates(values, cache_key="pms.rate:Start") == [
+            date(2025, 5, 11), date(2025, 11, 25), None, date(2025, 1, 1)
+        ]
+        # The next column of the field reuses the detected format
+        assert date_format_cache.get("pms.rate:Start") == "us"
+        assert parse_dates(["01/02/2025"], cache_key="pms.rate:Start") == [date(2025, 1, 2)]
+        # A value not matching it falls back and the format is re-detected later
+        assert parse_dates(["2025-02-03", "bad"], cache_key="pms.rate:Start") == [date(2025, 2, 3), None]
+        assert date_format_cache.get("pms.rate:Start") is None
+
+    def test_parse_dates_redetects_whole_column(self):
+        """Test a column contradicting the cached format is parsed in one re-detected format"""
+        date_format_cache.clear()
+        assert parse_dates(["11/25/2025"], cache_key="pms.rate:Start") == [date(2025, 11, 25)]
+        assert parse_dates(["05/11/2025", "25/11/2025"], cache_key="pms.rate:Start") == [
+            date(2025, 11, 5), date(2025, 11, 25)
+        ]
+        assert date_format_cache.get("pms.rate:Start") == "eu"
+        # Fields and format hints are cached separately
+        assert parse_dates(["11/25/2025"], cache_key="pms.rate:End") == [date(2025, 11, 25)]
+        assert parse_dates(["05/11/2025"], cache_key="pms.rate:End") == [date(2025, 5, 11)]
+        assert parse_dates(["05/11/2025"], cache_key="pms.rate:Start") == [date(2025, 11, 5)]
+        assert parse_dates(["05/11/2025"], "us", cache_key="pms.rate:Start") == [date(2025, 5, 11)]
+
+    def test_date_to_ordinal(self):
+        """Test day ordinals of ISO strings and dates"""
+        assert date_to_ordinal("2025-11-08") == date(2025, 11, 8).toordinal()
+        assert date_to_ordinal("2025-11-08T10:30:00") == date(2025, 11, 8).toordinal()
+        assert date_to_ordinal(datetime(2025, 11, 8, 10, 30)) == date(2025, 11, 8).toordinal()
+        assert date_to_ordinal("11/08/2025") is None
+        assert ordinal_weekday(date(2025, 11, 8).toordinal()) == date(2025, 11, 8).weekday()
+
+    def test_expand_date_range(self):
+        """Test expanding a range, optionally limited to days of week"""
+        monday = date(2025, 11, 3).toordinal()
+        assert list(expand_date_range(monday, monday + 6)) == list(range(monday, monday + 7))
+        weekend = (False, False, False, False, False, True, True)
+        assert expand_date_range(monday, monday + 13, weekend) == [monday + 5, monday + 6, monday + 12, monday + 13]
+
+    def test_compress_ordinals(self):
+        """Test days compress into maximal ranges"""
+        monday = date(2025, 11, 3).toordinal()
+        assert compress_ordinals([monday + 2, monday, monday + 1, monday + 5]) == [
+            (monday, monday + 2, None), (monday + 5, monday + 5, None)
+        ]
+        # Four weeks of weekdays: one range with weekday flags instead of four
+        weekdays = [day for day in range(monday, monday + 28) if ordinal_weekday(day) < 5]
+        assert compress_ordinals(weekdays, weekdays=True) == [
+            (monday, monday + 25, (True, True, True, True, True, False, False))
+        ]
+        assert len(compress_ordinals(weekdays)) == 4
+        assert compress_ordinals(range(monday, monday + 10), weekdays=True) == [(monday, monday + 9, None)]
+
 
 class TestCurrencyUtils:
     """Test currency utility functions"""
@@ -84,6 +160,40 @@ class TestCurrencyUtils:
         assert normalize_currency_code("usd") == "USD"
         assert normalize_currency_code("invalid") == "USD"
 
+    def test_currency_precision(self):
+        """Test ISO 4217 minor units"""
+        assert get_currency_precision("EUR") == 2
+        assert get_currency_precision("jpy") == 0
+        assert get_currency_precision("KWD") == 3
+        assert get_currency_precision("XXX") == 2
+        with pytest.raises(TypeError):
+            CURRENCIES["ABC"] = CURRENCIES["USD"]
+
+    def test_round_currency(self):
+        """Test rounding to the currency's precision"""
+        assert round_currency(Decimal("10.005"), "USD") == Decimal("10.01")
+        assert round_currency("1234.5", "JPY") == Decimal("1235")
+        assert round_currency(1.0005, "BHD") == Decimal("1.001")
+        assert round_currency(7, "EUR") == Decimal("7.00")
+
+    def test_round_currency_many(self):
+        """Test rounding a column, with one or per-value currencies"""
+        assert round_currency_many(["1.005", 2.5, Decimal("3")], "EUR") == [
+            Decimal("1.01"), Decimal("2.50"), Decimal("3.00")
+        ]
+        assert round_currency_many(["99.5", "99.5", "99.5"], ["USD", "JPY", None]) == [
+            Decimal("99.50"), Decimal("100"), Decimal("99.50")
+        ]
+
+    def test_parse_currency_amounts(self):
+        """Test bulk parsing matches parse_currency_amount"""
+        values = ["15.00", "-3", "1,234.56", "$ 99.90", "12,5", "abc", "", None, 4]
+        assert parse_currency_amounts(values) == [
+            Decimal("15.00"), Decimal("-3"), Decimal("1234.56"), Decimal("99.90"),
+            Decimal("12.5"), None, None, None, Decimal("4")
+        ]
+        assert parse_currency_amounts(values[:7]) == [parse_currency_amount(value) for value in values[:7]]
+
 
 class TestLOSUtils:
     """Test Length of Stay utility functions"""
@@ -120,6 +230,32 @@ class TestLOSUtils:
         assert validate_los_pattern("invalid") is False
 
 
+    def test_los_pattern_interned(self):
+        """Test every format of a pattern parses to the same interned value"""
+        pattern = LOSPattern.parse("1001111")
+        assert LOSPattern.parse("YNNYYYY") is pattern
+        assert LOSPattern.parse([True, False, False, True, True, True, True]) is pattern
+        assert LOSPattern.parse("1, 0, 0, 2, 1, 1, 1") is pattern
+        assert LOSPattern.from_days(["Mon", "Thu", "Fri", "Sat", "Sun"]) is pattern
+        assert pattern.bits == 0b1111001 and len(pattern) == 7
+        assert pattern.full_pattern_los == "1001111"
+        with pytest.raises(AttributeError):
+            pattern.bits = 0
+
+    def test_los_pattern_operations(self):
+        """Test day checks and set operations"""
+        weekdays, weekend = LOSPattern.parse("1111100"), LOSPattern.parse("0000011")
+        assert (weekdays | weekend).text == "1111111"
+        assert (weekdays & weekend).count() == 0
+        assert ~weekdays == weekend
+        assert (LOSPattern.parse("1111111") - weekend) == weekdays
+        assert weekend.is_day_available("Sat") and not weekend.is_day_available("Mon")
+        assert weekend.open_days() == ["Sat", "Sun"]
+        assert is_day_available("0000011", "Sun") is True
+        assert is_day_available("0000011", "Funday") is False
+        assert get_available_days("0000011") == ["Sat", "Sun"]
+
+
 class TestBooleanUtils:
     """Test boolean utility functions"""
     